@@ -42,6 +42,8 @@ int main() {
   DiscreteProblem *dp = new DiscreteProblem();
   dp->add_matrix_form(0, 0, jacobian);
   dp->add_vector_form(0, residual);
+  // the problem is linear (the system is assembled only once)
+  dp->set_linear(true);
 
   // Newton's loop
   newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER);
@@ -143,8 +143,8 @@ int main() {
       newton(dp, mesh, NULL, NEWTON_TOL_COARSE, NEWTON_MAXITER);
     }
     else {
-      jfnk_cg(dp, mesh, MATRIX_SOLVER_TOL, MATRIX_SOLVER_MAXITER,
-              JFNK_EPSILON, NEWTON_TOL_COARSE, NEWTON_MAXITER);
+      jfnk_gmres(dp, mesh, MATRIX_SOLVER_TOL, MATRIX_SOLVER_MAXITER,
+                 JFNK_EPSILON, NEWTON_TOL_COARSE, NEWTON_MAXITER);
     }
     // For every element perform its fast trial refinement (FTR),
     // calculate the norm of the difference between the FTR
@@ -169,8 +169,8 @@ int main() {
         newton(dp, mesh_ref_local, NULL, NEWTON_TOL_COARSE, NEWTON_MAXITER);
       }
       else {
-        jfnk_cg(dp, mesh_ref_local, MATRIX_SOLVER_TOL, MATRIX_SOLVER_MAXITER, 
-                JFNK_EPSILON, NEWTON_TOL_REF, NEWTON_MAXITER);
+        jfnk_gmres(dp, mesh_ref_local, MATRIX_SOLVER_TOL, MATRIX_SOLVER_MAXITER, 
+                   JFNK_EPSILON, NEWTON_TOL_REF, NEWTON_MAXITER);
       }
 
       // Print FTR solution (enumerated) 
@@ -68,7 +68,10 @@ int main() {
   dp->add_vector_form(3, residual_4);
 
   // Newton's loop
-  newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER);
+  // (the Jacobi matrix is banded after reordering, so the banded 
+  // direct solver is the fastest here)
+  CommonSolverBanded solver;
+  newton(dp, mesh, &solver, NEWTON_TOL, NEWTON_MAXITER);
 
   // Plot the solution
   Linearizer l(mesh);
@@ -74,6 +74,9 @@ int main() {
 
   dp->add_vector_form_surf(0, residual_surf_left_0, BOUNDARY_LEFT);
   dp->add_vector_form_surf(1, residual_surf_left_1, BOUNDARY_LEFT);
+
+  // the problem is linear (the system is assembled only once)
+  dp->set_linear(true);
 	  	
   // Newton's loop		
   newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER, verbose);
@@ -87,6 +87,9 @@ int main() {
   dp->add_vector_form(1, residual_mat1_1, mat1);
   dp->add_vector_form(1, residual_mat2_1, mat2); 
   dp->add_vector_form(1, residual_mat3_1, mat3);  
+
+  // the problem is linear (the system is assembled only once)
+  dp->set_linear(true);
 	  	
   // Newton's loop		
   newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER, verbose);
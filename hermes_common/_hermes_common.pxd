@@ -76,6 +76,7 @@ cdef extern from "arrayobject.h":
 
     object PyArray_SimpleNewFromData(int nd, npy_intp* dims, int typenum,
             void* data)
+    int PyArray_SetBaseObject(ndarray arr, PyObject *obj)
     void import_array()
 
 
@@ -84,11 +85,16 @@ cdef extern from "stdcython.h":
 
 cdef extern from "matrix.h":
 
+    cdef struct c_MatrixStorage "MatrixStorage"
+
     cdef struct c_Matrix "Matrix":
         int get_size()
         int is_complex()
         void add(int m, int n, double v)
         void add_cplx "add"(int m, int n, cplx v)
+        void add_many(int n, int *rows, int *cols, double *vals) except +
+        void add_many_cplx "add_many"(int n, int *rows, int *cols,
+                cplx *vals) except +
 
     cdef struct c_CooMatrix "CooMatrix":
         int get_nnz()
@@ -97,6 +103,15 @@ cdef extern from "matrix.h":
                 cplx *data)
     c_CooMatrix *new_CooMatrix "new CooMatrix" (int size, int is_complex)
 
+    cdef struct c_TripletMatrix "TripletMatrix":
+        int get_nnz()
+        int *get_row()
+        int *get_col()
+        double *get_data()
+        cplx *get_data_cplx()
+    c_TripletMatrix *new_TripletMatrix "new TripletMatrix" (int size,
+            int is_complex)
+
     cdef struct c_CSCMatrix "CSCMatrix"
 
     cdef struct c_CSRMatrix "CSRMatrix":
@@ -106,6 +121,8 @@ cdef extern from "matrix.h":
         double *get_Ax()
         cplx *get_Ax_cplx()
         int get_nnz()
+        void set_external_data(int size, int nnz, int *Ap, int *Ai,
+                double *Ax, cplx *Ax_cplx, c_MatrixStorage *storage) except +
     c_CSRMatrix *new_CSRMatrix_size "new CSRMatrix" (int size)
     c_CSRMatrix *new_CSRMatrix_coo_matrix "new CSRMatrix" (c_CooMatrix *m)
     c_CSRMatrix *new_CSRMatrix_csc_matrix "new CSRMatrix" (c_CSCMatrix *m)
@@ -121,6 +138,51 @@ cdef extern from "matrix.h":
     c_CSCMatrix *new_CSCMatrix_coo_matrix "new CSCMatrix" (c_CooMatrix *m)
     c_CSCMatrix *new_CSCMatrix_csr_matrix "new CSCMatrix" (c_CSRMatrix *m)
 
+cdef extern from "python_api.h":
+
+    c_MatrixStorage *new_PythonMatrixStorage "new PythonMatrixStorage" (
+            object a, object b, object c)
+
+cdef extern from "precond.h":
+
+    cdef struct c_CommonPreconditioner "CommonPreconditioner":
+        void setup(c_Matrix *mat) except +
+    cdef struct c_CommonPreconditionerBlockJacobi "CommonPreconditionerBlockJacobi":
+        void set_blocks(int n_blocks, int *ptr, int *idx)
+        int get_num_blocks()
+    c_CommonPreconditioner *new_CommonPreconditionerJacobi "new CommonPreconditionerJacobi" ()
+    c_CommonPreconditionerBlockJacobi *new_CommonPreconditionerBlockJacobi "new CommonPreconditionerBlockJacobi" ()
+    c_CommonPreconditioner *new_CommonPreconditionerILU0 "new CommonPreconditionerILU0" ()
+
+cdef extern from "solvers.h":
+
+    cdef struct c_CommonSolverStats "CommonSolverStats":
+        int iter_num
+        bint factorization_reused
+    cdef struct c_CommonSolver "CommonSolver":
+        int solve_nrhs "solve"(c_Matrix *mat, double *res, int nrhs) except +
+        void set_preconditioner(c_CommonPreconditioner *precond)
+        c_CommonSolverStats get_stats()
+    c_CommonSolver *new_CommonSolverDenseLU "new CommonSolverDenseLU" ()
+    c_CommonSolver *new_CommonSolverMixedLU "new CommonSolverMixedLU" ()
+    c_CommonSolver *new_CommonSolverBanded "new CommonSolverBanded" ()
+    c_CommonSolver *new_CommonSolverCholesky "new CommonSolverCholesky" ()
+    c_CommonSolver *new_CommonSolverUmfpack "new CommonSolverUmfpack" ()
+    c_CommonSolver *new_CommonSolverSuperLU "new CommonSolverSuperLU" ()
+    c_CommonSolver *new_CommonSolverCG "new CommonSolverCG" ()
+    c_CommonSolver *new_CommonSolverSparseLib "new CommonSolverSparseLib" ()
+    cdef struct c_vector_double "std::vector<double>":
+        int size()
+        double at(int i)
+    cdef struct c_CommonSolverKrylov "CommonSolverKrylov":
+        void set_tolerance(double tolerance)
+        void set_maxiter(int maxiter)
+        c_vector_double get_residual_history()
+    cdef struct c_CommonSolverGMRES "CommonSolverGMRES":
+        void set_restart(int restart)
+    c_CommonSolver *new_CommonSolverGMRES "new CommonSolverGMRES" ()
+    c_CommonSolver *new_CommonSolverBiCGStab "new CommonSolverBiCGStab" ()
+
 
 cdef api object c2numpy_int(int *A, int len)
 cdef api object c2numpy_double(double *A, int len)
@@ -22,6 +22,13 @@ cdef inline PY_NEW(T):
 
 cdef class Matrix:
     cdef c_Matrix *thisptr
+    # true if the C++ matrix belongs to this object (false for the matrices
+    # wrapped by c2py_CooMatrix() and friends, which are deleted by C++)
+    cdef int owner
+
+    def __dealloc__(self):
+        if self.owner:
+            delete(self.thisptr)
 
     def get_size(self):
         """
@@ -50,6 +57,48 @@ cdef class Matrix:
         """
         self.thisptr.add(m, n, v)
 
+    def add_many(self, rows, cols, vals):
+        """
+        Adds vals[k] to self[rows[k], cols[k]] for all k in one call.
+
+        The arguments are 1D arrays (or sequences) of the same length. They
+        are passed to C++ without copying if they are contiguous int32 and
+        float64 (complex128 for a complex matrix) NumPy arrays, otherwise
+        they are converted first. Entries with a negative index are skipped.
+
+        Example::
+
+            >>> from numpy import array
+            >>> from _hermes_common import CooMatrix
+            >>> a = CooMatrix(5)
+            >>> a.add_many(array([1, 2, 1]), array([3, 3, 3]),
+            ...         array([4.5, 3.5, 1.0]))
+            >>> a.row_col_data
+            (array([1, 2], dtype=int32), array([3, 3], dtype=int32), array([ 5.5,  3.5]))
+
+        """
+        from numpy import ascontiguousarray
+        cdef int n, nr, nc
+        cdef int *crows, *ccols
+        cdef double *cvals
+        cdef cplx *ccvals
+        rows = ascontiguousarray(rows, dtype="int32")
+        cols = ascontiguousarray(cols, dtype="int32")
+        numpy2c_int_inplace(rows, &crows, &nr)
+        numpy2c_int_inplace(cols, &ccols, &nc)
+        if self.thisptr.is_complex():
+            vals = ascontiguousarray(vals, dtype="complex128")
+            numpy2c_double_complex_inplace(vals, &ccvals, &n)
+        else:
+            vals = ascontiguousarray(vals, dtype="double")
+            numpy2c_double_inplace(vals, &cvals, &n)
+        if nr != n or nc != n:
+            raise ValueError("rows, cols and vals must have the same length.")
+        if self.thisptr.is_complex():
+            self.thisptr.add_many_cplx(n, crows, ccols, ccvals)
+        else:
+            self.thisptr.add_many(n, crows, ccols, cvals)
+
 cdef class SparseMatrix(Matrix):
     pass
 
@@ -68,6 +117,7 @@ cdef class CooMatrix(SparseMatrix):
 
     def __init__(self, size=0, is_complex=False):
         self.thisptr = <c_Matrix *>new_CooMatrix(size, is_complex)
+        self.owner = True
 
     def add(self, int m, int n, v):
         """
@@ -86,11 +136,37 @@ cdef class CooMatrix(SparseMatrix):
         else:
             self.thisptr.add(m, n, v)
 
+    @classmethod
+    def from_arrays(cls, rows, cols, vals, size=0):
+        """
+        Creates a Coo matrix from the (row, col, value) arrays.
+
+        The entries are inserted by a single add_many() call, duplicate
+        entries are summed up. The matrix is complex if ``vals`` is.
+
+        Example::
+
+            >>> from numpy import array
+            >>> from _hermes_common import CooMatrix
+            >>> a = CooMatrix.from_arrays(array([1, 2, 0]), array([3, 3, 2]),
+            ...         array([4.5, 3.5, 1.5]))
+            >>> a.get_size()
+            4
+
+        """
+        from numpy import iscomplexobj
+        cdef CooMatrix m = cls(size, iscomplexobj(vals))
+        m.add_many(rows, cols, vals)
+        return m
+
     @property
     def row_col_data(self):
         """
         Returns (row, col, data) arrays.
 
+        The entries are stored in a map, so the arrays are a copy. Use
+        TripletMatrix to get the arrays without copying.
+
         Example::
 
             >>> from _hermes_common import CooMatrix
@@ -152,6 +228,128 @@ cdef class CooMatrix(SparseMatrix):
     def __str__(self):
         return str(self.to_scipy_coo())
 
+cdef class TripletMatrix(SparseMatrix):
+    """
+    Represents a Triplet matrix, a COO matrix stored in contiguous (row, col,
+    data) arrays.
+
+    Example::
+
+        >>> from _hermes_common import TripletMatrix
+        >>> a = TripletMatrix(5)
+        >>> a.add(1, 3, 4.5)
+        >>> a.add(2, 3, 3.5)
+        >>> a.add(0, 2, 1.5)
+    """
+    # the number of alive arrays exported by row_col_data
+    cdef int nviews
+
+    def __init__(self, size=0, is_complex=False):
+        self.thisptr = <c_Matrix *>new_TripletMatrix(size, is_complex)
+        self.owner = True
+
+    cdef check_no_views(self):
+        # add() reallocates the arrays that the views point to
+        if self.nviews > 0:
+            raise RuntimeError("The matrix can't be changed while the "
+                    "arrays returned by row_col_data are alive.")
+
+    def add(self, int m, int n, v):
+        """
+        Adds the value ``v`` to self[m, n].
+
+        Raises RuntimeError if arrays returned by row_col_data (or
+        to_scipy_coo) are still alive.
+        """
+        self.check_no_views()
+        if self.thisptr.is_complex():
+            self.thisptr.add_cplx(m, n, v)
+        else:
+            self.thisptr.add(m, n, v)
+
+    def add_many(self, rows, cols, vals):
+        """
+        Adds vals[k] to self[rows[k], cols[k]] for all k in one call.
+
+        Raises RuntimeError if arrays returned by row_col_data (or
+        to_scipy_coo) are still alive.
+        """
+        self.check_no_views()
+        Matrix.add_many(self, rows, cols, vals)
+
+    @property
+    def row_col_data(self):
+        """
+        Returns (row, col, data) arrays sorted by (row, col), with the
+        duplicate entries summed up.
+
+        The arrays are views of the matrix data (nothing is copied), which
+        keep the matrix alive. The matrix can't be changed while they (or
+        any array or scipy matrix sharing their data) are alive: add() and
+        add_many() raise RuntimeError.
+
+        Example::
+
+            >>> from _hermes_common import TripletMatrix
+            >>> a = TripletMatrix(5)
+            >>> a.add(1, 3, 4.5)
+            >>> a.add(2, 3, 3.5)
+            >>> a.add(1, 3, 1.5)
+            >>> row, col, data = a.row_col_data
+            >>> print row, col, data
+            [1 2] [3 3] [ 6.   3.5]
+            >>> a.add(0, 0, 1.0)
+            Traceback (most recent call last):
+            ...
+            RuntimeError: The matrix can't be changed while the arrays returned by row_col_data are alive.
+            >>> del row, col, data
+            >>> a.add(0, 0, 1.0)
+
+        """
+        cdef c_TripletMatrix *_thisptr = <c_TripletMatrix*>(self.thisptr)
+        cdef int nnz = _thisptr.get_nnz()
+        # all three arrays share one base object, which counts the views
+        view = TripletMatrixView(self)
+        row = c2numpy_view(_thisptr.get_row(), nnz, NPY_INT, view)
+        col = c2numpy_view(_thisptr.get_col(), nnz, NPY_INT, view)
+        if self.thisptr.is_complex():
+            data = c2numpy_view(_thisptr.get_data_cplx(), nnz, NPY_COMPLEX128,
+                    view)
+        else:
+            data = c2numpy_view(_thisptr.get_data(), nnz, NPY_DOUBLE, view)
+        return row, col, data
+
+    def to_scipy_coo(self):
+        """
+        Converts itself to the scipy sparse COO format without copying the
+        arrays (see row_col_data). The matrix can't be changed while the
+        result is alive.
+        """
+        from scipy.sparse import coo_matrix
+        row, col, data = self.row_col_data
+        n = self.get_size()
+        return coo_matrix((data, (row, col)), shape=(n, n), copy=False)
+
+    def __str__(self):
+        return str(self.to_scipy_coo())
+
+cdef class TripletMatrixView:
+    """
+    The base object of the arrays returned by TripletMatrix.row_col_data.
+
+    It keeps the matrix alive and counts the alive views, so that the matrix
+    refuses to reallocate its arrays while some of them point there.
+    """
+    cdef TripletMatrix matrix
+
+    def __init__(self, TripletMatrix matrix):
+        self.matrix = matrix
+        matrix.nviews += 1
+
+    def __dealloc__(self):
+        if self.matrix is not None:
+            self.matrix.nviews -= 1
+
 cdef class CSRMatrix(SparseMatrix):
     """
     Represents a CSR Matrix.
@@ -181,42 +379,100 @@ cdef class CSRMatrix(SparseMatrix):
                     <c_CSCMatrix*>(py2c_Matrix(M).thisptr))
         else:
             raise Exception("Not implemented.")
+        self.owner = True
+
+    @classmethod
+    def from_scipy(cls, A):
+        """
+        Creates a CSR matrix from the scipy sparse matrix ``A``.
+
+        The indptr, indices and data arrays of ``A`` (converted to CSR with
+        sorted indices if needed) are used without copying if they are
+        contiguous int32 and float64 (or complex128) arrays, otherwise they
+        are converted first. The matrix keeps a reference to the arrays, so
+        changing the values of one of them changes the other one.
+
+        Example::
+
+            >>> from scipy.sparse import csr_matrix
+            >>> from _hermes_common import CSRMatrix
+            >>> A = csr_matrix([[2., 0], [1, 3]])
+            >>> m = CSRMatrix.from_scipy(A)
+            >>> m.A
+            array([ 2.,  1.,  3.])
+
+        """
+        from numpy import ascontiguousarray, iscomplexobj
+        cdef ndarray Ap, Ai, Ax
+        cdef CSRMatrix m
+        cdef c_CSRMatrix *_thisptr
+        cdef c_MatrixStorage *storage
+        A = A.tocsr()
+        n, n2 = A.shape
+        if n != n2:
+            raise ValueError("The matrix must be square.")
+        if not A.has_canonical_format:
+            A = A.copy()
+            A.sum_duplicates()
+        Ap = ascontiguousarray(A.indptr, dtype="int32")
+        Ai = ascontiguousarray(A.indices, dtype="int32")
+        if iscomplexobj(A.data):
+            Ax = ascontiguousarray(A.data, dtype="complex128")
+        else:
+            Ax = ascontiguousarray(A.data, dtype="double")
+        m = <CSRMatrix>PY_NEW(cls)
+        _thisptr = new_CSRMatrix_size(0)
+        m.thisptr = <c_Matrix *>_thisptr
+        m.owner = True
+        storage = new_PythonMatrixStorage(Ap, Ai, Ax)
+        if iscomplexobj(Ax):
+            _thisptr.set_external_data(n, len(Ai), <int *>(Ap.data),
+                    <int *>(Ai.data), NULL, <cplx *>(Ax.data), storage)
+        else:
+            _thisptr.set_external_data(n, len(Ai), <int *>(Ap.data),
+                    <int *>(Ai.data), <double *>(Ax.data), NULL, storage)
+        return m
 
     @property
     def IA(self):
         """
-        Returns (row, col, data) arrays.
+        Returns the row pointers (Ap), a view of the matrix data, which keeps
+        the matrix alive.
         """
         cdef c_CSRMatrix *_thisptr = <c_CSRMatrix*>(self.thisptr)
-        return c2numpy_int_inplace(_thisptr.get_Ap(), self.get_size()+1)
+        return c2numpy_view(_thisptr.get_Ap(), self.get_size()+1, NPY_INT, self)
 
     @property
     def JA(self):
         """
-        Returns (row, col, data) arrays.
+        Returns the column indices (Ai), a view of the matrix data, which keeps
+        the matrix alive.
         """
         cdef c_CSRMatrix *_thisptr = <c_CSRMatrix*>(self.thisptr)
-        return c2numpy_int_inplace(_thisptr.get_Ai(), _thisptr.get_nnz())
+        return c2numpy_view(_thisptr.get_Ai(), _thisptr.get_nnz(), NPY_INT, self)
 
     @property
     def A(self):
         """
-        Returns (row, col, data) arrays.
+        Returns the values (Ax), a view of the matrix data, which keeps
+        the matrix alive.
         """
         cdef c_CSRMatrix *_thisptr = <c_CSRMatrix*>(self.thisptr)
         if self.thisptr.is_complex():
-            return c2numpy_double_complex_inplace(_thisptr.get_Ax_cplx(),
-                    _thisptr.get_nnz())
+            return c2numpy_view(_thisptr.get_Ax_cplx(), _thisptr.get_nnz(),
+                    NPY_COMPLEX128, self)
         else:
-            return c2numpy_double_inplace(_thisptr.get_Ax(), _thisptr.get_nnz())
+            return c2numpy_view(_thisptr.get_Ax(), _thisptr.get_nnz(),
+                    NPY_DOUBLE, self)
 
     def to_scipy_csr(self):
         """
-        Converts itself to the scipy sparse CSR format.
+        Converts itself to the scipy sparse CSR format without copying the
+        arrays (see IA, JA and A).
         """
         from scipy.sparse import csr_matrix
         n = self.get_size()
-        return csr_matrix((self.A, self.JA, self.IA), shape=(n, n))
+        return csr_matrix((self.A, self.JA, self.IA), shape=(n, n), copy=False)
 
     def __str__(self):
         return str(self.to_scipy_csr())
@@ -250,42 +506,48 @@ cdef class CSCMatrix(SparseMatrix):
                     <c_CSRMatrix*>(py2c_Matrix(M).thisptr))
         else:
             raise Exception("Not implemented.")
+        self.owner = True
 
     @property
     def IA(self):
         """
-        Returns (row, col, data) arrays.
+        Returns the row indices (Ai), a view of the matrix data, which keeps
+        the matrix alive.
         """
         cdef c_CSCMatrix *_thisptr = <c_CSCMatrix*>(self.thisptr)
-        return c2numpy_int_inplace(_thisptr.get_Ai(), _thisptr.get_nnz())
+        return c2numpy_view(_thisptr.get_Ai(), _thisptr.get_nnz(), NPY_INT, self)
 
     @property
     def JA(self):
         """
-        Returns (row, col, data) arrays.
+        Returns the column pointers (Ap), a view of the matrix data, which keeps
+        the matrix alive.
         """
         cdef c_CSCMatrix *_thisptr = <c_CSCMatrix*>(self.thisptr)
-        return c2numpy_int_inplace(_thisptr.get_Ap(), self.get_size()+1)
+        return c2numpy_view(_thisptr.get_Ap(), self.get_size()+1, NPY_INT, self)
 
     @property
     def A(self):
         """
-        Returns (row, col, data) arrays.
+        Returns the values (Ax), a view of the matrix data, which keeps
+        the matrix alive.
         """
         cdef c_CSCMatrix *_thisptr = <c_CSCMatrix*>(self.thisptr)
         if self.thisptr.is_complex():
-            return c2numpy_double_complex_inplace(_thisptr.get_Ax_cplx(),
-                    _thisptr.get_nnz())
+            return c2numpy_view(_thisptr.get_Ax_cplx(), _thisptr.get_nnz(),
+                    NPY_COMPLEX128, self)
         else:
-            return c2numpy_double_inplace(_thisptr.get_Ax(), _thisptr.get_nnz())
+            return c2numpy_view(_thisptr.get_Ax(), _thisptr.get_nnz(),
+                    NPY_DOUBLE, self)
 
     def to_scipy_csc(self):
         """
-        Converts itself to the scipy sparse CSC format.
+        Converts itself to the scipy sparse CSC format without copying the
+        arrays (see IA, JA and A).
         """
         from scipy.sparse import csc_matrix
         n = self.get_size()
-        return csc_matrix((self.A, self.IA, self.JA), shape=(n, n))
+        return csc_matrix((self.A, self.IA, self.JA), shape=(n, n), copy=False)
 
     def __str__(self):
         return str(self.to_scipy_csc())
@@ -311,6 +573,242 @@ cdef api object c2py_CSCMatrix(c_CSCMatrix *m):
     c.thisptr = <c_Matrix *>m
     return c
 
+#-----------------------------------------------------------------------
+# Solvers:
+
+cdef class CommonPreconditioner:
+    cdef c_CommonPreconditioner *thisptr
+
+    def __dealloc__(self):
+        delete(self.thisptr)
+
+cdef class CommonPreconditionerJacobi(CommonPreconditioner):
+
+    def __init__(self):
+        self.thisptr = new_CommonPreconditionerJacobi()
+
+cdef class CommonPreconditionerBlockJacobi(CommonPreconditioner):
+
+    def __init__(self):
+        self.thisptr = <c_CommonPreconditioner *>(
+                new_CommonPreconditionerBlockJacobi())
+
+    def set_blocks(self, blocks):
+        """
+        Sets the blocks, ``blocks`` is a list of lists of indices (e.g. the
+        dofs of every element). The blocks may overlap.
+        """
+        from numpy import array, cumsum
+        cdef ndarray ptr = array([0] + list(cumsum([len(b) for b in blocks])),
+                dtype="int32")
+        cdef ndarray idx = array([i for b in blocks for i in b],
+                dtype="int32")
+        (<c_CommonPreconditionerBlockJacobi *>(self.thisptr)).set_blocks(
+                len(blocks), <int *>(ptr.data), <int *>(idx.data))
+
+    def get_num_blocks(self):
+        return (<c_CommonPreconditionerBlockJacobi *>(
+            self.thisptr)).get_num_blocks()
+
+cdef class CommonPreconditionerILU0(CommonPreconditioner):
+
+    def __init__(self):
+        self.thisptr = new_CommonPreconditionerILU0()
+
+cdef class CommonSolver:
+    cdef c_CommonSolver *thisptr
+    # keeps the preconditioner alive, the solver doesn't own it
+    cdef object precond
+
+    def __dealloc__(self):
+        delete(self.thisptr)
+
+    def set_preconditioner(self, CommonPreconditioner p):
+        """
+        Sets the preconditioner of the iterative solvers (CG, SparseLib++).
+        """
+        self.precond = p
+        self.thisptr.set_preconditioner(p.thisptr)
+
+    def solve(self, Matrix A, b):
+        """
+        Solves the system A*x = b and returns x.
+
+        ``b`` is either one right-hand side, or a 2D array with one
+        right-hand side in each row. The matrix is factorized only once for
+        all the right-hand sides. The errors of the solver (e.g. a singular
+        matrix) raise RuntimeError.
+
+        Example::
+
+            >>> from _hermes_common import CooMatrix, CommonSolverDenseLU
+            >>> a = CooMatrix(2)
+            >>> a.add(0, 0, 2)
+            >>> a.add(1, 1, 4)
+            >>> s = CommonSolverDenseLU()
+            >>> s.solve(a, [2, 4])
+            array([ 1.,  1.])
+            >>> s.solve(a, [[2, 4], [4, 2]])
+            array([[ 1. ,  1. ],
+                   [ 2. ,  0.5]])
+            >>> b = CooMatrix(2)
+            >>> b.add(0, 0, 2)
+            >>> s.solve(b, [2, 4])
+            Traceback (most recent call last):
+            ...
+            RuntimeError: Dense LU: the matrix is singular.
+
+        """
+        from numpy import array
+        cdef ndarray x = array(b, dtype="double", order="C")
+        n = A.get_size()
+        if x.nd == 1:
+            nrhs = 1
+        elif x.nd == 2:
+            nrhs = x.dimensions[0]
+        else:
+            raise ValueError("b must be a 1D or 2D array.")
+        if x.dimensions[x.nd-1] != n:
+            raise ValueError("The right-hand side has a wrong size.")
+        if not self.thisptr.solve_nrhs(A.thisptr, <double *>(x.data), nrhs):
+            raise Exception("The solver failed.")
+        return x
+
+    def get_stats(self):
+        """
+        Returns the statistics of the last solve() call as a dictionary:
+        the number of iterations of the iterative solvers ('iter_num') and
+        whether the factorization of the previous call was reused
+        ('factorization_reused').
+        """
+        cdef c_CommonSolverStats stats = self.thisptr.get_stats()
+        return {"iter_num": stats.iter_num,
+                "factorization_reused": bool(stats.factorization_reused)}
+
+cdef class CommonSolverDenseLU(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverDenseLU()
+
+cdef class CommonSolverMixedLU(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverMixedLU()
+
+cdef class CommonSolverBanded(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverBanded()
+
+cdef class CommonSolverCholesky(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverCholesky()
+
+cdef class CommonSolverUmfpack(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverUmfpack()
+
+cdef class CommonSolverSuperLU(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverSuperLU()
+
+cdef class CommonSolverCG(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverCG()
+
+cdef class CommonSolverSparseLib(CommonSolver):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverSparseLib()
+
+cdef class CommonSolverKrylov(CommonSolver):
+
+    def set_tolerance(self, double tolerance):
+        (<c_CommonSolverKrylov *>(self.thisptr)).set_tolerance(tolerance)
+
+    def set_maxiter(self, int maxiter):
+        (<c_CommonSolverKrylov *>(self.thisptr)).set_maxiter(maxiter)
+
+    def get_residual_history(self):
+        """
+        Returns the residual norms of the last solve() call (the initial one
+        and the one after every iteration) as a list.
+        """
+        cdef c_vector_double h = (<c_CommonSolverKrylov *>(
+            self.thisptr)).get_residual_history()
+        return [h.at(i) for i in range(h.size())]
+
+cdef class CommonSolverGMRES(CommonSolverKrylov):
+
+    def __init__(self, restart=30):
+        self.thisptr = new_CommonSolverGMRES()
+        (<c_CommonSolverGMRES *>(self.thisptr)).set_restart(restart)
+
+    def set_restart(self, int restart):
+        (<c_CommonSolverGMRES *>(self.thisptr)).set_restart(restart)
+
+cdef class CommonSolverBiCGStab(CommonSolverKrylov):
+
+    def __init__(self):
+        self.thisptr = new_CommonSolverBiCGStab()
+
+#-----------------------------------------------------------------------
+# Binary matrix files (see matrixio.h):
+
+def load_binary_matrix(filename):
+    """
+    Memory maps a matrix written by write_binary_csr(), write_binary_csc()
+    or write_binary_coo().
+
+    Returns (format, size, arrays), where format is "csr", "csc" or "coo"
+    and arrays are (Ap, Ai, Ax) for CSR/CSC and (row, col, data) for COO.
+    The arrays are numpy memmaps of the file (copy-on-write), so nothing
+    is read until the data is used.
+
+    Example::
+
+        >>> from scipy.sparse import csr_matrix
+        >>> from _hermes_common import load_binary_matrix
+        >>> format, n, (Ap, Ai, Ax) = load_binary_matrix("jacobian.bin") # doctest: +SKIP
+        >>> format # doctest: +SKIP
+        'csr'
+        >>> A = csr_matrix((Ax, Ai, Ap), shape=(n, n)) # doctest: +SKIP
+
+    """
+    from numpy import memmap, dtype
+    header_dtype = dtype([("magic", "S8"), ("version", "i4"),
+        ("format", "i4"), ("complex", "i4"), ("index_size", "i4"),
+        ("value_size", "i4"), ("size", "i4"), ("nnz", "i4"),
+        ("reserved", "i4")])
+    h = memmap(filename, dtype=header_dtype, mode="r", shape=(1,))[0]
+    if h["magic"] != b"HERMESMX" or h["version"] != 1:
+        raise ValueError("%s is not a binary matrix file." % filename)
+    if h["index_size"] != 4:
+        raise ValueError("Unsupported index size.")
+    if h["format"] not in (0, 1, 2) or h["size"] < 0 or h["nnz"] < 0:
+        raise ValueError("Invalid format, size or nnz.")
+    format = ["csr", "csc", "coo"][h["format"]]
+    size = int(h["size"])
+    nnz = int(h["nnz"])
+    values = "complex128" if h["complex"] else "float64"
+
+    # the arrays are aligned to 8 bytes
+    len1 = nnz if format == "coo" else size + 1
+    offset = header_dtype.itemsize
+    a1 = memmap(filename, dtype="int32", mode="c", offset=offset,
+            shape=(len1,))
+    offset += (4*len1 + 7) // 8 * 8
+    a2 = memmap(filename, dtype="int32", mode="c", offset=offset,
+            shape=(nnz,))
+    offset += (4*nnz + 7) // 8 * 8
+    a3 = memmap(filename, dtype=values, mode="c", offset=offset,
+            shape=(nnz,))
+    return format, size, (a1, a2, a3)
+
 #-----------------------------------------------------------------------
 # Common C++ <-> Python+NumPy conversion tools:
 
@@ -443,6 +941,19 @@ cdef api object c2numpy_double_complex_inplace(cplx *A, int len):
     cdef npy_intp dim = len
     return PyArray_SimpleNewFromData(1, &dim, NPY_COMPLEX128, A)
 
+cdef object c2numpy_view(void *A, int len, int typenum, object owner):
+    """
+    Construct the NumPy array inplace (don't copy any data), which keeps
+    ``owner`` (the object the data belong to) alive as long as the array or
+    any view of it exists.
+    """
+    cdef npy_intp dim = len
+    cdef ndarray vec = PyArray_SimpleNewFromData(1, &dim, typenum, A)
+    # PyArray_SetBaseObject() steals the reference
+    Py_INCREF(owner)
+    PyArray_SetBaseObject(vec, <PyObject *>owner)
+    return vec
+
 _AA = None
 
 cdef api void numpy2c_int_inplace(object A_n, int **A_c, int *n):
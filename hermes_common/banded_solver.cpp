@@ -0,0 +1,205 @@
+// Copyright (c) 2009 hp-FEM group at the University of Nevada, Reno (UNR).
+// Distributed under the terms of the BSD license (see the LICENSE
+// file for the exact terms).
+// Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
+
+#include <algorithm>
+
+#include "matrix.h"
+#include "solvers.h"
+
+// LU factorization of a band matrix with partial pivoting (the rows are
+// interchanged), done in place. The multipliers are stored below the
+// diagonal, the fill-in of U goes to the additional kl superdiagonals.
+// ipiv[k] is the row interchanged with the row k in the k-th step.
+template<typename T>
+void band_ludcmp(T *ab, int n, int kl, int ku, int *ipiv)
+{
+    int ldab = 2*kl + ku + 1;
+    // entry (i, j) of the band matrix
+#define AB(i, j) ab[(i)*ldab + (j) - (i) + kl]
+    for (int k = 0; k < n; k++)
+    {
+        int imax = std::min(n - 1, k + kl);
+        int jmax = std::min(n - 1, k + kl + ku);
+
+        // find the pivot in the column k
+        int p = k;
+        for (int i = k + 1; i <= imax; i++)
+            if (fabs(AB(i, k)) > fabs(AB(p, k))) p = i;
+        ipiv[k] = p;
+        if (AB(p, k) == 0)
+            _error("Banded LU solver: the matrix is singular.");
+
+        if (p != k)
+            for (int j = k; j <= jmax; j++)
+                std::swap(AB(k, j), AB(p, j));
+
+        // eliminate the column k below the diagonal
+        T pivot = AB(k, k);
+        for (int i = k + 1; i <= imax; i++)
+        {
+            T l = AB(i, k) /= pivot;
+            if (l == 0) continue;
+            for (int j = k + 1; j <= jmax; j++)
+                AB(i, j) -= l*AB(k, j);
+        }
+    }
+}
+
+// Solves the system using the factorization from band_ludcmp(). 'b' comes as
+// the right-hand side and leaves as the solution.
+template<typename T>
+void band_lubksb(T *ab, int n, int kl, int ku, int *ipiv, T *b)
+{
+    int ldab = 2*kl + ku + 1;
+    // forward substitution (applies the interchanges in the same order)
+    for (int k = 0; k < n; k++)
+    {
+        std::swap(b[k], b[ipiv[k]]);
+        int imax = std::min(n - 1, k + kl);
+        for (int i = k + 1; i <= imax; i++)
+            b[i] -= AB(i, k)*b[k];
+    }
+    // back substitution
+    for (int k = n - 1; k >= 0; k--)
+    {
+        int jmax = std::min(n - 1, k + kl + ku);
+        T sum = b[k];
+        for (int j = k + 1; j <= jmax; j++)
+            sum -= AB(k, j)*b[j];
+        b[k] = sum / AB(k, k);
+    }
+#undef AB
+}
+
+template void band_ludcmp<double>(double *ab, int n, int kl, int ku, int *ipiv);
+template void band_ludcmp<float>(float *ab, int n, int kl, int ku, int *ipiv);
+template void band_lubksb<double>(double *ab, int n, int kl, int ku, int *ipiv, double *b);
+template void band_lubksb<float>(float *ab, int n, int kl, int ku, int *ipiv, float *b);
+
+CommonSolverBanded::CommonSolverBanded()
+{
+    this->size = 0;
+    this->nnz = 0;
+    this->Ap = NULL;
+    this->Ai = NULL;
+    this->perm = NULL;
+    this->lu = NULL;
+    this->ipiv = NULL;
+    this->lu_permuted = false;
+}
+
+CommonSolverBanded::~CommonSolverBanded()
+{
+    free_factorization();
+    free_ordering();
+}
+
+void CommonSolverBanded::free_ordering()
+{
+    if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
+    if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
+    if (this->perm) { delete[] this->perm; this->perm = NULL; }
+    this->size = 0;
+    this->nnz = 0;
+}
+
+void CommonSolverBanded::free_factorization()
+{
+    if (this->lu) { delete this->lu; this->lu = NULL; }
+    if (this->ipiv) { delete[] this->ipiv; this->ipiv = NULL; }
+}
+
+void CommonSolverBanded::factorize(Matrix *mat)
+{
+    free_factorization();
+
+    if (BandedMatrix *mband = dynamic_cast<BandedMatrix*>(mat))
+    {
+        // the factorization is done in place, so we need a copy
+        this->lu = new BandedMatrix(mband->get_size(), mband->get_kl(), mband->get_ku());
+        memcpy(this->lu->get_data(), mband->get_data(),
+               mband->get_size()*mband->get_ldab()*sizeof(double));
+        this->lu_permuted = false;
+    }
+    else
+    {
+        CSRMatrix *Acsr = NULL;
+        if (CSRMatrix *mcsr = dynamic_cast<CSRMatrix*>(mat))
+            Acsr = mcsr;
+        else
+            Acsr = new CSRMatrix(mat);
+
+        // compute the ordering only if the sparsity pattern has changed
+        int n = Acsr->get_size();
+        int n_nz = Acsr->get_nnz();
+        if (this->factorization_scheme == FACTORIZE_FROM_SCRATCH
+            || n != this->size || n_nz != this->nnz
+            || memcmp(Acsr->get_Ap(), this->Ap, (n + 1)*sizeof(int))
+            || memcmp(Acsr->get_Ai(), this->Ai, n_nz*sizeof(int)))
+        {
+            free_ordering();
+            this->size = n;
+            this->nnz = n_nz;
+            this->Ap = new int[n + 1];
+            this->Ai = new int[n_nz];
+            this->perm = new int[n];
+            memcpy(this->Ap, Acsr->get_Ap(), (n + 1)*sizeof(int));
+            memcpy(this->Ai, Acsr->get_Ai(), n_nz*sizeof(int));
+            rcm_ordering(n, this->Ap, this->Ai, this->perm);
+        }
+
+        this->lu = new BandedMatrix(Acsr, this->perm);
+        this->lu_permuted = true;
+
+        if (!dynamic_cast<CSRMatrix*>(mat))
+            delete Acsr;
+    }
+
+    int n = this->lu->get_size();
+    printf("Banded LU solver: size: %i, kl: %i, ku: %i\n", n,
+           this->lu->get_kl(), this->lu->get_ku());
+
+    this->ipiv = new int[n];
+    band_ludcmp(this->lu->get_data(), n, this->lu->get_kl(), this->lu->get_ku(), this->ipiv);
+}
+
+bool CommonSolverBanded::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverBanded::solve(Matrix *mat, double *res, int nrhs)
+{
+    this->stats = CommonSolverStats();
+    if (this->factorization_scheme != REUSE_FACTORIZATION || this->lu == NULL
+        || this->lu->get_size() != mat->get_size())
+        factorize(mat);
+    else
+        this->stats.factorization_reused = true;
+
+    int n = this->lu->get_size();
+    double *b = new double[n];
+    for (int k = 0; k < nrhs; k++)
+    {
+        double *r = res + k*n;
+        for (int i = 0; i < n; i++)
+            b[i] = this->lu_permuted ? r[this->perm[i]] : r[i];
+        band_lubksb(this->lu->get_data(), n, this->lu->get_kl(), this->lu->get_ku(), this->ipiv, b);
+        for (int i = 0; i < n; i++)
+            if (this->lu_permuted)
+                r[this->perm[i]] = b[i];
+            else
+                r[i] = b[i];
+    }
+
+    delete[] b;
+
+    return true;
+}
+
+bool CommonSolverBanded::solve(Matrix *mat, cplx *res)
+{
+    _error("CommonSolverBanded::solve(Matrix *mat, cplx *res) not implemented.");
+}
@@ -0,0 +1,184 @@
+// Copyright (c) 2009 hp-FEM group at the University of Nevada, Reno (UNR).
+// Distributed under the terms of the BSD license (see the LICENSE
+// file for the exact terms).
+// Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
+
+#include <algorithm>
+
+#include "matrix.h"
+#include "solvers.h"
+
+// entry (i, j), i <= j <= i + kd, of the upper band matrix 'u'
+#define UB(i, j) u[(i)*(kd + 1) + (j) - (i)]
+
+// Cholesky factorization A = U^T U of a symmetric positive definite band
+// matrix with 'kd' superdiagonals, done in place: 'u' comes with the upper
+// triangle of A and leaves with U.
+static void band_cholesky(double *u, int n, int kd)
+{
+    for (int i = 0; i < n; i++)
+    {
+        int jmax = std::min(n - 1, i + kd);
+        for (int j = i; j <= jmax; j++)
+        {
+            double sum = UB(i, j);
+            for (int k = std::max(0, j - kd); k < i; k++)
+                sum -= UB(k, i)*UB(k, j);
+            if (j == i)
+            {
+                if (sum <= 0)
+                    _error("Cholesky solver: the matrix is not positive definite.");
+                UB(i, i) = sqrt(sum);
+            }
+            else
+                UB(i, j) = sum / UB(i, i);
+        }
+    }
+}
+
+// Solves U^T U x = b using the factorization from band_cholesky(). 'b' comes
+// as the right-hand side and leaves as the solution.
+static void band_cholesky_solve(double *u, int n, int kd, double *b)
+{
+    // U^T y = b
+    for (int i = 0; i < n; i++)
+    {
+        double sum = b[i];
+        for (int k = std::max(0, i - kd); k < i; k++)
+            sum -= UB(k, i)*b[k];
+        b[i] = sum / UB(i, i);
+    }
+    // U x = y
+    for (int i = n - 1; i >= 0; i--)
+    {
+        int jmax = std::min(n - 1, i + kd);
+        double sum = b[i];
+        for (int j = i + 1; j <= jmax; j++)
+            sum -= UB(i, j)*b[j];
+        b[i] = sum / UB(i, i);
+    }
+}
+
+#undef UB
+
+CommonSolverCholesky::CommonSolverCholesky()
+{
+    this->size = 0;
+    this->nnz = 0;
+    this->Ap = NULL;
+    this->Ai = NULL;
+    this->perm = NULL;
+    this->U = NULL;
+    this->kd = 0;
+}
+
+CommonSolverCholesky::~CommonSolverCholesky()
+{
+    free_factorization();
+    free_ordering();
+}
+
+void CommonSolverCholesky::free_ordering()
+{
+    if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
+    if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
+    if (this->perm) { delete[] this->perm; this->perm = NULL; }
+    this->size = 0;
+    this->nnz = 0;
+}
+
+void CommonSolverCholesky::free_factorization()
+{
+    if (this->U) { delete[] this->U; this->U = NULL; }
+}
+
+void CommonSolverCholesky::factorize(Matrix *mat)
+{
+    free_factorization();
+
+    SymCSRMatrix *A = dynamic_cast<SymCSRMatrix*>(mat);
+    if (A == NULL) A = new SymCSRMatrix(mat);
+
+    // compute the ordering only if the sparsity pattern has changed
+    int n = A->get_size();
+    int n_nz = A->get_nnz();
+    int *Ap = A->get_Ap(), *Ai = A->get_Ai();
+    double *Ax = A->get_Ax();
+    if (this->factorization_scheme == FACTORIZE_FROM_SCRATCH
+        || n != this->size || n_nz != this->nnz
+        || memcmp(Ap, this->Ap, (n + 1)*sizeof(int))
+        || memcmp(Ai, this->Ai, n_nz*sizeof(int)))
+    {
+        free_ordering();
+        this->size = n;
+        this->nnz = n_nz;
+        this->Ap = new int[n + 1];
+        this->Ai = new int[n_nz];
+        this->perm = new int[n];
+        memcpy(this->Ap, Ap, (n + 1)*sizeof(int));
+        memcpy(this->Ai, Ai, n_nz*sizeof(int));
+        // the pattern is symmetrized by rcm_ordering()
+        rcm_ordering(n, this->Ap, this->Ai, this->perm);
+    }
+
+    // iperm[i] is the new index of the original row i
+    int *iperm = new int[n];
+    for (int i = 0; i < n; i++) iperm[this->perm[i]] = i;
+    this->kd = 0;
+    for (int i = 0; i < n; i++)
+        for (int k = Ap[i]; k < Ap[i+1]; k++)
+            this->kd = std::max(this->kd, abs(iperm[i] - iperm[Ai[k]]));
+
+    printf("Cholesky solver: size: %i, kd: %i\n", n, this->kd);
+
+    this->U = new double[n*(this->kd + 1)];
+    memset(this->U, 0, n*(this->kd + 1)*sizeof(double));
+    for (int i = 0; i < n; i++)
+        for (int k = Ap[i]; k < Ap[i+1]; k++)
+        {
+            int r = iperm[i], c = iperm[Ai[k]];
+            if (r > c) std::swap(r, c);
+            this->U[r*(this->kd + 1) + c - r] = Ax[k];
+        }
+    delete[] iperm;
+
+    if (A != mat) delete A;
+
+    band_cholesky(this->U, n, this->kd);
+}
+
+bool CommonSolverCholesky::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverCholesky::solve(Matrix *mat, double *res, int nrhs)
+{
+    this->stats = CommonSolverStats();
+    if (this->factorization_scheme != REUSE_FACTORIZATION || this->U == NULL
+        || this->size != mat->get_size())
+        factorize(mat);
+    else
+        this->stats.factorization_reused = true;
+
+    int n = this->size;
+    double *b = new double[n];
+    for (int k = 0; k < nrhs; k++)
+    {
+        double *r = res + k*n;
+        for (int i = 0; i < n; i++)
+            b[i] = r[this->perm[i]];
+        band_cholesky_solve(this->U, n, this->kd, b);
+        for (int i = 0; i < n; i++)
+            r[this->perm[i]] = b[i];
+    }
+
+    delete[] b;
+
+    return true;
+}
+
+bool CommonSolverCholesky::solve(Matrix *mat, cplx *res)
+{
+    _error("CommonSolverCholesky::solve(Matrix *mat, cplx *res) not implemented.");
+}
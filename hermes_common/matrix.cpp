@@ -3,6 +3,11 @@
 // file for the exact terms).
 // Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
 
+#include <algorithm>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 #include "matrix.h"
 
 // print vector - int
@@ -71,6 +76,10 @@ DenseMatrix::DenseMatrix(Matrix *m)
 
     if (dynamic_cast<CooMatrix *>(m))
         this->add_from_coo((CooMatrix *)m);
+    else if (dynamic_cast<TripletMatrix *>(m))
+        this->add_from_triplet((TripletMatrix *)m);
+    else if (dynamic_cast<CSRMatrix *>(m))
+        this->add_from_csr((CSRMatrix *)m);
     else
         _error("Matrix type not supported.");
 }
@@ -84,6 +93,24 @@ DenseMatrix::DenseMatrix(CooMatrix *m)
     this->add_from_coo(m);
 }
 
+DenseMatrix::DenseMatrix(TripletMatrix *m)
+{
+    this->size = m->get_size();
+    this->complex = m->is_complex();
+    init();
+
+    this->add_from_triplet(m);
+}
+
+DenseMatrix::DenseMatrix(CSRMatrix *m)
+{
+    this->size = m->get_size();
+    this->complex = m->is_complex();
+    init();
+
+    this->add_from_csr(m);
+}
+
 DenseMatrix::DenseMatrix(int size, bool is_complex)
 {
     this->complex = is_complex;
@@ -163,6 +190,43 @@ void DenseMatrix::add_from_coo(CooMatrix *m)
     if (col) delete[] col;
 }
 
+void DenseMatrix::add_from_triplet(TripletMatrix *m)
+{
+    int nnz = m->get_nnz();
+    int *row = m->get_row();
+    int *col = m->get_col();
+
+    if (complex)
+    {
+        cplx *data = m->get_data_cplx();
+        for (int i = 0; i < nnz; i++)
+            A_cplx[row[i]][col[i]] = data[i];
+    }
+    else
+    {
+        double *data = m->get_data();
+        for (int i = 0; i < nnz; i++)
+            A[row[i]][col[i]] = data[i];
+    }
+}
+
+void DenseMatrix::add_from_csr(CSRMatrix *m)
+{
+    int *Ap = m->get_Ap();
+    int *Ai = m->get_Ai();
+
+    for (int i = 0; i < this->size; i++)
+    {
+        for (int j = Ap[i]; j < Ap[i+1]; j++)
+        {
+            if (complex)
+                A_cplx[i][Ai[j]] = m->get_Ax_cplx()[j];
+            else
+                A[i][Ai[j]] = m->get_Ax()[j];
+        }
+    }
+}
+
 int DenseMatrix::get_nnz()
 {
     int nnz = 0;
@@ -209,6 +273,22 @@ void DenseMatrix::print()
     }
 }
 
+void DenseMatrix::times_vector(double* vec, double* result, int rank)
+{
+    if (is_complex())
+        _error("DenseMatrix::times_vector() not implemented for complex matrices.");
+
+#pragma omp parallel for schedule(static) if (rank > 100)
+    for (int i = 0; i < rank; i++)
+    {
+        double *row = this->A[i];
+        double sum = 0;
+        for (int j = 0; j < rank; j++)
+            sum += row[j] * vec[j];
+        result[i] = sum;
+    }
+}
+
 // *********************************************************************************************************************
 
 CooMatrix::CooMatrix(bool complex) : Matrix()
@@ -261,6 +341,16 @@ void CooMatrix::free_data()
     A_cplx.clear();
     A.clear();
     this->size = 0;
+    free_csr_product();
+}
+
+void CooMatrix::free_csr_product()
+{
+    if (this->csr_product)
+    {
+        delete this->csr_product;
+        this->csr_product = NULL;
+    }
 }
 
 void CooMatrix::add_from_csr(CSRMatrix *m)
@@ -320,6 +410,8 @@ void CooMatrix::add(int m, int n, double v)
     if (this->complex)
         _error("can't use add(int, int, double) for complex matrix");
 
+    free_csr_product();
+
     // adjusting size if necessary
     if (m+1 > this->size) this->size = m+1;
     if (n+1 > this->size) this->size = n+1;
@@ -333,6 +425,8 @@ void CooMatrix::add(int m, int n, cplx v)
     if (!(this->complex))
         _error("can't use add(int, int, cplx) for real matrix");
 
+    free_csr_product();
+
     // adjusting size if necessary
     if (m+1 > this->size) this->size = m+1;
     if (n+1 > this->size) this->size = n+1;
@@ -439,15 +533,15 @@ int CooMatrix::get_nnz()
 
 void CooMatrix::times_vector(double* vec, double* result, int rank)
 {
-    for (int i=0; i < rank; i++) result[i] = 0;
+    if (is_complex())
+        _error("CooMatrix::times_vector() not implemented for complex matrices.");
 
-    for(std::map<size_t, std::map<size_t, double> >::const_iterator it_row = A.begin(); it_row != A.end(); ++it_row)
-    {
-        for(std::map<size_t, double>::const_iterator it_col = it_row->second.begin(); it_col != it_row->second.end(); ++it_col)
-        {
-            result[it_row->first] += it_col->second * vec[it_col->first];
-        }
-    }
+    // the iterative solvers multiply by the same matrix many times, so the
+    // maps are converted only once and the products use the (parallel) CSR
+    // kernel
+    if (this->csr_product == NULL)
+        this->csr_product = new CSRMatrix(this);
+    this->csr_product->times_vector(vec, result, rank);
 }
 
 void CooMatrix::print()
@@ -483,6 +577,266 @@ void CooMatrix::print()
     }
 }
 
+// *********************************************************************************************************************
+
+TripletMatrix::TripletMatrix(bool complex) : Matrix()
+{
+    init();
+
+    this->complex = complex;
+    this->size = 0;
+}
+
+TripletMatrix::TripletMatrix(int size, bool complex) : Matrix()
+{
+    init();
+
+    this->complex = complex;
+    this->size = size;
+}
+
+TripletMatrix::~TripletMatrix()
+{
+    this->free_data();
+}
+
+void TripletMatrix::free_data()
+{
+    // swap with empty vectors to really release the memory
+    std::vector<int>().swap(row);
+    std::vector<int>().swap(col);
+    std::vector<double>().swap(data);
+    std::vector<cplx>().swap(data_cplx);
+    this->finalized = true;
+    this->size = 0;
+    free_csr_product();
+}
+
+void TripletMatrix::free_csr_product()
+{
+    if (this->csr_product)
+    {
+        delete this->csr_product;
+        this->csr_product = NULL;
+    }
+}
+
+void TripletMatrix::set_zero()
+{
+    row.clear();
+    col.clear();
+    data.clear();
+    data_cplx.clear();
+    this->finalized = true;
+    free_csr_product();
+}
+
+void TripletMatrix::reserve(int nnz)
+{
+    row.reserve(nnz);
+    col.reserve(nnz);
+    if (this->complex)
+        data_cplx.reserve(nnz);
+    else
+        data.reserve(nnz);
+}
+
+void TripletMatrix::add(int m, int n, double v)
+{
+    if (this->complex)
+        _error("can't use add(int, int, double) for complex matrix");
+
+    free_csr_product();
+
+    // adjusting size if necessary
+    if (m+1 > this->size) this->size = m+1;
+    if (n+1 > this->size) this->size = n+1;
+
+    row.push_back(m);
+    col.push_back(n);
+    data.push_back(v);
+    this->finalized = false;
+}
+
+void TripletMatrix::add(int m, int n, cplx v)
+{
+    if (!(this->complex))
+        _error("can't use add(int, int, cplx) for real matrix");
+
+    free_csr_product();
+
+    // adjusting size if necessary
+    if (m+1 > this->size) this->size = m+1;
+    if (n+1 > this->size) this->size = n+1;
+
+    row.push_back(m);
+    col.push_back(n);
+    data_cplx.push_back(v);
+    this->finalized = false;
+}
+
+void TripletMatrix::add_many(int n, int *rows, int *cols, double *vals)
+{
+    if (this->complex)
+        _error("can't use add_many(..., double *vals) for complex matrix");
+
+    free_csr_product();
+    row.reserve(row.size() + n);
+    col.reserve(col.size() + n);
+    data.reserve(data.size() + n);
+    int max_idx = this->size - 1;
+    for (int k = 0; k < n; k++)
+    {
+        if (rows[k] < 0 || cols[k] < 0) continue;
+        if (rows[k] > max_idx) max_idx = rows[k];
+        if (cols[k] > max_idx) max_idx = cols[k];
+        row.push_back(rows[k]);
+        col.push_back(cols[k]);
+        data.push_back(vals[k]);
+    }
+    this->size = max_idx + 1;
+    this->finalized = false;
+}
+
+void TripletMatrix::add_many(int n, int *rows, int *cols, cplx *vals)
+{
+    if (!(this->complex))
+        _error("can't use add_many(..., cplx *vals) for real matrix");
+
+    free_csr_product();
+    row.reserve(row.size() + n);
+    col.reserve(col.size() + n);
+    data_cplx.reserve(data_cplx.size() + n);
+    int max_idx = this->size - 1;
+    for (int k = 0; k < n; k++)
+    {
+        if (rows[k] < 0 || cols[k] < 0) continue;
+        if (rows[k] > max_idx) max_idx = rows[k];
+        if (cols[k] > max_idx) max_idx = cols[k];
+        row.push_back(rows[k]);
+        col.push_back(cols[k]);
+        data_cplx.push_back(vals[k]);
+    }
+    this->size = max_idx + 1;
+    this->finalized = false;
+}
+
+void TripletMatrix::finalize()
+{
+    if (this->finalized) return;
+
+    int nnz = row.size();
+    if (nnz > 0)
+    {
+        if (this->complex)
+            nnz = compress_triplets(this->size, nnz, &row[0], &col[0], &data_cplx[0]);
+        else
+            nnz = compress_triplets(this->size, nnz, &row[0], &col[0], &data[0]);
+    }
+
+    row.resize(nnz);
+    col.resize(nnz);
+    if (this->complex)
+        data_cplx.resize(nnz);
+    else
+        data.resize(nnz);
+
+    this->finalized = true;
+}
+
+int TripletMatrix::get_nnz()
+{
+    finalize();
+    return row.size();
+}
+
+// returns the position of the entry (m, n) in the finalized arrays or -1
+static int triplet_find(std::vector<int> &row, std::vector<int> &col, int m, int n)
+{
+    std::vector<int>::iterator first = std::lower_bound(row.begin(), row.end(), m);
+    std::vector<int>::iterator last = std::upper_bound(first, row.end(), m);
+    int begin = first - row.begin();
+    int end = last - row.begin();
+    std::vector<int>::iterator it = std::lower_bound(col.begin() + begin, col.begin() + end, n);
+    if (it != col.begin() + end && *it == n)
+        return it - col.begin();
+    return -1;
+}
+
+double TripletMatrix::get(int m, int n)
+{
+    finalize();
+    int k = triplet_find(row, col, m, n);
+    if (k == -1) return 0;
+    return data[k];
+}
+
+cplx TripletMatrix::get_cplx(int m, int n)
+{
+    finalize();
+    int k = triplet_find(row, col, m, n);
+    if (k == -1) return 0;
+    return data_cplx[k];
+}
+
+void TripletMatrix::get_row_col_data(int *row, int *col, double *data)
+{
+    int nnz = get_nnz();
+    if (nnz == 0) return;
+    memcpy(row, &this->row[0], nnz*sizeof(int));
+    memcpy(col, &this->col[0], nnz*sizeof(int));
+    memcpy(data, &this->data[0], nnz*sizeof(double));
+}
+
+void TripletMatrix::get_row_col_data(int *row, int *col, cplx *data)
+{
+    int nnz = get_nnz();
+    if (nnz == 0) return;
+    memcpy(row, &this->row[0], nnz*sizeof(int));
+    memcpy(col, &this->col[0], nnz*sizeof(int));
+    memcpy(data, &this->data_cplx[0], nnz*sizeof(cplx));
+}
+
+void TripletMatrix::copy_into(Matrix *m)
+{
+    m->free_data();
+
+    int nnz = get_nnz();
+    for (int i = 0; i < nnz; i++)
+    {
+        if (this->complex)
+            m->add(row[i], col[i], data_cplx[i]);
+        else
+            m->add(row[i], col[i], data[i]);
+    }
+}
+
+void TripletMatrix::times_vector(double* vec, double* result, int rank)
+{
+    if (is_complex())
+        _error("TripletMatrix::times_vector() not implemented for complex matrices.");
+
+    // the same as CooMatrix::times_vector()
+    if (this->csr_product == NULL)
+        this->csr_product = new CSRMatrix(this);
+    this->csr_product->times_vector(vec, result, rank);
+}
+
+void TripletMatrix::print()
+{
+    printf("\nTriplet Matrix:\n");
+
+    int nnz = get_nnz();
+    for (int i = 0; i < nnz; i++)
+    {
+        if (is_complex())
+            printf("(%i, %i): (%f, %f)\n", row[i], col[i],
+                   data_cplx[i].real(), data_cplx[i].imag());
+        else
+            printf("(%i, %i): %f\n", row[i], col[i], data[i]);
+    }
+}
+
 // *********************************************************************************************************************
 CSRMatrix::CSRMatrix(int size) : Matrix()
 {
@@ -490,12 +844,24 @@ CSRMatrix::CSRMatrix(int size) : Matrix()
     this->size = size;
 }
 
+CSRMatrix::CSRMatrix(int size, int nnz, int *Ap, int *Ai, bool complex) : Matrix()
+{
+    init();
+    this->create(size, nnz, Ap, Ai, complex);
+}
+
 CSRMatrix::CSRMatrix(CooMatrix *m) : Matrix()
 {
     init();
     this->add_from_coo(m);
 }
 
+CSRMatrix::CSRMatrix(TripletMatrix *m) : Matrix()
+{
+    init();
+    this->add_from_triplet(m);
+}
+
 CSRMatrix::CSRMatrix(CSCMatrix *m) : Matrix()
 {
     init();
@@ -508,16 +874,28 @@ CSRMatrix::CSRMatrix(DenseMatrix *m) : Matrix()
     this->add_from_dense(m);
 }
 
+CSRMatrix::CSRMatrix(SymCSRMatrix *m) : Matrix()
+{
+    init();
+    this->add_from_sym_csr(m);
+}
+
 CSRMatrix::CSRMatrix(Matrix *m) : Matrix()
 {
     init();
 
     if (dynamic_cast<CooMatrix*>(m))
         this->add_from_coo((CooMatrix*)m);
+    else if (dynamic_cast<TripletMatrix*>(m))
+        this->add_from_triplet((TripletMatrix*)m);
     else if (dynamic_cast<CSCMatrix*>(m))
         this->add_from_csc((CSCMatrix*)m);
+    else if (dynamic_cast<CSRMatrix*>(m))
+        this->add_from_csr((CSRMatrix*)m);
     else if (dynamic_cast<DenseMatrix*>(m))
         this->add_from_dense((DenseMatrix*)m);
+    else if (dynamic_cast<SymCSRMatrix*>(m))
+        this->add_from_sym_csr((SymCSRMatrix*)m);
     else
         _error("Matrix type not supported.");
 }
@@ -537,10 +915,19 @@ void CSRMatrix::init()
     this->Ax_cplx = NULL;
     this->Ap = NULL;
     this->Ai = NULL;
+    this->storage = NULL;
 }
 
 void CSRMatrix::free_data()
 {
+    if (this->storage)
+    {
+        delete this->storage;
+        this->storage = NULL;
+        this->Ap = this->Ai = NULL;
+        this->Ax = NULL;
+        this->Ax_cplx = NULL;
+    }
     if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
     if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
     if (this->Ax) { delete[] this->Ax; this->Ax = NULL; }
@@ -550,6 +937,95 @@ void CSRMatrix::free_data()
     this->nnz = 0;
 }
 
+void CSRMatrix::set_external_data(int size, int nnz, int *Ap, int *Ai,
+                                  double *Ax, cplx *Ax_cplx, MatrixStorage *storage)
+{
+    free_data();
+
+    this->size = size;
+    this->nnz = nnz;
+    this->complex = (Ax == NULL);
+    this->Ap = Ap;
+    this->Ai = Ai;
+    this->Ax = Ax;
+    this->Ax_cplx = Ax_cplx;
+    this->storage = storage;
+}
+
+void CSRMatrix::create(int size, int nnz, int *Ap, int *Ai, bool complex)
+{
+    free_data();
+
+    this->size = size;
+    this->nnz = nnz;
+    this->complex = complex;
+
+    this->Ap = Ap;
+    this->Ai = Ai;
+    if (complex)
+        this->Ax_cplx = new cplx[nnz];
+    else
+        this->Ax = new double[nnz];
+
+    set_zero();
+}
+
+void CSRMatrix::set_zero()
+{
+    if (this->Ax)
+        memset(this->Ax, 0, this->nnz*sizeof(double));
+    if (this->Ax_cplx)
+        for (int i = 0; i < this->nnz; i++)
+            this->Ax_cplx[i] = 0;
+}
+
+int CSRMatrix::find(int m, int n)
+{
+    // binary search in the (sorted) column indices of the row 'm'
+    int *first = this->Ai + this->Ap[m];
+    int *last = this->Ai + this->Ap[m+1];
+    int *it = std::lower_bound(first, last, n);
+    if (it != last && *it == n)
+        return it - this->Ai;
+    return -1;
+}
+
+void CSRMatrix::add(int m, int n, double v)
+{
+    if (this->complex)
+        _error("can't use add(int, int, double) for complex matrix");
+
+    int k = find(m, n);
+    if (k == -1)
+        _error("CSRMatrix::add(): the entry is not in the sparsity pattern.");
+    this->Ax[k] += v;
+}
+
+void CSRMatrix::add(int m, int n, cplx v)
+{
+    if (!(this->complex))
+        _error("can't use add(int, int, cplx) for real matrix");
+
+    int k = find(m, n);
+    if (k == -1)
+        _error("CSRMatrix::add(): the entry is not in the sparsity pattern.");
+    this->Ax_cplx[k] += v;
+}
+
+double CSRMatrix::get(int m, int n)
+{
+    int k = find(m, n);
+    if (k == -1) return 0;
+    return this->Ax[k];
+}
+
+cplx CSRMatrix::get_cplx(int m, int n)
+{
+    int k = find(m, n);
+    if (k == -1) return 0;
+    return this->Ax_cplx[k];
+}
+
 void CSRMatrix::add_from_dense(DenseMatrix *m)
 {
     this->size = m->get_size();
@@ -628,7 +1104,7 @@ void CSRMatrix::add_from_coo(CooMatrix *m)
     if (col) delete[] col;
 }
 
-void CSRMatrix::add_from_csc(CSCMatrix *m)
+void CSRMatrix::add_from_triplet(TripletMatrix *m)
 {
     free_data();
 
@@ -644,16 +1120,110 @@ void CSRMatrix::add_from_csc(CSCMatrix *m)
     else
         this->Ax = new double[this->nnz];
 
+    // the finalized triplets are already sorted and compressed, so we can
+    // bucket them directly without any temporary copies
     if (is_complex())
-    {
-        csc_to_csr(this->size, this->nnz, m->get_Ap(), m->get_Ai(), m->get_Ax_cplx(), Ap, Ai, Ax_cplx);
-    }
+        coo_to_csr(this->size, this->nnz, m->get_row(), m->get_col(), m->get_data_cplx(), Ap, Ai, Ax_cplx);
     else
-    {
+        coo_to_csr(this->size, this->nnz, m->get_row(), m->get_col(), m->get_data(), Ap, Ai, Ax);
+}
+
+void CSRMatrix::add_from_csc(CSCMatrix *m)
+{
+    free_data();
+
+    this->size = m->get_size();
+    this->nnz = m->get_nnz();
+    this->complex = m->is_complex();
+
+    // allocate data
+    this->Ap = new int[this->size + 1];
+    this->Ai = new int[this->nnz];
+    if (is_complex())
+        this->Ax_cplx = new cplx[this->nnz];
+    else
+        this->Ax = new double[this->nnz];
+
+    if (is_complex())
+    {
+        csc_to_csr(this->size, this->nnz, m->get_Ap(), m->get_Ai(), m->get_Ax_cplx(), Ap, Ai, Ax_cplx);
+    }
+    else
+    {
         csc_to_csr(this->size, this->nnz, m->get_Ap(), m->get_Ai(), m->get_Ax(), Ap, Ai, Ax);
     }
 }
 
+void CSRMatrix::add_from_csr(CSRMatrix *m)
+{
+    free_data();
+
+    this->size = m->get_size();
+    this->nnz = m->get_nnz();
+    this->complex = m->is_complex();
+
+    // allocate data
+    this->Ap = new int[this->size + 1];
+    this->Ai = new int[this->nnz];
+    memcpy(this->Ap, m->get_Ap(), (this->size + 1)*sizeof(int));
+    memcpy(this->Ai, m->get_Ai(), this->nnz*sizeof(int));
+    if (is_complex())
+    {
+        this->Ax_cplx = new cplx[this->nnz];
+        memcpy(this->Ax_cplx, m->get_Ax_cplx(), this->nnz*sizeof(cplx));
+    }
+    else
+    {
+        this->Ax = new double[this->nnz];
+        memcpy(this->Ax, m->get_Ax(), this->nnz*sizeof(double));
+    }
+}
+
+void CSRMatrix::add_from_sym_csr(SymCSRMatrix *m)
+{
+    free_data();
+
+    int n = this->size = m->get_size();
+    int *sAp = m->get_Ap(), *sAi = m->get_Ai();
+    double *sAx = m->get_Ax();
+
+    // row lengths: the stored upper triangle plus the mirrored entries
+    this->Ap = new int[n + 1];
+    for (int i = 0; i <= n; i++) this->Ap[i] = 0;
+    for (int i = 0; i < n; i++)
+        for (int k = sAp[i]; k < sAp[i+1]; k++)
+        {
+            this->Ap[i+1]++;
+            if (sAi[k] != i) this->Ap[sAi[k]+1]++;
+        }
+    for (int i = 0; i < n; i++) this->Ap[i+1] += this->Ap[i];
+    this->nnz = this->Ap[n];
+    this->Ai = new int[this->nnz];
+    this->Ax = new double[this->nnz];
+
+    // the rows are traversed in increasing order, so the column indices of
+    // the mirrored entries (i) come sorted and before the upper ones (>= i)
+    int *next = new int[n];
+    memcpy(next, this->Ap, n*sizeof(int));
+    for (int i = 0; i < n; i++)
+        for (int k = sAp[i]; k < sAp[i+1]; k++)
+        {
+            int j = sAi[k];
+            if (j != i)
+            {
+                this->Ai[next[j]] = i;
+                this->Ax[next[j]++] = sAx[k];
+            }
+        }
+    for (int i = 0; i < n; i++)
+        for (int k = sAp[i]; k < sAp[i+1]; k++)
+        {
+            this->Ai[next[i]] = sAi[k];
+            this->Ax[next[i]++] = sAx[k];
+        }
+    delete[] next;
+}
+
 void CSRMatrix::print()
 {
     printf("\nCSR Matrix:\n");
@@ -668,6 +1238,22 @@ void CSRMatrix::print()
         print_vector("data", this->Ax, this->nnz);
 }
 
+void CSRMatrix::times_vector(double* vec, double* result, int rank)
+{
+    if (is_complex())
+        _error("CSRMatrix::times_vector() not implemented for complex matrices.");
+
+    // the rows are independent, small matrices are not worth the threads
+#pragma omp parallel for schedule(static) if (rank > 1000)
+    for (int i = 0; i < rank; i++)
+    {
+        double sum = 0;
+        for (int k = this->Ap[i]; k < this->Ap[i+1]; k++)
+            sum += this->Ax[k] * vec[this->Ai[k]];
+        result[i] = sum;
+    }
+}
+
 // *********************************************************************************************************************
 
 CSCMatrix::CSCMatrix(int size) : Matrix()
@@ -682,6 +1268,12 @@ CSCMatrix::CSCMatrix(CooMatrix *m) : Matrix()
     this->add_from_coo(m);
 }
 
+CSCMatrix::CSCMatrix(TripletMatrix *m) : Matrix()
+{
+    init();
+    this->add_from_triplet(m);
+}
+
 CSCMatrix::CSCMatrix(DenseMatrix *m) : Matrix()
 {
     init();
@@ -700,16 +1292,24 @@ CSCMatrix::CSCMatrix(Matrix *m) : Matrix()
 
     if (dynamic_cast<CooMatrix*>(m))
         this->add_from_coo((CooMatrix *) m);
+    else if (dynamic_cast<TripletMatrix*>(m))
+        this->add_from_triplet((TripletMatrix *) m);
     else if (dynamic_cast<DenseMatrix *>(m))
         this->add_from_dense((DenseMatrix *) m);
     else if (dynamic_cast<CSRMatrix *>(m))
         this->add_from_csr((CSRMatrix *) m);
+    else if (dynamic_cast<SymCSRMatrix *>(m))
+    {
+        CSRMatrix full((SymCSRMatrix *) m);
+        this->add_from_csr(&full);
+    }
     else
         _error("Matrix type not supported.");
 }
 
 CSCMatrix::CSCMatrix(int size, int nnz, int *Ap, int *Ai, double *Ax)
 {
+    init();
     this->size = size;
     this->nnz = nnz;
     this->complex = false;
@@ -721,6 +1321,7 @@ CSCMatrix::CSCMatrix(int size, int nnz, int *Ap, int *Ai, double *Ax)
 
 CSCMatrix::CSCMatrix(int size, int nnz, int *Ap, int *Ai, cplx *Ax_cplx)
 {
+    init();
     this->size = size;
     this->nnz = nnz;
     this->complex = true;
@@ -746,10 +1347,19 @@ void CSCMatrix::init()
     this->Ax_cplx = NULL;
     this->Ap = NULL;
     this->Ai = NULL;
+    this->storage = NULL;
 }
 
 void CSCMatrix::free_data()
 {
+    if (this->storage)
+    {
+        delete this->storage;
+        this->storage = NULL;
+        this->Ap = this->Ai = NULL;
+        this->Ax = NULL;
+        this->Ax_cplx = NULL;
+    }
     if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
     if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
     if (this->Ax) { delete[] this->Ax; this->Ax = NULL; }
@@ -759,6 +1369,21 @@ void CSCMatrix::free_data()
     nnz = 0;
 }
 
+void CSCMatrix::set_external_data(int size, int nnz, int *Ap, int *Ai,
+                                  double *Ax, cplx *Ax_cplx, MatrixStorage *storage)
+{
+    free_data();
+
+    this->size = size;
+    this->nnz = nnz;
+    this->complex = (Ax == NULL);
+    this->Ap = Ap;
+    this->Ai = Ai;
+    this->Ax = Ax;
+    this->Ax_cplx = Ax_cplx;
+    this->storage = storage;
+}
+
 void CSCMatrix::add_from_dense(DenseMatrix *m)
 {
     free_data();
@@ -840,6 +1465,28 @@ void CSCMatrix::add_from_coo(CooMatrix *m)
     if (col) delete[] col;
 }
 
+void CSCMatrix::add_from_triplet(TripletMatrix *m)
+{
+    free_data();
+
+    this->size = m->get_size();
+    this->nnz = m->get_nnz();
+    this->complex = m->is_complex();
+
+    // allocate data
+    this->Ap = new int[this->size + 1];
+    this->Ai = new int[this->nnz];
+    if (is_complex())
+        this->Ax_cplx = new cplx[this->nnz];
+    else
+        this->Ax = new double[this->nnz];
+
+    if (is_complex())
+        coo_to_csc(this->size, this->nnz, m->get_row(), m->get_col(), m->get_data_cplx(), Ap, Ai, Ax_cplx);
+    else
+        coo_to_csc(this->size, this->nnz, m->get_row(), m->get_col(), m->get_data(), Ap, Ai, Ax);
+}
+
 void CSCMatrix::add_from_csr(CSRMatrix *m)
 {
     free_data();
@@ -880,6 +1527,330 @@ void CSCMatrix::print()
         print_vector("data", this->Ax, this->nnz);
 }
 
+void CSCMatrix::times_vector(double* vec, double* result, int rank)
+{
+    if (is_complex())
+        _error("CSCMatrix::times_vector() not implemented for complex matrices.");
+
+    // The CSC arrays are the CSR arrays of the transposed matrix, so the
+    // columns scatter into the result. Each thread sums its columns into its
+    // own copy of the result and the copies are added up at the end.
+#ifdef _OPENMP
+    int nthreads = omp_get_max_threads();
+    if (rank > 1000 && nthreads > 1)
+    {
+        std::vector<double> part((size_t) nthreads * rank, 0.0);
+#pragma omp parallel num_threads(nthreads)
+        {
+            double *y = &part[(size_t) omp_get_thread_num() * rank];
+#pragma omp for schedule(static)
+            for (int j = 0; j < rank; j++)
+                for (int k = this->Ap[j]; k < this->Ap[j+1]; k++)
+                    y[this->Ai[k]] += this->Ax[k] * vec[j];
+#pragma omp for schedule(static)
+            for (int i = 0; i < rank; i++)
+            {
+                double sum = 0;
+                for (int t = 0; t < nthreads; t++)
+                    sum += part[(size_t) t * rank + i];
+                result[i] = sum;
+            }
+        }
+        return;
+    }
+#endif
+    for (int i = 0; i < rank; i++)
+        result[i] = 0;
+    for (int j = 0; j < rank; j++)
+        for (int k = this->Ap[j]; k < this->Ap[j+1]; k++)
+            result[this->Ai[k]] += this->Ax[k] * vec[j];
+}
+
+// ******************************************************************************************************************************
+
+SymCSRMatrix::SymCSRMatrix(int size) : Matrix()
+{
+    init();
+    this->size = size;
+}
+
+SymCSRMatrix::SymCSRMatrix(Matrix *m) : Matrix()
+{
+    init();
+    if (m->is_complex())
+        _error("SymCSRMatrix: complex matrices are not supported.");
+
+    CSRMatrix *Acsr = dynamic_cast<CSRMatrix*>(m);
+    if (Acsr == NULL) Acsr = new CSRMatrix(m);
+
+    int n = Acsr->get_size();
+    int *Ap = Acsr->get_Ap(), *Ai = Acsr->get_Ai();
+    double *Ax = Acsr->get_Ax();
+    int *sAp = new int[n + 1];
+    sAp[0] = 0;
+    for (int i = 0; i < n; i++)
+    {
+        sAp[i+1] = sAp[i];
+        for (int k = Ap[i]; k < Ap[i+1]; k++)
+            if (Ai[k] >= i) sAp[i+1]++;
+    }
+    int *sAi = new int[sAp[n]];
+    for (int i = 0, l = 0; i < n; i++)
+        for (int k = Ap[i]; k < Ap[i+1]; k++)
+            if (Ai[k] >= i) sAi[l++] = Ai[k];
+    create(n, sAp[n], sAp, sAi);
+    for (int i = 0, l = 0; i < n; i++)
+        for (int k = Ap[i]; k < Ap[i+1]; k++)
+            if (Ai[k] >= i) this->Ax[l++] = Ax[k];
+
+    if (Acsr != m) delete Acsr;
+}
+
+SymCSRMatrix::~SymCSRMatrix()
+{
+    free_data();
+}
+
+void SymCSRMatrix::init()
+{
+    this->complex = false;
+    this->size = 0;
+    this->nnz = 0;
+
+    this->Ap = NULL;
+    this->Ai = NULL;
+    this->Ax = NULL;
+}
+
+void SymCSRMatrix::free_data()
+{
+    if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
+    if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
+    if (this->Ax) { delete[] this->Ax; this->Ax = NULL; }
+
+    this->size = 0;
+    this->nnz = 0;
+}
+
+void SymCSRMatrix::create(int size, int nnz, int *Ap, int *Ai)
+{
+    free_data();
+
+    this->size = size;
+    this->nnz = nnz;
+    this->Ap = Ap;
+    this->Ai = Ai;
+    this->Ax = new double[nnz];
+
+    set_zero();
+}
+
+void SymCSRMatrix::set_zero()
+{
+    if (this->Ax)
+        memset(this->Ax, 0, this->nnz*sizeof(double));
+}
+
+int SymCSRMatrix::find(int m, int n)
+{
+    int *first = this->Ai + this->Ap[m];
+    int *last = this->Ai + this->Ap[m+1];
+    int *it = std::lower_bound(first, last, n);
+    if (it != last && *it == n)
+        return it - this->Ai;
+    return -1;
+}
+
+void SymCSRMatrix::add(int m, int n, double v)
+{
+    // the lower triangle is given by the upper one
+    if (m > n) return;
+
+    int k = find(m, n);
+    if (k == -1)
+        _error("SymCSRMatrix::add(): the entry is not in the sparsity pattern.");
+    this->Ax[k] += v;
+}
+
+double SymCSRMatrix::get(int m, int n)
+{
+    if (m > n) std::swap(m, n);
+    int k = find(m, n);
+    if (k == -1) return 0;
+    return this->Ax[k];
+}
+
+void SymCSRMatrix::print()
+{
+    printf("\nSymmetric CSR Matrix (upper triangle):\n");
+    printf("size: %i\n", this->size);
+    printf("nzz: %i\n", this->nnz);
+
+    print_vector("row_ptr", this->Ap, this->size+1);
+    print_vector("col_ind", this->Ai, this->nnz);
+    print_vector("data", this->Ax, this->nnz);
+}
+
+void SymCSRMatrix::times_vector(double* vec, double* result, int rank)
+{
+    // the entries of a row are also added to the rows below (the lower
+    // triangle), so the rows are not independent and the loop is serial
+    for (int i = 0; i < rank; i++)
+        result[i] = 0;
+    for (int i = 0; i < rank; i++)
+    {
+        double sum = 0;
+        double x_i = vec[i];
+        for (int k = this->Ap[i]; k < this->Ap[i+1]; k++)
+        {
+            int j = this->Ai[k];
+            sum += this->Ax[k] * vec[j];
+            if (j != i) result[j] += this->Ax[k] * x_i;
+        }
+        result[i] += sum;
+    }
+}
+
+// ******************************************************************************************************************************
+
+BandedMatrix::BandedMatrix(int size, int kl, int ku)
+{
+    this->A = NULL;
+    this->complex = false;
+    alloc(size, kl, ku);
+}
+
+BandedMatrix::BandedMatrix(CSRMatrix *m, int *perm)
+{
+    if (m->is_complex())
+        _error("BandedMatrix: complex matrices are not supported.");
+
+    int size = m->get_size();
+    int *Ap = m->get_Ap();
+    int *Ai = m->get_Ai();
+    double *Ax = m->get_Ax();
+
+    // iperm[k] is the new index of the original row (column) k
+    int *iperm = new int[size];
+    for (int i = 0; i < size; i++)
+        iperm[perm ? perm[i] : i] = i;
+
+    // bandwidth of the permuted matrix
+    int kl = 0, ku = 0;
+    for (int r = 0; r < size; r++)
+        for (int k = Ap[r]; k < Ap[r+1]; k++)
+        {
+            int d = iperm[Ai[k]] - iperm[r];
+            if (d > ku) ku = d;
+            if (-d > kl) kl = -d;
+        }
+
+    this->A = NULL;
+    this->complex = false;
+    alloc(size, kl, ku);
+
+    int ldab = get_ldab();
+    for (int r = 0; r < size; r++)
+    {
+        int i = iperm[r];
+        for (int k = Ap[r]; k < Ap[r+1]; k++)
+            this->A[i*ldab + iperm[Ai[k]] - i + kl] += Ax[k];
+    }
+
+    delete[] iperm;
+}
+
+BandedMatrix::~BandedMatrix()
+{
+    free_data();
+}
+
+void BandedMatrix::alloc(int size, int kl, int ku)
+{
+    free_data();
+
+    this->size = size;
+    this->kl = kl;
+    this->ku = ku;
+    this->A = new double[size*get_ldab()];
+    set_zero();
+}
+
+void BandedMatrix::free_data()
+{
+    if (this->A) { delete[] this->A; this->A = NULL; }
+}
+
+void BandedMatrix::set_zero()
+{
+    memset(this->A, 0, this->size*get_ldab()*sizeof(double));
+}
+
+int BandedMatrix::get_nnz()
+{
+    // number of entries in the band (the fill-in part is not counted)
+    int nnz = 0;
+    for (int i = 0; i < this->size; i++)
+        nnz += std::min(this->size - 1, i + this->ku) - std::max(0, i - this->kl) + 1;
+    return nnz;
+}
+
+void BandedMatrix::add(int m, int n, double v)
+{
+    if (n - m > this->ku || m - n > this->kl)
+        _error("BandedMatrix::add(): the entry is outside of the band.");
+    this->A[m*get_ldab() + n - m + this->kl] += v;
+}
+
+double BandedMatrix::get(int m, int n)
+{
+    if (n - m > this->ku || m - n > this->kl)
+        return 0;
+    return this->A[m*get_ldab() + n - m + this->kl];
+}
+
+void BandedMatrix::copy_into(Matrix *m)
+{
+    m->free_data();
+
+    for (int i = 0; i < this->size; i++)
+    {
+        int jmax = std::min(this->size - 1, i + this->ku);
+        for (int j = std::max(0, i - this->kl); j <= jmax; j++)
+        {
+            double v = get(i, j);
+            if (v != 0) m->add(i, j, v);
+        }
+    }
+}
+
+void BandedMatrix::times_vector(double* vec, double* result, int rank)
+{
+    int ldab = get_ldab();
+    for (int i = 0; i < rank; i++)
+    {
+        double *row = this->A + i*ldab + this->kl - i;
+        int jmax = std::min(rank - 1, i + this->ku);
+        double sum = 0;
+        for (int j = std::max(0, i - this->kl); j <= jmax; j++)
+            sum += row[j] * vec[j];
+        result[i] = sum;
+    }
+}
+
+void BandedMatrix::print()
+{
+    printf("\nBanded Matrix:\n");
+    printf("size: %i, kl: %i, ku: %i\n", this->size, this->kl, this->ku);
+
+    for (int i = 0; i < this->size; i++)
+    {
+        int jmax = std::min(this->size - 1, i + this->ku);
+        for (int j = std::max(0, i - this->kl); j <= jmax; j++)
+            printf("(%i, %i): %f\n", i, j, get(i, j));
+    }
+}
+
 // ******************************************************************************************************************************
 
 template<typename T>
@@ -1029,6 +2000,144 @@ void csr_to_coo(int size, int nnz, int *Ap, int *Ai, T *Ax, int *row, int *col,
     }
 }
 
+template<typename T>
+static bool compare_first(const std::pair<int, T> &a, const std::pair<int, T> &b)
+{
+    return a.first < b.first;
+}
+
+// Sorts the triplets by (row, col) and sums up duplicate entries, in place.
+// Rows are bucketed by a counting sort (O(nnz)), only the (short) rows
+// themselves are sorted by columns. Returns the number of unique entries.
+template<typename T>
+int compress_triplets(int size, int nnz, int *row, int *col, T *A)
+{
+    // bucket the triplets by rows
+    int *Ap = new int[size + 1];
+    int *Ai = new int[nnz];
+    T *Ax = new T[nnz];
+    coo_to_csr(size, nnz, row, col, A, Ap, Ai, Ax);
+
+    // sort every row by columns and sum up duplicates
+    std::vector<std::pair<int, T> > entries;
+    int count = 0;
+    for (int i = 0; i < size; i++)
+    {
+        entries.clear();
+        for (int j = Ap[i]; j < Ap[i+1]; j++)
+            entries.push_back(std::pair<int, T>(Ai[j], Ax[j]));
+        std::stable_sort(entries.begin(), entries.end(), compare_first<T>);
+
+        for (int j = 0; j < (int) entries.size(); j++)
+        {
+            if (j > 0 && entries[j].first == entries[j-1].first)
+                A[count-1] += entries[j].second;
+            else
+            {
+                row[count] = i;
+                col[count] = entries[j].first;
+                A[count] = entries[j].second;
+                count++;
+            }
+        }
+    }
+
+    delete[] Ap;
+    delete[] Ai;
+    delete[] Ax;
+
+    return count;
+}
+
+// Reverse Cuthill-McKee ordering. Every connected component of the graph is
+// numbered by a breadth-first search starting at a pseudo-peripheral node,
+// the neighbours are visited in the order of increasing degree. Reversing
+// the whole ordering at the end reduces the fill-in of the LU factorization.
+void rcm_ordering(int size, int *Ap, int *Ai, int *perm)
+{
+    // adjacency of A + A^T without the diagonal
+    std::vector<std::vector<int> > adj(size);
+    for (int i = 0; i < size; i++)
+        for (int k = Ap[i]; k < Ap[i+1]; k++)
+        {
+            int j = Ai[k];
+            if (i == j) continue;
+            adj[i].push_back(j);
+            adj[j].push_back(i);
+        }
+    for (int i = 0; i < size; i++)
+    {
+        std::sort(adj[i].begin(), adj[i].end());
+        adj[i].erase(std::unique(adj[i].begin(), adj[i].end()), adj[i].end());
+    }
+
+    std::vector<int> level(size, -1);
+    std::vector<bool> numbered(size, false);
+    std::vector<int> queue;
+    std::vector<std::pair<int, int> > nbrs;
+    int n = 0;
+    while (n < size)
+    {
+        // node with the minimum degree among the not yet numbered ones
+        int start = -1;
+        for (int i = 0; i < size; i++)
+            if (!numbered[i] && (start == -1 || adj[i].size() < adj[start].size()))
+                start = i;
+
+        // find a pseudo-peripheral node: repeat the level structure
+        // construction from a node of minimum degree in the last level
+        // while the number of levels increases
+        int depth = -1;
+        while (1)
+        {
+            queue.clear();
+            queue.push_back(start);
+            level[start] = 0;
+            for (int q = 0; q < queue.size(); q++)
+            {
+                int i = queue[q];
+                for (int k = 0; k < adj[i].size(); k++)
+                    if (level[adj[i][k]] == -1)
+                    {
+                        level[adj[i][k]] = level[i] + 1;
+                        queue.push_back(adj[i][k]);
+                    }
+            }
+            int last = level[queue.back()];
+            int next = start;
+            for (int q = queue.size() - 1; q >= 0 && level[queue[q]] == last; q--)
+                if (adj[queue[q]].size() < adj[next].size() || next == start)
+                    next = queue[q];
+            for (int q = 0; q < queue.size(); q++)
+                level[queue[q]] = -1;
+            if (last <= depth) break;
+            depth = last;
+            start = next;
+        }
+
+        // Cuthill-McKee numbering of this component
+        int first = n;
+        perm[n++] = start;
+        numbered[start] = true;
+        for (int q = first; q < n; q++)
+        {
+            int i = perm[q];
+            nbrs.clear();
+            for (int k = 0; k < adj[i].size(); k++)
+                if (!numbered[adj[i][k]])
+                    nbrs.push_back(std::make_pair((int) adj[adj[i][k]].size(), adj[i][k]));
+            std::sort(nbrs.begin(), nbrs.end());
+            for (int k = 0; k < nbrs.size(); k++)
+            {
+                perm[n++] = nbrs[k].second;
+                numbered[nbrs[k].second] = true;
+            }
+        }
+    }
+
+    std::reverse(perm, perm + size);
+}
+
 // matrix vector multiplication
 void mat_dot(Matrix *A, double *x, double *result, int n_dof)
 {
@@ -1043,6 +2152,165 @@ double vec_dot(double *r, double *s, int n_dof)
     return result;
 }
 
+#ifdef COMMON_WITH_LAPACK
+extern "C" {
+    void dgetrf_(int *m, int *n, double *a, int *lda, int *ipiv, int *info);
+    void dgetrs_(char *trans, int *n, int *nrhs, double *a, int *lda,
+                 int *ipiv, double *b, int *ldb, int *info);
+}
+#endif
+
+// number of columns of a panel and width of a column tile in the update of
+// the trailing matrix (the panel rows of a tile, 64 x 256 doubles, stay in
+// the L2 cache while all the rows below are updated)
+#define DENSE_LU_BLOCK 64
+#define DENSE_LU_TILE 256
+
+void dense_lu_factorize(double *a, int n, int *ipiv)
+{
+    // The pivots are chosen with the implicit row scaling of ludcmp() (the
+    // largest entry relative to the largest entry of its row), so that the
+    // same rows are interchanged as before.
+    std::vector<double> vv(n);
+    for (int i = 0; i < n; i++)
+    {
+        double big = 0;
+        for (int j = 0; j < n; j++)
+            big = std::max(big, fabs(a[i*n + j]));
+        if (big == 0) _error("Dense LU: the matrix is singular.");
+        vv[i] = 1 / big;
+    }
+
+#ifdef COMMON_WITH_LAPACK
+    // LAPACK works with columns: transpose the matrix and scale its rows, so
+    // that the partial pivoting of dgetrf picks the same pivots as above
+    for (int i = 0; i < n; i++)
+    {
+        a[i*n + i] *= vv[i];
+        for (int j = i + 1; j < n; j++)
+        {
+            double aij = a[i*n + j];
+            a[i*n + j] = vv[j]*a[j*n + i];
+            a[j*n + i] = vv[i]*aij;
+        }
+    }
+    int info;
+    dgetrf_(&n, &n, a, &n, ipiv, &info);
+    if (info < 0) _error("Dense LU: illegal argument of dgetrf.");
+    if (info > 0) _error("Dense LU: the matrix is singular.");
+
+    // D A = P L U gives A = P (D'^{-1} L D') (D'^{-1} U), where D' are the
+    // scales of the permuted rows, i.e. the factors of A itself
+    for (int k = 0; k < n; k++)
+        std::swap(vv[k], vv[ipiv[k] - 1]);
+    for (int j = 0; j < n; j++)
+    {
+        double *aj = a + j*n;
+        for (int i = 0; i <= j; i++)
+            aj[i] /= vv[i];
+        for (int i = j + 1; i < n; i++)
+            aj[i] *= vv[j] / vv[i];
+    }
+#else
+    for (int k0 = 0; k0 < n; k0 += DENSE_LU_BLOCK)
+    {
+        int k1 = std::min(n, k0 + DENSE_LU_BLOCK);
+
+        // factorize the panel (columns k0, ..., k1-1), the interchanges are
+        // applied to the whole rows
+        for (int k = k0; k < k1; k++)
+        {
+            int p = k;
+            double big = 0;
+            for (int i = k; i < n; i++)
+                if (vv[i]*fabs(a[i*n + k]) >= big)
+                {
+                    big = vv[i]*fabs(a[i*n + k]);
+                    p = i;
+                }
+            ipiv[k] = p;
+            if (a[p*n + k] == 0) _error("Dense LU: the matrix is singular.");
+            if (p != k)
+            {
+                std::swap_ranges(a + k*n, a + (k+1)*n, a + p*n);
+                vv[p] = vv[k];
+            }
+
+            double pivot = a[k*n + k];
+            for (int i = k + 1; i < n; i++)
+            {
+                double l = a[i*n + k] /= pivot;
+                if (l == 0) continue;
+                for (int j = k + 1; j < k1; j++)
+                    a[i*n + j] -= l*a[k*n + j];
+            }
+        }
+
+        // U12 = L11^{-1} A12
+        for (int k = k0; k < k1; k++)
+            for (int i = k + 1; i < k1; i++)
+            {
+                double l = a[i*n + k];
+                if (l == 0) continue;
+                for (int j = k1; j < n; j++)
+                    a[i*n + j] -= l*a[k*n + j];
+            }
+
+        // A22 -= L21 U12, tile by tile, the rows are independent
+        for (int j0 = k1; j0 < n; j0 += DENSE_LU_TILE)
+        {
+            int j1 = std::min(n, j0 + DENSE_LU_TILE);
+#pragma omp parallel for schedule(static) if ((n - k1)*(j1 - j0) > 20000)
+            for (int i = k1; i < n; i++)
+            {
+                double *ai = a + i*n;
+                for (int k = k0; k < k1; k++)
+                {
+                    double l = ai[k];
+                    if (l == 0) continue;
+                    double *ak = a + k*n;
+                    for (int j = j0; j < j1; j++)
+                        ai[j] -= l*ak[j];
+                }
+            }
+        }
+    }
+#endif
+}
+
+void dense_lu_solve(double *a, int n, int *ipiv, double *b, int nrhs)
+{
+#ifdef COMMON_WITH_LAPACK
+    // the factors are stored by columns, see dense_lu_factorize()
+    char trans = 'N';
+    int info;
+    dgetrs_(&trans, &n, &nrhs, a, &n, ipiv, b, &n, &info);
+    if (info < 0) _error("Dense LU: illegal argument of dgetrs.");
+#else
+    for (int r = 0; r < nrhs; r++, b += n)
+    {
+        for (int k = 0; k < n; k++)
+            std::swap(b[k], b[ipiv[k]]);
+        // L y = b (unit diagonal)
+        for (int i = 0; i < n; i++)
+        {
+            double sum = b[i];
+            double *ai = a + i*n;
+            for (int j = 0; j < i; j++) sum -= ai[j]*b[j];
+            b[i] = sum;
+        }
+        // U x = y
+        for (int i = n - 1; i >= 0; i--)
+        {
+            double sum = b[i];
+            double *ai = a + i*n;
+            for (int j = i + 1; j < n; j++) sum -= ai[j]*b[j];
+            b[i] = sum / ai[i];
+        }
+    }
+#endif
+}
+
 /// Solves the set of n linear equations A*x = b, where a is a positive-definite symmetric matrix.
 /// a[n][n] and p[n] are input as the output of the routine choldc. Only the lower
 /// subdiagonal portion of a is accessed. b[n] is input as the right-hand side vector. The
@@ -1050,11 +2318,12 @@ double vec_dot(double *r, double *s, int n_dof)
 /// for successive calls with different right-hand sides b. b is not modified unless you identify b and
 /// x in the calling sequence, which is allowed. The right-hand side b can be complex, in which case
 /// the solution x is also complex.
-void ludcmp(double** a, int n, int* indx, double* d)
+template<typename T>
+void ludcmp(T** a, int n, int* indx, T* d)
 {
     int i, imax = 0, j, k;
-    double big, dum, sum, temp;
-    double* vv = new double[n];
+    T big, dum, sum, temp;
+    T* vv = new T[n];
 
     *d = 1.0;
     for (i = 0; i < n; i++)
@@ -1107,6 +2376,8 @@ void ludcmp(double** a, int n, int* indx, double* d)
     }
     delete [] vv;
 }
+template void ludcmp<double>(double** a, int n, int* indx, double* d);
+template void ludcmp<float>(float** a, int n, int* indx, float* d);
 
 /// Solves the set of n linear equations AX = B. Here a[n][n] is input, not as the matrix
 /// A but rather as its LU decomposition, determined by the routine ludcmp. indx[n] is input
@@ -1115,10 +2386,11 @@ void ludcmp(double** a, int n, int* indx, double* d)
 /// and can be left in place for successive calls with different right-hand sides b. This routine takes
 /// into account the possibility that b will begin with many zero elements, so it is efficient for use
 /// in matrix inversion.
-void lubksb(double** a, int n, int* indx, double* b)
+template<typename T>
+void lubksb(T** a, int n, int* indx, T* b)
 {
     int i, ip, j;
-    double sum;
+    T sum;
 
     for (i = 0; i < n; i++)
     {
@@ -1135,3 +2407,5 @@ void lubksb(double** a, int n, int* indx, double* b)
         b[i] = sum / a[i][i];
     }
 }
+template void lubksb<double>(double** a, int n, int* indx, double* b);
+template void lubksb<float>(float** a, int n, int* indx, float* b);
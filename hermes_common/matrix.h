@@ -16,6 +16,7 @@
 #include <string.h>
 #include <complex>
 #include <map>
+#include <vector>
 
 typedef std::complex<double> cplx;
 class Matrix;
@@ -26,8 +27,11 @@ class Matrix;
 #define _error(x) throw std::runtime_error(x)
 
 class CooMatrix;
+class TripletMatrix;
 class CSRMatrix;
 class CSCMatrix;
+class SymCSRMatrix;
+class BandedMatrix;
 
 /// Creates a new (full) matrix with m rows and n columns with entries of the type T.
 /// The entries can be accessed by matrix[i][j]. To delete the matrix, just
@@ -44,6 +48,14 @@ T** _new_matrix(int m, int n = 0)
     return vec;
 }
 
+/// Owner of the arrays, which a CSRMatrix or CSCMatrix uses without copying
+/// them (e.g. a memory mapped file, see read_binary_csr()). It is deleted
+/// together with the matrix instead of the arrays.
+class MatrixStorage {
+public:
+    virtual ~MatrixStorage() {}
+};
+
 class Matrix {
 public:
     Matrix() {}
@@ -77,6 +89,21 @@ public:
                 if (iidx[i] >= 0 && jidx[j] >= 0)
                     this->add(iidx[i], jidx[j], mat[i][j]);
     }
+    // Adds vals[k] to the entry (rows[k], cols[k]) for k = 0, ..., n-1 in a
+    // single call (e.g. from Python, see Matrix.add_many()). Negative
+    // indices are skipped like in add_block().
+    virtual void add_many(int n, int *rows, int *cols, double *vals)
+    {
+        for (int k = 0; k < n; k++)
+            if (rows[k] >= 0 && cols[k] >= 0)
+                this->add(rows[k], cols[k], vals[k]);
+    }
+    virtual void add_many(int n, int *rows, int *cols, cplx *vals)
+    {
+        for (int k = 0; k < n; k++)
+            if (rows[k] >= 0 && cols[k] >= 0)
+                this->add(rows[k], cols[k], vals[k]);
+    }
     virtual double get(int m, int n) = 0;
     virtual cplx get_cplx(int m, int n)
     {
@@ -107,7 +134,7 @@ public:
     CooMatrix(CSCMatrix *m);
     ~CooMatrix();
 
-    inline virtual void init() { this->complex = false; free_data(); }
+    inline virtual void init() { this->complex = false; this->csr_product = NULL; free_data(); }
     virtual void free_data();
 
     virtual void set_zero()
@@ -131,11 +158,78 @@ public:
 
     inline virtual double get(int m, int n) { return A[m][n]; }
 
+    // uses a CSR copy of the matrix, which is kept until the next change
     virtual void times_vector(double* vec, double* result, int rank);
 
 protected:
     std::map<size_t, std::map<size_t, double> > A;
     std::map<size_t, std::map<size_t, cplx> > A_cplx;
+
+    CSRMatrix *csr_product;
+    void free_csr_product();
+};
+
+// **********************************************************************************************************
+
+/// COO matrix assembled into contiguous (row, col, value) arrays.
+///
+/// add() only appends a triplet, so assembling is a push_back instead of
+/// two tree lookups. Duplicate entries are summed up by a single
+/// sort-and-compress pass in finalize(), which is called automatically
+/// before the matrix is read or converted to CSR/CSC.
+class TripletMatrix : public Matrix {
+public:
+    TripletMatrix(bool complex = false);
+    TripletMatrix(int size, bool complex = false);
+    ~TripletMatrix();
+
+    inline virtual void init() { this->complex = false; this->csr_product = NULL; free_data(); }
+    virtual void free_data();
+
+    // removes all entries, but keeps the allocated buffers
+    virtual void set_zero();
+
+    virtual int get_nnz();
+    virtual void print();
+
+    virtual void add(int m, int n, double v);
+    virtual void add(int m, int n, cplx v);
+    // appends all the triplets at once
+    virtual void add_many(int n, int *rows, int *cols, double *vals);
+    virtual void add_many(int n, int *rows, int *cols, cplx *vals);
+    virtual double get(int m, int n);
+    virtual cplx get_cplx(int m, int n);
+
+    // preallocates the buffers for 'nnz' triplets
+    void reserve(int nnz);
+    // sorts the triplets by (row, col) and sums up duplicates
+    void finalize();
+
+    void get_row_col_data(int *row, int *col, double *data);
+    void get_row_col_data(int *row, int *col, cplx *data);
+
+    virtual void copy_into(Matrix *m);
+
+    // uses a CSR copy of the matrix, which is kept until the next change
+    virtual void times_vector(double* vec, double* result, int rank);
+
+    // Return the internal (finalized) arrays.
+    inline int *get_row() { finalize(); return this->row.empty() ? NULL : &this->row[0]; }
+    inline int *get_col() { finalize(); return this->col.empty() ? NULL : &this->col[0]; }
+    inline double *get_data() { finalize(); return this->data.empty() ? NULL : &this->data[0]; }
+    inline cplx *get_data_cplx() { finalize(); return this->data_cplx.empty() ? NULL : &this->data_cplx[0]; }
+
+protected:
+    std::vector<int> row;
+    std::vector<int> col;
+    std::vector<double> data;
+    std::vector<cplx> data_cplx;
+
+    // true if the triplets are sorted and contain no duplicates
+    bool finalized;
+
+    CSRMatrix *csr_product;
+    void free_csr_product();
 };
 
 // **********************************************************************************************************
@@ -145,6 +239,8 @@ class DenseMatrix : public Matrix
 public:
     DenseMatrix(Matrix *m);
     DenseMatrix(CooMatrix *m);
+    DenseMatrix(TripletMatrix *m);
+    DenseMatrix(CSRMatrix *m);
     DenseMatrix(int size, bool is_complex = false);
     ~DenseMatrix();
 
@@ -157,6 +253,8 @@ public:
     inline virtual void add(int m, int n, cplx v) { this->A_cplx[m][n] += v; }
 
     void add_from_coo(CooMatrix *m);
+    void add_from_triplet(TripletMatrix *m);
+    void add_from_csr(CSRMatrix *m);
 
     inline virtual double get(int m, int n) { return this->A[m][n]; }
 
@@ -164,26 +262,27 @@ public:
     {
         m->free_data();
         for (int i = 0; i < this->size; i++)
-        {
             for (int j = 0; j < this->size; j++)
             {
-                for (int j = 0; j < this->size; j++)
+                if (complex)
+                {
+                    if (std::abs(A_cplx[i][j]) > 1e-12)
+                        m->add(i, j, A_cplx[i][j]);
+                }
+                else
                 {
-                    if (complex)
-                        if (std::abs(A_cplx[i][j]) > 1e-12)
-                             m->add(i, j, A_cplx[i][j]);
-                    else
-                        if (fabs(A[i][j]) > 1e-12)
-                            m->add(i, j, A[i][j]);
+                    if (fabs(A[i][j]) > 1e-12)
+                        m->add(i, j, A[i][j]);
                 }
             }
-        }
     }
 
     virtual int get_nnz();
 
     virtual void print();
 
+    virtual void times_vector(double* vec, double* result, int rank);
+
     // Return the internal matrix.
     inline double **get_A() { return this->A; }
     inline cplx **get_A_cplx() { return this->A_cplx; }
@@ -199,33 +298,50 @@ class CSRMatrix : public Matrix
 {
 public:
     CSRMatrix(int size);
+    // Creates a matrix with a fixed sparsity pattern and zero values. The
+    // matrix takes ownership of the Ap and Ai arrays (see create()).
+    CSRMatrix(int size, int nnz, int *Ap, int *Ai, bool complex = false);
     CSRMatrix(Matrix *m);
     CSRMatrix(CooMatrix *m);
+    CSRMatrix(TripletMatrix *m);
     CSRMatrix(CSCMatrix *m);
     CSRMatrix(DenseMatrix *m);
+    // both triangles of the symmetric matrix
+    CSRMatrix(SymCSRMatrix *m);
     ~CSRMatrix();
 
     virtual void init();
     virtual void free_data();
 
-    virtual void set_zero()
-    {
-        _error("CSRMatrix::set_zero() not implemented.");
-    }
+    // Sets up the sparsity pattern (row pointers Ap and sorted column
+    // indices Ai in every row) and allocates zero values. The matrix takes
+    // ownership of Ap and Ai. After that, add() writes into the existing
+    // entries, so the same matrix can be zeroed and refilled (e.g. in every
+    // Newton iteration) without any allocation.
+    void create(int size, int nnz, int *Ap, int *Ai, bool complex = false);
+
+    // Uses the arrays Ap, Ai and Ax (or Ax_cplx if Ax is NULL) without
+    // copying them. They belong to 'storage', which is deleted instead of
+    // them by free_data().
+    void set_external_data(int size, int nnz, int *Ap, int *Ai, double *Ax,
+                           cplx *Ax_cplx, MatrixStorage *storage);
+
+    // zeroes the values, but keeps the sparsity pattern
+    virtual void set_zero();
 
     void add_from_dense(DenseMatrix *m);
     void add_from_coo(CooMatrix *m);
+    void add_from_triplet(TripletMatrix *m);
     void add_from_csc(CSCMatrix *m);
+    void add_from_csr(CSRMatrix *m);
+    void add_from_sym_csr(SymCSRMatrix *m);
 
-    virtual void add(int m, int n, double v)
-    {
-        _error("CSR matrix add() not implemented.");
-    }
+    // The entry (m, n) has to be in the sparsity pattern.
+    virtual void add(int m, int n, double v);
+    virtual void add(int m, int n, cplx v);
 
-    virtual double get(int m, int n)
-    {
-        _error("CSR matrix get() not implemented.");
-    }
+    virtual double get(int m, int n);
+    virtual cplx get_cplx(int m, int n);
 
     virtual int get_size()
     {
@@ -238,6 +354,10 @@ public:
 
     virtual void print();
 
+    // Sparse matrix-vector product. If compiled with OpenMP, the rows are
+    // distributed among the threads.
+    virtual void times_vector(double* vec, double* result, int rank);
+
     inline int *get_Ap() { return this->Ap; }
     inline int *get_Ai() { return this->Ai; }
     inline double *get_Ax() { return this->Ax; }
@@ -251,6 +371,12 @@ private:
     int *Ai;
     double *Ax;
     cplx *Ax_cplx;
+
+    // the owner of the arrays if they are not allocated by the matrix
+    MatrixStorage *storage;
+
+    // returns the position of the entry (m, n) in Ai/Ax or -1
+    int find(int m, int n);
 };
 
 // **********************************************************************************************************
@@ -262,6 +388,7 @@ public:
     CSCMatrix(Matrix *m);
     CSCMatrix(DenseMatrix *m);
     CSCMatrix(CooMatrix *m);
+    CSCMatrix(TripletMatrix *m);
     CSCMatrix(CSRMatrix *m);
     CSCMatrix(int size, int nnz, int *Ap, int *Ai, double *Ax);
     CSCMatrix(int size, int nnz, int *Ap, int *Ai, cplx *Ax_cplx);
@@ -277,8 +404,13 @@ public:
 
     void add_from_dense(DenseMatrix *m);
     void add_from_coo(CooMatrix *m);
+    void add_from_triplet(TripletMatrix *m);
     void add_from_csr(CSRMatrix *m);
 
+    // see CSRMatrix::set_external_data()
+    void set_external_data(int size, int nnz, int *Ap, int *Ai, double *Ax,
+                           cplx *Ax_cplx, MatrixStorage *storage);
+
     virtual void add(int m, int n, double v)
     {
         _error("CSC matrix add() not implemented.");
@@ -301,6 +433,8 @@ public:
 
     virtual void print();
 
+    virtual void times_vector(double* vec, double* result, int rank);
+
     inline int *get_Ap() { return this->Ap; }
     inline int *get_Ai() { return this->Ai; }
     inline double *get_Ax() { return this->Ax; }
@@ -315,8 +449,115 @@ private:
 
     int *Ap;
     int *Ai;
+
+    // the owner of the arrays if they are not allocated by the matrix
+    MatrixStorage *storage;
 };
 
+// **********************************************************************************************************
+
+// Symmetric matrix in the CSR format, only the upper triangle (including the
+// diagonal) is stored. add() ignores the entries below the diagonal, so the
+// matrix can be filled either like a general one or with the upper triangle
+// only, get() returns the entries of both triangles.
+class SymCSRMatrix : public Matrix
+{
+public:
+    SymCSRMatrix(int size);
+    // Takes the upper triangle of 'm' (which has to be symmetric).
+    SymCSRMatrix(Matrix *m);
+    ~SymCSRMatrix();
+
+    virtual void init();
+    virtual void free_data();
+
+    // Sets up the sparsity pattern of the upper triangle (the column indices
+    // in every row are sorted and not less than the row index) and allocates
+    // zero values. The matrix takes ownership of Ap and Ai.
+    void create(int size, int nnz, int *Ap, int *Ai);
+
+    // zeroes the values, but keeps the sparsity pattern
+    virtual void set_zero();
+
+    // The entry (m, n) has to be in the sparsity pattern if m <= n.
+    virtual void add(int m, int n, double v);
+    virtual double get(int m, int n);
+
+    // number of the stored entries (the upper triangle)
+    inline int get_nnz() { return this->nnz; }
+    virtual void copy_into(Matrix *m) {
+        _error("SymCSRMatrix copy_into() not implemented.");
+    }
+
+    virtual void print();
+
+    // Symmetric sparse matrix-vector product, every stored entry is read
+    // once and used for both triangles.
+    virtual void times_vector(double* vec, double* result, int rank);
+
+    inline int *get_Ap() { return this->Ap; }
+    inline int *get_Ai() { return this->Ai; }
+    inline double *get_Ax() { return this->Ax; }
+
+private:
+    int nnz;
+
+    int *Ap;
+    int *Ai;
+    double *Ax;
+
+    // returns the position of the entry (m, n), m <= n, in Ai/Ax or -1
+    int find(int m, int n);
+};
+
+// **********************************************************************************************************
+
+// Band matrix with 'kl' subdiagonals and 'ku' superdiagonals. The rows are
+// stored contiguously, each of them has the width 2*kl + ku + 1: besides the
+// band itself there are 'kl' additional superdiagonals, which are only
+// filled in by the LU factorization with partial pivoting (see
+// CommonSolverBanded).
+class BandedMatrix : public Matrix
+{
+public:
+    BandedMatrix(int size, int kl, int ku);
+    // Creates the band matrix P*A*P^T, where perm[i] is the original index
+    // of the i-th row (and column). If perm is NULL, no permutation is used.
+    // The bandwidth is determined from the sparsity pattern of 'm'.
+    BandedMatrix(CSRMatrix *m, int *perm = NULL);
+    ~BandedMatrix();
+
+    virtual void free_data();
+    virtual void set_zero();
+
+    virtual int get_nnz();
+    virtual void print();
+
+    virtual void add(int m, int n, double v);
+    virtual double get(int m, int n);
+
+    virtual void copy_into(Matrix *m);
+    virtual void times_vector(double* vec, double* result, int rank);
+
+    inline int get_kl() { return this->kl; }
+    inline int get_ku() { return this->ku; }
+    // the row width of the storage
+    inline int get_ldab() { return 2*this->kl + this->ku + 1; }
+    // the entry (i, j) is stored at get_data()[i*get_ldab() + j - i + kl]
+    inline double *get_data() { return this->A; }
+
+protected:
+    void alloc(int size, int kl, int ku);
+
+    int kl, ku;
+    double *A;
+};
+
+// Computes the reverse Cuthill-McKee ordering of the (symmetrized) sparsity
+// pattern Ap, Ai in the CSR format. perm[i] is the original index of the
+// i-th row in the new ordering.
+void rcm_ordering(int size, int *Ap, int *Ai, int *perm);
+
 // print vector - int
 void print_vector(const char *label, int *value, int size);
 // print vector - double
@@ -338,13 +579,41 @@ template<typename T>
 void csc_to_coo(int size, int nnz, int *Ap, int *Ai, T *Ax, int *row, int *col, T *A);
 template<typename T>
 void csr_to_coo(int size, int nnz, int *Ap, int *Ai, T *Ax, int *row, int *col, T *A);
+template<typename T>
+int compress_triplets(int size, int nnz, int *row, int *col, T *A);
 
-// matrix vector multiplication
+// matrix vector multiplication (calls A->times_vector(), the COO formats
+// convert themselves to CSRMatrix on the first product after a change)
 void mat_dot(Matrix *A, double *x, double *result, int n_dof);
 // vector vector multiplication
 double vec_dot(double *r, double *s, int n_dof);
 
-void ludcmp(double** a, int n, int* indx, double* d);
-void lubksb(double** a, int n, int* indx, double* b);
+// Blocked LU factorization with partial pivoting of the n x n matrix 'a'
+// stored contiguously by rows (e.g. DenseMatrix::get_A()[0]), done in place.
+// ipiv[k] is the row interchanged with the row k in the k-th step. The update
+// of the trailing matrix is distributed among the threads if compiled with
+// OpenMP, with COMMON_WITH_LAPACK dgetrf is used instead (with the same
+// pivots, but the factors are stored by columns and ipiv is LAPACK's, so
+// only pass them to dense_lu_solve()).
+void dense_lu_factorize(double *a, int n, int *ipiv);
+// Solves the system with 'nrhs' right-hand sides stored one after another in
+// 'b' using the factorization from dense_lu_factorize().
+void dense_lu_solve(double *a, int n, int *ipiv, double *b, int nrhs = 1);
+
+// LU factorization and back substitution of a dense matrix, T is double or
+// float (the float version is used by CommonSolverMixedLU)
+template<typename T>
+void ludcmp(T** a, int n, int* indx, T* d);
+template<typename T>
+void lubksb(T** a, int n, int* indx, T* b);
+
+// LU factorization with partial pivoting and back substitution of a band
+// matrix in the storage of BandedMatrix (the row width 2*kl + ku + 1), done
+// in place, T is double or float (the float version is used by
+// CommonSolverMixedLU)
+template<typename T>
+void band_ludcmp(T *ab, int n, int kl, int ku, int *ipiv);
+template<typename T>
+void band_lubksb(T *ab, int n, int kl, int ku, int *ipiv, T *b);
 
 #endif
@@ -4,6 +4,11 @@
 // Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
 // Harwell-Boeing format
 
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+
 #include "matrixio.h"
 #include "iohb.h"
 
@@ -82,3 +87,270 @@ void write_hb_coo(const char *filename, CooMatrix *A, double *rhs)
 
     write_hb_csc(filename, Acsc, rhs);
 }
+
+// Binary format
+
+static const char binary_magic[8] = {'H', 'E', 'R', 'M', 'E', 'S', 'M', 'X'};
+
+// the arrays start at multiples of 8 bytes
+static size_t binary_align(size_t n)
+{
+    return (n + 7) & ~((size_t) 7);
+}
+
+static void write_binary(const char *filename, int format, int size, int nnz,
+                         int *idx1, int len1, int *idx2, void *values,
+                         bool complex)
+{
+    BinaryMatrixHeader header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, binary_magic, 8);
+    header.version = 1;
+    header.format = format;
+    header.complex = complex;
+    header.index_size = sizeof(int);
+    header.value_size = complex ? sizeof(cplx) : sizeof(double);
+    header.size = size;
+    header.nnz = nnz;
+
+    FILE *f = fopen(filename, "wb");
+    if (f == NULL)
+        _error("write_binary: can't open the file.");
+
+    char zeros[8] = {0};
+    size_t len1_bytes = len1*sizeof(int);
+    size_t len2_bytes = nnz*sizeof(int);
+    bool ok = fwrite(&header, sizeof(header), 1, f) == 1;
+    ok = ok && fwrite(idx1, 1, len1_bytes, f) == len1_bytes;
+    ok = ok && fwrite(zeros, 1, binary_align(len1_bytes) - len1_bytes, f)
+        == binary_align(len1_bytes) - len1_bytes;
+    ok = ok && fwrite(idx2, 1, len2_bytes, f) == len2_bytes;
+    ok = ok && fwrite(zeros, 1, binary_align(len2_bytes) - len2_bytes, f)
+        == binary_align(len2_bytes) - len2_bytes;
+    ok = ok && fwrite(values, header.value_size, nnz, f) == (size_t) nnz;
+    if (fclose(f) != 0 || !ok)
+        _error("write_binary: can't write the file.");
+}
+
+void write_binary_csr(const char *filename, CSRMatrix *A)
+{
+    write_binary(filename, BINARY_CSR, A->get_size(), A->get_nnz(),
+                 A->get_Ap(), A->get_size() + 1, A->get_Ai(),
+                 A->is_complex() ? (void *) A->get_Ax_cplx() : (void *) A->get_Ax(),
+                 A->is_complex());
+}
+
+void write_binary_csc(const char *filename, CSCMatrix *A)
+{
+    write_binary(filename, BINARY_CSC, A->get_size(), A->get_nnz(),
+                 A->get_Ap(), A->get_size() + 1, A->get_Ai(),
+                 A->is_complex() ? (void *) A->get_Ax_cplx() : (void *) A->get_Ax(),
+                 A->is_complex());
+}
+
+void write_binary_coo(const char *filename, CooMatrix *A)
+{
+    int nnz = A->get_nnz();
+    int *row = new int[nnz];
+    int *col = new int[nnz];
+    if (A->is_complex())
+    {
+        cplx *data = new cplx[nnz];
+        A->get_row_col_data(row, col, data);
+        write_binary(filename, BINARY_COO, A->get_size(), nnz, row, nnz, col,
+                     data, true);
+        delete[] data;
+    }
+    else
+    {
+        double *data = new double[nnz];
+        A->get_row_col_data(row, col, data);
+        write_binary(filename, BINARY_COO, A->get_size(), nnz, row, nnz, col,
+                     data, false);
+        delete[] data;
+    }
+    delete[] row;
+    delete[] col;
+}
+
+static void check_binary_header(BinaryMatrixHeader *header)
+{
+    if (memcmp(header->magic, binary_magic, 8) || header->version != 1)
+        _error("read_binary: not a binary matrix file.");
+    if (header->index_size != sizeof(int)
+        || header->value_size != (header->complex ? sizeof(cplx) : sizeof(double)))
+        _error("read_binary: unsupported index or value size.");
+    if (header->format < BINARY_CSR || header->format > BINARY_COO
+        || header->size < 0 || header->nnz < 0)
+        _error("read_binary: invalid format, size or nnz.");
+}
+
+void read_binary_header(const char *filename, BinaryMatrixHeader *header)
+{
+    FILE *f = fopen(filename, "rb");
+    if (f == NULL)
+        _error("read_binary: can't open the file.");
+    bool ok = fread(header, sizeof(BinaryMatrixHeader), 1, f) == 1;
+    fclose(f);
+    if (!ok)
+        _error("read_binary: not a binary matrix file.");
+    check_binary_header(header);
+}
+
+// The memory mapped file, the matrices use its arrays directly.
+class BinaryMatrixFile : public MatrixStorage
+{
+public:
+    BinaryMatrixFile(const char *filename)
+    {
+        int fd = open(filename, O_RDONLY);
+        if (fd < 0)
+            _error("read_binary: can't open the file.");
+        struct stat st;
+        if (fstat(fd, &st) != 0 || st.st_size < (off_t) sizeof(BinaryMatrixHeader))
+        {
+            close(fd);
+            _error("read_binary: not a binary matrix file.");
+        }
+        this->length = st.st_size;
+        // private mapping: the pages are copied only if they are written to
+        this->data = mmap(NULL, this->length, PROT_READ | PROT_WRITE,
+                          MAP_PRIVATE, fd, 0);
+        close(fd);
+        if (this->data == MAP_FAILED)
+            _error("read_binary: mmap() failed.");
+
+        this->header = (BinaryMatrixHeader *) this->data;
+        try
+        {
+            check_binary_header(this->header);
+            size_t len1 = (this->header->format == BINARY_COO ?
+                           this->header->nnz : this->header->size + 1);
+            this->offset2 = sizeof(BinaryMatrixHeader) + binary_align(len1*sizeof(int));
+            this->offset3 = this->offset2 + binary_align(this->header->nnz*sizeof(int));
+            if (this->offset3 + (size_t) this->header->nnz*this->header->value_size
+                > this->length)
+                _error("read_binary: the file is truncated.");
+        }
+        catch (...)
+        {
+            munmap(this->data, this->length);
+            throw;
+        }
+    }
+
+    virtual ~BinaryMatrixFile()
+    {
+        munmap(this->data, this->length);
+    }
+
+    inline BinaryMatrixHeader *get_header() { return this->header; }
+    // Ap (CSR, CSC) or row (COO)
+    inline int *get_idx1() { return (int *) ((char *) this->data + sizeof(BinaryMatrixHeader)); }
+    // Ai (CSR, CSC) or col (COO)
+    inline int *get_idx2() { return (int *) ((char *) this->data + this->offset2); }
+    inline double *get_values() { return (double *) ((char *) this->data + this->offset3); }
+    inline cplx *get_values_cplx() { return (cplx *) ((char *) this->data + this->offset3); }
+
+private:
+    void *data;
+    size_t length;
+    size_t offset2, offset3;
+    BinaryMatrixHeader *header;
+};
+
+CSRMatrix *read_binary_csr(const char *filename)
+{
+    BinaryMatrixFile *file = new BinaryMatrixFile(filename);
+    BinaryMatrixHeader *h = file->get_header();
+    if (h->format == BINARY_CSR)
+    {
+        CSRMatrix *A = new CSRMatrix(h->size);
+        A->set_external_data(h->size, h->nnz, file->get_idx1(), file->get_idx2(),
+                             h->complex ? NULL : file->get_values(),
+                             h->complex ? file->get_values_cplx() : NULL, file);
+        return A;
+    }
+
+    int format = h->format;
+    delete file;
+    CSRMatrix *A;
+    if (format == BINARY_CSC)
+    {
+        CSCMatrix *Acsc = read_binary_csc(filename);
+        A = new CSRMatrix(Acsc);
+        delete Acsc;
+    }
+    else
+    {
+        CooMatrix *Acoo = read_binary_coo(filename);
+        A = new CSRMatrix(Acoo);
+        delete Acoo;
+    }
+    return A;
+}
+
+CSCMatrix *read_binary_csc(const char *filename)
+{
+    BinaryMatrixFile *file = new BinaryMatrixFile(filename);
+    BinaryMatrixHeader *h = file->get_header();
+    if (h->format == BINARY_CSC)
+    {
+        CSCMatrix *A = new CSCMatrix(h->size);
+        A->set_external_data(h->size, h->nnz, file->get_idx1(), file->get_idx2(),
+                             h->complex ? NULL : file->get_values(),
+                             h->complex ? file->get_values_cplx() : NULL, file);
+        return A;
+    }
+
+    int format = h->format;
+    delete file;
+    CSCMatrix *A;
+    if (format == BINARY_CSR)
+    {
+        CSRMatrix *Acsr = read_binary_csr(filename);
+        A = new CSCMatrix(Acsr);
+        delete Acsr;
+    }
+    else
+    {
+        CooMatrix *Acoo = read_binary_coo(filename);
+        A = new CSCMatrix(Acoo);
+        delete Acoo;
+    }
+    return A;
+}
+
+CooMatrix *read_binary_coo(const char *filename)
+{
+    BinaryMatrixFile file(filename);
+    BinaryMatrixHeader *h = file.get_header();
+    int size = h->size;
+    int nnz = h->nnz;
+    int *idx1 = file.get_idx1();
+    int *idx2 = file.get_idx2();
+    CooMatrix *A = new CooMatrix(size, h->complex);
+    if (h->format == BINARY_COO)
+    {
+        for (int k = 0; k < nnz; k++)
+            if (h->complex)
+                A->add(idx1[k], idx2[k], file.get_values_cplx()[k]);
+            else
+                A->add(idx1[k], idx2[k], file.get_values()[k]);
+    }
+    else
+    {
+        // CSR (idx1 are the row pointers) or CSC (the column pointers)
+        for (int j = 0; j < size; j++)
+            for (int k = idx1[j]; k < idx1[j+1]; k++)
+            {
+                int row = (h->format == BINARY_CSR) ? j : idx2[k];
+                int col = (h->format == BINARY_CSR) ? idx2[k] : j;
+                if (h->complex)
+                    A->add(row, col, file.get_values_cplx()[k]);
+                else
+                    A->add(row, col, file.get_values()[k]);
+            }
+    }
+    return A;
+}
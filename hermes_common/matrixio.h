@@ -3,6 +3,9 @@
 // file for the exact terms).
 // Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
 
+#ifndef __HERMES_COMMON_MATRIXIO_H
+#define __HERMES_COMMON_MATRIXIO_H
+
 #include "matrix.h"
 
 // Harwell-Boeing format
@@ -14,3 +17,45 @@ void write_hb_csr(const char *filename, CSRMatrix *A, double *rhs);
 void write_hb_coo(const char *filename, CooMatrix *A, double *rhs);
 
 double *read_rhs(const char *filename, int j = 0);
+
+// Binary format: a header followed by the arrays in the native byte order.
+// Every array starts at a multiple of 8 bytes, so the file can be memory
+// mapped and the arrays used directly, without any parsing or copying:
+//   BINARY_CSR, BINARY_CSC: Ap (size + 1 ints), Ai (nnz ints), Ax (nnz values)
+//   BINARY_COO:             row (nnz ints), col (nnz ints), data (nnz values)
+// The values are double, or cplx if 'complex' is set.
+enum BinaryMatrixFormat
+{
+    BINARY_CSR = 0,
+    BINARY_CSC = 1,
+    BINARY_COO = 2
+};
+
+struct BinaryMatrixHeader
+{
+    char magic[8];      // "HERMESMX"
+    int version;        // 1
+    int format;         // BinaryMatrixFormat
+    int complex;        // 0 - double values, 1 - cplx values
+    int index_size;     // sizeof(int)
+    int value_size;     // sizeof(double) or sizeof(cplx)
+    int size;
+    int nnz;
+    int reserved;
+};
+
+void write_binary_csr(const char *filename, CSRMatrix *A);
+void write_binary_csc(const char *filename, CSCMatrix *A);
+void write_binary_coo(const char *filename, CooMatrix *A);
+
+// Reads the header only.
+void read_binary_header(const char *filename, BinaryMatrixHeader *header);
+
+// The file is memory mapped (copy-on-write, so the matrix can be modified
+// without changing the file). If the file is in the same format, the matrix
+// uses the mapped arrays directly (zero-copy), otherwise it is converted.
+CSRMatrix *read_binary_csr(const char *filename);
+CSCMatrix *read_binary_csc(const char *filename);
+CooMatrix *read_binary_coo(const char *filename);
+
+#endif
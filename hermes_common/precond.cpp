@@ -0,0 +1,210 @@
+// Copyright (c) 2009 hp-FEM group at the University of Nevada, Reno (UNR).
+// Distributed under the terms of the BSD license (see the LICENSE
+// file for the exact terms).
+// Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
+
+#include <algorithm>
+
+#include "matrix.h"
+#include "precond.h"
+
+// Returns the matrix in the CSR format, 'created' is set if the matrix had
+// to be converted (and the caller has to delete it).
+static CSRMatrix *get_csr(Matrix *mat, bool &created)
+{
+    if (mat->is_complex())
+        _error("Preconditioners are not implemented for complex matrices.");
+
+    CSRMatrix *csr = dynamic_cast<CSRMatrix*>(mat);
+    created = (csr == NULL);
+    if (created)
+        csr = new CSRMatrix(mat);
+    return csr;
+}
+
+// ***********************************************************************************************************************
+
+void CommonPreconditionerJacobi::setup(Matrix *mat)
+{
+    bool created;
+    CSRMatrix *A = get_csr(mat, created);
+
+    int n = A->get_size();
+    this->inv_diag.resize(n);
+    for (int i = 0; i < n; i++)
+    {
+        double d = A->get(i, i);
+        if (d == 0)
+            _error("Jacobi preconditioner: zero on the diagonal.");
+        this->inv_diag[i] = 1. / d;
+    }
+
+    if (created) delete A;
+}
+
+void CommonPreconditionerJacobi::apply(double *r, double *z)
+{
+    int n = this->inv_diag.size();
+    for (int i = 0; i < n; i++)
+        z[i] = this->inv_diag[i] * r[i];
+}
+
+// ***********************************************************************************************************************
+
+CommonPreconditionerBlockJacobi::~CommonPreconditionerBlockJacobi()
+{
+    free_blocks();
+}
+
+void CommonPreconditionerBlockJacobi::free_blocks()
+{
+    for (int b = 0; b < this->lu.size(); b++)
+    {
+        delete[] this->lu[b];
+        delete[] this->indx[b];
+    }
+    this->lu.clear();
+    this->indx.clear();
+}
+
+void CommonPreconditionerBlockJacobi::set_blocks(int n_blocks, int *ptr, int *idx)
+{
+    free_blocks();
+    this->ptr.assign(ptr, ptr + n_blocks + 1);
+    this->idx.assign(idx, idx + ptr[n_blocks]);
+}
+
+void CommonPreconditionerBlockJacobi::setup(Matrix *mat)
+{
+    if (this->ptr.size() < 2)
+        _error("Block Jacobi preconditioner: the blocks are not set.");
+
+    free_blocks();
+
+    bool created;
+    CSRMatrix *A = get_csr(mat, created);
+    this->size = A->get_size();
+
+    std::vector<bool> in_block(this->size, false);
+    for (int k = 0; k < this->idx.size(); k++)
+        in_block[this->idx[k]] = true;
+    this->inv_diag.assign(this->size, 0.);
+    for (int i = 0; i < this->size; i++)
+        if (!in_block[i])
+        {
+            double d = A->get(i, i);
+            if (d == 0)
+                _error("Block Jacobi preconditioner: zero on the diagonal.");
+            this->inv_diag[i] = 1. / d;
+        }
+
+    for (int b = 0; b < get_num_blocks(); b++)
+    {
+        int *bidx = &this->idx[this->ptr[b]];
+        int m = this->ptr[b+1] - this->ptr[b];
+        double **a = _new_matrix<double>(m);
+        for (int i = 0; i < m; i++)
+            for (int j = 0; j < m; j++)
+                a[i][j] = A->get(bidx[i], bidx[j]);
+        int *bindx = new int[m];
+        double d;
+        ludcmp(a, m, bindx, &d);
+        this->lu.push_back(a);
+        this->indx.push_back(bindx);
+    }
+
+    if (created) delete A;
+}
+
+void CommonPreconditionerBlockJacobi::apply(double *r, double *z)
+{
+    std::vector<double> w;
+    std::vector<double> result(this->size);
+    for (int i = 0; i < this->size; i++)
+        result[i] = this->inv_diag[i] * r[i];
+    for (int b = 0; b < get_num_blocks(); b++)
+    {
+        int *bidx = &this->idx[this->ptr[b]];
+        int m = this->ptr[b+1] - this->ptr[b];
+        w.resize(m);
+        for (int i = 0; i < m; i++)
+            w[i] = r[bidx[i]];
+        lubksb(this->lu[b], m, this->indx[b], &w[0]);
+        for (int i = 0; i < m; i++)
+            result[bidx[i]] += w[i];
+    }
+    // 'r' and 'z' can be the same array
+    for (int i = 0; i < this->size; i++)
+        z[i] = result[i];
+}
+
+// ***********************************************************************************************************************
+
+void CommonPreconditionerILU0::setup(Matrix *mat)
+{
+    bool created;
+    CSRMatrix *A = get_csr(mat, created);
+
+    int n = this->size = A->get_size();
+    int nnz = A->get_nnz();
+    this->Ap.assign(A->get_Ap(), A->get_Ap() + n + 1);
+    this->Ai.assign(A->get_Ai(), A->get_Ai() + nnz);
+    this->Ax.assign(A->get_Ax(), A->get_Ax() + nnz);
+
+    if (created) delete A;
+
+    // the column indices are sorted in every row of a CSRMatrix
+    this->diag.resize(n);
+    for (int i = 0; i < n; i++)
+    {
+        int *first = &this->Ai[0] + this->Ap[i];
+        int *last = &this->Ai[0] + this->Ap[i+1];
+        int *it = std::lower_bound(first, last, i);
+        if (it == last || *it != i)
+            _error("ILU(0) preconditioner: zero on the diagonal.");
+        this->diag[i] = it - &this->Ai[0];
+    }
+
+    // IKJ variant of the Gaussian elimination, the entries outside of the
+    // pattern are dropped. pos[j] is the position of the entry (i, j) in the
+    // current row 'i' or -1.
+    std::vector<int> pos(n, -1);
+    for (int i = 0; i < n; i++)
+    {
+        for (int k = this->Ap[i]; k < this->Ap[i+1]; k++)
+            pos[this->Ai[k]] = k;
+        for (int k = this->Ap[i]; k < this->diag[i]; k++)
+        {
+            int j = this->Ai[k];
+            double l = this->Ax[k] /= this->Ax[this->diag[j]];
+            for (int kk = this->diag[j] + 1; kk < this->Ap[j+1]; kk++)
+                if (pos[this->Ai[kk]] != -1)
+                    this->Ax[pos[this->Ai[kk]]] -= l * this->Ax[kk];
+        }
+        if (this->Ax[this->diag[i]] == 0)
+            _error("ILU(0) preconditioner: zero pivot.");
+        for (int k = this->Ap[i]; k < this->Ap[i+1]; k++)
+            pos[this->Ai[k]] = -1;
+    }
+}
+
+void CommonPreconditionerILU0::apply(double *r, double *z)
+{
+    int n = this->size;
+    // L y = r
+    for (int i = 0; i < n; i++)
+    {
+        double sum = r[i];
+        for (int k = this->Ap[i]; k < this->diag[i]; k++)
+            sum -= this->Ax[k] * z[this->Ai[k]];
+        z[i] = sum;
+    }
+    // U z = y
+    for (int i = n - 1; i >= 0; i--)
+    {
+        double sum = z[i];
+        for (int k = this->diag[i] + 1; k < this->Ap[i+1]; k++)
+            sum -= this->Ax[k] * z[this->Ai[k]];
+        z[i] = sum / this->Ax[this->diag[i]];
+    }
+}
@@ -0,0 +1,91 @@
+// Copyright (c) 2009 hp-FEM group at the University of Nevada, Reno (UNR).
+// Distributed under the terms of the BSD license (see the LICENSE
+// file for the exact terms).
+// Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
+
+#ifndef __HERMES_COMMON_PRECOND_H
+#define __HERMES_COMMON_PRECOND_H
+
+#include <vector>
+
+class Matrix;
+class CSRMatrix;
+
+// Preconditioners for the iterative solvers (see
+// CommonSolver::set_preconditioner()). The solver calls setup() with the
+// system matrix before the iteration and then apply() in every iteration.
+//
+// abstract class
+class CommonPreconditioner
+{
+public:
+    virtual ~CommonPreconditioner() {}
+
+    // computes the preconditioner for the matrix 'mat'
+    virtual void setup(Matrix *mat) = 0;
+    // z = M^{-1} r
+    virtual void apply(double *r, double *z) = 0;
+};
+
+// Jacobi (diagonal) preconditioner
+class CommonPreconditionerJacobi : public CommonPreconditioner
+{
+public:
+    virtual void setup(Matrix *mat);
+    virtual void apply(double *r, double *z);
+
+private:
+    // inverse of the diagonal
+    std::vector<double> inv_diag;
+};
+
+// Block Jacobi preconditioner. The blocks are given as sets of indices, e.g.
+// the dofs of every element. The diagonal blocks of the matrix are LU
+// factorized in setup(). The blocks may overlap (the elements share the
+// vertex dofs), then the solutions of the blocks are added up (additive
+// Schwarz), which keeps the preconditioner symmetric. The dofs, which are not
+// in any block, are preconditioned by the diagonal.
+class CommonPreconditionerBlockJacobi : public CommonPreconditioner
+{
+public:
+    CommonPreconditionerBlockJacobi() {}
+    ~CommonPreconditionerBlockJacobi();
+
+    // The indices of the block 'b' are idx[ptr[b]], ..., idx[ptr[b+1] - 1].
+    void set_blocks(int n_blocks, int *ptr, int *idx);
+    inline int get_num_blocks() { return (int) this->ptr.size() - 1; }
+
+    virtual void setup(Matrix *mat);
+    virtual void apply(double *r, double *z);
+
+private:
+    void free_blocks();
+
+    int size;
+    std::vector<int> ptr, idx;
+    // inverse of the diagonal for the dofs outside of the blocks, 0 otherwise
+    std::vector<double> inv_diag;
+    // LU factorizations of the diagonal blocks
+    std::vector<double **> lu;
+    std::vector<int *> indx;
+};
+
+// Incomplete LU factorization with the sparsity pattern of the matrix
+// (ILU(0)), computed in the CSR format.
+class CommonPreconditionerILU0 : public CommonPreconditioner
+{
+public:
+    virtual void setup(Matrix *mat);
+    virtual void apply(double *r, double *z);
+
+private:
+    int size;
+    // L (unit diagonal, not stored) and U in the pattern of the matrix, the
+    // column indices in every row are sorted
+    std::vector<int> Ap, Ai;
+    std::vector<double> Ax;
+    // position of the diagonal entry in every row
+    std::vector<int> diag;
+};
+
+#endif
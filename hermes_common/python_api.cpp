@@ -96,3 +96,18 @@ PyObject *Python::pull(const char *name)
     Py_DECREF(tmp);
     return tmp;
 }
+
+PythonMatrixStorage::PythonMatrixStorage(PyObject *a, PyObject *b, PyObject *c)
+{
+    this->objects[0] = a;
+    this->objects[1] = b;
+    this->objects[2] = c;
+    for (int i = 0; i < 3; i++)
+        Py_XINCREF(this->objects[i]);
+}
+
+PythonMatrixStorage::~PythonMatrixStorage()
+{
+    for (int i = 0; i < 3; i++)
+        Py_XDECREF(this->objects[i]);
+}
@@ -7,6 +7,7 @@
 #define __HERMES_COMMON_PYTHON_API_H
 
 #include "_hermes_common_api_new.h"
+#include "matrix.h"
 
 /*
     This is a nice C++ Python API and the only header file that you should
@@ -49,4 +50,16 @@ private:
     void _init(int argc, char* argv[]);
 };
 
+// Owner of the Python objects (e.g. NumPy arrays), whose buffers a CSRMatrix
+// or CSCMatrix uses without copying them (see CSRMatrix::set_external_data()
+// and CSRMatrix.from_scipy()). It holds a reference to every object, so they
+// are not deallocated before the matrix.
+class PythonMatrixStorage : public MatrixStorage {
+public:
+    PythonMatrixStorage(PyObject *a, PyObject *b, PyObject *c);
+    ~PythonMatrixStorage();
+private:
+    PyObject *objects[3];
+};
+
 #endif
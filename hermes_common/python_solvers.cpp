@@ -9,102 +9,219 @@
 #ifdef COMMON_WITH_SCIPY
 #include "python_api.h"
 
+// The solvers are defined only once in a persistent session, which is shared
+// by all the python solvers. Every solver function takes the CSR or CSC
+// arrays of the matrix, the right-hand sides one after another in one array
+// and the relative tolerance and the maximum number of iterations of the
+// iterative solvers (maxiter = 0 is SciPy's default). The solution is
+// written directly to the right-hand side array, the function returns the
+// info of SciPy (0 on success) and the number of iterations.
+// NOTE: the code is executed with the session namespace as locals (see
+// run_cmd()), so the imported functions are bound as default arguments.
+static const char *solvers_code =
+"import warnings\n"
+"from numpy.linalg import solve\n"
+"from scipy.sparse import csr_matrix, csc_matrix\n"
+"from scipy.sparse.linalg import factorized, cg, gmres\n"
+"\n"
+"def system(Ax, Ai, Ap, csr, rhs, csr_matrix=csr_matrix,\n"
+"           csc_matrix=csc_matrix):\n"
+"    n = len(Ap) - 1\n"
+"    A = (csr_matrix if csr else csc_matrix)((Ax, Ai, Ap), shape=(n, n))\n"
+"    return A, rhs.reshape(len(rhs) // n, n)\n"
+"\n"
+"def solve_numpy(Ax, Ai, Ap, csr, rhs, tol, maxiter, system=system,\n"
+"                solve=solve):\n"
+"    A, rhs = system(Ax, Ai, Ap, csr, rhs)\n"
+"    rhs[:] = solve(A.toarray(), rhs.T).T\n"
+"    return 0, 0\n"
+"\n"
+"def solve_umfpack(Ax, Ai, Ap, csr, rhs, tol, maxiter, system=system,\n"
+"                  factorized=factorized, warnings=warnings):\n"
+"    A, rhs = system(Ax, Ai, Ap, csr, rhs)\n"
+"    # a real matrix is factorized as complex for complex right-hand sides\n"
+"    if rhs.dtype.kind == 'c':\n"
+"        A = A.astype(rhs.dtype)\n"
+"    # Turn off warnings in the factorization (only there)\n"
+"    with warnings.catch_warnings():\n"
+"        warnings.simplefilter('ignore')\n"
+"        solve = factorized(A.tocsc())\n"
+"    for b in rhs:\n"
+"        b[:] = solve(b)\n"
+"    return 0, 0\n"
+"\n"
+"def solve_cg(Ax, Ai, Ap, csr, rhs, tol, maxiter, system=system, cg=cg):\n"
+"    A, rhs = system(Ax, Ai, Ap, csr, rhs)\n"
+"    info = 0\n"
+"    # the iterations are counted by the callback\n"
+"    iters = []\n"
+"    for b in rhs:\n"
+"        x, i = cg(A, b, tol=tol, maxiter=maxiter or None, atol=0,\n"
+"                  callback=lambda xk: iters.append(0))\n"
+"        b[:] = x\n"
+"        info = info or i\n"
+"    return info, len(iters)\n"
+"\n"
+"def solve_gmres(Ax, Ai, Ap, csr, rhs, tol, maxiter, system=system,\n"
+"                gmres=gmres):\n"
+"    A, rhs = system(Ax, Ai, Ap, csr, rhs)\n"
+"    info = 0\n"
+"    # the (inner) iterations are counted by the callback\n"
+"    iters = []\n"
+"    for b in rhs:\n"
+"        x, i = gmres(A, b, tol=tol, maxiter=maxiter or None, atol=0,\n"
+"                     callback=lambda rk: iters.append(0))\n"
+"        b[:] = x\n"
+"        info = info or i\n"
+"    return info, len(iters)\n";
+
+// the solver functions defined by solvers_code
+enum SolverFunction
+{
+    SOLVE_NUMPY,
+    SOLVE_UMFPACK,
+    SOLVE_CG,
+    SOLVE_GMRES,
+    N_SOLVER_FUNCTIONS
+};
+static const char *solver_function_names[N_SOLVER_FUNCTIONS] =
+{
+    "solve_numpy", "solve_umfpack", "solve_cg", "solve_gmres"
+};
+
+// Returns the solver function 'fn' of the session (a borrowed reference, the
+// session is never deleted). The session is created and the functions are
+// looked up on the first call, so that every solve is just a python call.
+static PyObject *solver_function(SolverFunction fn)
+{
+    static Python *p = NULL;
+    static PyObject *functions[N_SOLVER_FUNCTIONS];
+    if (p == NULL)
+    {
+        p = new Python();
+        p->exec(solvers_code);
+        for (int i = 0; i < N_SOLVER_FUNCTIONS; i++)
+            functions[i] = p->pull(solver_function_names[i]);
+    }
+    return functions[fn];
+}
+
+// Calls the python function 'fn' with the matrix and the 'nrhs' right-hand
+// sides 'res' (or 'res_cplx'), as numpy arrays pointing to the C arrays.
+// CSR and CSC matrices are passed without any conversion or copying, the
+// other formats are converted to CSC first. Returns the info returned by
+// 'fn', the number of iterations goes to 'stats'.
+static int solve_in_session(SolverFunction fn, Matrix *mat, double *res,
+                            cplx *res_cplx, int nrhs, CommonSolverStats &stats,
+                            double tol = 0, int maxiter = 0)
+{
+    // the session has to exist before any conversion function is called
+    // (they are initialized together with the interpreter)
+    PyObject *f = solver_function(fn);
+
+    CSRMatrix *Acsr = dynamic_cast<CSRMatrix*>(mat);
+    CSCMatrix *Acsc = dynamic_cast<CSCMatrix*>(mat);
+    CSCMatrix *Atmp = NULL;
+    if (Acsr == NULL && Acsc == NULL)
+        Acsc = Atmp = new CSCMatrix(mat);
+
+    int size = mat->get_size();
+    int nnz = Acsr ? Acsr->get_nnz() : Acsc->get_nnz();
+    PyObject *Ap = c2numpy_int_inplace(Acsr ? Acsr->get_Ap() : Acsc->get_Ap(), size + 1);
+    PyObject *Ai = c2numpy_int_inplace(Acsr ? Acsr->get_Ai() : Acsc->get_Ai(), nnz);
+    PyObject *Ax;
+    if (mat->is_complex())
+        Ax = c2numpy_double_complex_inplace(
+                Acsr ? Acsr->get_Ax_cplx() : Acsc->get_Ax_cplx(), nnz);
+    else
+        Ax = c2numpy_double_inplace(Acsr ? Acsr->get_Ax() : Acsc->get_Ax(), nnz);
+    PyObject *rhs;
+    if (res_cplx)
+        rhs = c2numpy_double_complex_inplace(res_cplx, size*nrhs);
+    else
+        rhs = c2numpy_double_inplace(res, size*nrhs);
+
+    PyObject *py_tol = PyFloat_FromDouble(tol);
+    PyObject *py_maxiter = PyInt_FromLong(maxiter);
+
+    PyObject *result = PyObject_CallFunctionObjArgs(f, Ax, Ai, Ap,
+                                                    Acsr ? Py_True : Py_False,
+                                                    rhs, py_tol, py_maxiter,
+                                                    NULL);
+    Py_DECREF(Ap);
+    Py_DECREF(Ai);
+    Py_DECREF(Ax);
+    Py_DECREF(rhs);
+    Py_DECREF(py_tol);
+    Py_DECREF(py_maxiter);
+    if (Atmp) delete Atmp;
+    int info;
+    stats = CommonSolverStats();
+    if (result == NULL
+        || !PyArg_ParseTuple(result, "ii", &info, &stats.iter_num))
+    {
+        PyErr_Print();
+        Py_XDECREF(result);
+        _error("Exception raised in the python solver.");
+    }
+    Py_DECREF(result);
+
+    return info;
+}
+
 bool CommonSolverNumPy::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverNumPy::solve(Matrix *mat, double *res, int nrhs)
 {
   //printf("NumPy solver\n");
 
-    CSRMatrix M(mat);
-    Python *p = new Python();
-    p->push("m", c2py_CSRMatrix(&M));
-    p->push("rhs", c2numpy_double_inplace(res, mat->get_size()));
-    p->exec("A = m.to_scipy_csr().todense()");
-    p->exec("from numpy.linalg import solve");
-    p->exec("x = solve(A, rhs)");
-    double *x;
-    int n;
-    numpy2c_double_inplace(p->pull("x"), &x, &n);
-    memcpy(res, x, n*sizeof(double));
-    delete p;
+    return solve_in_session(SOLVE_NUMPY, mat, res, NULL, nrhs,
+                            this->stats) == 0;
 }
 
 bool CommonSolverNumPy::solve(Matrix *mat, cplx *res)
 {
   //printf("NumPy solver - cplx\n");
 
-    CSRMatrix M(mat);
-    Python *p = new Python();
-    p->push("m", c2py_CSRMatrix(&M));
-    p->push("rhs", c2numpy_double_complex_inplace(res, mat->get_size()));
-    p->exec("A = m.to_scipy_csr().todense()");
-    p->exec("from numpy.linalg import solve");
-    p->exec("x = solve(A, rhs)");
-    cplx *x;
-    int n;
-    numpy2c_double_complex_inplace(p->pull("x"), &x, &n);
-    memcpy(res, x, n*sizeof(cplx));
-    delete p;
+    return solve_in_session(SOLVE_NUMPY, mat, NULL, res, 1,
+                            this->stats) == 0;
 }
 
 bool CommonSolverSciPyUmfpack::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverSciPyUmfpack::solve(Matrix *mat, double *res, int nrhs)
 {
   //printf("SciPy UMFPACK solver\n");
 
-    CSCMatrix M(mat);
-    Python *p = new Python();
-    p->push("m", c2py_CSCMatrix(&M));
-    p->push("rhs", c2numpy_double_inplace(res, mat->get_size()));
-    p->exec("A = m.to_scipy_csc()");
-    p->exec("from scipy.sparse.linalg import spsolve");
-    // Turn off warnings in spsolve (only there)
-    p->exec("import warnings");
-    p->exec("with warnings.catch_warnings():\n"
-            "    warnings.simplefilter('ignore')\n"
-            "    x = spsolve(A, rhs)");
-    double *x;
-    int n;
-    numpy2c_double_inplace(p->pull("x"), &x, &n);
-    memcpy(res, x, n*sizeof(double));
-    delete p;
+    return solve_in_session(SOLVE_UMFPACK, mat, res, NULL, nrhs,
+                            this->stats) == 0;
 }
 
 bool CommonSolverSciPyUmfpack::solve(Matrix *mat, cplx *res)
 {
   //printf("SciPy UMFPACK solver - cplx\n");
 
-    CSCMatrix M(mat);
-    Python *p = new Python();
-    p->push("m", c2py_CSCMatrix(&M));
-    p->push("rhs", c2numpy_double_complex_inplace(res, mat->get_size()));
-    p->exec("A = m.to_scipy_csc()");
-    p->exec("from scipy.sparse.linalg import spsolve");
-    // Turn off warnings in spsolve (only there)
-    p->exec("import warnings");
-    p->exec("with warnings.catch_warnings():\n"
-            "    warnings.simplefilter('ignore')\n"
-            "    x = spsolve(A, rhs)");
-    cplx *x;
-    int n;
-    numpy2c_double_complex_inplace(p->pull("x"), &x, &n);
-    memcpy(res, x, n*sizeof(cplx));
-    delete p;
+    return solve_in_session(SOLVE_UMFPACK, mat, NULL, res, 1,
+                            this->stats) == 0;
 }
 
 bool CommonSolverSciPyCG::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverSciPyCG::solve(Matrix *mat, double *res, int nrhs)
 {
   //printf("SciPy CG solver\n");
 
-    CSRMatrix M(mat);
-    Python *p = new Python();
-    p->push("m", c2py_CSRMatrix(&M));
-    p->push("rhs", c2numpy_double_inplace(res, mat->get_size()));
-    p->exec("A = m.to_scipy_csr()");
-    p->exec("from scipy.sparse.linalg import cg");
-    p->exec("x, res = cg(A, rhs)");
-    double *x;
-    int n;
-    numpy2c_double_inplace(p->pull("x"), &x, &n);
-    memcpy(res, x, n*sizeof(double));
-    delete p;
+    return solve_in_session(SOLVE_CG, mat, res, NULL, nrhs, this->stats,
+                            this->tolerance, this->maxiter) == 0;
 }
 
 bool CommonSolverSciPyCG::solve(Matrix *mat, cplx *res)
@@ -113,21 +230,16 @@ bool CommonSolverSciPyCG::solve(Matrix *mat, cplx *res)
 }
 
 bool CommonSolverSciPyGMRES::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverSciPyGMRES::solve(Matrix *mat, double *res, int nrhs)
 {
   //printf("SciPy GMRES solver\n");
 
-    CSRMatrix M(mat);
-    Python *p = new Python();
-    p->push("m", c2py_CSRMatrix(&M));
-    p->push("rhs", c2numpy_double_inplace(res, mat->get_size()));
-    p->exec("A = m.to_scipy_csr()");
-    p->exec("from scipy.sparse.linalg import gmres");
-    p->exec("x, res = gmres(A, rhs)");
-    double *x;
-    int n;
-    numpy2c_double_inplace(p->pull("x"), &x, &n);
-    memcpy(res, x, n*sizeof(double));
-    delete p;
+    return solve_in_session(SOLVE_GMRES, mat, res, NULL, nrhs, this->stats,
+                            this->tolerance, this->maxiter) == 0;
 }
 
 bool CommonSolverSciPyGMRES::solve(Matrix *mat, cplx *res)
@@ -142,6 +254,11 @@ bool CommonSolverNumPy::solve(Matrix *mat, double *res)
     _error("CommonSolverNumPy::solve(Matrix *mat, double *res) not implemented.");
 }
 
+bool CommonSolverNumPy::solve(Matrix *mat, double *res, int nrhs)
+{
+    _error("CommonSolverNumPy::solve(Matrix *mat, double *res, int nrhs) not implemented.");
+}
+
 bool CommonSolverNumPy::solve(Matrix *mat, cplx *res)
 {
     _error("CommonSolverNumPy::solve(Matrix *mat, cplx *res) not implemented.");
@@ -152,6 +269,11 @@ bool CommonSolverSciPyUmfpack::solve(Matrix *mat, double *res)
     _error("CommonSolverSciPyUmfpack::solve(Matrix *mat, double *res) not implemented.");
 }
 
+bool CommonSolverSciPyUmfpack::solve(Matrix *mat, double *res, int nrhs)
+{
+    _error("CommonSolverSciPyUmfpack::solve(Matrix *mat, double *res, int nrhs) not implemented.");
+}
+
 bool CommonSolverSciPyUmfpack::solve(Matrix *mat, cplx *res)
 {
     _error("CommonSolverSciPyUmfpack::solve(Matrix *mat, cplx *res) not implemented.");
@@ -162,6 +284,11 @@ bool CommonSolverSciPyCG::solve(Matrix *mat, double *res)
     _error("CommonSolverSciPyCG::solve(Matrix *mat, double *res) not implemented.");
 }
 
+bool CommonSolverSciPyCG::solve(Matrix *mat, double *res, int nrhs)
+{
+    _error("CommonSolverSciPyCG::solve(Matrix *mat, double *res, int nrhs) not implemented.");
+}
+
 bool CommonSolverSciPyCG::solve(Matrix *mat, cplx *res)
 {
     _error("CommonSolverSciPyCG::solve(Matrix *mat, cplx *res) not implemented.");
@@ -172,6 +299,11 @@ bool CommonSolverSciPyGMRES::solve(Matrix *mat, double *res)
     _error("CommonSolverSciPyGMRES::solve(Matrix *mat, double *res) not implemented.");
 }
 
+bool CommonSolverSciPyGMRES::solve(Matrix *mat, double *res, int nrhs)
+{
+    _error("CommonSolverSciPyGMRES::solve(Matrix *mat, double *res, int nrhs) not implemented.");
+}
+
 bool CommonSolverSciPyGMRES::solve(Matrix *mat, cplx *res)
 {
     _error("CommonSolverSciPyGMRES::solve(Matrix *mat, cplx *res) not implemented.");
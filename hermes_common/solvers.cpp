@@ -3,39 +3,91 @@
 // file for the exact terms).
 // Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
 
+#include <algorithm>
+
 #include "matrix.h"
 #include "solvers.h"
 
-// Standard CG method starting from zero vector
+bool CommonSolver::solve(Matrix *mat, double *res, int nrhs)
+{
+    int n = mat->get_size();
+    FactorizationScheme scheme = this->factorization_scheme;
+    bool flag = true;
+    // the statistics of the first right-hand side with the iterations of
+    // all of them
+    CommonSolverStats stats;
+    for (int i = 0; i < nrhs; i++)
+    {
+        if (!solve(mat, res + i*n)) flag = false;
+        if (i == 0) stats = this->stats;
+        else stats.iter_num += this->stats.iter_num;
+        // only the first right-hand side factorizes the matrix
+        this->factorization_scheme = REUSE_FACTORIZATION;
+    }
+    this->factorization_scheme = scheme;
+    this->stats = stats;
+
+    return flag;
+}
+
+// ***********************************************************************************************************************
+
+// Returns the matrix used for the matrix-vector products of the iterative
+// solvers. The COO formats are converted only once, so that all the products
+// use a contiguous kernel (see CSRMatrix::times_vector()), the caller has to
+// delete the returned matrix if it differs from 'A'.
+static Matrix *get_product_matrix(Matrix *A)
+{
+    if (dynamic_cast<CooMatrix*>(A) || dynamic_cast<TripletMatrix*>(A))
+        return new CSRMatrix(A);
+    return A;
+}
+
+// Standard (preconditioned) CG method starting from zero vector
 // (because we solve for the increment)
 // x... comes as right-hand side, leaves as solution
 bool CommonSolverCG::solve(Matrix* A, double *x, double tol, int maxiter)
 {
     printf("CG solver\n");
+    this->stats = CommonSolverStats();
+
+    Matrix *Amul = get_product_matrix(A);
 
     int n_dof = A->get_size();
     double *r = new double[n_dof];
     double *p = new double[n_dof];
     double *help_vec = new double[n_dof];
-    if (r == NULL || p == NULL || help_vec == NULL) {
+    // preconditioned residual, z = r without a preconditioner
+    double *z = this->precond ? new double[n_dof] : r;
+    if (r == NULL || p == NULL || help_vec == NULL || z == NULL) {
         _error("a vector could not be allocated in solve_linear_system_iter().");
     }
+    // the COO formats are not converted again by the preconditioner
+    if (this->precond) this->precond->setup(Amul);
+
+    // the tolerance is relative to the norm of the right-hand side, for
+    // b = 0 the solution is x = 0
+    double b_norm = sqrt(vec_dot(x, x, n_dof));
+    if (b_norm == 0) b_norm = 1;
+    tol *= b_norm;
+
     // r = b - A*x0  (where b is x and x0 = 0)
     for (int i=0; i < n_dof; i++) r[i] = x[i];
-    // p = r
-    for (int i=0; i < n_dof; i++) p[i] = r[i];
+    // p = z = M^{-1} r
+    if (this->precond) this->precond->apply(r, z);
+    for (int i=0; i < n_dof; i++) p[i] = z[i];
 
     // setting initial condition x = 0
     for (int i=0; i < n_dof; i++) x[i] = 0;
 
     // CG iteration
     int iter_current = 0;
-    double tol_current;
-    while (1)
+    double tol_current = sqrt(vec_dot(r, r, n_dof));
+    double r_times_z = vec_dot(r, z, n_dof);
+    while (tol_current > tol && iter_current < maxiter)
     {
-        mat_dot(A, p, help_vec, n_dof);
-        double r_times_r = vec_dot(r, r, n_dof);
-        double alpha = r_times_r / vec_dot(p, help_vec, n_dof);
+        mat_dot(Amul, p, help_vec, n_dof);
+        double alpha = r_times_z / vec_dot(p, help_vec, n_dof);
         for (int i=0; i < n_dof; i++) {
             x[i] += alpha*p[i];
             r[i] -= alpha*help_vec[i];
@@ -45,8 +97,14 @@ bool CommonSolverCG::solve(Matrix* A, double *x, double tol, int maxiter)
         tol_current = sqrt(r_times_r_new);
         if (tol_current < tol
             || iter_current >= maxiter) break;
-        double beta = r_times_r_new/r_times_r;
-        for (int i=0; i < n_dof; i++) p[i] = r[i] + beta*p[i];
+        double r_times_z_new = r_times_r_new;
+        if (this->precond) {
+            this->precond->apply(r, z);
+            r_times_z_new = vec_dot(r, z, n_dof);
+        }
+        double beta = r_times_z_new/r_times_z;
+        r_times_z = r_times_z_new;
+        for (int i=0; i < n_dof; i++) p[i] = z[i] + beta*p[i];
     }
     bool flag;
     if (tol_current <= tol)
@@ -54,12 +112,15 @@ bool CommonSolverCG::solve(Matrix* A, double *x, double tol, int maxiter)
     else
         flag = false;
 
+    if (z != r) delete [] z;
     if (r != NULL) delete [] r;
     if (p != NULL) delete [] p;
     if (help_vec != NULL) delete [] help_vec;
+    if (Amul != A) delete Amul;
 
     printf("CG solver: maxiter: %i, tol: %e\n",
-           iter_current, tol_current);
+           iter_current, tol_current / b_norm);
+    this->stats.iter_num = iter_current;
 
     return flag;
 }
@@ -72,32 +133,421 @@ bool CommonSolverCG::solve(Matrix* A, cplx *x)
 
 // ***********************************************************************************************************************
 
+bool CommonSolverKrylov::solve(Matrix* A, cplx *x)
+{
+    _error("CommonSolverKrylov::solve(Matrix *mat, cplx *res) not implemented.");
+}
+
+// Restarted GMRES(m) with the modified Gram-Schmidt orthogonalization and
+// the Givens rotations, right preconditioned: A M^{-1} u = b, x = M^{-1} u.
+// x... comes as right-hand side, leaves as solution
+bool CommonSolverGMRES::solve(Matrix* A, double *x)
+{
+    printf("GMRES solver\n");
+    this->stats = CommonSolverStats();
+
+    Matrix *Amul = get_product_matrix(A);
+    int n_dof = A->get_size();
+    int m = std::min(this->restart, n_dof);
+    if (m < 1) _error("GMRES solver: the restart length must be positive.");
+    if (this->precond) this->precond->setup(Amul);
+
+    std::vector<double> b(x, x + n_dof), r(n_dof), w(n_dof), z(n_dof);
+    // Krylov basis, the columns of the Hessenberg matrix, the Givens
+    // rotations and the right-hand side of the least squares problem
+    std::vector<std::vector<double> > V(m + 1, std::vector<double>(n_dof));
+    std::vector<std::vector<double> > H(m, std::vector<double>(m + 1));
+    std::vector<double> cs(m), sn(m), g(m + 1), y(m);
+
+    double b_norm = sqrt(vec_dot(&b[0], &b[0], n_dof));
+    // for b = 0 the solution is x = 0
+    if (b_norm == 0) b_norm = 1;
+    double tol = this->tolerance * b_norm;
+
+    // x = 0, r = b
+    for (int i=0; i < n_dof; i++) {
+        x[i] = 0;
+        r[i] = b[i];
+    }
+    double beta = sqrt(vec_dot(&r[0], &r[0], n_dof));
+    this->residuals.clear();
+    this->residuals.push_back(beta);
+
+    int iter_current = 0;
+    bool breakdown = false;
+    while (beta > tol && iter_current < this->maxiter && !breakdown)
+    {
+        for (int i=0; i < n_dof; i++) V[0][i] = r[i] / beta;
+        for (int j=0; j <= m; j++) g[j] = 0;
+        g[0] = beta;
+
+        int k = 0;
+        while (k < m && iter_current < this->maxiter)
+        {
+            // w = A M^{-1} v_k
+            if (this->precond) this->precond->apply(&V[k][0], &z[0]);
+            else z = V[k];
+            mat_dot(Amul, &z[0], &w[0], n_dof);
+            for (int j=0; j <= k; j++) {
+                H[k][j] = vec_dot(&w[0], &V[j][0], n_dof);
+                for (int i=0; i < n_dof; i++) w[i] -= H[k][j] * V[j][i];
+            }
+            double h = sqrt(vec_dot(&w[0], &w[0], n_dof));
+            H[k][k+1] = h;
+            if (h != 0)
+                for (int i=0; i < n_dof; i++) V[k+1][i] = w[i] / h;
+
+            // apply the previous rotations to the new column and eliminate
+            // its subdiagonal entry
+            for (int j=0; j < k; j++) {
+                double tmp = cs[j]*H[k][j] + sn[j]*H[k][j+1];
+                H[k][j+1] = -sn[j]*H[k][j] + cs[j]*H[k][j+1];
+                H[k][j] = tmp;
+            }
+            double d = sqrt(H[k][k]*H[k][k] + H[k][k+1]*H[k][k+1]);
+            // the Hessenberg matrix is singular (and so is A M^{-1}), the
+            // new column can't be used, stop with the current iterate
+            if (d == 0) {
+                breakdown = true;
+                break;
+            }
+            cs[k] = H[k][k] / d;
+            sn[k] = H[k][k+1] / d;
+            H[k][k] = d;
+            H[k][k+1] = 0;
+            g[k+1] = -sn[k]*g[k];
+            g[k] = cs[k]*g[k];
+
+            k++;
+            iter_current++;
+            this->residuals.push_back(fabs(g[k]));
+            // h == 0 is a (lucky) breakdown, the Krylov space is invariant
+            if (fabs(g[k]) <= tol || h == 0) break;
+        }
+
+        // y = H^{-1} g, x += M^{-1} V y
+        for (int i=k-1; i >= 0; i--) {
+            y[i] = g[i];
+            for (int j=i+1; j < k; j++) y[i] -= H[j][i] * y[j];
+            y[i] /= H[i][i];
+        }
+        for (int i=0; i < n_dof; i++) {
+            w[i] = 0;
+            for (int j=0; j < k; j++) w[i] += V[j][i] * y[j];
+        }
+        if (this->precond) this->precond->apply(&w[0], &z[0]);
+        else z = w;
+        for (int i=0; i < n_dof; i++) x[i] += z[i];
+
+        // the true residual for the restart (and the convergence test)
+        mat_dot(Amul, x, &w[0], n_dof);
+        for (int i=0; i < n_dof; i++) r[i] = b[i] - w[i];
+        beta = sqrt(vec_dot(&r[0], &r[0], n_dof));
+    }
+    if (Amul != A) delete Amul;
+
+    printf("GMRES solver: maxiter: %i, tol: %e\n",
+           iter_current, beta / b_norm);
+    if (breakdown) printf("GMRES solver: breakdown (singular matrix)\n");
+    this->stats.iter_num = iter_current;
+
+    return !breakdown && beta <= tol;
+}
+
+// BiCGStab method, right preconditioned.
+// x... comes as right-hand side, leaves as solution
+bool CommonSolverBiCGStab::solve(Matrix* A, double *x)
+{
+    printf("BiCGStab solver\n");
+    this->stats = CommonSolverStats();
+
+    Matrix *Amul = get_product_matrix(A);
+    int n_dof = A->get_size();
+    if (this->precond) this->precond->setup(Amul);
+
+    std::vector<double> r(x, x + n_dof), r0(r), p(n_dof, 0.), v(n_dof, 0.);
+    std::vector<double> s(n_dof), t(n_dof), p_hat(n_dof), s_hat(n_dof);
+
+    double b_norm = sqrt(vec_dot(&r[0], &r[0], n_dof));
+    // for b = 0 the solution is x = 0
+    if (b_norm == 0) b_norm = 1;
+    double tol = this->tolerance * b_norm;
+
+    // x = 0, r = r0 = b
+    for (int i=0; i < n_dof; i++) x[i] = 0;
+    double r_norm = sqrt(vec_dot(&r[0], &r[0], n_dof));
+    this->residuals.clear();
+    this->residuals.push_back(r_norm);
+
+    int iter_current = 0;
+    double rho = 1, alpha = 1, omega = 1;
+    while (r_norm > tol && iter_current < this->maxiter)
+    {
+        double rho_new = vec_dot(&r0[0], &r[0], n_dof);
+        // breakdown
+        if (rho_new == 0) break;
+        double beta = (rho_new / rho) * (alpha / omega);
+        rho = rho_new;
+        for (int i=0; i < n_dof; i++) p[i] = r[i] + beta*(p[i] - omega*v[i]);
+        if (this->precond) this->precond->apply(&p[0], &p_hat[0]);
+        else p_hat = p;
+        mat_dot(Amul, &p_hat[0], &v[0], n_dof);
+        alpha = rho / vec_dot(&r0[0], &v[0], n_dof);
+        for (int i=0; i < n_dof; i++) s[i] = r[i] - alpha*v[i];
+
+        iter_current++;
+        double s_norm = sqrt(vec_dot(&s[0], &s[0], n_dof));
+        if (s_norm <= tol) {
+            for (int i=0; i < n_dof; i++) x[i] += alpha*p_hat[i];
+            r_norm = s_norm;
+            this->residuals.push_back(r_norm);
+            break;
+        }
+
+        if (this->precond) this->precond->apply(&s[0], &s_hat[0]);
+        else s_hat = s;
+        mat_dot(Amul, &s_hat[0], &t[0], n_dof);
+        omega = vec_dot(&t[0], &s[0], n_dof) / vec_dot(&t[0], &t[0], n_dof);
+        for (int i=0; i < n_dof; i++) {
+            x[i] += alpha*p_hat[i] + omega*s_hat[i];
+            r[i] = s[i] - omega*t[i];
+        }
+        r_norm = sqrt(vec_dot(&r[0], &r[0], n_dof));
+        this->residuals.push_back(r_norm);
+        // breakdown
+        if (omega == 0) break;
+    }
+    if (Amul != A) delete Amul;
+
+    printf("BiCGStab solver: maxiter: %i, tol: %e\n",
+           iter_current, r_norm / b_norm);
+    this->stats.iter_num = iter_current;
+
+    return r_norm <= tol;
+}
+
+// ***********************************************************************************************************************
+
 bool CommonSolverDenseLU::solve(Matrix* A, double *x)
+{
+    return solve(A, x, 1);
+}
+
+bool CommonSolverDenseLU::solve(Matrix* A, double *x, int nrhs)
 {
     printf("DenseLU solver\n");
+    this->stats = CommonSolverStats();
 
-    DenseMatrix *Aden = NULL;
+    if (this->factorization_scheme != REUSE_FACTORIZATION || this->lu == NULL
+        || this->lu->get_size() != A->get_size())
+    {
+        free_factorization();
+
+        // the factorization is done in place, so we need a copy
+        if (DenseMatrix *mden = dynamic_cast<DenseMatrix*>(A))
+        {
+            int n = mden->get_size();
+            this->lu = new DenseMatrix(n);
+            memcpy(this->lu->get_A()[0], mden->get_A()[0], n*n*sizeof(double));
+        }
+        else if (CooMatrix *mcoo = dynamic_cast<CooMatrix*>(A))
+            this->lu = new DenseMatrix(mcoo);
+        else if (TripletMatrix *mtr = dynamic_cast<TripletMatrix*>(A))
+            this->lu = new DenseMatrix(mtr);
+        else if (CSRMatrix *mcsr = dynamic_cast<CSRMatrix*>(A))
+            this->lu = new DenseMatrix(mcsr);
+        else if (SymCSRMatrix *msym = dynamic_cast<SymCSRMatrix*>(A))
+        {
+            CSRMatrix full(msym);
+            this->lu = new DenseMatrix(&full);
+        }
+        else
+            _error("Matrix type not supported.");
 
-    if (DenseMatrix *mden = dynamic_cast<DenseMatrix*>(A))
-        Aden = mden;
-    else if (CooMatrix *mcoo = dynamic_cast<CooMatrix*>(A))
-        Aden = new DenseMatrix(mcoo);
+        int n = this->lu->get_size();
+        this->indx = new int[n];
+        dense_lu_factorize(this->lu->get_A()[0], n, this->indx);
+    }
     else
-        _error("Matrix type not supported.");
+        this->stats.factorization_reused = true;
+
+    dense_lu_solve(this->lu->get_A()[0], this->lu->get_size(), this->indx, x, nrhs);
 
-    int n = Aden->get_size();
-    int *indx = new int[n];
-    double **_mat = Aden->get_A();
-    double d;
-    ludcmp(_mat, n, indx, &d);
-    lubksb(_mat, n, indx, x);
+    return true;
+}
 
-    delete[] indx;
-    if (!dynamic_cast<DenseMatrix*>(A))
-        delete Aden;
+void CommonSolverDenseLU::free_factorization()
+{
+    if (this->lu) { delete this->lu; this->lu = NULL; }
+    if (this->indx) { delete[] this->indx; this->indx = NULL; }
 }
 
 bool CommonSolverDenseLU::solve(Matrix* A, cplx *x)
 {
     _error("CommonSolverDenseLU::solve(Matrix *mat, cplx *res) not implemented.");
 }
+
+// ***********************************************************************************************************************
+
+void CommonSolverMixedLU::free_ordering()
+{
+    if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
+    if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
+    if (this->perm) { delete[] this->perm; this->perm = NULL; }
+    this->pattern_size = 0;
+    this->pattern_nnz = 0;
+}
+
+void CommonSolverMixedLU::free_factorization()
+{
+    if (this->lu) { delete[] this->lu; this->lu = NULL; }
+    if (this->band) { delete[] this->band; this->band = NULL; }
+    if (this->indx) { delete[] this->indx; this->indx = NULL; }
+    this->size = 0;
+}
+
+void CommonSolverMixedLU::factorize(Matrix *mat)
+{
+    if (mat->is_complex())
+        _error("CommonSolverMixedLU: complex matrices are not supported.");
+
+    free_factorization();
+    int n = this->size = mat->get_size();
+    this->indx = new int[n];
+
+    // the double precision dense matrix is never created
+    if (DenseMatrix *mden = dynamic_cast<DenseMatrix*>(mat))
+    {
+        this->lu = _new_matrix<float>(n);
+        double **A = mden->get_A();
+        for (int i = 0; i < n; i++)
+            for (int j = 0; j < n; j++)
+                this->lu[i][j] = (float) A[i][j];
+
+        float d;
+        ludcmp(this->lu, n, this->indx, &d);
+        return;
+    }
+
+    // the double precision band matrix is never created either
+    CSRMatrix *Acsr = dynamic_cast<CSRMatrix*>(mat);
+    if (Acsr == NULL) Acsr = new CSRMatrix(mat);
+    int *Ap = Acsr->get_Ap(), *Ai = Acsr->get_Ai();
+    double *Ax = Acsr->get_Ax();
+
+    // compute the ordering only if the sparsity pattern has changed
+    int n_nz = Acsr->get_nnz();
+    if (this->factorization_scheme == FACTORIZE_FROM_SCRATCH
+        || n != this->pattern_size || n_nz != this->pattern_nnz
+        || memcmp(Ap, this->Ap, (n + 1)*sizeof(int))
+        || memcmp(Ai, this->Ai, n_nz*sizeof(int)))
+    {
+        free_ordering();
+        this->pattern_size = n;
+        this->pattern_nnz = n_nz;
+        this->Ap = new int[n + 1];
+        this->Ai = new int[n_nz];
+        this->perm = new int[n];
+        memcpy(this->Ap, Ap, (n + 1)*sizeof(int));
+        memcpy(this->Ai, Ai, n_nz*sizeof(int));
+        rcm_ordering(n, this->Ap, this->Ai, this->perm);
+    }
+
+    // P*A*P^T in the band storage (see BandedMatrix(CSRMatrix *m, int *perm))
+    int *iperm = new int[n];
+    for (int i = 0; i < n; i++) iperm[this->perm[i]] = i;
+    this->kl = this->ku = 0;
+    for (int r = 0; r < n; r++)
+        for (int k = Ap[r]; k < Ap[r+1]; k++)
+        {
+            int d = iperm[Ai[k]] - iperm[r];
+            if (d > this->ku) this->ku = d;
+            if (-d > this->kl) this->kl = -d;
+        }
+    int ldab = 2*this->kl + this->ku + 1;
+    this->band = new float[n*ldab];
+    memset(this->band, 0, n*ldab*sizeof(float));
+    for (int r = 0; r < n; r++)
+    {
+        int i = iperm[r];
+        for (int k = Ap[r]; k < Ap[r+1]; k++)
+            this->band[i*ldab + iperm[Ai[k]] - i + this->kl] += (float) Ax[k];
+    }
+    delete[] iperm;
+    if (Acsr != mat) delete Acsr;
+
+    printf("Mixed precision LU solver: size: %i, kl: %i, ku: %i\n", n,
+           this->kl, this->ku);
+    band_ludcmp(this->band, n, this->kl, this->ku, this->indx);
+}
+
+// x... comes as right-hand side, leaves as solution
+bool CommonSolverMixedLU::solve(Matrix* A, double *x)
+{
+    printf("Mixed precision LU solver\n");
+    this->stats = CommonSolverStats();
+
+    if (this->factorization_scheme != REUSE_FACTORIZATION || this->size == 0
+        || this->size != A->get_size())
+        factorize(A);
+    else
+        this->stats.factorization_reused = true;
+
+    Matrix *Amul = get_product_matrix(A);
+    int n = this->size;
+    std::vector<double> b(x, x + n), r(b), Ax(n), x_prev(n);
+    std::vector<float> d(n);
+
+    double b_norm = sqrt(vec_dot(&b[0], &b[0], n));
+    // for b = 0 the solution is x = 0
+    double tol = this->tolerance * (b_norm == 0 ? 1 : b_norm);
+    for (int i = 0; i < n; i++) x[i] = 0;
+
+    double r_norm = b_norm;
+    int iter_current = 0;
+    while (r_norm > tol && iter_current < this->maxiter)
+    {
+        // correction in single precision
+        for (int i = 0; i < n; i++) x_prev[i] = x[i];
+        if (this->lu)
+        {
+            for (int i = 0; i < n; i++) d[i] = (float) r[i];
+            lubksb(this->lu, n, this->indx, &d[0]);
+            for (int i = 0; i < n; i++) x[i] += d[i];
+        }
+        else
+        {
+            for (int i = 0; i < n; i++) d[i] = (float) r[this->perm[i]];
+            band_lubksb(this->band, n, this->kl, this->ku, this->indx, &d[0]);
+            for (int i = 0; i < n; i++) x[this->perm[i]] += d[i];
+        }
+
+        // residual in double precision
+        mat_dot(Amul, x, &Ax[0], n);
+        for (int i = 0; i < n; i++) r[i] = b[i] - Ax[i];
+        double r_norm_prev = r_norm;
+        r_norm = sqrt(vec_dot(&r[0], &r[0], n));
+        iter_current++;
+        // the refinement does not converge any more (the double precision
+        // limit or a too ill-conditioned matrix), the last correction is
+        // undone
+        if (r_norm >= r_norm_prev)
+        {
+            for (int i = 0; i < n; i++) x[i] = x_prev[i];
+            r_norm = r_norm_prev;
+            break;
+        }
+    }
+    if (Amul != A) delete Amul;
+
+    printf("Mixed precision LU solver: iterations: %i, tol: %e\n",
+           iter_current, r_norm / (b_norm == 0 ? 1 : b_norm));
+    this->stats.iter_num = iter_current;
+
+    return r_norm <= tol;
+}
+
+bool CommonSolverMixedLU::solve(Matrix* A, cplx *x)
+{
+    _error("CommonSolverMixedLU::solve(Matrix *mat, cplx *res) not implemented.");
+}
@@ -6,32 +6,139 @@
 #ifndef __HERMES_COMMON_SOLVERS_H
 #define __HERMES_COMMON_SOLVERS_H
 
+#include <vector>
+
+#include "precond.h"
+
 class Matrix;
+class DenseMatrix;
+class BandedMatrix;
+
+// How the direct solvers reuse the work done in the previous solve() call.
+enum FactorizationScheme
+{
+    // both the ordering (symbolic analysis) and the numerical
+    // factorization are computed from scratch
+    FACTORIZE_FROM_SCRATCH,
+    // the ordering (symbolic analysis) is reused as long as the sparsity
+    // pattern of the matrix stays the same
+    REUSE_SYMBOLIC,
+    // the numerical factorization of the previous matrix is reused, the
+    // matrix passed to solve() is not factorized (modified Newton method)
+    REUSE_FACTORIZATION
+};
+
+// Statistics of the last solve() call (see CommonSolver::get_stats()).
+struct CommonSolverStats
+{
+    CommonSolverStats()
+    {
+        iter_num = 0;
+        factorization_reused = false;
+    }
+
+    // iterations of the iterative solvers (the refinement steps of
+    // CommonSolverMixedLU), 0 for the direct solvers
+    int iter_num;
+    // the factorization of the previous call was reused, the matrix was
+    // not factorized (see REUSE_FACTORIZATION)
+    bool factorization_reused;
+};
 
 // abstract class
 class CommonSolver
 {
 public:
+    CommonSolver()
+    {
+        factorization_scheme = REUSE_SYMBOLIC;
+        precond = NULL;
+    }
+    virtual ~CommonSolver() {}
+
     virtual bool solve(Matrix *mat, double *res) = 0;
     virtual bool solve(Matrix *mat, cplx *res) = 0;
+    // Solves the system with 'nrhs' right-hand sides, which are stored one
+    // after another in 'res' (i.e. 'res' is a size x nrhs column-major
+    // array), the solutions overwrite them. The default implementation
+    // calls solve() for each right-hand side, reusing the factorization of
+    // the first one.
+    virtual bool solve(Matrix *mat, double *res, int nrhs);
     inline char *get_log() { return log; }
 
+    // Only used by the solvers that factorize the matrix, the other
+    // solvers ignore it. The default is REUSE_SYMBOLIC.
+    inline void set_factorization_scheme(FactorizationScheme scheme)
+    {
+        this->factorization_scheme = scheme;
+    }
+    inline FactorizationScheme get_factorization_scheme()
+    {
+        return this->factorization_scheme;
+    }
+
+    // Only used by the iterative solvers, the other solvers ignore it. The
+    // preconditioner is not deleted by the solver. The default is NULL (no
+    // preconditioner, the SparseLib++ solvers use their own ILU then).
+    inline void set_preconditioner(CommonPreconditioner *precond)
+    {
+        this->precond = precond;
+    }
+    inline CommonPreconditioner *get_preconditioner()
+    {
+        return this->precond;
+    }
+
+    // Only used by the iterative solvers with a relative tolerance (the
+    // residual norm divided by the norm of the right-hand side), the other
+    // solvers ignore it and get_tolerance() returns 0 for them (e.g. in
+    // newton_inexact(), which chooses the tolerance of every linear
+    // system).
+    virtual void set_tolerance(double tolerance) {}
+    virtual double get_tolerance() { return 0; }
+
+    // statistics of the last solve() call (e.g. for the iteration
+    // statistics of newton())
+    inline CommonSolverStats &get_stats() { return this->stats; }
+
+protected:
+    FactorizationScheme factorization_scheme;
+    CommonPreconditioner *precond;
+    CommonSolverStats stats;
+
 private:
     char *log;
 };
 
 // c++ cg
+// Starts from the zero vector and stops when the residual norm drops below
+// 'tolerance' times the norm of the right-hand side (like
+// CommonSolverKrylov) or after 'maxiter' iterations.
 class CommonSolverCG : public CommonSolver
 {
 public:
+    CommonSolverCG()
+    {
+        tolerance = 1e-8;
+        maxiter = 1000;
+    }
+
+    using CommonSolver::solve;
     bool solve(Matrix *mat, double *res)
     {
-        solve(mat, res, 1e-6, 1000);
+        return solve(mat, res, this->tolerance, this->maxiter);
     }
     bool solve(Matrix *mat, double *res,
                double tol,
                int maxiter);
     bool solve(Matrix *mat, cplx *res);
+    inline void set_tolerance(double tolerance) { this->tolerance = tolerance; }
+    inline double get_tolerance() { return this->tolerance; }
+    inline void set_maxiter(int maxiter) { this->maxiter = maxiter; }
+
+private:
+    double tolerance;
+    int maxiter;
 };
 inline bool solve_linear_system_cg(Matrix *mat, double *res,
                                    double tolerance,
@@ -46,12 +153,97 @@ inline bool solve_linear_system_cg(Matrix *mat, cplx *res)
     return solver.solve(mat, res);
 }
 
+// Base class of the native Krylov solvers for nonsymmetric matrices. They
+// start from the zero vector and stop when the residual norm drops below
+// 'tolerance' times the norm of the right-hand side. The matrix is only
+// used through Matrix::times_vector(), the preconditioner (if set) is
+// applied from the right, so that the residual is the true one.
+class CommonSolverKrylov : public CommonSolver
+{
+public:
+    CommonSolverKrylov()
+    {
+        tolerance = 1e-8;
+        maxiter = 1000;
+    }
+
+    using CommonSolver::solve;
+    bool solve(Matrix *mat, cplx *res);
+    inline void set_tolerance(double tolerance) { this->tolerance = tolerance; }
+    inline double get_tolerance() { return this->tolerance; }
+    inline void set_maxiter(int maxiter) { this->maxiter = maxiter; }
+    // the residual norms of the last solve() call: the initial one and the
+    // one after every iteration
+    inline std::vector<double> &get_residual_history() { return this->residuals; }
+
+protected:
+    double tolerance;
+    int maxiter;
+    std::vector<double> residuals;
+};
+
+// c++ restarted GMRES(m)
+class CommonSolverGMRES : public CommonSolverKrylov
+{
+public:
+    CommonSolverGMRES()
+    {
+        restart = 30;
+    }
+
+    using CommonSolverKrylov::solve;
+    bool solve(Matrix *mat, double *res);
+    inline void set_restart(int restart) { this->restart = restart; }
+
+private:
+    int restart;
+};
+inline bool solve_linear_system_gmres(Matrix *mat, double *res,
+                                      double tolerance, int maxiter,
+                                      int restart)
+{
+    CommonSolverGMRES solver;
+    solver.set_tolerance(tolerance);
+    solver.set_maxiter(maxiter);
+    solver.set_restart(restart);
+    return solver.solve(mat, res);
+}
+
+// c++ BiCGStab
+class CommonSolverBiCGStab : public CommonSolverKrylov
+{
+public:
+    using CommonSolverKrylov::solve;
+    bool solve(Matrix *mat, double *res);
+};
+inline bool solve_linear_system_bicgstab(Matrix *mat, double *res,
+                                         double tolerance, int maxiter)
+{
+    CommonSolverBiCGStab solver;
+    solver.set_tolerance(tolerance);
+    solver.set_maxiter(maxiter);
+    return solver.solve(mat, res);
+}
+
 // c++ lu
+// Blocked LU factorization of a DenseMatrix (see dense_lu_factorize()),
+// LAPACK's dgetrf with COMMON_WITH_LAPACK.
 class CommonSolverDenseLU : public CommonSolver
 {
 public:
+    CommonSolverDenseLU() { lu = NULL; indx = NULL; }
+    ~CommonSolverDenseLU() { free_factorization(); }
+
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve(Matrix *mat, cplx *res);
+
+private:
+    void free_factorization();
+
+    // LU factorization of the last matrix and the row interchanges
+    DenseMatrix *lu;
+    int *indx;
 };
 inline void solve_linear_system_dense_lu(Matrix *mat, double *res)
 {
@@ -64,12 +256,94 @@ inline void solve_linear_system_dense_lu(Matrix *mat, cplx *res)
     solver.solve(mat, res);
 }
 
+// c++ mixed precision lu
+// The matrix is LU factorized in single precision and the solution is
+// refined to double precision, the residuals are computed in double
+// precision:
+//     x_0 = 0,  x_{k+1} = x_k + (LU)^{-1} (b - A x_k)
+// A DenseMatrix is factorized as it is (half the memory of
+// CommonSolverDenseLU), the other matrices are reordered like in
+// CommonSolverBanded and factorized in the band storage (half the memory of
+// CommonSolverBanded). This converges as long as the matrix is not too
+// ill-conditioned for the single precision factorization (condition number
+// well below 1e7).
+class CommonSolverMixedLU : public CommonSolver
+{
+public:
+    CommonSolverMixedLU()
+    {
+        size = 0;
+        lu = NULL;
+        band = NULL;
+        indx = NULL;
+        pattern_size = pattern_nnz = 0;
+        Ap = Ai = perm = NULL;
+        tolerance = 1e-12;
+        maxiter = 20;
+    }
+    ~CommonSolverMixedLU() { free_factorization(); free_ordering(); }
+
+    using CommonSolver::solve;
+    bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, cplx *res);
+    // The refinement stops when the residual norm drops below 'tolerance'
+    // times the norm of the right-hand side, after 'maxiter' steps or when
+    // the residual stops decreasing.
+    inline void set_tolerance(double tolerance) { this->tolerance = tolerance; }
+    inline double get_tolerance() { return this->tolerance; }
+    inline void set_maxiter(int maxiter) { this->maxiter = maxiter; }
+
+private:
+    void free_ordering();
+    void free_factorization();
+    void factorize(Matrix *mat);
+
+    // single precision LU factorization of the last matrix, dense ('lu') or
+    // band ('band', see BandedMatrix) of the reordered matrix, and the row
+    // interchanges
+    int size;
+    float **lu;
+    float *band;
+    int kl, ku;
+    int *indx;
+
+    // the sparsity pattern (CSR) the ordering was computed for
+    int pattern_size, pattern_nnz;
+    int *Ap, *Ai;
+    int *perm;
+
+    double tolerance;
+    int maxiter;
+};
+inline bool solve_linear_system_mixed_lu(Matrix *mat, double *res)
+{
+    CommonSolverMixedLU solver;
+    return solver.solve(mat, res);
+}
+
 // c++ umfpack - optional
 class CommonSolverUmfpack : public CommonSolver
 {
 public:
+    CommonSolverUmfpack()
+    {
+        symbolic = numeric = NULL;
+        size = nnz = 0;
+        Ap = Ai = NULL;
+    }
+    ~CommonSolverUmfpack() { free_factorization(); }
+
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve(Matrix *mat, cplx *res);
+
+private:
+    void free_factorization();
+
+    void *symbolic, *numeric;
+    // the sparsity pattern (CSC) of the symbolic analysis
+    int size, nnz;
+    int *Ap, *Ai;
 };
 inline void solve_linear_system_umfpack(Matrix *mat, double *res)
 {
@@ -89,25 +363,33 @@ public:
     enum CommonSolverSparseLibSolver
     {
         CommonSolverSparseLibSolver_ConjugateGradientSquared,
-        CommonSolverSparseLibSolver_RichardsonIterativeRefinement
+        CommonSolverSparseLibSolver_RichardsonIterativeRefinement,
+        CommonSolverSparseLibSolver_GMRES,
+        CommonSolverSparseLibSolver_BiCGStab
     };
 
     CommonSolverSparseLib()
     {
         tolerance = 1e-8;
         maxiter = 1000;
+        restart = 30;
         method = CommonSolverSparseLibSolver_ConjugateGradientSquared;
     }
 
+    using CommonSolver::solve;
     bool solve(Matrix *mat, double *res);
     bool solve(Matrix *mat, cplx *res);
     inline void set_tolerance(double tolerance) { this->tolerance = tolerance; }
+    inline double get_tolerance() { return this->tolerance; }
     inline void set_maxiter(int maxiter) { this->maxiter = maxiter; }
+    // only used by GMRES
+    inline void set_restart(int restart) { this->restart = restart; }
     inline void set_method(CommonSolverSparseLibSolver method) { this->method = method; }
 
 private:
     double tolerance;
     int maxiter;
+    int restart;
     CommonSolverSparseLibSolver method;
 };
 inline void solve_linear_system_sparselib_cgs(Matrix *mat, double *res, double tolerance = 1e-8, int maxiter = 1000)
@@ -128,12 +410,23 @@ inline void solve_linear_system_sparselib_ir(Matrix *mat, double *res, double to
 }
 
 // c++ superlu - optional
+struct CommonSolverSuperLUData;
 class CommonSolverSuperLU : public CommonSolver
 {
 public:
+    CommonSolverSuperLU() { data = NULL; }
+    ~CommonSolverSuperLU() { free_factorization(); }
+
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve2(Matrix *mat, double *res);
     bool solve(Matrix *mat, cplx *res);
+
+private:
+    void free_factorization();
+
+    // the column ordering and the factors L, U of the last matrix
+    CommonSolverSuperLUData *data;
 };
 inline void solve_linear_system_superlu(Matrix *mat, double *res)
 {
@@ -141,11 +434,85 @@ inline void solve_linear_system_superlu(Matrix *mat, double *res)
     solver.solve(mat, res);
 }
 
+// c++ banded lu
+// Direct solver for band matrices (LU factorization with partial pivoting,
+// O(n*kl*(kl+ku)) operations). Other matrices are converted to a band
+// matrix using the reverse Cuthill-McKee ordering, which is the symbolic
+// analysis here: it is reused as long as the sparsity pattern stays the
+// same (e.g. during the Newton iteration).
+class CommonSolverBanded : public CommonSolver
+{
+public:
+    CommonSolverBanded();
+    ~CommonSolverBanded();
+
+    bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
+    bool solve(Matrix *mat, cplx *res);
+
+private:
+    void free_ordering();
+    void free_factorization();
+    void factorize(Matrix *mat);
+
+    // the sparsity pattern (CSR) the ordering was computed for
+    int size, nnz;
+    int *Ap, *Ai;
+    int *perm;
+
+    // LU factorization of the last matrix
+    BandedMatrix *lu;
+    int *ipiv;
+    bool lu_permuted;
+};
+inline void solve_linear_system_banded(Matrix *mat, double *res)
+{
+    CommonSolverBanded solver;
+    solver.solve(mat, res);
+}
+
+// c++ banded cholesky
+// Direct solver for symmetric positive definite matrices (band Cholesky
+// factorization A = U^T U, O(n*kd^2) operations, no pivoting). Only the upper
+// triangle is used, a SymCSRMatrix is taken as it is, other matrices are
+// converted to it. The reverse Cuthill-McKee ordering is reused as long as
+// the sparsity pattern stays the same, like in CommonSolverBanded.
+class CommonSolverCholesky : public CommonSolver
+{
+public:
+    CommonSolverCholesky();
+    ~CommonSolverCholesky();
+
+    bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
+    bool solve(Matrix *mat, cplx *res);
+
+private:
+    void free_ordering();
+    void free_factorization();
+    void factorize(Matrix *mat);
+
+    // the sparsity pattern (upper triangle) the ordering was computed for
+    int size, nnz;
+    int *Ap, *Ai;
+    int *perm;
+
+    // the band of U of the last matrix, the row i holds U(i, i..i+kd)
+    double *U;
+    int kd;
+};
+inline void solve_linear_system_cholesky(Matrix *mat, double *res)
+{
+    CommonSolverCholesky solver;
+    solver.solve(mat, res);
+}
+
 // python numpy - optional
 class CommonSolverNumPy : public CommonSolver
 {
 public:
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve(Matrix *mat, cplx *res);
 };
 inline void solve_linear_system_numpy(Matrix *mat, double *res)
@@ -164,6 +531,7 @@ class CommonSolverSciPyUmfpack : public CommonSolver
 {
 public:
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve(Matrix *mat, cplx *res);
 };
 inline void solve_linear_system_scipy_umfpack(Matrix *mat, double *res)
@@ -180,8 +548,24 @@ inline void solve_linear_system_scipy_umfpack(Matrix *mat, cplx *res)
 class CommonSolverSciPyCG : public CommonSolver
 {
 public:
+    CommonSolverSciPyCG()
+    {
+        tolerance = 1e-5;
+        maxiter = 0;
+    }
+
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve(Matrix *mat, cplx *res);
+    // the relative tolerance and the maximum number of iterations passed to
+    // SciPy (maxiter = 0 is SciPy's default)
+    inline void set_tolerance(double tolerance) { this->tolerance = tolerance; }
+    inline double get_tolerance() { return this->tolerance; }
+    inline void set_maxiter(int maxiter) { this->maxiter = maxiter; }
+
+private:
+    double tolerance;
+    int maxiter;
 };
 inline void solve_linear_system_scipy_cg(Matrix *mat, double *res)
 {
@@ -192,8 +576,24 @@ inline void solve_linear_system_scipy_cg(Matrix *mat, double *res)
 class CommonSolverSciPyGMRES : public CommonSolver
 {
 public:
+    CommonSolverSciPyGMRES()
+    {
+        tolerance = 1e-5;
+        maxiter = 0;
+    }
+
     bool solve(Matrix *mat, double *res);
+    bool solve(Matrix *mat, double *res, int nrhs);
     bool solve(Matrix *mat, cplx *res);
+    // the relative tolerance and the maximum number of iterations passed to
+    // SciPy (maxiter = 0 is SciPy's default)
+    inline void set_tolerance(double tolerance) { this->tolerance = tolerance; }
+    inline double get_tolerance() { return this->tolerance; }
+    inline void set_maxiter(int maxiter) { this->maxiter = maxiter; }
+
+private:
+    double tolerance;
+    int maxiter;
 };
 inline void solve_linear_system_scipy_gmres(Matrix *mat, double *res)
 {
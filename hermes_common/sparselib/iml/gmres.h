@@ -46,6 +46,13 @@ abs(Real x)
 }
 
 
+template<class Real> 
+void GeneratePlaneRotation(Real &dx, Real &dy, Real &cs, Real &sn);
+
+template<class Real> 
+void ApplyPlaneRotation(Real &dx, Real &dy, Real &cs, Real &sn);
+
+
 template < class Operator, class Vector, class Preconditioner,
            class Matrix, class Real >
 int 
@@ -9,6 +9,7 @@
 #include <coord_double.h>
 #include <compcol_double.h>
 #include <mvvd.h>
+#include <mvmd.h>
 #include <ilupre_double.h>
 #include <bicg.h>
 #include <cg.h>
@@ -19,20 +20,75 @@
 #include <ir.h>
 #include <qmr.h>
 
+// IML++ interface of CommonPreconditioner
+class SparseLibPreconditioner
+{
+public:
+    SparseLibPreconditioner(CommonPreconditioner *precond)
+    {
+        this->precond = precond;
+    }
+
+    VECTOR_double solve(const VECTOR_double &x) const
+    {
+        VECTOR_double z(x.size());
+        this->precond->apply((double *) &x(0), &z(0));
+        return z;
+    }
+
+private:
+    CommonPreconditioner *precond;
+};
+
+template<class Preconditioner>
+static int sparselib_solve(CommonSolverSparseLib::CommonSolverSparseLibSolver method,
+                           CompCol_Mat_double &A, VECTOR_double &x,
+                           VECTOR_double &b, Preconditioner &M,
+                           int &maxiter, double &tolerance, int restart)
+{
+    int result = -1;
+    switch (method)
+    {
+    case CommonSolverSparseLib::CommonSolverSparseLibSolver_ConjugateGradientSquared:
+        result = CGS(A, x, b, M, maxiter, tolerance);
+        break;
+    case CommonSolverSparseLib::CommonSolverSparseLibSolver_RichardsonIterativeRefinement:
+        result = IR(A, x, b, M, maxiter, tolerance);
+        break;
+    case CommonSolverSparseLib::CommonSolverSparseLibSolver_GMRES:
+        {
+            MATRIX_double H(restart + 1, restart, 0.0);
+            result = GMRES(A, x, b, M, H, restart, maxiter, tolerance);
+        }
+        break;
+    case CommonSolverSparseLib::CommonSolverSparseLibSolver_BiCGStab:
+        result = BiCGSTAB(A, x, b, M, maxiter, tolerance);
+        break;
+    default:
+        _error("SparseLib++ error. Method is not defined.");
+    }
+    return result;
+}
+
 bool CommonSolverSparseLib::solve(Matrix *mat, double *res)
 {
     printf("SparseLib++ solver\n");
+    this->stats = CommonSolverStats();
 
     CSCMatrix *Acsc = NULL;
 
     if (CooMatrix *mcoo = dynamic_cast<CooMatrix*>(mat))
         Acsc = new CSCMatrix(mcoo);
+    else if (TripletMatrix *mtr = dynamic_cast<TripletMatrix*>(mat))
+        Acsc = new CSCMatrix(mtr);
     else if (DenseMatrix *mden = dynamic_cast<DenseMatrix *>(mat))
         Acsc = new CSCMatrix(mden);
     else if (CSCMatrix *mcsc = dynamic_cast<CSCMatrix*>(mat))
         Acsc = mcsc;
     else if (CSRMatrix *mcsr = dynamic_cast<CSRMatrix*>(mat))
         Acsc = new CSCMatrix(mcsr);
+    else if (SymCSRMatrix *msym = dynamic_cast<SymCSRMatrix*>(mat))
+        Acsc = new CSCMatrix(msym);
     else
         _error("Matrix type not supported.");
 
@@ -45,28 +101,34 @@ bool CommonSolverSparseLib::solve(Matrix *mat, double *res)
     // rhs
     VECTOR_double rhs(res, size);
 
-    // preconditioner
-    CompCol_ILUPreconditioner_double ILU(Acc);
-    VECTOR_double xv = ILU.solve(rhs);
+    // the iteration changes maxiter and tolerance
+    int maxiter = this->maxiter;
+    double tolerance = this->tolerance;
 
-    // method
-    int result = -1;
-    switch (method)
+    // preconditioner (the initial guess is M^{-1} rhs)
+    int result;
+    VECTOR_double xv;
+    if (this->precond)
     {
-    case CommonSolverSparseLibSolver_ConjugateGradientSquared:
-        result = CGS(Acc, xv, rhs, ILU, maxiter, tolerance);
-        break;
-    case CommonSolverSparseLibSolver_RichardsonIterativeRefinement:
-        result = IR(Acc, xv, rhs, ILU, maxiter, tolerance);
-        break;
-    default:
-        _error("SparseLib++ error. Method is not defined.");
+        this->precond->setup(Acsc);
+        SparseLibPreconditioner M(this->precond);
+        xv = M.solve(rhs);
+        result = sparselib_solve(method, Acc, xv, rhs, M, maxiter, tolerance,
+                                 this->restart);
+    }
+    else
+    {
+        CompCol_ILUPreconditioner_double ILU(Acc);
+        xv = ILU.solve(rhs);
+        result = sparselib_solve(method, Acc, xv, rhs, ILU, maxiter, tolerance,
+                                 this->restart);
     }
 
     if (result == 0)
         printf("SparseLib++ solver: maxiter: %i, tol: %e\n", maxiter, tolerance);
     else
         _error("SparseLib++ error.");
+    this->stats.iter_num = maxiter;
 
     double *x;
     x = (double*) malloc(size * sizeof(double));
@@ -79,6 +141,8 @@ bool CommonSolverSparseLib::solve(Matrix *mat, double *res)
 
     if (!dynamic_cast<CSCMatrix*>(mat))
         delete Acsc;
+
+    return true;
 }
 
 bool CommonSolverSparseLib::solve(Matrix *mat, cplx *res)
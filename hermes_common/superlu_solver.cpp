@@ -9,9 +9,32 @@
 #ifdef COMMON_WITH_SUPERLU
 #include <superlu/slu_ddefs.h>
 
+// the column ordering and the factors of the last matrix
+struct CommonSolverSuperLUData
+{
+    // the sparsity pattern (CSC) of the column ordering
+    int size, nnz;
+    int *Ap, *Ai;
+
+    // column permutation vector
+    int *perm_c;
+    // row permutations from partial pivoting
+    int *perm_r;
+
+    bool factorized;
+    SuperMatrix L;      // factor L
+    SuperMatrix U;      // factor U
+};
+
 bool CommonSolverSuperLU::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverSuperLU::solve(Matrix *mat, double *res, int nrhs)
 {
     printf("SuperLU solver\n");
+    this->stats = CommonSolverStats();
 
     int size = mat->get_size();
     int nnz = 0;
@@ -24,10 +47,14 @@ bool CommonSolverSuperLU::solve(Matrix *mat, double *res)
 
     if (CooMatrix *mcoo = dynamic_cast<CooMatrix*>(mat))
         Acsc = new CSCMatrix(mcoo);
+    else if (TripletMatrix *mtr = dynamic_cast<TripletMatrix*>(mat))
+        Acsc = new CSCMatrix(mtr);
     else if (CSCMatrix *mcsc = dynamic_cast<CSCMatrix*>(mat))
         Acsc = mcsc;
     else if (CSRMatrix *mcsr = dynamic_cast<CSRMatrix*>(mat))
         Acsc = new CSCMatrix(mcsr);
+    else if (SymCSRMatrix *msym = dynamic_cast<SymCSRMatrix*>(mat))
+        Acsc = new CSCMatrix(msym);
     else
         _error("Matrix type not supported.");
 
@@ -38,10 +65,8 @@ bool CommonSolverSuperLU::solve(Matrix *mat, double *res)
 
     SuperMatrix A;
     SuperMatrix B;
-    SuperMatrix L;      // factor L
-    SuperMatrix U;      // factor U
 
-    int nrhs, info;
+    int info;
 
     superlu_options_t options;
     SuperLUStat_t stat;
@@ -61,71 +86,116 @@ bool CommonSolverSuperLU::solve(Matrix *mat, double *res)
     */
     set_default_options(&options);
 
-    // create csc matrix
-    dCreate_CompCol_Matrix(&A, size, size, nnz, Ax, Ai, Ap,
-                           SLU_NC, SLU_D, SLU_GE);
-    // dPrint_CompCol_Matrix("A", &A);
-
-    nrhs = 1;
-    // create rhs matrix
+    // create rhs matrix (all right-hand sides are solved at once)
     dCreate_Dense_Matrix(&B, size, nrhs, res, size,
                          SLU_DN, SLU_D, SLU_GE);
     // dPrint_Dense_Matrix("B", &B);
 
-    // column permutation vector
-    int *perm_c = intMalloc(size);
-    // row permutations from partial pivoting
-    int *perm_r = intMalloc(size);
-    if (!perm_c) ABORT("Malloc fails for perm_c[].");
-    if (!perm_r) ABORT("Malloc fails for perm_r[].");
+    if (this->factorization_scheme == FACTORIZE_FROM_SCRATCH)
+        free_factorization();
 
     // initialize the statistics variables
     StatInit(&stat);
-    dgssv(&options, &A, perm_c, perm_r, &L, &U, &B, &stat, &info);
 
-    mem_usage_t mem_usage;
+    CommonSolverSuperLUData *d = this->data;
+    if (this->factorization_scheme == REUSE_FACTORIZATION
+        && d != NULL && d->factorized && d->size == size)
+    {
+        // only the triangular solves with the previous factors
+        this->stats.factorization_reused = true;
+        dgstrs(NOTRANS, &d->L, &d->U, d->perm_c, d->perm_r, &B, &stat, &info);
+    }
+    else
+    {
+        if (d == NULL || size != d->size || nnz != d->nnz
+            || memcmp(Ap, d->Ap, (size + 1)*sizeof(int))
+            || memcmp(Ai, d->Ai, nnz*sizeof(int)))
+        {
+            // new sparsity pattern, the column ordering is computed by dgssv()
+            free_factorization();
+            d = this->data = new CommonSolverSuperLUData;
+            d->size = size;
+            d->nnz = nnz;
+            d->Ap = new int[size + 1];
+            d->Ai = new int[nnz];
+            memcpy(d->Ap, Ap, (size + 1)*sizeof(int));
+            memcpy(d->Ai, Ai, nnz*sizeof(int));
+            d->perm_c = intMalloc(size);
+            d->perm_r = intMalloc(size);
+            if (!d->perm_c) ABORT("Malloc fails for perm_c[].");
+            if (!d->perm_r) ABORT("Malloc fails for perm_r[].");
+            d->factorized = false;
+        }
+        else
+        {
+            // the same sparsity pattern, reuse the column ordering
+            options.ColPerm = MY_PERMC;
+            if (d->factorized)
+            {
+                Destroy_SuperNode_Matrix(&d->L);
+                Destroy_CompCol_Matrix(&d->U);
+                d->factorized = false;
+            }
+        }
+
+        // create csc matrix
+        dCreate_CompCol_Matrix(&A, size, size, nnz, Ax, Ai, Ap,
+                               SLU_NC, SLU_D, SLU_GE);
+        // dPrint_CompCol_Matrix("A", &A);
+
+        dgssv(&options, &A, d->perm_c, d->perm_r, &d->L, &d->U, &B, &stat, &info);
+
+        // the arrays of A belong to Acsc
+        Destroy_SuperMatrix_Store(&A);
+
+        if (info == 0)
+            d->factorized = true;
+        else if (info <= size)
+        {
+            // factorization completes, but the matrix is singular
+            Destroy_SuperNode_Matrix(&d->L);
+            Destroy_CompCol_Matrix(&d->U);
+        }
+    }
+
     if ( info == 0 )
     {
         // solution
         double *x = (double*) ((DNformat*) B.Store)->nzval;
 
         // copy result
-        memcpy(res, x, size*sizeof(double));
-
-        /*
-        SCformat *Lstore = (SCformat *) L.Store;
-        NCformat *Ustore = (NCformat *) U.Store;
-        printf("No of nonzeros in factor L = %d\n", Lstore->nnz);
-        printf("No of nonzeros in factor U = %d\n", Ustore->nnz);
-        printf("No of nonzeros in L+U = %d\n", Lstore->nnz + Ustore->nnz - mcsc.get_size());
-        printf("FILL ratio = %.1f\n", (float)(Lstore->nnz + Ustore->nnz - mcsc.get_size())/nnz);
-
-        mem_usage_t mem_usage;
-        dQuerySpace(&L, &U, &mem_usage);
-        printf("L\\U MB %.3f\ttotal MB needed %.3f\n", mem_usage.for_lu/1e6, mem_usage.total_needed/1e6);
-        */
+        memcpy(res, x, size*nrhs*sizeof(double));
     }
     else
     {
         printf("dgssv() error returns INFO = %d\n", info);
-        if (info <= size)
-        {
-            // factorization completes
-            dQuerySpace(&L, &U, &mem_usage);
-            printf("L\\U MB %.3f\ttotal MB needed %.3f\n", mem_usage.for_lu/1e6, mem_usage.total_needed/1e6);
-        }
     }
 
-    SUPERLU_FREE (perm_r);
-    SUPERLU_FREE (perm_c);
-    // FIXME
-    // Destroy_CompCol_Matrix(&A);
+    StatFree(&stat);
     Destroy_SuperMatrix_Store(&B);
-    Destroy_SuperNode_Matrix(&L);
-    Destroy_CompCol_Matrix(&U);
 
     if (!dynamic_cast<CSCMatrix*>(mat))
         delete Acsc;
+
+    return info == 0;
+}
+
+void CommonSolverSuperLU::free_factorization()
+{
+    if (this->data == NULL) return;
+
+    CommonSolverSuperLUData *d = this->data;
+    if (d->factorized)
+    {
+        Destroy_SuperNode_Matrix(&d->L);
+        Destroy_CompCol_Matrix(&d->U);
+    }
+    SUPERLU_FREE (d->perm_r);
+    SUPERLU_FREE (d->perm_c);
+    delete[] d->Ap;
+    delete[] d->Ai;
+    delete d;
+    this->data = NULL;
 }
 
 bool CommonSolverSuperLU::solve(Matrix *mat, cplx *res)
@@ -135,11 +205,20 @@ bool CommonSolverSuperLU::solve(Matrix *mat, cplx *res)
 
 #else
 
+void CommonSolverSuperLU::free_factorization()
+{
+}
+
 bool CommonSolverSuperLU::solve(Matrix *mat, double *res)
 {
     _error("CommonSolverSuperLU::solve(Matrix *mat, double *res) not implemented.");
 }
 
+bool CommonSolverSuperLU::solve(Matrix *mat, double *res, int nrhs)
+{
+    _error("CommonSolverSuperLU::solve(Matrix *mat, double *res, int nrhs) not implemented.");
+}
+
 bool CommonSolverSuperLU::solve(Matrix *mat, cplx *res)
 {
     _error("CommonSolverSuperLU::solve(Matrix *mat, cplx *res) not implemented.");
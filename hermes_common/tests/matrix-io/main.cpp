@@ -1,5 +1,7 @@
 #include <iostream>
 #include <stdexcept>
+#include <vector>
+#include <unistd.h>
 
 #include "matrix.h"
 #include "matrixio.h"
@@ -59,6 +61,124 @@ void test_matrix_hb()
     Acsrr->print();
     remove("/tmp/csr.rua");
 }
+
+// Copies the binary matrix file 'src' to 'dst' with the header changed by
+// 'format', 'size' and 'nnz', and returns whether reading it fails.
+bool read_binary_fails(const char *src, const char *dst,
+                       int format, int size, int nnz)
+{
+    FILE *f = fopen(src, "rb");
+    std::vector<char> data;
+    char buf[256];
+    size_t n;
+    while ((n = fread(buf, 1, sizeof(buf), f)) > 0)
+        data.insert(data.end(), buf, buf + n);
+    fclose(f);
+    BinaryMatrixHeader *header = (BinaryMatrixHeader *) &data[0];
+    header->format = format;
+    header->size = size;
+    header->nnz = nnz;
+    f = fopen(dst, "wb");
+    fwrite(&data[0], 1, data.size(), f);
+    fclose(f);
+
+    bool fails = false;
+    try {
+        delete read_binary_csc(dst);
+    } catch(std::exception const &ex) {
+        fails = true;
+    }
+    remove(dst);
+    return fails;
+}
+
+void test_matrix_binary()
+{
+    CooMatrix Acoo(4);
+    Acoo.add(0, 0, -1);
+    Acoo.add(1, 1, -1);
+    Acoo.add(2, 2, -1);
+    Acoo.add(3, 3, 1./3);
+    Acoo.add(0, 1, 2);
+    Acoo.add(1, 0, 2);
+    Acoo.add(1, 2, 2);
+    Acoo.add(2, 1, 2);
+    Acoo.add(2, 3, 2);
+
+    CSRMatrix Acsr(&Acoo);
+    CSCMatrix Acsc(&Acoo);
+    write_binary_csr("/tmp/csr.bin", &Acsr);
+    write_binary_csc("/tmp/csc.bin", &Acsc);
+    write_binary_coo("/tmp/coo.bin", &Acoo);
+
+    BinaryMatrixHeader header;
+    read_binary_header("/tmp/csc.bin", &header);
+    _assert(header.format == BINARY_CSC);
+    _assert(header.size == 4 && header.nnz == 9 && !header.complex);
+
+    // every file can be read in every format, the values are exact
+    const char *files[3] = {"/tmp/csr.bin", "/tmp/csc.bin", "/tmp/coo.bin"};
+    for (int f = 0; f < 3; f++) {
+        CSRMatrix *r = read_binary_csr(files[f]);
+        _assert(r->get_size() == 4 && r->get_nnz() == 9);
+        for (int i = 0; i < 5; i++)
+            _assert(r->get_Ap()[i] == Acsr.get_Ap()[i]);
+        for (int i = 0; i < 9; i++) {
+            _assert(r->get_Ai()[i] == Acsr.get_Ai()[i]);
+            _assert(r->get_Ax()[i] == Acsr.get_Ax()[i]);
+        }
+        delete r;
+
+        CSCMatrix *c = read_binary_csc(files[f]);
+        _assert(c->get_size() == 4 && c->get_nnz() == 9);
+        for (int i = 0; i < 5; i++)
+            _assert(c->get_Ap()[i] == Acsc.get_Ap()[i]);
+        for (int i = 0; i < 9; i++) {
+            _assert(c->get_Ai()[i] == Acsc.get_Ai()[i]);
+            _assert(c->get_Ax()[i] == Acsc.get_Ax()[i]);
+        }
+        delete c;
+
+        CooMatrix *o = read_binary_coo(files[f]);
+        _assert(o->get_nnz() == 9);
+        _assert(o->get(3, 3) == 1./3 && o->get(2, 3) == 2);
+        delete o;
+    }
+
+    // the mapped matrix can be changed, the file stays the same
+    CSRMatrix *r = read_binary_csr("/tmp/csr.bin");
+    r->add(3, 3, 1);
+    _assert(r->get(3, 3) == 1 + 1./3);
+    delete r;
+    r = read_binary_csr("/tmp/csr.bin");
+    _assert(r->get(3, 3) == 1./3);
+    delete r;
+
+    // complex
+    CooMatrix Bcoo(2, true);
+    Bcoo.add(0, 0, cplx(1, 2));
+    Bcoo.add(1, 0, cplx(0, -1));
+    Bcoo.add(1, 1, cplx(3, 0));
+    CSRMatrix Bcsr(&Bcoo);
+    write_binary_csr("/tmp/csr_cplx.bin", &Bcsr);
+    CSRMatrix *b = read_binary_csr("/tmp/csr_cplx.bin");
+    _assert(b->is_complex() && b->get_nnz() == 3);
+    _assert(b->get_cplx(1, 0) == cplx(0, -1));
+    _assert(b->get_cplx(0, 0) == cplx(1, 2));
+    delete b;
+
+    // corrupted headers are rejected
+    _assert(!read_binary_fails("/tmp/csr.bin", "/tmp/bad.bin", BINARY_CSR, 4, 9));
+    _assert(read_binary_fails("/tmp/csr.bin", "/tmp/bad.bin", 3, 4, 9));
+    _assert(read_binary_fails("/tmp/csr.bin", "/tmp/bad.bin", -1, 4, 9));
+    _assert(read_binary_fails("/tmp/csr.bin", "/tmp/bad.bin", BINARY_CSR, -4, 9));
+    _assert(read_binary_fails("/tmp/coo.bin", "/tmp/bad.bin", BINARY_COO, 4, -9));
+
+    remove("/tmp/csr.bin");
+    remove("/tmp/csc.bin");
+    remove("/tmp/coo.bin");
+    remove("/tmp/csr_cplx.bin");
+}
 int main(int argc, char* argv[])
 {
     long size;
@@ -74,6 +194,7 @@ int main(int argc, char* argv[])
 
     try {
         test_matrix_hb();
+        test_matrix_binary();
 
         return ERROR_SUCCESS;
     } catch(std::exception const &ex) {
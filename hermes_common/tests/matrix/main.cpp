@@ -88,12 +88,330 @@ void test_matrix3()
 
 }
 
+void test_matrix4()
+{
+    // the same entries as in test_matrix2(), but in a different order and
+    // with more duplicates
+    CooMatrix m(5);
+    TripletMatrix t(5);
+    m.add(2, 3, 4.5);
+    t.add(2, 3, 4.5);
+    m.add(1, 3, 3.5);
+    t.add(1, 3, 3.5);
+    m.add(4, 2, 1.5);
+    t.add(4, 2, 1.5);
+    m.add(3, 4, 1.5);
+    t.add(3, 4, 1.5);
+    m.add(2, 3, 1);
+    t.add(2, 3, 1);
+    m.add(3, 4, -0.5);
+    t.add(3, 4, -0.5);
+    m.add(2, 0, 2);
+    t.add(2, 0, 2);
+    t.print();
+
+    _assert(t.get_nnz() == m.get_nnz());
+    _assert(fabs(t.get(2, 3) - 5.5) < 1e-12);
+    _assert(fabs(t.get(3, 4) - 1.0) < 1e-12);
+    _assert(t.get(0, 0) == 0);
+
+    // convert from triplets, compare with the conversion from COO
+    CSRMatrix n1(&t);
+    CSRMatrix n2(&m);
+    n1.print();
+    _assert(n1.get_nnz() == n2.get_nnz());
+    for (int i = 0; i <= n1.get_size(); i++)
+        _assert(n1.get_Ap()[i] == n2.get_Ap()[i]);
+    for (int i = 0; i < n1.get_nnz(); i++)
+    {
+        _assert(n1.get_Ai()[i] == n2.get_Ai()[i]);
+        _assert(fabs(n1.get_Ax()[i] - n2.get_Ax()[i]) < 1e-12);
+    }
+
+    Matrix *_t = &t;
+    CSCMatrix n3(_t);
+    CSCMatrix n4(&m);
+    n3.print();
+    _assert(n3.get_nnz() == n4.get_nnz());
+    for (int i = 0; i <= n3.get_size(); i++)
+        _assert(n3.get_Ap()[i] == n4.get_Ap()[i]);
+    for (int i = 0; i < n3.get_nnz(); i++)
+    {
+        _assert(n3.get_Ai()[i] == n4.get_Ai()[i]);
+        _assert(fabs(n3.get_Ax()[i] - n4.get_Ax()[i]) < 1e-12);
+    }
+
+    // set_zero() removes the entries, but keeps the size
+    t.set_zero();
+    _assert(t.get_nnz() == 0);
+    _assert(t.get_size() == 5);
+    t.add(1, 1, 2.5);
+    _assert(t.get_nnz() == 1);
+    _assert(fabs(t.get(1, 1) - 2.5) < 1e-12);
+}
+
+void test_matrix5()
+{
+    TripletMatrix t(3, true);
+    t.add(0, 2, cplx(2.3, 3.5));
+    t.add(2, 1, cplx(1.2, 4.5));
+    t.add(0, 2, cplx(2, 1.5));
+    t.print();
+
+    _assert(t.get_nnz() == 2);
+    _assert(std::abs(t.get_cplx(0, 2) - cplx(4.3, 5.0)) < 1e-12);
+
+    CSRMatrix n1(&t);
+    n1.print();
+    CSCMatrix n2(&t);
+    n2.print();
+    _assert(std::abs(n1.get_Ax_cplx()[0] - cplx(4.3, 5.0)) < 1e-12);
+    _assert(std::abs(n2.get_Ax_cplx()[1] - cplx(4.3, 5.0)) < 1e-12);
+}
+
+void test_matrix6()
+{
+    // sparsity pattern of test_matrix2(): rows 1, 2, 3, 4
+    int *Ap = new int[6];
+    int *Ai = new int[4];
+    int ap[6] = {0, 0, 1, 2, 3, 4};
+    int ai[4] = {3, 3, 4, 2};
+    memcpy(Ap, ap, 6*sizeof(int));
+    memcpy(Ai, ai, 4*sizeof(int));
+    CSRMatrix m(5, 4, Ap, Ai);
+    _assert(m.get_nnz() == 4);
+
+    // refill the values twice, the pattern stays the same
+    for (int k = 0; k < 2; k++) {
+        m.set_zero();
+        _assert(m.get(2, 3) == 0);
+        m.add(1, 3, 3.5);
+        m.add(2, 3, 4.5);
+        m.add(3, 4, 1.5);
+        m.add(4, 2, 1.5);
+        m.add(2, 3, 1);
+    }
+    m.print();
+    _assert(m.get_nnz() == 4);
+    _assert(m.get(2, 3) == 5.5);
+    _assert(m.get(4, 2) == 1.5);
+    _assert(m.get(0, 0) == 0);
+
+    // the same matrix as assembled in the COO format
+    CooMatrix c(5);
+    c.add(1, 3, 3.5);
+    c.add(2, 3, 4.5);
+    c.add(3, 4, 1.5);
+    c.add(4, 2, 1.5);
+    c.add(2, 3, 1);
+    CSRMatrix n(&c);
+    for (int i = 0; i < 6; i++)
+        _assert(m.get_Ap()[i] == n.get_Ap()[i]);
+    for (int i = 0; i < 4; i++) {
+        _assert(m.get_Ai()[i] == n.get_Ai()[i]);
+        _assert(m.get_Ax()[i] == n.get_Ax()[i]);
+    }
+
+    // copy and conversions
+    Matrix *_m = &m;
+    CSRMatrix m2(_m);
+    _assert(m2.get(2, 3) == 5.5);
+    DenseMatrix d(_m);
+    _assert(d.get(2, 3) == 5.5);
+    _assert(d.get(3, 4) == 1.5);
+
+    // adding outside of the pattern is an error
+    bool failed = false;
+    try {
+        m.add(0, 0, 1.);
+    } catch(std::exception const &ex) {
+        failed = true;
+    }
+    _assert(failed);
+}
+
+void test_matrix7()
+{
+    // matrix-vector products of all the formats give the same result
+    CooMatrix c(5);
+    c.add(0, 0, 2);
+    c.add(1, 3, 3.5);
+    c.add(2, 3, 4.5);
+    c.add(3, 4, 1.5);
+    c.add(4, 2, 1.5);
+    c.add(4, 4, -1);
+    double x[5] = {1., 2., -1., 0.5, 3.};
+    double r[5];
+    c.times_vector(x, r, 5);
+    _assert(r[0] == 2 && r[1] == 1.75 && r[2] == 2.25);
+    _assert(r[3] == 4.5 && r[4] == -4.5);
+
+    CSRMatrix m1(&c);
+    CSCMatrix m2(&c);
+    DenseMatrix m3(&c);
+    Matrix *mats[3] = {&m1, &m2, &m3};
+    for (int k = 0; k < 3; k++) {
+        double y[5];
+        mat_dot(mats[k], x, y, 5);
+        for (int i = 0; i < 5; i++)
+            _assert(y[i] == r[i]);
+    }
+
+    // large enough to use the threads
+    int n = 2000;
+    CooMatrix t(n);
+    double *v = new double[n];
+    for (int i = 0; i < n; i++) {
+        t.add(i, i, 2);
+        if (i > 0) t.add(i, i-1, -1);
+        if (i < n-1) t.add(i, i+1, -1);
+        v[i] = i;
+    }
+    TripletMatrix ttr(n);
+    for (int i = 0; i < n; i++) {
+        ttr.add(i, i, 2);
+        if (i > 0) ttr.add(i, i-1, -1);
+        if (i < n-1) ttr.add(i, i+1, -1);
+    }
+    CSRMatrix tcsr(&t);
+    CSCMatrix tcsc(&t);
+    Matrix *tmats[4] = {&tcsr, &tcsc, &t, &ttr};
+    double *w = new double[n];
+    for (int k = 0; k < 4; k++) {
+        tmats[k]->times_vector(v, w, n);
+        _assert(w[0] == -1 && w[n-1] == n);
+        for (int i = 1; i < n-1; i++)
+            _assert(w[i] == 0);
+    }
+
+    // the CSR copy of the COO formats is dropped by add()
+    t.add(0, 1, 1);
+    ttr.add(0, 1, 1);
+    for (int k = 2; k < 4; k++) {
+        tmats[k]->times_vector(v, w, n);
+        _assert(w[0] == 0 && w[1] == 0 && w[n-1] == n);
+    }
+    t.add(1, 2, 1);
+    ttr.add(1, 2, 1);
+    for (int k = 2; k < 4; k++) {
+        tmats[k]->times_vector(v, w, n);
+        _assert(w[0] == 0 && w[1] == 2 && w[n-1] == n);
+    }
+    ttr.set_zero();
+    ttr.add(5, 5, 3);
+    ttr.times_vector(v, w, n);
+    _assert(w[5] == 15 && w[4] == 0 && w[6] == 0);
+    delete[] v;
+    delete[] w;
+}
+
+void test_matrix8()
+{
+    // symmetric matrix, filled like a general one (the entries below the
+    // diagonal are ignored)
+    CooMatrix c(4);
+    c.add(0, 0, 4);
+    c.add(0, 2, -1);
+    c.add(2, 0, -1);
+    c.add(1, 1, 3);
+    c.add(1, 3, 0.5);
+    c.add(3, 1, 0.5);
+    c.add(2, 2, 5);
+    c.add(3, 3, 2);
+    SymCSRMatrix s(&c);
+    _assert(s.get_size() == 4);
+    _assert(s.get_nnz() == 6);
+    _assert(s.get(0, 2) == -1 && s.get(2, 0) == -1);
+    _assert(s.get(3, 1) == 0.5 && s.get(2, 3) == 0);
+
+    double x[4] = {1., -2., 0.5, 3.};
+    double r[4], y[4];
+    c.times_vector(x, r, 4);
+    s.times_vector(x, y, 4);
+    for (int i = 0; i < 4; i++)
+        _assert(y[i] == r[i]);
+
+    // both triangles again
+    CSRMatrix full(&s);
+    _assert(full.get_nnz() == 8);
+    for (int i = 0; i < 4; i++)
+        for (int j = 0; j < 4; j++)
+            _assert(full.get(i, j) == c.get(i, j));
+    CSCMatrix full_csc((Matrix *) &s);
+    _assert(full_csc.get_nnz() == 8);
+
+    // add() into a fixed pattern of the upper triangle
+    int *Ap = new int[3];
+    int *Ai = new int[3];
+    Ap[0] = 0; Ap[1] = 2; Ap[2] = 3;
+    Ai[0] = 0; Ai[1] = 1; Ai[2] = 1;
+    SymCSRMatrix t(2);
+    t.create(2, 3, Ap, Ai);
+    t.add(0, 1, 2);
+    t.add(1, 0, 2);
+    t.add(1, 1, 1);
+    _assert(t.get(0, 1) == 2 && t.get(1, 0) == 2 && t.get(1, 1) == 1);
+    t.set_zero();
+    _assert(t.get(0, 1) == 0);
+}
+
+void test_matrix9()
+{
+    // DenseMatrix::copy_into() copies the nonzero entries
+    DenseMatrix d(3);
+    d.add(0, 0, 1);
+    d.add(0, 2, -2);
+    d.add(1, 1, 3);
+    d.add(2, 0, 4);
+    CooMatrix c(3);
+    d.copy_into(&c);
+    _assert(c.get_nnz() == 4);
+    for (int i = 0; i < 3; i++)
+        for (int j = 0; j < 3; j++)
+            _assert(c.get(i, j) == d.get(i, j));
+}
+
+void test_matrix10()
+{
+    // add_many() gives the same matrix as add() called for every entry
+    int rows[6] = {0, 1, 2, 0, -1, 1};
+    int cols[6] = {0, 1, 2, 2, 1, 1};
+    double vals[6] = {1, 2, 3, 4, 5, 6};
+    TripletMatrix t;
+    CooMatrix c;
+    t.add_many(6, rows, cols, vals);
+    c.add_many(6, rows, cols, vals);
+    _assert(t.get_size() == 3);
+    _assert(c.get_size() == 3);
+    _assert(t.get_nnz() == 4);
+    _assert(c.get_nnz() == 4);
+    for (int i = 0; i < 3; i++)
+        for (int j = 0; j < 3; j++)
+            _assert(t.get(i, j) == c.get(i, j));
+    _assert(t.get(1, 1) == 8);
+    _assert(t.get(0, 2) == 4);
+
+    cplx vals_cplx[6] = {1, 2, 3, cplx(0, 4), 5, 6};
+    TripletMatrix tc(true);
+    tc.add_many(6, rows, cols, vals_cplx);
+    _assert(tc.get_nnz() == 4);
+    _assert(tc.get_cplx(0, 2) == cplx(0, 4));
+    _assert(tc.get_cplx(1, 1) == cplx(8, 0));
+}
+
 int main(int argc, char* argv[])
 {
     try {
         test_matrix1();
         test_matrix2();
         test_matrix3();
+        test_matrix4();
+        test_matrix5();
+        test_matrix6();
+        test_matrix7();
+        test_matrix8();
+        test_matrix9();
+        test_matrix10();
 
         return ERROR_SUCCESS;
     } catch(std::exception const &ex) {
@@ -1,5 +1,6 @@
 #include <iostream>
 #include <stdexcept>
+#include <vector>
 
 #include "matrix.h"
 #include "solvers.h"
@@ -69,6 +70,523 @@ void test_solver_dense_lu2()
     _assert(fabs(res[3] - 0.2) < EPS);
 }
 
+void test_solver_dense_lu3()
+{
+    TripletMatrix A(4);
+    A.add(0, 0, -1);
+    A.add(1, 1, -1);
+    A.add(2, 2, -0.5);
+    A.add(3, 3, -1);
+    A.add(0, 1, 2);
+    A.add(1, 0, 2);
+    A.add(1, 2, 2);
+    A.add(2, 1, 2);
+    A.add(2, 3, 2);
+    A.add(3, 2, 2);
+    A.add(2, 2, -0.5);
+
+    double res[4] = {1., 1., 1., 1.};
+
+    solve_linear_system_dense_lu(&A, res);
+    _assert(fabs(res[0] - 0.2) < EPS);
+    _assert(fabs(res[1] - 0.6) < EPS);
+    _assert(fabs(res[2] - 0.6) < EPS);
+    _assert(fabs(res[3] - 0.2) < EPS);
+
+    for (int i=0; i < 4; i++) res[i] = 1.;
+    solve_linear_system_sparselib_cgs(&A, res, 1e-14);
+    _assert(fabs(res[0] - 0.2) < EPS);
+    _assert(fabs(res[1] - 0.6) < EPS);
+    _assert(fabs(res[2] - 0.6) < EPS);
+    _assert(fabs(res[3] - 0.2) < EPS);
+}
+
+void test_solver_dense_lu4()
+{
+    // larger than a panel of the blocked factorization, pivoting needed
+    int n = 150;
+    DenseMatrix A(n);
+    double *x = new double[2*n];
+    double *b = new double[2*n];
+    for (int i=0; i < n; i++) {
+        for (int j=0; j < n; j++)
+            A.add(i, j, sin(i + 2*j) + (i == (j + 7) % n ? 5 : 0));
+        x[i] = cos(i);
+        x[n+i] = i % 3;
+    }
+    A.times_vector(x, b, n);
+    A.times_vector(x + n, b + n, n);
+
+    // the same pivots and factors as ludcmp() (also with LAPACK, which
+    // stores the factors by columns and numbers the rows from 1)
+    double **lu = _new_matrix<double>(n);
+    double *a = new double[n*n];
+    int *indx = new int[n];
+    int *ipiv = new int[n];
+    for (int i=0; i < n; i++)
+        for (int j=0; j < n; j++)
+            lu[i][j] = a[i*n + j] = A.get(i, j);
+    double d;
+    ludcmp(lu, n, indx, &d);
+    dense_lu_factorize(a, n, ipiv);
+    for (int i=0; i < n; i++) {
+#ifdef COMMON_WITH_LAPACK
+        _assert(ipiv[i] - 1 == indx[i]);
+        for (int j=0; j < n; j++) _assert(fabs(a[j*n + i] - lu[i][j]) < 1e-10);
+#else
+        _assert(ipiv[i] == indx[i]);
+        for (int j=0; j < n; j++) _assert(fabs(a[i*n + j] - lu[i][j]) < 1e-10);
+#endif
+    }
+    delete[] lu;
+    delete[] a;
+    delete[] indx;
+    delete[] ipiv;
+
+    CommonSolverDenseLU solver;
+    _assert(solver.solve(&A, b, 2));
+    for (int i=0; i < 2*n; i++) _assert(fabs(b[i] - x[i]) < 1e-10);
+
+    delete[] x;
+    delete[] b;
+}
+
+void test_solver_banded1()
+{
+    // the matrix from test_solver_dense_lu3(), the partial pivoting
+    // interchanges rows here
+    BandedMatrix A(4, 1, 1);
+    A.add(0, 0, -1);
+    A.add(1, 1, -1);
+    A.add(2, 2, -1);
+    A.add(3, 3, -1);
+    A.add(0, 1, 2);
+    A.add(1, 0, 2);
+    A.add(1, 2, 2);
+    A.add(2, 1, 2);
+    A.add(2, 3, 2);
+    A.add(3, 2, 2);
+
+    double res[4] = {1., 1., 1., 1.};
+
+    solve_linear_system_banded(&A, res);
+    _assert(fabs(res[0] - 0.2) < EPS);
+    _assert(fabs(res[1] - 0.6) < EPS);
+    _assert(fabs(res[2] - 0.6) < EPS);
+    _assert(fabs(res[3] - 0.2) < EPS);
+
+    // the matrix is not changed by the solver
+    double x[4] = {0.2, 0.6, 0.6, 0.2};
+    A.times_vector(x, res, 4);
+    for (int i=0; i < 4; i++) _assert(fabs(res[i] - 1.) < EPS);
+}
+
+void test_solver_banded2()
+{
+    // nonsymmetric chain of 2x2 blocks, numbered so that the bandwidth is
+    // large (the ordering has to be found by the solver)
+    const int n = 20;
+    int idx[n];
+    for (int i=0; i < n; i++) idx[i] = (7*i) % n;
+    CooMatrix A(n);
+    for (int i=0; i < n; i++) {
+        A.add(idx[i], idx[i], 4. + i);
+        if (i > 0) A.add(idx[i], idx[i-1], -1.);
+        if (i < n-1) A.add(idx[i], idx[i+1], -2.);
+        if (i < n-2 && i % 2 == 0) A.add(idx[i], idx[i+2], 0.5);
+    }
+
+    CommonSolverBanded solver;
+    // solve twice, the second solve reuses the ordering
+    for (int k=0; k < 2; k++) {
+        double res[n], res2[n];
+        for (int i=0; i < n; i++) res[i] = res2[i] = 1. + i + k;
+        solver.solve(&A, res);
+        solve_linear_system_dense_lu(&A, res2);
+        for (int i=0; i < n; i++) _assert(fabs(res[i] - res2[i]) < EPS);
+    }
+
+    // the reordered matrix has a small bandwidth
+    CSRMatrix Acsr(&A);
+    int perm[n];
+    rcm_ordering(n, Acsr.get_Ap(), Acsr.get_Ai(), perm);
+    BandedMatrix B(&Acsr, perm);
+    _assert(B.get_kl() <= 2 && B.get_ku() <= 2);
+}
+
+void test_solver_factorization_reuse()
+{
+    CooMatrix A(3);
+    A.add(0, 0, 4);
+    A.add(0, 1, 1);
+    A.add(1, 0, 1);
+    A.add(1, 1, 3);
+    A.add(1, 2, 1);
+    A.add(2, 1, 1);
+    A.add(2, 2, 2);
+    // the same sparsity pattern, different values
+    CooMatrix B(3);
+    B.add(0, 0, 1);
+    B.add(0, 1, 1);
+    B.add(1, 0, 1);
+    B.add(1, 1, 1);
+    B.add(1, 2, 1);
+    B.add(2, 1, 1);
+    B.add(2, 2, 1);
+    double x[3] = {1., -1., 2.};
+
+    CommonSolverDenseLU dense;
+    CommonSolverBanded banded;
+    std::vector<CommonSolver *> solvers;
+    solvers.push_back(&dense);
+    solvers.push_back(&banded);
+#ifdef COMMON_WITH_UMFPACK
+    CommonSolverUmfpack umfpack;
+    solvers.push_back(&umfpack);
+#endif
+#ifdef COMMON_WITH_SUPERLU
+    CommonSolverSuperLU superlu;
+    solvers.push_back(&superlu);
+#endif
+    for (int k=0; k < (int)solvers.size(); k++) {
+        CommonSolver *solver = solvers[k];
+        double b[3];
+        A.times_vector(x, b, 3);
+        solver->solve(&A, b);
+        for (int i=0; i < 3; i++) _assert(fabs(b[i] - x[i]) < EPS);
+        _assert(!solver->get_stats().factorization_reused);
+
+        // B is ignored, the factorization of A is used
+        solver->set_factorization_scheme(REUSE_FACTORIZATION);
+        A.times_vector(x, b, 3);
+        solver->solve(&B, b);
+        for (int i=0; i < 3; i++) _assert(fabs(b[i] - x[i]) < EPS);
+        _assert(solver->get_stats().factorization_reused);
+        _assert(solver->get_stats().iter_num == 0);
+
+        // B is factorized
+        solver->set_factorization_scheme(REUSE_SYMBOLIC);
+        B.times_vector(x, b, 3);
+        solver->solve(&B, b);
+        for (int i=0; i < 3; i++) _assert(fabs(b[i] - x[i]) < EPS);
+        _assert(!solver->get_stats().factorization_reused);
+
+        solver->set_factorization_scheme(FACTORIZE_FROM_SCRATCH);
+        A.times_vector(x, b, 3);
+        solver->solve(&A, b);
+        for (int i=0; i < 3; i++) _assert(fabs(b[i] - x[i]) < EPS);
+    }
+}
+
+void test_solver_nrhs()
+{
+    CooMatrix A(3);
+    A.add(0, 0, 4);
+    A.add(0, 1, 1);
+    A.add(1, 0, 1);
+    A.add(1, 1, 3);
+    A.add(1, 2, 1);
+    A.add(2, 1, 1);
+    A.add(2, 2, 2);
+    // three solutions, stored one after another
+    double x[9] = {1., -1., 2.,
+                   0., 1., 0.,
+                   3., 2., 1.};
+
+    CommonSolverDenseLU dense;
+    CommonSolverBanded banded;
+    // uses the default implementation (one solve() per right-hand side)
+    CommonSolverSparseLib sparselib;
+    std::vector<CommonSolver *> solvers;
+    solvers.push_back(&dense);
+    solvers.push_back(&banded);
+    solvers.push_back(&sparselib);
+#ifdef COMMON_WITH_SCIPY
+    CommonSolverNumPy numpy;
+    CommonSolverSciPyUmfpack scipy_umfpack;
+    solvers.push_back(&numpy);
+    solvers.push_back(&scipy_umfpack);
+#endif
+#ifdef COMMON_WITH_UMFPACK
+    CommonSolverUmfpack umfpack;
+    solvers.push_back(&umfpack);
+#endif
+#ifdef COMMON_WITH_SUPERLU
+    CommonSolverSuperLU superlu;
+    solvers.push_back(&superlu);
+#endif
+    for (int k=0; k < (int)solvers.size(); k++) {
+        CommonSolver *solver = solvers[k];
+        double b[9];
+        for (int j=0; j < 3; j++)
+            A.times_vector(x + 3*j, b + 3*j, 3);
+        _assert(solver->solve(&A, b, 3));
+        for (int i=0; i < 9; i++) _assert(fabs(b[i] - x[i]) < EPS);
+        // the factorization scheme is not changed
+        _assert(solver->get_factorization_scheme() == REUSE_SYMBOLIC);
+    }
+}
+
+void test_solver_precond()
+{
+    // symmetric positive definite (CG) and nonsymmetric matrix
+    int n = 41;
+    CooMatrix A(n), B(n);
+    double x[41], a[41], b[41];
+    for (int i=0; i < n; i++) {
+        A.add(i, i, 2 + i % 5);
+        B.add(i, i, 3 + i % 5);
+        if (i > 0) { A.add(i, i-1, -1); B.add(i, i-1, -1); }
+        if (i < n-1) { A.add(i, i+1, -1); B.add(i, i+1, -0.5); }
+        x[i] = sin(i);
+    }
+
+    // overlapping blocks {0, 1, 2}, {2, 3, 4}, ... like 1D elements (the
+    // last dof is not in any block)
+    int n_blocks = (n-1)/2 - 1;
+    int ptr[21], idx[60];
+    for (int k=0; k <= n_blocks; k++) ptr[k] = 3*k;
+    for (int k=0; k < n_blocks; k++)
+        for (int i=0; i < 3; i++) idx[3*k + i] = 2*k + i;
+
+    CommonPreconditionerJacobi jacobi;
+    CommonPreconditionerBlockJacobi block_jacobi;
+    block_jacobi.set_blocks(n_blocks, ptr, idx);
+    CommonPreconditionerILU0 ilu;
+    CommonPreconditioner *preconds[3] = {&jacobi, &block_jacobi, &ilu};
+
+    for (int k=0; k < 3; k++) {
+        CommonSolverCG cg;
+        cg.set_preconditioner(preconds[k]);
+        A.times_vector(x, a, n);
+        _assert(cg.solve(&A, a, 1e-12, 100));
+        for (int i=0; i < n; i++) _assert(fabs(a[i] - x[i]) < 1e-10);
+
+        CommonSolverSparseLib::CommonSolverSparseLibSolver methods[3] = {
+            CommonSolverSparseLib::CommonSolverSparseLibSolver_ConjugateGradientSquared,
+            CommonSolverSparseLib::CommonSolverSparseLibSolver_GMRES,
+            CommonSolverSparseLib::CommonSolverSparseLibSolver_BiCGStab
+        };
+        for (int m=0; m < 3; m++) {
+            CommonSolverSparseLib sparselib;
+            sparselib.set_preconditioner(preconds[k]);
+            sparselib.set_method(methods[m]);
+            sparselib.set_tolerance(1e-14);
+            sparselib.set_restart(10);
+            B.times_vector(x, b, n);
+            _assert(sparselib.solve(&B, b));
+            for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-10);
+        }
+    }
+
+    // ILU(0) of a tridiagonal matrix is its LU factorization
+    CSRMatrix Bcsr(&B);
+    ilu.setup(&Bcsr);
+    B.times_vector(x, b, n);
+    ilu.apply(b, b);
+    for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-12);
+}
+
+void test_solver_gmres_bicgstab()
+{
+    // nonsymmetric (convection dominated) matrix
+    int n = 50;
+    CooMatrix A(n);
+    double x[50], b[50];
+    for (int i=0; i < n; i++) {
+        A.add(i, i, 2);
+        if (i > 0) A.add(i, i-1, -1.5);
+        if (i < n-1) A.add(i, i+1, -0.4);
+        x[i] = cos(i);
+    }
+
+    CommonPreconditionerILU0 ilu;
+    CommonPreconditioner *preconds[2] = {NULL, &ilu};
+    for (int k=0; k < 2; k++) {
+        CommonSolverGMRES gmres;
+        gmres.set_preconditioner(preconds[k]);
+        gmres.set_tolerance(1e-12);
+        gmres.set_restart(8);
+        A.times_vector(x, b, n);
+        _assert(gmres.solve(&A, b));
+        for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-10);
+        std::vector<double> &h1 = gmres.get_residual_history();
+        _assert(h1.size() >= 2);
+        _assert(gmres.get_stats().iter_num == h1.size() - 1);
+        // GMRES residuals never increase
+        for (int i=1; i < h1.size(); i++) _assert(h1[i] <= h1[i-1] * (1 + 1e-8));
+
+        CommonSolverBiCGStab bicgstab;
+        bicgstab.set_preconditioner(preconds[k]);
+        bicgstab.set_tolerance(1e-12);
+        A.times_vector(x, b, n);
+        _assert(bicgstab.solve(&A, b));
+        for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-10);
+        std::vector<double> &h2 = bicgstab.get_residual_history();
+        _assert(h2.size() >= 2 && h2.back() < 1e-12 * h2[0]);
+        _assert(bicgstab.get_stats().iter_num == h2.size() - 1);
+    }
+
+    // ILU(0) is exact for a tridiagonal matrix
+    CommonSolverGMRES gmres;
+    gmres.set_preconditioner(&ilu);
+    A.times_vector(x, b, n);
+    _assert(gmres.solve(&A, b));
+    _assert(gmres.get_residual_history().size() == 2);
+
+    // not converged in 'maxiter' iterations
+    CommonSolverGMRES gmres2;
+    gmres2.set_maxiter(3);
+    gmres2.set_tolerance(1e-14);
+    A.times_vector(x, b, n);
+    _assert(!gmres2.solve(&A, b));
+    _assert(gmres2.get_residual_history().size() == 4);
+
+    // singular matrix, A v_1 is a multiple of A v_0 and the rotated column
+    // of the Hessenberg matrix is zero
+    CooMatrix S(2);
+    S.add(0, 0, 1);
+    S.add(0, 1, 1);
+    double c[2] = {0, 1};
+    CommonSolverGMRES gmres3;
+    _assert(!gmres3.solve(&S, c));
+    _assert(c[0] == 0 && c[1] == 0);
+    _assert(gmres3.get_stats().iter_num == 1);
+}
+
+void test_solver_mixed_lu()
+{
+    int n = 30;
+    CooMatrix A(n);
+    double x[30], b[30];
+    for (int i=0; i < n; i++) {
+        A.add(i, i, 4 + sin(i));
+        if (i > 0) A.add(i, i-1, -1.5);
+        if (i < n-1) A.add(i, i+1, -1. / 3);
+        if (i < n-5) A.add(i, i+5, 0.1);
+        x[i] = cos(i);
+    }
+
+    // all the input formats give the double precision solution
+    CSRMatrix Acsr(&A);
+    CSCMatrix Acsc(&A);
+    DenseMatrix Aden(&A);
+    Matrix *mats[4] = {&A, &Acsr, &Acsc, &Aden};
+    for (int k=0; k < 4; k++) {
+        CommonSolverMixedLU solver;
+        A.times_vector(x, b, n);
+        _assert(solver.solve(mats[k], b));
+        for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-12);
+    }
+
+    // the refinement converges with the factorization of a nearby matrix
+    // (modified Newton method)
+    CommonSolverMixedLU solver;
+    A.times_vector(x, b, n);
+    _assert(solver.solve(&A, b));
+    CooMatrix B(n);
+    for (int i=0; i < n; i++) {
+        B.add(i, i, 4.2 + sin(i));
+        if (i > 0) B.add(i, i-1, -1.5);
+        if (i < n-1) B.add(i, i+1, -1. / 3);
+        if (i < n-5) B.add(i, i+5, 0.1);
+    }
+    solver.set_factorization_scheme(REUSE_FACTORIZATION);
+    solver.set_maxiter(100);
+    B.times_vector(x, b, n);
+    _assert(solver.solve(&B, b));
+    for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-12);
+    _assert(solver.get_stats().factorization_reused);
+    _assert(solver.get_stats().iter_num > 1);
+
+    // a correction that increases the residual is undone: with the
+    // factorization of A the first correction for 3*A gives the residual -2*b
+    CooMatrix C(n);
+    for (int i=0; i < n; i++) {
+        C.add(i, i, 3*(4 + sin(i)));
+        if (i > 0) C.add(i, i-1, -4.5);
+        if (i < n-1) C.add(i, i+1, -1.);
+        if (i < n-5) C.add(i, i+5, 0.3);
+    }
+    CommonSolverMixedLU solver_c;
+    A.times_vector(x, b, n);
+    _assert(solver_c.solve(&A, b));
+    solver_c.set_factorization_scheme(REUSE_FACTORIZATION);
+    C.times_vector(x, b, n);
+    _assert(!solver_c.solve(&C, b));
+    _assert(solver_c.get_stats().iter_num == 1);
+    for (int i=0; i < n; i++) _assert(b[i] == 0);
+
+    // the dofs numbered out of order (as after an adaptive refinement) are
+    // reordered to a narrow band
+    CooMatrix D(n);
+    for (int i=0; i < n; i++) {
+        int p = (7*i) % n, q = (7*(i+1)) % n;
+        D.add(p, p, 4 + sin(i));
+        if (i < n-1) { D.add(p, q, -1.5); D.add(q, p, -1. / 3); }
+    }
+    CSRMatrix Dcsr(&D);
+    CommonSolverMixedLU solver_d;
+    D.times_vector(x, b, n);
+    _assert(solver_d.solve(&Dcsr, b));
+    for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-12);
+}
+
+void test_solver_cholesky()
+{
+    // symmetric positive definite matrix of a 1D problem with the dofs
+    // numbered out of order (as after an adaptive refinement)
+    int n = 30;
+    CooMatrix A(n);
+    double x[60], b[60];
+    for (int i=0; i < n; i++) {
+        int p = (7*i) % n, q = (7*(i+1)) % n;
+        A.add(p, p, 2.5);
+        if (i < n-1) { A.add(p, q, -1); A.add(q, p, -1); }
+        x[i] = sin(i);
+        x[n+i] = cos(i);
+    }
+    SymCSRMatrix S(&A);
+    CSRMatrix Acsr(&A);
+
+    Matrix *mats[3] = {&S, &Acsr, &A};
+    for (int k=0; k < 3; k++) {
+        CommonSolverCholesky solver;
+        A.times_vector(x, b, n);
+        A.times_vector(x + n, b + n, n);
+        _assert(solver.solve(mats[k], b, 2));
+        for (int i=0; i < 2*n; i++) _assert(fabs(b[i] - x[i]) < EPS);
+    }
+
+    // the ordering is reused, the factorization is recomputed
+    CommonSolverCholesky solver;
+    A.times_vector(x, b, n);
+    _assert(solver.solve(&S, b));
+    for (int i=0; i < n; i++) S.add(i, i, 1);
+    S.times_vector(x, b, n);
+    _assert(solver.solve(&S, b));
+    for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < EPS);
+
+    // CG uses the symmetric matrix-vector product
+    S.times_vector(x, b, n);
+    _assert(solve_linear_system_cg(&S, b, 1e-14, 100));
+    for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-10);
+
+    // not positive definite
+    CooMatrix B(2);
+    B.add(0, 0, 1);
+    B.add(0, 1, 2);
+    B.add(1, 0, 2);
+    B.add(1, 1, 1);
+    bool raised = false;
+    try {
+        solve_linear_system_cholesky(&B, b);
+    } catch (std::exception const &ex) {
+        raised = true;
+    }
+    _assert(raised);
+}
+
 void test_solver_cg()
 {
     CooMatrix A(4);
@@ -90,6 +608,16 @@ void test_solver_cg()
     _assert(fabs(res[1] - 0.6) < EPS);
     _assert(fabs(res[2] - 0.6) < EPS);
     _assert(fabs(res[3] - 0.2) < EPS);
+
+    // the tolerance is relative to the norm of the right-hand side
+    CommonSolverCG cg;
+    cg.set_tolerance(1e-12);
+    _assert(cg.get_tolerance() == 1e-12);
+    for (int i=0; i < 4; i++) res[i] = 1e8;
+    _assert(cg.solve(&A, res));
+    _assert(fabs(res[0] - 0.2e8) < 1e-2);
+    _assert(fabs(res[1] - 0.6e8) < 1e-2);
+    _assert(cg.get_stats().iter_num > 0);
 }
 
 void test_solver_scipy_1()
@@ -127,6 +655,33 @@ void test_solver_scipy_1()
     _assert(fabs(res[1] - 0.6) < EPS);
     _assert(fabs(res[2] - 0.6) < EPS);
     _assert(fabs(res[3] - 0.2) < EPS);
+
+    // the tolerance is passed to SciPy and the iterations are counted
+    int n = 30;
+    CooMatrix B(n);
+    double x[30], b[30];
+    for (int i=0; i < n; i++) {
+        B.add(i, i, 2.5);
+        if (i > 0) B.add(i, i-1, -1);
+        if (i < n-1) B.add(i, i+1, -1);
+        x[i] = sin(i);
+    }
+    CommonSolverSciPyCG scipy_cg;
+    CommonSolverSciPyGMRES scipy_gmres;
+    CommonSolver *solvers[2] = {&scipy_cg, &scipy_gmres};
+    for (int k=0; k < 2; k++) {
+        int iter_num[2];
+        double tols[2] = {1e-2, 1e-12};
+        for (int t=0; t < 2; t++) {
+            solvers[k]->set_tolerance(tols[t]);
+            _assert(solvers[k]->get_tolerance() == tols[t]);
+            B.times_vector(x, b, n);
+            _assert(solvers[k]->solve(&B, b));
+            iter_num[t] = solvers[k]->get_stats().iter_num;
+        }
+        for (int i=0; i < n; i++) _assert(fabs(b[i] - x[i]) < 1e-10);
+        _assert(0 < iter_num[0] && iter_num[0] < iter_num[1]);
+    }
 }
 
 void test_solver_scipy_2()
@@ -427,7 +982,17 @@ int main(int argc, char* argv[])
         // Hermes Common
         test_solver_dense_lu1();
         test_solver_dense_lu2();
+        test_solver_dense_lu3();
+        test_solver_dense_lu4();
+        test_solver_banded1();
+        test_solver_banded2();
+        test_solver_factorization_reuse();
+        test_solver_nrhs();
         test_solver_cg();
+        test_solver_precond();
+        test_solver_gmres_bicgstab();
+        test_solver_mixed_lu();
+        test_solver_cholesky();
 
         // NumPy + SciPy
 #ifdef COMMON_WITH_SCIPY
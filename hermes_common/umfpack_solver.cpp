@@ -36,17 +36,27 @@ void print_status(int status)
 }
 
 bool CommonSolverUmfpack::solve(Matrix *mat, double *res)
+{
+    return solve(mat, res, 1);
+}
+
+bool CommonSolverUmfpack::solve(Matrix *mat, double *res, int nrhs)
 {
     printf("UMFPACK solver\n");
+    this->stats = CommonSolverStats();
 
     CSCMatrix *Acsc = NULL;
 
     if (CooMatrix *mcoo = dynamic_cast<CooMatrix*>(mat))
         Acsc = new CSCMatrix(mcoo);
+    else if (TripletMatrix *mtr = dynamic_cast<TripletMatrix*>(mat))
+        Acsc = new CSCMatrix(mtr);
     else if (CSCMatrix *mcsc = dynamic_cast<CSCMatrix*>(mat))
         Acsc = mcsc;
     else if (CSRMatrix *mcsr = dynamic_cast<CSRMatrix*>(mat))
         Acsc = new CSCMatrix(mcsr);
+    else if (SymCSRMatrix *msym = dynamic_cast<SymCSRMatrix*>(mat))
+        Acsc = new CSCMatrix(msym);
     else
         _error("Matrix type not supported.");
 
@@ -56,40 +66,76 @@ bool CommonSolverUmfpack::solve(Matrix *mat, double *res)
     // solve
     umfpack_di_defaults(control_array);
 
-    /* symbolic analysis */
-    void *symbolic, *numeric;
-    int status_symbolic = umfpack_di_symbolic(size, size,
-                                              Acsc->get_Ap(), Acsc->get_Ai(), NULL, &symbolic,
-                                              control_array, info_array);
-    print_status(status_symbolic);
-
-    /* LU factorization */
-    int status_numeric = umfpack_di_numeric(Acsc->get_Ap(), Acsc->get_Ai(), Acsc->get_Ax(), symbolic, &numeric,
-                                            control_array, info_array);
-    print_status(status_numeric);
+    if (this->factorization_scheme == FACTORIZE_FROM_SCRATCH)
+        free_factorization();
 
-    umfpack_di_free_symbolic(&symbolic);
+    if (this->factorization_scheme != REUSE_FACTORIZATION
+        || this->numeric == NULL || size != this->size)
+    {
+        /* symbolic analysis (only if the sparsity pattern has changed) */
+        if (this->symbolic == NULL || size != this->size || nnz != this->nnz
+            || memcmp(Acsc->get_Ap(), this->Ap, (size + 1)*sizeof(int))
+            || memcmp(Acsc->get_Ai(), this->Ai, nnz*sizeof(int)))
+        {
+            free_factorization();
+            this->size = size;
+            this->nnz = nnz;
+            this->Ap = new int[size + 1];
+            this->Ai = new int[nnz];
+            memcpy(this->Ap, Acsc->get_Ap(), (size + 1)*sizeof(int));
+            memcpy(this->Ai, Acsc->get_Ai(), nnz*sizeof(int));
+
+            int status_symbolic = umfpack_di_symbolic(size, size,
+                                                      Acsc->get_Ap(), Acsc->get_Ai(), NULL, &this->symbolic,
+                                                      control_array, info_array);
+            print_status(status_symbolic);
+        }
+
+        /* LU factorization */
+        if (this->numeric) umfpack_di_free_numeric(&this->numeric);
+        int status_numeric = umfpack_di_numeric(Acsc->get_Ap(), Acsc->get_Ai(), Acsc->get_Ax(), this->symbolic, &this->numeric,
+                                                control_array, info_array);
+        print_status(status_numeric);
+    }
+    else
+    {
+        // the iterative refinement would use the new matrix with the factors
+        // of the old one
+        control_array[UMFPACK_IRSTEP] = 0;
+        this->stats.factorization_reused = true;
+    }
 
     double *x;
     x = (double*) malloc(size * sizeof(double));
 
-    /* solve system */
-    int status_solve = umfpack_di_solve(UMFPACK_A,
-                                        Acsc->get_Ap(), Acsc->get_Ai(), Acsc->get_Ax(), x, res, numeric,
-                                        control_array, info_array);
-
-    print_status(status_solve);
+    /* solve system (the factorization is used for all right-hand sides) */
+    for (int i = 0; i < nrhs; i++)
+    {
+        double *b = res + i*size;
+        int status_solve = umfpack_di_solve(UMFPACK_A,
+                                            Acsc->get_Ap(), Acsc->get_Ai(), Acsc->get_Ax(), x, b, this->numeric,
+                                            control_array, info_array);
 
-    umfpack_di_free_numeric(&numeric);
+        print_status(status_solve);
 
-    if (symbolic) umfpack_di_free_symbolic(&symbolic);
-    if (numeric) umfpack_di_free_numeric(&numeric);
-
-    memcpy(res, x, size*sizeof(double));
-    delete[] x;
+        memcpy(b, x, size*sizeof(double));
+    }
+    free(x);
 
     if (!dynamic_cast<CSCMatrix*>(mat))
         delete Acsc;
+
+    return true;
+}
+
+void CommonSolverUmfpack::free_factorization()
+{
+    if (this->symbolic) umfpack_di_free_symbolic(&this->symbolic);
+    if (this->numeric) umfpack_di_free_numeric(&this->numeric);
+    if (this->Ap) { delete[] this->Ap; this->Ap = NULL; }
+    if (this->Ai) { delete[] this->Ai; this->Ai = NULL; }
+    this->size = 0;
+    this->nnz = 0;
 }
 
 bool CommonSolverUmfpack::solve(Matrix *mat, cplx *res)
@@ -100,10 +146,14 @@ bool CommonSolverUmfpack::solve(Matrix *mat, cplx *res)
 
     if (CooMatrix *mcoo = dynamic_cast<CooMatrix*>(mat))
         Acsc = new CSCMatrix(mcoo);
+    else if (TripletMatrix *mtr = dynamic_cast<TripletMatrix*>(mat))
+        Acsc = new CSCMatrix(mtr);
     else if (CSCMatrix *mcsc = dynamic_cast<CSCMatrix*>(mat))
         Acsc = mcsc;
     else if (CSRMatrix *mcsr = dynamic_cast<CSRMatrix*>(mat))
         Acsc = new CSCMatrix(mcsr);
+    else if (SymCSRMatrix *msym = dynamic_cast<SymCSRMatrix*>(mat))
+        Acsc = new CSCMatrix(msym);
     else
         _error("Matrix type not supported.");
 
@@ -178,11 +228,20 @@ bool CommonSolverUmfpack::solve(Matrix *mat, cplx *res)
 
 #else
 
+void CommonSolverUmfpack::free_factorization()
+{
+}
+
 bool CommonSolverUmfpack::solve(Matrix *mat, double *res)
 {
     _error("CommonSolverUmfpack::solve(Matrix *mat, double *res) not implemented.");
 }
 
+bool CommonSolverUmfpack::solve(Matrix *mat, double *res, int nrhs)
+{
+    _error("CommonSolverUmfpack::solve(Matrix *mat, double *res, int nrhs) not implemented.");
+}
+
 bool CommonSolverUmfpack::solve(Matrix *mat, cplx *res)
 {
     _error("CommonSolverUmfpack::solve(Matrix *mat, cplx *res) not implemented.");
@@ -0,0 +1,152 @@
+// Copyright (c) 2009 hp-FEM group at the University of Nevada, Reno (UNR).
+// Distributed under the terms of the BSD license (see the LICENSE
+// file for the exact terms).
+// Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
+
+#include <vector>
+
+#include "condensation.h"
+#include "iterator.h"
+
+CondensationSolver::CondensationSolver(Mesh *mesh, CommonSolver *solver) {
+  this->mesh = mesh;
+  this->solver = solver;
+}
+
+// the eliminated part of one element, needed for the back substitution
+struct CondensedElem {
+  std::vector<int> bubble;    // bubble dofs
+  std::vector<int> vertex;    // vertex dofs
+  // columns of A_BB^{-1} A_BV and A_BB^{-1} f_B (the last one), 
+  // stored one after another
+  std::vector<double> x;
+};
+
+bool CondensationSolver::solve(Matrix *mat, double *res) {
+  int n_dof = mat->get_size();
+  if (n_dof != this->mesh->get_n_dof()) 
+    error("matrix does not match the mesh in CondensationSolver::solve().");
+  CSRMatrix *A = dynamic_cast<CSRMatrix*>(mat);
+  if (A == NULL) A = new CSRMatrix(mat);
+  int *Ap = A->get_Ap();
+  int *Ai = A->get_Ai();
+  double *Ax = A->get_Ax();
+
+  // collect the bubble and vertex dofs of all active elements
+  std::vector<CondensedElem> elems;
+  std::vector<bool> is_bubble(n_dof, false);
+  Iterator *I = new Iterator(this->mesh);
+  Element *e;
+  while ((e = I->next_active_element()) != NULL) {
+    if (e->p < 2) continue;
+    CondensedElem ce;
+    for (int c=0; c < e->n_eq; c++) {
+      for (int k=0; k < e->p + 1; k++) {
+        int pos = e->dof[c][k];
+        if (pos == -1) continue;
+        if (k < 2) ce.vertex.push_back(pos);
+        else {
+          ce.bubble.push_back(pos);
+          is_bubble[pos] = true;
+        }
+      }
+    }
+    elems.push_back(ce);
+  }
+  delete I;
+
+  // numbering of the vertex dofs in the reduced system
+  std::vector<int> idx(n_dof, -1);
+  int n_red = 0;
+  for (int i=0; i < n_dof; i++) if (!is_bubble[i]) idx[i] = n_red++;
+
+  // A_VV and f_V
+  TripletMatrix S(n_red);
+  double *g = new double[n_red];
+  for (int i=0; i < n_dof; i++) {
+    if (is_bubble[i]) continue;
+    g[idx[i]] = res[i];
+    for (int k=Ap[i]; k < Ap[i+1]; k++)
+      if (!is_bubble[Ai[k]]) S.add(idx[i], idx[Ai[k]], Ax[k]);
+  }
+
+  // subtract A_VB A_BB^{-1} A_BV and A_VB A_BB^{-1} f_B element by element
+  for (int m=0; m < elems.size(); m++) {
+    CondensedElem *ce = &elems[m];
+    int nb = ce->bubble.size();
+    int nv = ce->vertex.size();
+    if (nb == 0) continue;
+    double **Abb = _new_matrix<double>(nb);
+    for (int i=0; i < nb; i++)
+      for (int j=0; j < nb; j++) 
+        Abb[i][j] = A->get(ce->bubble[i], ce->bubble[j]);
+    int *indx = new int[nb];
+    double d;
+    ludcmp(Abb, nb, indx, &d);
+
+    ce->x.resize(nb*(nv + 1));
+    for (int j=0; j <= nv; j++) {
+      double *col = &ce->x[j*nb];
+      for (int i=0; i < nb; i++) 
+        col[i] = (j < nv) ? A->get(ce->bubble[i], ce->vertex[j]) 
+                          : res[ce->bubble[i]];
+      lubksb(Abb, nb, indx, col);
+    }
+
+    for (int i=0; i < nv; i++) {
+      int row = idx[ce->vertex[i]];
+      for (int j=0; j <= nv; j++) {
+        double *col = &ce->x[j*nb];
+        double val = 0;
+        for (int k=0; k < nb; k++) 
+          val += A->get(ce->vertex[i], ce->bubble[k]) * col[k];
+        if (j < nv) S.add(row, idx[ce->vertex[j]], -val);
+        else g[row] -= val;
+      }
+    }
+
+    delete [] indx;
+    delete [] Abb;
+  }
+
+  // solve the reduced system, the factorization of the previous reduced
+  // system is reused as requested from this solver (e.g. by newton())
+  CommonSolverSparseLib cgs;
+  CommonSolver *solver = this->solver;
+  if (solver == NULL) {
+    cgs.set_method(CommonSolverSparseLib::CommonSolverSparseLibSolver_ConjugateGradientSquared);
+    solver = &cgs;
+  }
+  solver->set_factorization_scheme(this->factorization_scheme);
+  bool flag = solver->solve(&S, g);
+  this->stats = solver->get_stats();
+  // the bubble coefficients would be garbage
+  if (!flag) {
+    delete [] g;
+    if (A != mat) delete A;
+    return false;
+  }
+
+  // vertex coefficients and the back substitution for bubbles:
+  // x_B = A_BB^{-1} f_B - A_BB^{-1} A_BV x_V
+  for (int i=0; i < n_dof; i++) if (!is_bubble[i]) res[i] = g[idx[i]];
+  for (int m=0; m < elems.size(); m++) {
+    CondensedElem *ce = &elems[m];
+    int nb = ce->bubble.size();
+    int nv = ce->vertex.size();
+    for (int i=0; i < nb; i++) {
+      double val = ce->x[nv*nb + i];
+      for (int j=0; j < nv; j++) val -= ce->x[j*nb + i] * g[idx[ce->vertex[j]]];
+      res[ce->bubble[i]] = val;
+    }
+  }
+
+  delete [] g;
+  if (A != mat) delete A;
+  return true;
+}
+
+bool CondensationSolver::solve(Matrix *mat, cplx *res) {
+  error("CondensationSolver::solve(Matrix *mat, cplx *res) not implemented.");
+  return false;
+}
@@ -0,0 +1,35 @@
+// Copyright (c) 2009 hp-FEM group at the University of Nevada, Reno (UNR).
+// Distributed under the terms of the BSD license (see the LICENSE
+// file for the exact terms).
+// Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
+
+#ifndef _CONDENSATION_H_
+#define _CONDENSATION_H_
+
+#include "mesh.h"
+#include "matrix.h"
+#include "solvers.h"
+
+// Solver with static condensation of bubble functions. The bubble 
+// functions (Lobatto k >= 2) only couple within their element, so they 
+// are eliminated element by element (Schur complement onto the vertex 
+// dofs), the reduced system of size ~ n_eq*(n_elem+1) is solved by 
+// 'solver' (SparseLib++ CGS if NULL) and the bubble coefficients are 
+// recovered afterwards. The matrix must be assembled on 'mesh' and the 
+// bubble blocks of all elements must be regular. solve() returns the 
+// result of 'solver' and passes the factorization scheme on to it.
+// Usage: newton(dp, mesh, new CondensationSolver(mesh), ...)
+class CondensationSolver : public CommonSolver {
+public:
+  CondensationSolver(Mesh *mesh, CommonSolver *solver=NULL);
+  // needs to be called when the mesh changes (e.g. in adaptivity)
+  void set_mesh(Mesh *mesh) { this->mesh = mesh; }
+  bool solve(Matrix *mat, double *res);
+  bool solve(Matrix *mat, cplx *res);
+
+private:
+  Mesh *mesh;
+  CommonSolver *solver;
+};
+
+#endif
@@ -3,11 +3,15 @@
 // file for the exact terms).
 // Email: hermes1d@googlegroups.com, home page: http://hpfem.org/
 
+#include <algorithm>
+#include <string>
+
 #include "matrix.h"
 #include "discrete.h"
 #include "mesh.h"
 
 #include "solvers.h"
+#include "common_time_period.h"
 
 DiscreteProblem::DiscreteProblem() {
   // precalculating values and derivatives 
@@ -26,6 +30,14 @@ DiscreteProblem::DiscreteProblem() {
   precalculate_lobatto_1d_left();
   precalculate_lobatto_1d_right();
   fprintf(stderr, "done.\n");
+
+  this->symmetric = false;
+  this->linear = false;
+  this->parallel = false;
+  this->fd_jacobian = false;
+  this->fd_epsilon = 1e-7;
+  this->sln_vector = NULL;
+  this->elem_cache_epoch = 0;
 }
 
 void DiscreteProblem::add_matrix_form(int i, int j, matrix_form fn, int marker)
@@ -35,6 +47,23 @@ void DiscreteProblem::add_matrix_form(int i, int j, matrix_form fn, int marker)
     this->matrix_forms_vol.push_back(form);
 }
 
+void DiscreteProblem::add_matrix_form_ref(int i, int j, int type, double coeff,
+                                          int marker)
+{
+    if (marker != ANY && marker < 0) error("Invalid element marker.");
+    if (type < 0 || type >= REF_FORM_NUM) error("Invalid reference form type.");
+    MatrixFormVol form = {i, j, NULL, marker, type, coeff};
+    this->matrix_forms_vol.push_back(form);
+}
+
+void DiscreteProblem::add_matrix_form_block(int i, int j, matrix_form_block fn, 
+                                            int marker)
+{
+    if (marker != ANY && marker < 0) error("Invalid element marker.");
+    MatrixFormVol form = {i, j, NULL, marker, 0, 0, fn};
+    this->matrix_forms_vol.push_back(form);
+}
+
 void DiscreteProblem::add_vector_form(int i, vector_form fn, int marker)
 {
     if (marker != ANY && marker < 0) error("Invalid element marker.");
@@ -42,6 +71,13 @@ void DiscreteProblem::add_vector_form(int i, vector_form fn, int marker)
     this->vector_forms_vol.push_back(form);
 }
 
+void DiscreteProblem::add_vector_form_block(int i, vector_form_block fn, int marker)
+{
+    if (marker != ANY && marker < 0) error("Invalid element marker.");
+    VectorFormVol form = {i, NULL, marker, fn};
+    this->vector_forms_vol.push_back(form);
+}
+
 void DiscreteProblem::add_matrix_form_surf(int i, int j, matrix_form_surf fn, int bdy_index)
 {
     MatrixFormSurf form = {i, j, bdy_index, fn};
@@ -54,138 +90,457 @@ void DiscreteProblem::add_vector_form_surf(int i, vector_form_surf fn, int bdy_i
     this->vector_forms_surf.push_back(form);
 }
 
+double *DiscreteProblem::get_ref_matrix(int type, int p) {
+  std::vector<double> &m = this->ref_matrices[type][p];
+  if (m.empty()) {
+    // the same quadrature as in process_vol_forms()
+    int order = 4*p;
+    int pts_num;
+    double pts[MAX_QUAD_PTS_NUM], weights[MAX_QUAD_PTS_NUM];
+    double u[MAX_QUAD_PTS_NUM], dudx[MAX_QUAD_PTS_NUM];
+    double v[MAX_QUAD_PTS_NUM], dvdx[MAX_QUAD_PTS_NUM];
+    create_phys_element_quadrature(-1, 1, order, pts, weights, &pts_num);
+    m.resize((p + 1)*(p + 1));
+    for (int i = 0; i < p + 1; i++) {
+      element_shapefn(-1, 1, i, order, v, dvdx);
+      for (int j = 0; j < p + 1; j++) {
+        element_shapefn(-1, 1, j, order, u, dudx);
+        double val = 0;
+        for (int k = 0; k < pts_num; k++) {
+          if (type == REF_FORM_MASS) val += u[k]*v[k]*weights[k];
+          else if (type == REF_FORM_STIFFNESS) val += dudx[k]*dvdx[k]*weights[k];
+          else val += dudx[k]*v[k]*weights[k];
+        }
+        m[i*(p + 1) + j] = val;
+      }
+    }
+  }
+  return &m[0];
+}
+
+// number of elements whose forms are evaluated at once by the threads in 
+// the parallel assembly (see DiscreteProblem::set_parallel())
+#define PARALLEL_BATCH_SIZE 256
+
+DiscreteProblem::ElemCache *DiscreteProblem::get_elem_cache(Element *e) {
+  ElemCacheKey key(std::make_pair(e->x1, e->x2), e->p);
+  std::map<ElemCacheKey, ElemCache>::iterator it = this->elem_cache.find(key);
+  if (it != this->elem_cache.end()) {
+    it->second.epoch = this->elem_cache_epoch;
+    return &it->second;
+  }
+
+  ElemCache &c = this->elem_cache[key];
+  c.epoch = this->elem_cache_epoch;
+  // decide quadrature order and set up 
+  // quadrature weights and points in element m
+  // CAUTION: This is heuristic
+  c.order = 4*e->p;
+  int n_fns = e->p + 1;
+
+  // prepare quadrature points and weights in element 'e'
+  double pts[MAX_QUAD_PTS_NUM], weights[MAX_QUAD_PTS_NUM];
+  create_phys_element_quadrature(e->x1, e->x2, c.order, pts, weights, 
+                                 &c.pts_num); 
+  c.pts.assign(pts, pts + c.pts_num);
+  c.weights.assign(weights, weights + c.pts_num);
+
+  // transform all shape functions to element 'e'
+  c.u.resize(n_fns*c.pts_num);
+  c.dudx.resize(n_fns*c.pts_num);
+  for (int k = 0; k < n_fns; k++) 
+    element_shapefn(e->x1, e->x2, k, c.order, &c.u[k*c.pts_num], 
+                    &c.dudx[k*c.pts_num]);
+  return &c;
+}
+
+void DiscreteProblem::sweep_elem_cache() {
+  std::map<ElemCacheKey, ElemCache>::iterator it = this->elem_cache.begin();
+  while (it != this->elem_cache.end()) {
+    if (it->second.epoch != this->elem_cache_epoch) 
+      this->elem_cache.erase(it++);
+    else ++it;
+  }
+}
+
+// copies the shape functions from the element cache to the arrays 
+// passed to the block forms
+static bool copy_shapefns(int n_fns, int pts_num, double **u, double **dudx, 
+                          double u_trg[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                          double dudx_trg[MAX_P + 1][MAX_QUAD_PTS_NUM]) {
+  for (int k = 0; k < n_fns; k++) 
+    for (int i = 0; i < pts_num; i++) {
+      u_trg[k][i] = u[k][i];
+      dudx_trg[k][i] = dudx[k][i];
+    }
+  return true;
+}
+
+// Evaluates all volumetric forms in element 'e' into 'out': the element
+// matrix of every matrix form (row i: test function, column j: basis 
+// function), followed by the element vector of every vector form, in the 
+// order in which the forms were added. 'c' is the cache entry of the 
+// element. Only reads the problem, the mesh and the caches, so it can run
+// in parallel.
+void DiscreteProblem::eval_vol_forms(Element *e, ElemCache *c, int matrix_flag, 
+                                     double *out) {
+  int    pts_num = c->pts_num;                        // num of quad points
+  double *phys_pts = &c->pts[0];                      // quad points
+  double *phys_weights = &c->weights[0];              // quad weights
+  // values and x-derivatives of all shape functions of the element
+  // (the basis and test functions are the same)
+  double *phys_u[MAX_P + 1];
+  double *phys_dudx[MAX_P + 1];
+  // all previous solutions (all components)
+  double phys_u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM];     
+  // x-derivatives of all previous solutions (all components)
+  double phys_du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM];  
+  int order = c->order;
+  int n_fns = e->p + 1;
+  for (int k = 0; k < n_fns; k++) {
+    phys_u[k] = &c->u[k*pts_num];
+    phys_dudx[k] = &c->dudx[k*pts_num];
+  }
+  // the shape functions in the arrays passed to the block forms (copied 
+  // from the cache when the first block form is evaluated)
+  double block_u[MAX_P + 1][MAX_QUAD_PTS_NUM];
+  double block_dudx[MAX_P + 1][MAX_QUAD_PTS_NUM];
+  bool block_ready = false;
+
+  // evaluate previous solution and its derivative 
+  // at all quadrature points in the element, 
+  // for every solution component
+  // 0... in the entire element
+  // (the current solution from the solution vector if given, see 
+  // assemble_vector())
+  for(int sln=0; sln < e->n_sln; sln++) {
+    e->get_solution_quad(0, order, phys_u_prev[sln], phys_du_prevdx[sln], sln,
+                         sln == 0 ? this->sln_vector : NULL); 
+  }
+
+  // volumetric bilinear forms
+  if(matrix_flag == 0 || matrix_flag == 1) {
+    for (int ww = 0; ww < this->matrix_forms_vol.size(); ww++) {
+      MatrixFormVol *mfv = &this->matrix_forms_vol[ww];
+      // element matrix of the form
+      double *local_mat[MAX_P + 1];
+      for (int i = 0; i < n_fns; i++) local_mat[i] = out + i*n_fns;
+      out += n_fns*n_fns;
+      if (e->marker != mfv->marker && mfv->marker != ANY) continue;
+      int c_i = mfv->i;  
+      int c_j = mfv->j;  
+      // symmetric problem: the form (c_j, c_i) is the transposed 
+      // form (c_i, c_j)
+      if (this->symmetric && c_i > c_j) continue;
+
+      if (mfv->fn_block != NULL) {
+        if (!block_ready) 
+          block_ready = copy_shapefns(n_fns, pts_num, phys_u, phys_dudx, 
+                                      block_u, block_dudx);
+        mfv->fn_block(pts_num, phys_pts, phys_weights, n_fns, 
+                      block_u, block_dudx, phys_u_prev, phys_du_prevdx, 
+                      local_mat, NULL);
+      }
+      else if (mfv->fn != NULL) {
+        for(int i=0; i < n_fns; i++) {
+          for(int j=0; j < n_fns; j++) {
+            // only for the active test and basis functions (and the 
+            // upper triangle of the symmetric problem)
+            int pos_i = e->dof[c_i][i], pos_j = e->dof[c_j][j];
+            if (pos_i == -1 || pos_j == -1 
+                || (this->symmetric && c_i == c_j && pos_i > pos_j)) {
+              local_mat[i][j] = 0;
+              continue;
+            }
+            local_mat[i][j] = mfv->fn(pts_num, phys_pts, phys_weights, 
+                                      phys_u[j], phys_dudx[j], 
+                                      phys_u[i], phys_dudx[i], 
+                                      phys_u_prev, phys_du_prevdx, NULL); 
+          }
+        }
+      }
+      else {
+        // forms added by add_matrix_form_ref(): scaled reference 
+        // matrix instead of the quadrature (the reference matrix is 
+        // already computed by process_vol_forms())
+        double *ref = &this->ref_matrices[mfv->ref_type].find(e->p)->second[0];
+        double h = e->x2 - e->x1;
+        double ref_scale = mfv->coeff;
+        if (mfv->ref_type == REF_FORM_MASS) ref_scale *= h/2;
+        else if (mfv->ref_type == REF_FORM_STIFFNESS) ref_scale *= 2/h;
+        for(int i=0; i < n_fns; i++) 
+          for(int j=0; j < n_fns; j++) 
+            local_mat[i][j] = ref_scale*ref[i*n_fns + j];
+      }
+    }
+  }
+
+  // volumetric part of residual
+  if(matrix_flag == 0 || matrix_flag == 2) {
+    for (int ww = 0; ww < this->vector_forms_vol.size(); ww++) {
+      VectorFormVol *vfv = &this->vector_forms_vol[ww];
+      // element vector of the form
+      double *local_vec = out;
+      out += n_fns;
+      if (e->marker != vfv->marker && vfv->marker != ANY) continue;
+      int c_i = vfv->i;  
+
+      if (vfv->fn_block != NULL) {
+        if (!block_ready) 
+          block_ready = copy_shapefns(n_fns, pts_num, phys_u, phys_dudx, 
+                                      block_u, block_dudx);
+        vfv->fn_block(pts_num, phys_pts, phys_weights, phys_u_prev, 
+                      phys_du_prevdx, n_fns, block_u, block_dudx, 
+                      local_vec, NULL);
+      }
+      else {
+        for(int i=0; i < n_fns; i++) {
+          if (e->dof[c_i][i] == -1) {
+            local_vec[i] = 0;
+            continue;
+          }
+          local_vec[i] = vfv->fn(pts_num, phys_pts, phys_weights, 
+                                 phys_u_prev, phys_du_prevdx, phys_u[i],
+                                 phys_dudx[i], NULL);
+        }
+      }
+    }
+  }
+}
+
+// Adds the element matrices and vectors evaluated by eval_vol_forms() to 
+// the matrix 'mat' and the residual vector 'res'.
+void DiscreteProblem::insert_vol_forms(Element *e, int matrix_flag, double *out, 
+                                       Matrix *mat, double *res) {
+  int n_fns = e->p + 1;
+
+  // volumetric bilinear forms
+  if(matrix_flag == 0 || matrix_flag == 1) {
+    for (int ww = 0; ww < this->matrix_forms_vol.size(); ww++) {
+      MatrixFormVol *mfv = &this->matrix_forms_vol[ww];
+      double *local_mat[MAX_P + 1];
+      for (int i = 0; i < n_fns; i++) local_mat[i] = out + i*n_fns;
+      out += n_fns*n_fns;
+      if (e->marker != mfv->marker && mfv->marker != ANY) continue;
+      int c_i = mfv->i;  
+      int c_j = mfv->j;  
+      if (this->symmetric && c_i > c_j) continue;
+
+      // truncating
+      for(int i=0; i < n_fns; i++) 
+        for(int j=0; j < n_fns; j++) 
+          if (fabs(local_mat[i][j]) < 1e-12) local_mat[i][j] = 0.0; 
+
+      // block forms: the whole element matrix at once (add_block() 
+      // skips the inactive functions)
+      if (mfv->fn_block != NULL && !this->symmetric) {
+        mat->add_block(e->dof[c_i], n_fns, e->dof[c_j], n_fns, local_mat);
+        continue;
+      }
+
+      // loop over test functions (rows)
+      for(int i=0; i < n_fns; i++) {
+        // if i-th test function is active
+        int pos_i = e->dof[c_i][i]; // row in matrix
+        if(pos_i == -1) continue;
+        // loop over basis functions (columns)
+        for(int j=0; j < n_fns; j++) {
+          int pos_j = e->dof[c_j][j]; // matrix column
+          // if j-th basis function is active
+          if(pos_j == -1) continue;
+          // symmetric problem: the entries below the diagonal 
+          // are given by the ones above it
+          if (this->symmetric && c_i == c_j && pos_i > pos_j) continue;
+          double val_ij = local_mat[i][j];
+          // add the result to the matrix (only to the upper 
+          // triangle in the symmetric case)
+          if (val_ij != 0) {
+            if (this->symmetric) 
+              mat->add(std::min(pos_i, pos_j), std::max(pos_i, pos_j), val_ij);
+            else
+              mat->add(pos_i, pos_j, val_ij);
+          }
+          if (DEBUG) {
+            printf("Adding to matrix pos %d, %d value %g (comp %d, %d)\n", 
+            pos_i, pos_j, val_ij, c_i, c_j);
+          }
+        }
+      }
+    }
+  }
+
+  // volumetric part of residual
+  if(matrix_flag == 0 || matrix_flag == 2) {
+    for (int ww = 0; ww < this->vector_forms_vol.size(); ww++) {
+      VectorFormVol *vfv = &this->vector_forms_vol[ww];
+      double *local_vec = out;
+      out += n_fns;
+      if (e->marker != vfv->marker && vfv->marker != ANY) continue;
+      int c_i = vfv->i;  
+
+      // loop over test functions (rows)
+      for(int i=0; i < n_fns; i++) {
+        // if i-th test function is active
+        int pos_i = e->dof[c_i][i]; // row in residual vector
+        if(pos_i == -1) continue;
+        double val_i = local_vec[i];
+        // truncating
+        if(fabs(val_i) < 1e-12) val_i = 0.0; 
+        // add the contribution to the residual vector
+        if (val_i != 0) res[pos_i] += val_i;
+        if (DEBUG) {
+          if (val_i != 0) {
+            printf("Adding to residual pos %d value %g (comp %d)\n", 
+            pos_i, val_i, c_i);
+          }
+        }
+      }
+    }
+  }
+}
+
 // process volumetric weak forms
 void DiscreteProblem::process_vol_forms(Mesh *mesh, Matrix *mat, double *res, 
 					int matrix_flag) {
   int n_eq = mesh->get_n_eq();
-  Element *elems = mesh->get_base_elems();
-  int n_elem = mesh->get_n_base_elem();
-  Iterator *I = new Iterator(mesh);
+  if (n_eq > MAX_EQN_NUM) error("number of equations exceeded in process_vol_forms().");
 
+  // flat array of the active elements
+  std::vector<Element *> elems;
+  Iterator *I = new Iterator(mesh);
   Element *e;
-  while ((e = I->next_active_element()) != NULL) {
-    //printf("Processing elem %d\n", m);
-    int    pts_num;                                     // num of quad points
-    double phys_pts[MAX_QUAD_PTS_NUM];                  // quad points
-    double phys_weights[MAX_QUAD_PTS_NUM];              // quad weights
-    double phys_u[MAX_QUAD_PTS_NUM];                    // basis function 
-    double phys_dudx[MAX_QUAD_PTS_NUM];                 // basis function x-derivative
-    double phys_v[MAX_QUAD_PTS_NUM];                    // test function
-    double phys_dvdx[MAX_QUAD_PTS_NUM];                 // test function x-derivative
-    if (n_eq > MAX_EQN_NUM) error("number of equations exceeded in process_vol_forms().");
-    // all previous solutions (all components)
-    double phys_u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM];     
-    // x-derivatives of all previous solutions (all components)
-    double phys_du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM];  
-    // decide quadrature order and set up 
-    // quadrature weights and points in element m
-    // CAUTION: This is heuristic
-    int order = 4*e->p;
-
-    // prepare quadrature points and weights in element 'e'
-    create_phys_element_quadrature(e->x1, e->x2,  
-                               order, phys_pts, phys_weights, &pts_num); 
-
-    // evaluate previous solution and its derivative 
-    // at all quadrature points in the element, 
-    // for every solution component
-    // 0... in the entire element
-    for(int sln=0; sln < e->n_sln; sln++) {
-      e->get_solution_quad(0, order, phys_u_prev[sln], phys_du_prevdx[sln], sln); 
-    }
-
-    // volumetric bilinear forms
-    if(matrix_flag == 0 || matrix_flag == 1) 
-    {
-      for (int ww = 0; ww < this->matrix_forms_vol.size(); ww++)
-      {
-	MatrixFormVol *mfv = &this->matrix_forms_vol[ww];
-	if (e->marker == mfv->marker ||  mfv->marker == ANY) {
-  	  int c_i = mfv->i;  
-	  int c_j = mfv->j;  
-
-	  // loop over test functions (rows)
-	  for(int i=0; i<e->p + 1; i++) {
-	    // if i-th test function is active
-	    int pos_i = e->dof[c_i][i]; // row in matrix
-            //printf("elem (%g, %g): pos_i = %d\n", e->x1, e->x2, pos_i);
-	    if(pos_i != -1) {
-	      // transform i-th test function to element 'm'
-              //printf("Elem (%g, %g): i = %d, order = %d\n", e->x1, e->x2, i, order);
-	      element_shapefn(e->x1, e->x2,  
-			      i, order, phys_v, phys_dvdx); 
-	      // if we are constructing the matrix
-	      if(matrix_flag == 0 || matrix_flag == 1) {
-	        // loop over basis functions (columns)
-	        for(int j=0; j < e->p + 1; j++) {
-		  int pos_j = e->dof[c_j][j]; // matrix column
-                  //printf("elem (%g, %g): pos_j = %d\n", e->x1, e->x2, pos_j);
-		  // if j-th basis function is active
-		  if(pos_j != -1) {
-		    // transform j-th basis function to element 'm'
-		    element_shapefn(e->x1, e->x2,  
-				    j, order, phys_u, phys_dudx); 
-		    // evaluate the bilinear form
-		    double val_ij = mfv->fn(pts_num, phys_pts,
-			      phys_weights, phys_u, phys_dudx, phys_v, phys_dvdx,
-			      phys_u_prev, phys_du_prevdx, NULL); 
-		    //truncating
-		    if (fabs(val_ij) < 1e-12) val_ij = 0.0; 
-		    // add the result to the matrix
-		    if (val_ij != 0) mat->add(pos_i, pos_j, val_ij);
-		    if (DEBUG) {
-		      printf("Adding to matrix pos %d, %d value %g (comp %d, %d)\n", 
-		      pos_i, pos_j, val_ij, c_i, c_j);
-		    }
-	          }
-	        }
-	      }
-	    }
-          }
-	}
+  while ((e = I->next_active_element()) != NULL) elems.push_back(e);
+  delete I;
+
+  int n_mat_forms = (matrix_flag == 0 || matrix_flag == 1) ? 
+                    this->matrix_forms_vol.size() : 0;
+  int n_vec_forms = (matrix_flag == 0 || matrix_flag == 2) ? 
+                    this->vector_forms_vol.size() : 0;
+
+  // The forms are evaluated in batches of elements (by the threads in the
+  // parallel assembly), then the results are added to the matrix and the
+  // vector in the order of the elements. So the result doesn't depend on
+  // the number of threads, it is exactly the same as in the serial case.
+  int batch_size = this->parallel ? PARALLEL_BATCH_SIZE : 1;
+  std::vector<double> out;
+  std::vector<int> offset(batch_size + 1);
+  std::vector<ElemCache *> cache(batch_size);
+  this->elem_cache_epoch++;
+  for (int b0 = 0; b0 < elems.size(); b0 += batch_size) {
+    int b1 = std::min((int) elems.size(), b0 + batch_size);
+    offset[0] = 0;
+    for (int k = b0; k < b1; k++) {
+      int n_fns = elems[k]->p + 1;
+      offset[k - b0 + 1] = offset[k - b0] 
+                           + n_mat_forms*n_fns*n_fns + n_vec_forms*n_fns;
+      // the caches are filled here, as the threads only read them
+      cache[k - b0] = get_elem_cache(elems[k]);
+      for (int ww = 0; ww < n_mat_forms; ww++) {
+        MatrixFormVol *mfv = &this->matrix_forms_vol[ww];
+        if (mfv->fn == NULL && mfv->fn_block == NULL) 
+          get_ref_matrix(mfv->ref_type, elems[k]->p);
       }
     }
+    if (out.size() < offset[b1 - b0]) out.resize(offset[b1 - b0]);
+
+#pragma omp parallel for schedule(dynamic) if (this->parallel && b1 - b0 > 1)
+    for (int k = b0; k < b1; k++) 
+      eval_vol_forms(elems[k], cache[k - b0], matrix_flag, 
+                     &out[offset[k - b0]]);
+
+    for (int k = b0; k < b1; k++) 
+      insert_vol_forms(elems[k], matrix_flag, &out[offset[k - b0]], mat, res);
+  }
+  // drop the entries of the old (refined) elements
+  sweep_elem_cache();
+}
 
-    // volumetric part of residual
-    if(matrix_flag == 0 || matrix_flag == 2) {
-      for (int ww = 0; ww < this->vector_forms_vol.size(); ww++)
-      {
-        VectorFormVol *vfv = &this->vector_forms_vol[ww];
-	if (e->marker == vfv->marker ||  vfv->marker == ANY) {
-          int c_i = vfv->i;  
+// Finite difference Jacobi matrix. The residual vector of element 'e' 
+// depends only on the coefficients of 'e', so the column of unknown j is 
+// the sum of the difference quotients of the element vectors of the 
+// elements which contain j, each evaluated with only the coefficient 
+// of j in this element perturbed.
+void DiscreteProblem::process_fd_jacobian(Mesh *mesh, Matrix *mat) {
+  int n_eq = mesh->get_n_eq();
+  int n_vec_forms = this->vector_forms_vol.size();
+  int n_surf_forms = this->vector_forms_surf.size();
+
+  // boundary elements (for the surface vector forms)
+  Iterator *I = new Iterator(mesh);
+  Element *e_left = I->first_active_element();
+  Element *e_right = I->last_active_element();
+
+  // element vectors of the forms: base and perturbed
+  std::vector<double> base((n_vec_forms + 2*n_surf_forms)*(MAX_P + 1));
+  std::vector<double> pert(base.size());
 
+  this->elem_cache_epoch++;
+  Element *e;
+  while ((e = I->next_active_element()) != NULL) {
+    int n_fns = e->p + 1;
+    ElemCache *c = get_elem_cache(e);
+    double *base_surf = &base[n_vec_forms*n_fns];
+    double *pert_surf = &pert[n_vec_forms*n_fns];
+    int n_surf = 0;
+    if (e == e_left) 
+      eval_surf_vector_forms(e, BOUNDARY_LEFT, mesh->get_left_endpoint(), 
+                             base_surf + (n_surf++)*n_surf_forms*n_fns);
+    if (e == e_right) 
+      eval_surf_vector_forms(e, BOUNDARY_RIGHT, mesh->get_right_endpoint(), 
+                             base_surf + (n_surf++)*n_surf_forms*n_fns);
+    if (n_vec_forms > 0) eval_vol_forms(e, c, 2, &base[0]);
+
+    // loop over the unknowns (columns) of the element
+    for (int c_j = 0; c_j < n_eq; c_j++) {
+      for (int j = 0; j < n_fns; j++) {
+        int pos_j = e->dof[c_j][j]; // matrix column
+        if (pos_j == -1) continue;
+
+        // perturb the coefficient (the step is the difference of the 
+        // floating point numbers), evaluate the forms and restore it
+        double y_j = e->coeffs[0][c_j][j];
+        e->coeffs[0][c_j][j] = y_j + this->fd_epsilon*(1 + fabs(y_j));
+        double h = e->coeffs[0][c_j][j] - y_j;
+        n_surf = 0;
+        if (e == e_left) 
+          eval_surf_vector_forms(e, BOUNDARY_LEFT, mesh->get_left_endpoint(), 
+                                 pert_surf + (n_surf++)*n_surf_forms*n_fns);
+        if (e == e_right) 
+          eval_surf_vector_forms(e, BOUNDARY_RIGHT, mesh->get_right_endpoint(),
+                                 pert_surf + (n_surf++)*n_surf_forms*n_fns);
+        if (n_vec_forms > 0) eval_vol_forms(e, c, 2, &pert[0]);
+        e->coeffs[0][c_j][j] = y_j;
+
+        // difference quotients of the volumetric and surface forms 
+        // (every surface form is evaluated on its boundary only)
+        for (int ww = 0; ww < n_vec_forms + n_surf*n_surf_forms; ww++) {
+          int c_i, offset = ww*n_fns;
+          if (ww < n_vec_forms) {
+            VectorFormVol *vfv = &this->vector_forms_vol[ww];
+            if (e->marker != vfv->marker && vfv->marker != ANY) continue;
+            c_i = vfv->i;
+          }
+          else {
+            VectorFormSurf *vfs = 
+              &this->vector_forms_surf[(ww - n_vec_forms) % n_surf_forms];
+            int bdy_index = (e == e_left && ww - n_vec_forms < n_surf_forms) 
+                            ? BOUNDARY_LEFT : BOUNDARY_RIGHT;
+            if (vfs->bdy_index != bdy_index) continue;
+            c_i = vfs->i;
+          }
           // loop over test functions (rows)
-          for(int i=0; i<e->p + 1; i++) {
-	    // if i-th test function is active
-	    int pos_i = e->dof[c_i][i]; // row in residual vector
-	    if(pos_i != -1) {
-	      // transform i-th test function to element 'm'
-	      element_shapefn(e->x1, e->x2,  
-			      i, order, phys_v, phys_dvdx); 
-	      // contribute to residual vector
-	      if(matrix_flag == 0 || matrix_flag == 2) {
-	        double val_i = vfv->fn(pts_num, phys_pts, phys_weights, 
-				       phys_u_prev, phys_du_prevdx, phys_v,
-				       phys_dvdx, NULL);
-	        // truncating
-	        if(fabs(val_i) < 1e-12) val_i = 0.0; 
-	        // add the contribution to the residual vector
- 	        if (val_i != 0) res[pos_i] += val_i;
-	        if (DEBUG) {
-		  if (val_i != 0) {
-	            printf("Adding to residual pos %d value %g (comp %d)\n", 
-                    pos_i, val_i, c_i);
-                  }
-                }
-              }
-	    }
-	  }
+          for (int i = 0; i < n_fns; i++) {
+            int pos_i = e->dof[c_i][i]; // matrix row
+            if (pos_i == -1) continue;
+            double val_ij = (pert[offset + i] - base[offset + i])/h;
+            if (val_ij != 0) mat->add(pos_i, pos_j, val_ij);
+          }
         }
       }
     }
-  } // end while
-
+  }
   delete I;
+  sweep_elem_cache();
 }
 
 // process boundary weak forms
@@ -214,7 +569,8 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
 
   // get solution value and derivative at the boundary point
   for(int sln=0; sln < e->n_sln; sln++) {
-    e->get_solution_point(x_phys, phys_u_prev[sln], phys_du_prevdx[sln], sln); 
+    e->get_solution_point(x_phys, phys_u_prev[sln], phys_du_prevdx[sln], sln,
+                          sln == 0 ? this->sln_vector : NULL); 
   }
 
   // surface bilinear forms
@@ -225,6 +581,9 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
       if (mfs->bdy_index != bdy_index) continue;
       int c_i = mfs->i;  
       int c_j = mfs->j;  
+      // symmetric problem: the form (c_j, c_i) is the transposed 
+      // form (c_i, c_j)
+      if (this->symmetric && c_i > c_j) continue;
 
       // loop over test functions on the boundary element
       for(int i=0; i<e->p + 1; i++) {
@@ -240,6 +599,7 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
             int pos_j = e->dof[c_j][j]; // matrix column
             // if j-th basis function is active
             if(pos_j != -1) {
+              if (this->symmetric && c_i == c_j && pos_i > pos_j) continue;
               // transform j-th basis function to the boundary element
               element_shapefn_point(x_ref, e->x1, e->x2, j, phys_u, 
                                     phys_dudx); 
@@ -251,7 +611,13 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
   	      // truncating
 	      if(fabs(val_ij_surf) < 1e-12) val_ij_surf = 0.0; 
               // add the result to the matrix
-              if (val_ij_surf != 0) mat->add(pos_i, pos_j, val_ij_surf);
+              if (val_ij_surf != 0) {
+                if (this->symmetric) 
+                  mat->add(std::min(pos_i, pos_j), std::max(pos_i, pos_j), 
+                           val_ij_surf);
+                else
+                  mat->add(pos_i, pos_j, val_ij_surf);
+              }
             }
           }
 	}
@@ -261,6 +627,9 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
 
   // surface part of residual
   if(matrix_flag == 0 || matrix_flag == 2) {
+    int n_fns = e->p + 1;
+    std::vector<double> out(this->vector_forms_surf.size()*n_fns);
+    if (!out.empty()) eval_surf_vector_forms(e, bdy_index, x_phys, &out[0]);
     for (int ww = 0; ww < this->vector_forms_surf.size(); ww++)
     {
       VectorFormSurf *vfs = &this->vector_forms_surf[ww];
@@ -268,17 +637,10 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
       int c_i = vfs->i;  
 
       // loop over test functions on the boundary element
-      for(int i=0; i<e->p + 1; i++) {
-        double phys_v, phys_dvdx; 
+      for(int i=0; i<n_fns; i++) {
         int pos_i = e->dof[c_i][i]; // matrix row
         if(pos_i != -1) {
-          // transform j-th basis function to the boundary element
-          element_shapefn_point(x_ref, e->x1, e->x2, i, phys_v, 
-                                phys_dvdx); 
-          // evaluate the surface bilinear form
-          double val_i_surf = vfs->fn(x_phys,
-                          phys_u_prev, phys_du_prevdx, phys_v, phys_dvdx, 
-                          NULL);
+          double val_i_surf = out[ww*n_fns + i];
           // truncating
           if(fabs(val_i_surf) < 1e-12) val_i_surf = 0.0; 
           // add the result to the matrix
@@ -290,6 +652,151 @@ void DiscreteProblem::process_surf_forms(Mesh *mesh, Matrix *mat, double *res,
   delete I;
 }
 
+void DiscreteProblem::eval_surf_vector_forms(Element *e, int bdy_index, 
+                                             double x_phys, double *out) {
+  // evaluate previous solution and its derivative at the end point
+  double phys_u_prev[MAX_SLN_NUM][MAX_EQN_NUM], 
+         phys_du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM]; // at the end point
+  double x_ref = (bdy_index == BOUNDARY_LEFT) ? -1 : 1;
+  for(int sln=0; sln < e->n_sln; sln++) {
+    e->get_solution_point(x_phys, phys_u_prev[sln], phys_du_prevdx[sln], sln,
+                          sln == 0 ? this->sln_vector : NULL); 
+  }
+
+  int n_fns = e->p + 1;
+  for (int ww = 0; ww < this->vector_forms_surf.size(); ww++)
+  {
+    VectorFormSurf *vfs = &this->vector_forms_surf[ww];
+    if (vfs->bdy_index != bdy_index) continue;
+    int c_i = vfs->i;  
+
+    // loop over test functions on the boundary element
+    for(int i=0; i<n_fns; i++) {
+      double phys_v, phys_dvdx; 
+      if (e->dof[c_i][i] == -1) {
+        out[ww*n_fns + i] = 0;
+        continue;
+      }
+      // transform i-th test function to the boundary element
+      element_shapefn_point(x_ref, e->x1, e->x2, i, phys_v, phys_dvdx); 
+      // evaluate the surface linear form
+      out[ww*n_fns + i] = vfs->fn(x_phys, phys_u_prev, phys_du_prevdx, 
+                                  phys_v, phys_dvdx, NULL);
+    }
+  }
+}
+
+// adds all pairs (dof[c_i][i], dof[c_j][j]) of active dofs 
+// in element 'e' to the sparsity pattern 'rows' (only the upper 
+// triangle if 'upper' is set)
+static void add_elem_pattern(Element *e, int c_i, int c_j, bool upper, 
+                             std::vector<std::vector<int> > &rows) {
+  for(int i=0; i<e->p + 1; i++) {
+    int pos_i = e->dof[c_i][i]; // matrix row
+    if(pos_i == -1) continue;
+    for(int j=0; j < e->p + 1; j++) {
+      int pos_j = e->dof[c_j][j]; // matrix column
+      if(pos_j == -1) continue;
+      if (upper) 
+        rows[std::min(pos_i, pos_j)].push_back(std::max(pos_i, pos_j));
+      else 
+        rows[pos_i].push_back(pos_j);
+    }
+  }
+}
+
+// converts the rows of the pattern to the CSR arrays
+static void create_csr_pattern(std::vector<std::vector<int> > &rows, 
+                               int &nnz, int *&Ap, int *&Ai) {
+  int n_dof = rows.size();
+  nnz = 0;
+  for (int i = 0; i < n_dof; i++) nnz += rows[i].size();
+
+  Ap = new int[n_dof + 1];
+  Ai = new int[nnz];
+  Ap[0] = 0;
+  for (int i = 0; i < n_dof; i++) {
+    Ap[i+1] = Ap[i] + rows[i].size();
+    for (int k = 0; k < rows[i].size(); k++) Ai[Ap[i] + k] = rows[i][k];
+  }
+}
+
+// The pattern contains every position that process_vol_forms(),
+// process_surf_forms() and process_fd_jacobian() can write to, so it 
+// only has to be created again when the mesh (and thus the dof 
+// numbering) changes.
+void DiscreteProblem::create_sparse_rows(Mesh *mesh, bool upper, 
+                                         std::vector<std::vector<int> > &rows) {
+  rows.assign(mesh->get_n_dof(), std::vector<int>());
+
+  // volumetric bilinear forms
+  Iterator *I = new Iterator(mesh);
+  Element *e;
+  while ((e = I->next_active_element()) != NULL) {
+    // the finite difference Jacobi matrix couples all solution 
+    // components in the element
+    if (this->fd_jacobian) {
+      for (int c_i = 0; c_i < mesh->get_n_eq(); c_i++) 
+        for (int c_j = 0; c_j < mesh->get_n_eq(); c_j++) 
+          add_elem_pattern(e, c_i, c_j, upper, rows);
+      continue;
+    }
+    for (int ww = 0; ww < this->matrix_forms_vol.size(); ww++) {
+      MatrixFormVol *mfv = &this->matrix_forms_vol[ww];
+      if (e->marker == mfv->marker || mfv->marker == ANY) 
+        add_elem_pattern(e, mfv->i, mfv->j, upper, rows);
+    }
+  }
+
+  // surface bilinear forms
+  for (int ww = 0; ww < this->matrix_forms_surf.size() && !this->fd_jacobian; 
+       ww++) {
+    MatrixFormSurf *mfs = &this->matrix_forms_surf[ww];
+    if (mfs->bdy_index == BOUNDARY_LEFT) e = I->first_active_element();
+    else e = I->last_active_element();
+    add_elem_pattern(e, mfs->i, mfs->j, upper, rows);
+  }
+  delete I;
+
+  // sort column indices and remove duplicates
+  for (int i = 0; i < rows.size(); i++) {
+    std::sort(rows[i].begin(), rows[i].end());
+    rows[i].erase(std::unique(rows[i].begin(), rows[i].end()), rows[i].end());
+  }
+}
+
+void DiscreteProblem::create_sparse_structure(Mesh *mesh, CSRMatrix *mat) {
+  std::vector<std::vector<int> > rows;
+  create_sparse_rows(mesh, false, rows);
+  int nnz, *Ap, *Ai;
+  create_csr_pattern(rows, nnz, Ap, Ai);
+  mat->create(rows.size(), nnz, Ap, Ai);
+}
+
+void DiscreteProblem::create_sparse_structure(Mesh *mesh, SymCSRMatrix *mat) {
+  std::vector<std::vector<int> > rows;
+  create_sparse_rows(mesh, true, rows);
+  int nnz, *Ap, *Ai;
+  create_csr_pattern(rows, nnz, Ap, Ai);
+  mat->create(rows.size(), nnz, Ap, Ai);
+}
+
+void create_element_blocks(Mesh *mesh, CommonPreconditionerBlockJacobi *precond) {
+  int n_eq = mesh->get_n_eq();
+  std::vector<int> ptr(1, 0), idx;
+  Iterator *I = new Iterator(mesh);
+  Element *e;
+  while ((e = I->next_active_element()) != NULL) {
+    for (int c = 0; c < n_eq; c++)
+      for (int i = 0; i < e->p + 1; i++)
+        if (e->dof[c][i] != -1) idx.push_back(e->dof[c][i]);
+    ptr.push_back(idx.size());
+  }
+  delete I;
+  if (idx.empty()) error("create_element_blocks(): no dofs in the mesh.");
+  precond->set_blocks(ptr.size() - 1, &ptr[0], &idx[0]);
+}
+
 // construct Jacobi matrix or residual vector
 // matrix_flag == 0... assembling Jacobi matrix and residual vector together
 // matrix_flag == 1... assembling Jacobi matrix only
@@ -304,18 +811,35 @@ void DiscreteProblem::assemble(Mesh *mesh, Matrix *mat, double *res,
   // total number of unknowns
   int n_dof = mesh->get_n_dof();
 
+  // only the upper triangle is assembled for a symmetric problem
+  if (this->symmetric && (matrix_flag == 0 || matrix_flag == 1) 
+      && dynamic_cast<SymCSRMatrix*>(mat) == NULL)
+    error("The matrix of a symmetric problem has to be a SymCSRMatrix.");
+
   // erase residual vector
   if(matrix_flag == 0 || matrix_flag == 2) 
     for(int i=0; i<n_dof; i++) res[i] = 0;
 
-  // process volumetric weak forms via an element loop
-  process_vol_forms(mesh, mat, res, matrix_flag);
+  // the finite difference Jacobi matrix is assembled separately, the 
+  // forms only give the residual vector
+  int forms_flag = matrix_flag;
+  if (this->fd_jacobian && (matrix_flag == 0 || matrix_flag == 1)) {
+    if (this->symmetric) 
+      error("The finite difference Jacobi matrix cannot be used for a symmetric problem.");
+    process_fd_jacobian(mesh, mat);
+    forms_flag = (matrix_flag == 0) ? 2 : -1;
+  }
+
+  if (forms_flag != -1) {
+    // process volumetric weak forms via an element loop
+    process_vol_forms(mesh, mat, res, forms_flag);
 
-  // process surface weak forms for the left boundary
-  process_surf_forms(mesh, mat, res, matrix_flag, BOUNDARY_LEFT);
+    // process surface weak forms for the left boundary
+    process_surf_forms(mesh, mat, res, forms_flag, BOUNDARY_LEFT);
 
-  // process surface weak forms for the right boundary
-  process_surf_forms(mesh, mat, res, matrix_flag, BOUNDARY_RIGHT);
+    // process surface weak forms for the right boundary
+    process_surf_forms(mesh, mat, res, forms_flag, BOUNDARY_RIGHT);
+  }
 
   // DEBUG: print Jacobi matrix
   if(DEBUG && (matrix_flag == 0 || matrix_flag == 1)) {
@@ -355,11 +879,136 @@ void DiscreteProblem::assemble_vector(Mesh *mesh, double *res) {
   assemble(mesh, void_mat, res, 2);
 } 
 
+// construct residual vector for the solution vector 'y'
+void DiscreteProblem::assemble_vector(Mesh *mesh, double *y, double *res) {
+  this->sln_vector = y;
+  assemble_vector(mesh, res);
+  this->sln_vector = NULL;
+} 
+
+// creates the Jacobi matrix for the Newton's method (the sparsity 
+// pattern does not change during the iteration, so it is created only
+// once and then the values are refilled; only the upper triangle is 
+// stored for a symmetric problem)
+static Matrix *create_jacobi_matrix(DiscreteProblem *dp, Mesh *mesh) 
+{
+  int n_dof = mesh->get_n_dof();
+  if (dp->is_symmetric()) {
+    SymCSRMatrix *mat_sym = new SymCSRMatrix(n_dof);
+    dp->create_sparse_structure(mesh, mat_sym);
+    return mat_sym;
+  }
+  else {
+    CSRMatrix *mat_csr = new CSRMatrix(n_dof);
+    dp->create_sparse_structure(mesh, mat_csr);
+    return mat_csr;
+  }
+}
+
+// number of the nonzeros of a matrix created by create_jacobi_matrix()
+static int get_jacobi_matrix_nnz(Matrix *mat)
+{
+  if (CSRMatrix *mat_csr = dynamic_cast<CSRMatrix*>(mat)) 
+    return mat_csr->get_nnz();
+  if (SymCSRMatrix *mat_sym = dynamic_cast<SymCSRMatrix*>(mat)) 
+    return mat_sym->get_nnz();
+  return 0;
+}
+
+// solves the matrix system by 'solver' (by the SparseLib++ CGS solver 
+// if NULL) and fills the solver statistics of the iteration 'it'
+static void solve_newton_system(CommonSolver *solver, Matrix *mat, 
+                                double *res, NewtonIterationStats &it)
+{
+  TimePeriod timer;
+  CommonSolverSparseLib solver_cgs;
+  if (solver == NULL) solver = &solver_cgs;
+  solver->solve(mat, res);
+  it.solve_time = timer.tick().last();
+  it.linear_iter_num = solver->get_stats().iter_num;
+  it.factorization_reused = solver->get_stats().factorization_reused;
+}
+
+// the verbose output of an iteration of the Newton's methods
+static void print_iteration_stats(NewtonIterationStats &it)
+{
+  printf("Residual norm: %.15f\n", it.res_norm);
+}
+
+// Newton's iteration for a linear problem (see 
+// DiscreteProblem::set_linear()): the Jacobi matrix 'mat' and the 
+// residual vector are assembled only once, the next residual vectors 
+// are F(y + dy) = F(y) + J*dy. More than one solve (with the same 
+// matrix) is only needed if the matrix solver is not accurate enough.
+static void newton_linear(DiscreteProblem *dp, Mesh *mesh, 
+                          CommonSolver *solver, Matrix *mat, 
+                          double *y, double *res, 
+                          double newton_tol, int newton_maxiter, 
+                          bool verbose, 
+                          std::vector<NewtonIterationStats> *stats)
+{
+  int n_dof = mesh->get_n_dof();
+  // residual vector F(y) and the product J*dy
+  double *f = new double[n_dof];
+  double *mat_dy = new double[n_dof];
+  NewtonIterationStats it;
+  TimePeriod timer;
+  dp->assemble_matrix_and_vector(mesh, mat, f);
+  it.assembly_time = timer.tick().last();
+  it.nnz = get_jacobi_matrix_nnz(mat);
+
+  FactorizationScheme scheme = solver ? solver->get_factorization_scheme() 
+                                      : REUSE_SYMBOLIC;
+  int newton_iter_num = 0;
+  while (1) {
+    // calculate L2 norm of residual vector
+    double res_norm_squared = 0;
+    for(int i=0; i<n_dof; i++) res_norm_squared += f[i]*f[i];
+    it.res_norm = sqrt(res_norm_squared);
+
+    // the system is solved at least once
+    if (verbose) print_iteration_stats(it);
+    if(res_norm_squared < newton_tol*newton_tol && newton_iter_num > 0) {
+      if (stats) stats->push_back(it);
+      break;
+    }
+    if (newton_iter_num >= newton_maxiter) {
+      error("Newton's iteration did not converge.");
+    }
+
+    // solving the matrix system J*dy = -F(y) (the factorization 
+    // is reused if the system is solved again)
+    for(int i=0; i<n_dof; i++) res[i] = -f[i];
+    if (solver) 
+      solver->set_factorization_scheme(newton_iter_num > 0 ? 
+                                       REUSE_FACTORIZATION : scheme);
+    solve_newton_system(solver, mat, res, it);
+
+    // updating vector y and the residual vector
+    mat->times_vector(res, mat_dy, n_dof);
+    for(int i=0; i<n_dof; i++) {
+      y[i] += res[i];
+      f[i] += mat_dy[i];
+    }
+    if (stats) stats->push_back(it);
+    it = NewtonIterationStats();
+    newton_iter_num++;
+  }
+
+  // copy coefficients from vector y to elements
+  copy_vector_to_mesh(y, mesh);
+
+  if (solver) solver->set_factorization_scheme(scheme);
+  delete [] f;
+  delete [] mat_dy;
+}
+
 // Newton's iteration
 void newton(DiscreteProblem *dp, Mesh *mesh,
             CommonSolver *solver,
             double newton_tol, int newton_maxiter,
-            bool verbose)
+            bool verbose, int newton_reuse, double newton_contraction, 
+            std::vector<NewtonIterationStats> *stats)
 {
   int newton_iter_num = 0;
   int n_dof = mesh->get_n_dof();
@@ -374,14 +1023,42 @@ void newton(DiscreteProblem *dp, Mesh *mesh,
   copy_mesh_to_vector(mesh, y);
 
   // Newton iteration
-  CooMatrix *mat = NULL;
+  if (stats) stats->clear();
+  Matrix *mat = create_jacobi_matrix(dp, mesh);
+  // linear problem: the system is assembled only once
+  if (dp->is_linear()) {
+    newton_linear(dp, mesh, solver, mat, y, res, newton_tol, newton_maxiter, 
+                  verbose, stats);
+    delete mat;
+    delete [] y;
+    delete [] res;
+    return;
+  }
+
+  // modified Newton: number of iterations with the current 
+  // Jacobi matrix, residual norm from the previous iteration
+  FactorizationScheme scheme = solver ? solver->get_factorization_scheme() 
+                                      : REUSE_SYMBOLIC;
+  bool reuse = false;
+  int reuse_num = 0;
+  double res_norm_prev = 0;
+  TimePeriod timer;
   while (1) {
-    // Reset the matrix:
-    if (mat != NULL) delete mat;
-    mat = new CooMatrix();
+    NewtonIterationStats it;
+    timer.tick(H2D_SKIP);
+    if (reuse) {
+      // only the residual vector, the Jacobi matrix is kept
+      dp->assemble_vector(mesh, res);
+    }
+    else {
+      // Reset the matrix:
+      mat->set_zero();
 
-    // construct matrix and residual vector
-    dp->assemble_matrix_and_vector(mesh, mat, res);
+      // construct matrix and residual vector
+      dp->assemble_matrix_and_vector(mesh, mat, res);
+      it.nnz = get_jacobi_matrix_nnz(mat);
+    }
+    it.assembly_time = timer.tick().last();
 
     // debug
     //mat->print();
@@ -390,23 +1067,42 @@ void newton(DiscreteProblem *dp, Mesh *mesh,
     // calculate L2 norm of residual vector
     double res_norm_squared = 0;
     for(int i=0; i<n_dof; i++) res_norm_squared += res[i]*res[i];
+    it.res_norm = sqrt(res_norm_squared);
 
     // If residual norm less than 'newton_tol', quit
     // latest solution is in the vector y.
     // NOTE: at least one full iteration forced
     //       here because sometimes the initial
     //       residual on fine mesh is too small
-    if (verbose) printf("Residual norm: %.15f\n", sqrt(res_norm_squared));
-    if(res_norm_squared < newton_tol*newton_tol && newton_iter_num > 1) break;
+    if (verbose) print_iteration_stats(it);
+    if(res_norm_squared < newton_tol*newton_tol && newton_iter_num > 1) {
+      if (stats) stats->push_back(it);
+      break;
+    }
+
+    // if the old Jacobi matrix was used too many times or the 
+    // convergence slowed down, update it 
+    if (reuse && (reuse_num >= newton_reuse || 
+        sqrt(res_norm_squared) > newton_contraction*res_norm_prev)) {
+      timer.tick(H2D_SKIP);
+      mat->set_zero();
+      dp->assemble_matrix(mesh, mat);
+      it.assembly_time += timer.tick().last();
+      it.nnz = get_jacobi_matrix_nnz(mat);
+      reuse = false;
+    }
+    if (reuse) reuse_num++;
+    else reuse_num = 0;
+    res_norm_prev = sqrt(res_norm_squared);
 
     // changing sign of vector res
     for(int i=0; i<n_dof; i++) res[i]*= -1;
 
     // solving the matrix system
-    if (solver)
-        solver->solve(mat, res);
-    else
-        solve_linear_system_sparselib_cgs(mat, res);
+    if (solver) 
+      solver->set_factorization_scheme(reuse ? REUSE_FACTORIZATION : scheme);
+    solve_newton_system(solver, mat, res, it);
+    reuse = newton_reuse > 0;
 
     // updating vector y by new solution which is in res
     for(int i=0; i<n_dof; i++) y[i] += res[i];
@@ -414,151 +1110,325 @@ void newton(DiscreteProblem *dp, Mesh *mesh,
     // copy coefficients from vector y to elements
     copy_vector_to_mesh(y, mesh);
 
+    if (stats) stats->push_back(it);
     newton_iter_num++;
     if (newton_iter_num >= newton_maxiter) {
       error("Newton's iteration did not converge.");
     }
   }
 
+  if (solver) solver->set_factorization_scheme(scheme);
   if (mat != NULL) delete mat;
   if (y != NULL) delete [] y;
   if (res != NULL) delete [] res;
 }
 
-void J_dot_vec_jfnk(DiscreteProblem *dp, Mesh *mesh, double* vec,
-                    double* y_orig, double* f_orig, 
-                    double* J_dot_vec,
-                    double jfnk_epsilon, int n_dof) 
-{
-  double y_perturbed[MAX_N_DOF];
-  double f_perturbed[MAX_N_DOF];
-  for (int i=0; i<n_dof; i++) {
-    y_perturbed[i] = y_orig[i] + jfnk_epsilon*vec[i];
-  }
-  copy_vector_to_mesh(y_perturbed, mesh);
-  dp->assemble_vector(mesh, f_perturbed); 
-  copy_vector_to_mesh(y_orig, mesh);
-  for (int i=0; i<n_dof; i++) {
-    J_dot_vec[i] = (f_perturbed[i] - f_orig[i])/jfnk_epsilon;
-  }
-}
-
-// CG method adjusted for JFNK
-// NOTE: 
-void jfnk_cg(DiscreteProblem *dp, Mesh *mesh, 
-             double matrix_solver_tol, int matrix_solver_maxiter, 
-	     double jfnk_epsilon, double tol_jfnk, int jfnk_maxiter, bool verbose)
+// parameters of the Eisenstat-Walker forcing terms (choice 2) and of 
+// the line search in newton_inexact()
+#define EW_GAMMA 0.9
+#define EW_ALPHA 2.0
+#define LINE_SEARCH_T 1e-4
+#define LINE_SEARCH_MAXITER 20
+
+int newton_inexact(DiscreteProblem *dp, Mesh *mesh, 
+                   CommonSolver *solver,
+                   double newton_tol, int newton_maxiter,
+                   bool verbose, double eta_max, 
+                   std::vector<NewtonIterationStats> *stats)
 {
+  if (solver == NULL) error("newton_inexact() needs an iterative solver.");
   int n_dof = mesh->get_n_dof();
-  // vectors for JFNK
-  double f_orig[MAX_N_DOF];
-  double y_orig[MAX_N_DOF];
-  double vec[MAX_N_DOF];
-  double rhs[MAX_N_DOF];
-
-  // vectors for the CG method
-  double r[MAX_N_DOF];
-  double p[MAX_N_DOF];
-  double J_dot_vec[MAX_N_DOF];
-
-  /*
-  // debug
-  // fill vector y_orig using dof and coeffs arrays in elements
-  copy_mesh_to_vector(mesh, y_orig);
-  dp->assemble_vector(mesh, f_orig); 
-  double *w = new double[n_dof];
-  for(int i=0; i<n_dof; i++) w[i] = 0;
-  w[0] = 1;
-  J_dot_vec_jfnk(dp, mesh, w, y_orig, f_orig, 
-                 J_dot_vec, jfnk_epsilon, n_dof);
-  printf("   J_dot_vec = ");
-  for (int i=0; i < n_dof; i++) {
-    printf("%g ", J_dot_vec[i]);
-  }
-  printf("\n\n");
-  */
+  double *y = new double[n_dof];
+  double *f = new double[n_dof];
+  double *dy = new double[n_dof];
+  double *y_trial = new double[n_dof];
+  double *f_trial = new double[n_dof];
 
-  // JFNK loop
-  int jfnk_iter_num = 1;
+  // fill vector y using dof and coeffs arrays
+  // in elements
+  copy_mesh_to_vector(mesh, y);
+  Matrix *mat = create_jacobi_matrix(dp, mesh);
+  double tol_orig = solver->get_tolerance();
+  if (stats) stats->clear();
+
+  // only the first residual vector is assembled here, the next ones are 
+  // assembled by the line search (a part of the previous iteration)
+  NewtonIterationStats it;
+  TimePeriod timer;
+  dp->assemble_vector(mesh, f);
+  it.assembly_time = timer.tick().last();
+  double res_norm = 0;
+  for(int i=0; i<n_dof; i++) res_norm += f[i]*f[i];
+  res_norm = sqrt(res_norm);
+
+  int newton_iter_num = 0, linear_iter_num = 0, backtrack_num = 0;
+  double eta = eta_max, res_norm_prev = 0;
   while (1) {
-    // fill vector y_orig using dof and coeffs arrays in elements
-    copy_mesh_to_vector(mesh, y_orig);
-
-    // construct residual vector f_orig corresponding to y_orig
-    // (f_orig stays unchanged through the entire CG loop)
-    dp->assemble_vector(mesh, f_orig); 
-
-    // calculate L2 norm of f_orig
-    double res_norm_squared = 0;
-    for(int i=0; i<n_dof; i++) res_norm_squared += f_orig[i]*f_orig[i];
+    it.res_norm = res_norm;
+    if (verbose) print_iteration_stats(it);
+    if (res_norm < newton_tol) {
+      if (stats) stats->push_back(it);
+      break;
+    }
+    if (newton_iter_num >= newton_maxiter) {
+      error("Newton's iteration did not converge.");
+    }
 
-    // If residual norm less than 'tol_jfnk', break
-    if (verbose) printf("Residual norm: %.15f\n", sqrt(res_norm_squared));
-    if(res_norm_squared < tol_jfnk*tol_jfnk) break;
+    // forcing term: the relative tolerance of the linear system, 
+    // small when the residual decreases fast (Eisenstat-Walker)
+    if (newton_iter_num > 0) {
+      double eta_new = EW_GAMMA*pow(res_norm/res_norm_prev, EW_ALPHA);
+      // safeguard against too small forcing terms
+      double eta_safe = EW_GAMMA*pow(eta, EW_ALPHA);
+      if (eta_safe > 0.1) eta_new = std::max(eta_new, eta_safe);
+      eta = eta_new;
+    }
+    // no need to solve more accurately than the Newton's tolerance
+    eta = std::min(eta_max, std::max(eta, 0.5*newton_tol/res_norm));
+
+    // solving the matrix system J*dy = -F(y) inexactly
+    timer.tick(H2D_SKIP);
+    mat->set_zero();
+    dp->assemble_matrix(mesh, mat);
+    it.assembly_time += timer.tick().last();
+    it.nnz = get_jacobi_matrix_nnz(mat);
+    for(int i=0; i<n_dof; i++) dy[i] = -f[i];
+    solver->set_tolerance(eta);
+    // the direct solvers ignore the tolerance
+    if (solver->get_tolerance() != eta) 
+      error("newton_inexact() needs a solver with a relative tolerance.");
+    solve_newton_system(solver, mat, dy, it);
+    linear_iter_num += it.linear_iter_num;
+
+    // backtracking line search: the step is shortened until the 
+    // residual norm decreases enough (the residual vector of the 
+    // accepted step is used in the next iteration)
+    double lambda = 1, eta_step = eta, res_norm_trial;
+    int line_search_iter = 0;
+    timer.tick(H2D_SKIP);
+    while (1) {
+      for(int i=0; i<n_dof; i++) y_trial[i] = y[i] + lambda*dy[i];
+      copy_vector_to_mesh(y_trial, mesh);
+      dp->assemble_vector(mesh, f_trial);
+      res_norm_trial = 0;
+      for(int i=0; i<n_dof; i++) res_norm_trial += f_trial[i]*f_trial[i];
+      res_norm_trial = sqrt(res_norm_trial);
+      if (res_norm_trial <= (1 - LINE_SEARCH_T*(1 - eta_step))*res_norm) break;
+      if (++line_search_iter > LINE_SEARCH_MAXITER) 
+        error("Line search in newton_inexact() failed.");
+      lambda /= 2;
+      eta_step = 1 - (1 - eta_step)/2;
+      backtrack_num++;
+    }
+    it.assembly_time += timer.tick().last();
+    it.backtrack_num = line_search_iter;
+    if (verbose && lambda < 1) printf("Line search: step %g\n", lambda);
+    if (stats) stats->push_back(it);
+    it = NewtonIterationStats();
+
+    std::swap(y, y_trial);
+    std::swap(f, f_trial);
+    res_norm_prev = res_norm;
+    res_norm = res_norm_trial;
+    newton_iter_num++;
+  }
 
-    if (verbose) printf("JFNK iteration: %d\n", jfnk_iter_num);
+  if (verbose) {
+    printf("Inexact Newton: %d iteration(s), %d step reduction(s), "
+           "%d linear solver iteration(s)\n", 
+           newton_iter_num, backtrack_num, linear_iter_num);
+  }
 
-    // right-hand side is negative residual
-    // (rhs stays unchanged through the CG loop)
-    for(int i=0; i<n_dof; i++) rhs[i] = -f_orig[i];
+  solver->set_tolerance(tol_orig);
+  delete mat;
+  delete [] y;
+  delete [] f;
+  delete [] dy;
+  delete [] y_trial;
+  delete [] f_trial;
+  return newton_iter_num;
+}
 
-    // beginning CG method
-    // r = rhs - A*vec0 (where the initial vector vec0 = 0)
-    for (int i=0; i < n_dof; i++) r[i] = rhs[i];
-    // p = r
-    for (int i=0; i < n_dof; i++) p[i] = r[i];
+// Matrix-free Jacobi matrix of the JFNK method at the solution vector 'y'
+// with the residual vector 'f' = F(y): the product with a vector v is the
+// finite difference (F(y + h*v) - F(y))/h, h = eps*(1 + |y|)/|v|. The 
+// perturbed residual vectors are assembled directly from the vector 
+// y + h*v, the mesh is not changed.
+class JfnkMatrix : public Matrix {
+public:
+  JfnkMatrix(DiscreteProblem *dp, Mesh *mesh, double *y, double *f, 
+             double eps) {
+    this->dp = dp;
+    this->mesh = mesh;
+    this->y = y;
+    this->f = f;
+    this->eps = eps;
+    this->size = mesh->get_n_dof();
+    this->complex = false;
+    this->y_perturbed.resize(this->size);
+    this->f_perturbed.resize(this->size);
+    this->product_num = 0;
+  }
 
-    // CG loop
-    int iter_current = 0;
-    double tol_current_squared;
-    // initializing the solution vector with zero
-    for(int i=0; i<n_dof; i++) vec[i] = 0;
-    while (1) {
-      J_dot_vec_jfnk(dp, mesh, p, y_orig, f_orig,
-                     J_dot_vec, jfnk_epsilon, n_dof);
-      double r_times_r = vec_dot(r, r, n_dof);
-      double alpha = r_times_r / vec_dot(p, J_dot_vec, n_dof); 
-      for (int i=0; i < n_dof; i++) {
-        vec[i] += alpha*p[i];
-        r[i] -= alpha*J_dot_vec[i];
-      }
-      /*
-      // debug - output of solution vector
-      printf("   vec = ");
-      for (int i=0; i < n_dof; i++) {
-        printf("%g ", vec[i]);
-      }
-      printf("\n");
-      */
+  virtual void free_data() {}
+  virtual void set_zero() {}
+  virtual void print() { 
+    printf("JFNK Jacobi matrix (matrix-free) of size %d\n", this->size); 
+  }
+  virtual void add(int m, int n, double v) { 
+    error("The JFNK Jacobi matrix is matrix-free, add() is not supported.");
+  }
+  virtual double get(int m, int n) { 
+    error("The JFNK Jacobi matrix is matrix-free, get() is not supported.");
+    return 0;
+  }
+  virtual void copy_into(Matrix *m) { 
+    error("The JFNK Jacobi matrix is matrix-free, copy_into() is not supported.");
+  }
 
-      double r_times_r_new = vec_dot(r, r, n_dof);
-      iter_current++;
-      tol_current_squared = r_times_r_new;
-      if (tol_current_squared < matrix_solver_tol*matrix_solver_tol 
-          || iter_current >= matrix_solver_maxiter) break;
-      double beta = r_times_r_new/r_times_r;
-      for (int i=0; i < n_dof; i++) p[i] = r[i] + beta*p[i];
-    }
-    // check whether CG converged
-    if (verbose) printf("CG (JFNK) made %d iteration(s) (tol = %g)\n", 
-           iter_current, sqrt(tol_current_squared));
-    if(tol_current_squared > matrix_solver_tol*matrix_solver_tol) {
-      error("CG (JFNK) did not converge.");
+  virtual void times_vector(double *vec, double *result, int rank) {
+    double vec_norm = sqrt(vec_dot(vec, vec, rank));
+    if (vec_norm == 0) {
+      for (int i=0; i < rank; i++) result[i] = 0;
+      return;
     }
+    double h = this->eps*(1 + sqrt(vec_dot(this->y, this->y, rank)))/vec_norm;
+    for (int i=0; i < rank; i++) 
+      this->y_perturbed[i] = this->y[i] + h*vec[i];
+    this->dp->assemble_vector(this->mesh, &this->y_perturbed[0], 
+                              &this->f_perturbed[0]);
+    for (int i=0; i < rank; i++) 
+      result[i] = (this->f_perturbed[i] - this->f[i])/h;
+    this->product_num++;
+  }
 
-    // updating vector y_orig by new solution which is in x
-    for(int i=0; i<n_dof; i++) y_orig[i] += vec[i];
+  // number of the products (residual vector assemblies)
+  int product_num;
+
+private:
+  DiscreteProblem *dp;
+  Mesh *mesh;
+  double *y, *f;
+  double eps;
+  std::vector<double> y_perturbed, f_perturbed;
+};
+
+// The preconditioner of jfnk_gmres(): 'precond' is set up with the 
+// assembled Jacobi matrix by jfnk_gmres(), the setup with the matrix-free
+// Jacobi matrix (by the solver) does nothing.
+class JfnkPreconditioner : public CommonPreconditioner {
+public:
+  JfnkPreconditioner(CommonPreconditioner *precond) { 
+    this->precond = precond; 
+  }
+  virtual void setup(Matrix *mat) {}
+  virtual void apply(double *r, double *z) { this->precond->apply(r, z); }
+
+private:
+  CommonPreconditioner *precond;
+};
+
+int jfnk_gmres(DiscreteProblem *dp, Mesh *mesh, 
+               double matrix_solver_tol, int matrix_solver_maxiter, 
+               double jfnk_epsilon, double jfnk_tol, int jfnk_maxiter, 
+               CommonPreconditioner *precond, int precond_lag, 
+               DiscreteProblem *dp_precond, bool verbose, 
+               std::vector<NewtonIterationStats> *stats)
+{
+  int n_dof = mesh->get_n_dof();
+  double *y = new double[n_dof];
+  double *f = new double[n_dof];
+  double *dy = new double[n_dof];
+  if (y == NULL || f == NULL || dy == NULL)
+    error("vectors could not be allocated in jfnk_gmres().");
 
-    // copying vector y_orig to mesh elements
-    copy_vector_to_mesh(y_orig, mesh);
+  // fill vector y using dof and coeffs arrays in elements
+  copy_mesh_to_vector(mesh, y);
 
-    jfnk_iter_num++;
+  JfnkMatrix mat(dp, mesh, y, f, jfnk_epsilon);
+  CommonSolverGMRES solver;
+  solver.set_tolerance(matrix_solver_tol);
+  solver.set_maxiter(matrix_solver_maxiter);
+
+  // the preconditioner is set up with the Jacobi matrix assembled by 
+  // 'dp_precond' (the sparsity pattern is created only once)
+  JfnkPreconditioner jfnk_precond(precond);
+  Matrix *mat_precond = NULL;
+  if (precond != NULL) {
+    if (precond_lag < 1) error("precond_lag in jfnk_gmres() must be positive.");
+    if (dp_precond == NULL) dp_precond = dp;
+    mat_precond = create_jacobi_matrix(dp_precond, mesh);
+    solver.set_preconditioner(&jfnk_precond);
+  }
+
+  // JFNK loop
+  if (stats) stats->clear();
+  int jfnk_iter_num = 0, linear_iter_num = 0;
+  TimePeriod timer;
+  while (1) {
+    // construct residual vector f corresponding to y (from the vector, 
+    // like in the products, the solution coefficients in the mesh need not
+    // be the same before the first update); f stays unchanged through 
+    // the entire GMRES solve
+    NewtonIterationStats it;
+    timer.tick(H2D_SKIP);
+    dp->assemble_vector(mesh, y, f); 
+    it.assembly_time = timer.tick().last();
+
+    // calculate L2 norm of f
+    double res_norm_squared = 0;
+    for(int i=0; i<n_dof; i++) res_norm_squared += f[i]*f[i];
+    it.res_norm = sqrt(res_norm_squared);
+
+    // If residual norm less than 'jfnk_tol', break
+    if (verbose) print_iteration_stats(it);
+    if(res_norm_squared < jfnk_tol*jfnk_tol) {
+      if (stats) stats->push_back(it);
+      break;
+    }
     if (jfnk_iter_num >= jfnk_maxiter) {
       error("JFNK did not converge.");
     }
+
+    if (verbose) printf("JFNK iteration: %d\n", jfnk_iter_num + 1);
+
+    // the lagged Jacobi matrix of the preconditioner (the mesh has the 
+    // current solution)
+    if (precond != NULL && jfnk_iter_num % precond_lag == 0) {
+      timer.tick(H2D_SKIP);
+      mat_precond->set_zero();
+      dp_precond->assemble_matrix(mesh, mat_precond);
+      it.assembly_time += timer.tick().last();
+      it.nnz = get_jacobi_matrix_nnz(mat_precond);
+      precond->setup(mat_precond);
+    }
+    else it.factorization_reused = precond != NULL;
+
+    // solving J*dy = -F(y) by GMRES (an inexact solution is still a 
+    // descent direction, so the iteration goes on)
+    for(int i=0; i<n_dof; i++) dy[i] = -f[i];
+    timer.tick(H2D_SKIP);
+    if (!solver.solve(&mat, dy) && verbose) 
+      printf("GMRES (JFNK) did not reach the tolerance.\n");
+    it.solve_time = timer.tick().last();
+    it.linear_iter_num = solver.get_stats().iter_num;
+    linear_iter_num += it.linear_iter_num;
+
+    // updating vector y and copying it to mesh elements
+    for(int i=0; i<n_dof; i++) y[i] += dy[i];
+    copy_vector_to_mesh(y, mesh);
+
+    if (stats) stats->push_back(it);
+    jfnk_iter_num++;
   }
 
-  // copy updated vector y_orig to mesh
-  copy_vector_to_mesh(y_orig, mesh);
-}
+  if (verbose) 
+    printf("JFNK: %d iteration(s), %d GMRES iteration(s), %d residual vector(s)\n",
+           jfnk_iter_num, linear_iter_num, mat.product_num + jfnk_iter_num + 1);
 
+  if (mat_precond != NULL) delete mat_precond;
+  delete [] y;
+  delete [] f;
+  delete [] dy;
+  return jfnk_iter_num;
+}
@@ -6,6 +6,7 @@
 #ifndef _DISCRETE_H_
 #define _DISCRETE_H_
 
+#include <map>
 #include <vector>
 
 #include "mesh.h"
@@ -34,30 +35,178 @@ typedef double (*vector_form_surf) (double x, double u_prev[MAX_SLN_NUM][MAX_EQN
         double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM], double v, double dvdx,
         void *user_data);
 
+// Block forms evaluate the whole element matrix (vector) of the form in one
+// call. u[j][k] and dudx[j][k] are the value and the x-derivative of the
+// j-th shape function of the element (j = 0, ..., n_fns-1) at the k-th
+// quadrature point; the basis and test functions are the same. The form
+// fills mat[i][j] (test function i, basis function j) or vec[i].
+typedef void (*matrix_form_block) (int num, double *x, double *weights,
+        int n_fns, double u[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+        double dudx[MAX_P + 1][MAX_QUAD_PTS_NUM],
+        double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+        double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+        double **mat, void *user_data);
+
+typedef void (*vector_form_block) (int num, double *x, double *weights,
+        double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+        double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+        int n_fns, double v[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+        double dvdx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+        double *vec, void *user_data);
+
+// Bilinear forms with a constant coefficient, whose element matrix is the
+// matrix on the reference element (-1, 1) scaled by the element length h
+// (see DiscreteProblem::add_matrix_form_ref()).
+enum RefFormType {
+    REF_FORM_MASS,        // coeff * \int u v,    scaled by h/2
+    REF_FORM_STIFFNESS,   // coeff * \int u' v',  scaled by 2/h
+    REF_FORM_ADVECTION,   // coeff * \int u' v,   not scaled
+    REF_FORM_NUM
+};
+
 class DiscreteProblem {
 
 public:
     DiscreteProblem();
     void add_matrix_form(int i, int j, matrix_form fn, int marker=ANY);
+    // Adds the bilinear form 'type' (see RefFormType) with the constant
+    // coefficient 'coeff'. Its element matrices are computed from the
+    // reference element matrices, which are evaluated only once for every
+    // polynomial degree, instead of by the quadrature in every element.
+    void add_matrix_form_ref(int i, int j, int type, double coeff, 
+                             int marker=ANY);
     void add_vector_form(int i, vector_form fn, int marker=ANY);
+    // the same for the block forms (see matrix_form_block)
+    void add_matrix_form_block(int i, int j, matrix_form_block fn, 
+                               int marker=ANY);
+    void add_vector_form_block(int i, vector_form_block fn, int marker=ANY);
     void add_matrix_form_surf(int i, int j, matrix_form_surf fn, int bdy_index);
     void add_vector_form_surf(int i, vector_form_surf fn, int bdy_index);
+    // Declares the Jacobi matrix symmetric: the bilinear form (j, i) is
+    // then the transpose of the form (i, j), so only the forms with i <= j
+    // are evaluated and only the upper triangle of the matrix is assembled,
+    // which has to be a SymCSRMatrix (see CommonSolverCholesky).
+    void set_symmetric(bool symmetric) { this->symmetric = symmetric; }
+    bool is_symmetric() { return this->symmetric; }
+    // Declares the problem linear (the residual vector is F(y) = J*y - b 
+    // with a constant Jacobi matrix J): newton() then assembles the matrix
+    // and the residual vector only once, and the new residual vector 
+    // F(y + dy) = F(y) + J*dy is computed by a matrix-vector product, so 
+    // the system is usually solved only once.
+    void set_linear(bool linear) { this->linear = linear; }
+    bool is_linear() { return this->linear; }
+    // Parallel assembly: the volumetric forms are evaluated in the active 
+    // elements by OpenMP threads (if hermes1d is compiled with OpenMP). The
+    // element matrices are added to the matrix in the order of the elements,
+    // so the result is the same as in the serial assembly. The forms must
+    // not write to any shared data.
+    void set_parallel(bool parallel) { this->parallel = parallel; }
+    bool is_parallel() { return this->parallel; }
+    // The quadrature points and weights and the shape functions of every
+    // element are cached between the assemblies (e.g., the Newton 
+    // iterations), only the previous solutions are evaluated again. The 
+    // cache is indexed by the endpoints and the polynomial degree of the 
+    // element, so refined elements get new entries; the entries not used 
+    // by the last assembly are dropped at its end, this frees all of them.
+    void clear_element_cache() { this->elem_cache.clear(); }
+    int get_element_cache_size() { return this->elem_cache.size(); }
+    // Finite difference Jacobi matrix: the Jacobi matrix is computed from
+    // the vector forms (the matrix forms are not needed and not used) as
+    // the difference quotients of the element residual vectors. Every
+    // unknown y_j of an element is perturbed by fd_epsilon*(1 + |y_j|) and
+    // only the vector forms of this element are evaluated again, so every
+    // element is evaluated once per its unknowns, independently of the
+    // size of the mesh. All solution components in an element are coupled
+    // in the sparsity pattern (see create_sparse_structure()).
+    void set_fd_jacobian(bool fd_jacobian, double fd_epsilon=1e-7) { 
+        this->fd_jacobian = fd_jacobian; 
+        this->fd_epsilon = fd_epsilon; 
+    }
+    bool is_fd_jacobian() { return this->fd_jacobian; }
     // c is solution component
     void process_vol_forms(Mesh *mesh, Matrix *mat, double *res, 
                            int matrix_flag);
     // c is solution component
     void process_surf_forms(Mesh *mesh, Matrix *mat, double *res, 
                             int matrix_flag, int bdy_index);
+    // creates the sparsity pattern of the Jacobi matrix from the element
+    // dof arrays and the registered bilinear forms (all values are zero)
+    void create_sparse_structure(Mesh *mesh, CSRMatrix *mat);
+    // the same for the upper triangle of a symmetric problem
+    void create_sparse_structure(Mesh *mesh, SymCSRMatrix *mat);
     void assemble(Mesh *mesh, Matrix *mat, double *res, int matrix_flag);
     void assemble_matrix_and_vector(Mesh *mesh, Matrix *mat, double *res); 
     void assemble_matrix(Mesh *mesh, Matrix *mat);
     void assemble_vector(Mesh *mesh, double *res);
+    // residual vector for the solution vector 'y' instead of the solution
+    // coefficients in the elements (which are not changed), e.g. for the 
+    // finite difference products of the Jacobi matrix in jfnk_gmres()
+    void assemble_vector(Mesh *mesh, double *y, double *res);
 
 private:
+        // fills the (sorted, unique) column indices of every row
+        void create_sparse_rows(Mesh *mesh, bool upper,
+                                std::vector<std::vector<int> > &rows);
+        // returns the (p+1) x (p+1) reference matrix of the form 'type'
+        // (row i: test function i, column j: basis function j)
+        double *get_ref_matrix(int type, int p);
+
+        // reference matrices by form type and polynomial degree
+        std::map<int, std::vector<double> > ref_matrices[REF_FORM_NUM];
+
+        // quadrature and shape functions of one element (see 
+        // clear_element_cache())
+        struct ElemCache {
+                int order, pts_num;
+                std::vector<double> pts, weights;
+                // values and x-derivatives of the shape functions: 
+                // u[k*pts_num + i] is the k-th function at the i-th point
+                std::vector<double> u, dudx;
+                // the last assembly which used the entry
+                int epoch;
+        };
+        // endpoints and polynomial degree of the element
+        typedef std::pair<std::pair<double, double>, int> ElemCacheKey;
+        std::map<ElemCacheKey, ElemCache> elem_cache;
+        // number of the current assembly (see sweep_elem_cache())
+        int elem_cache_epoch;
+        // returns the cache entry of element 'e' (computed if needed)
+        ElemCache *get_elem_cache(Element *e);
+        // drops the cache entries not used in the current assembly (e.g.,
+        // those of the refined elements)
+        void sweep_elem_cache();
+
+        // evaluates / adds the volumetric forms of one element (see 
+        // process_vol_forms())
+        void eval_vol_forms(Element *e, ElemCache *c, int matrix_flag, 
+                            double *out);
+        void insert_vol_forms(Element *e, int matrix_flag, double *out, 
+                              Matrix *mat, double *res);
+        // evaluates the surface vector forms of the boundary element 'e'
+        // (at the point x_phys) into 'out', the element vector of every form
+        void eval_surf_vector_forms(Element *e, int bdy_index, double x_phys, 
+                                    double *out);
+        // assembles the finite difference Jacobi matrix (see 
+        // set_fd_jacobian())
+        void process_fd_jacobian(Mesh *mesh, Matrix *mat);
+
+        bool symmetric;
+        bool linear;
+        bool parallel;
+        bool fd_jacobian;
+        double fd_epsilon;
+        // solution vector of assemble_vector(mesh, y, res), NULL otherwise
+        double *sln_vector;
+
 	struct MatrixFormVol {
 		int i, j;
 		matrix_form fn;
 	        int marker;
+	        // for the forms added by add_matrix_form_ref() (fn is NULL)
+	        int ref_type;
+	        double coeff;
+	        // for the forms added by add_matrix_form_block() (fn is NULL)
+	        matrix_form_block fn_block;
 	};
 	struct MatrixFormSurf {
 		int i, j, bdy_index;
@@ -67,6 +216,8 @@ private:
 		int i;
 		vector_form fn;
 	        int marker;
+	        // for the forms added by add_vector_form_block() (fn is NULL)
+	        vector_form_block fn_block;
 	};
 	struct VectorFormSurf {
 		int i, bdy_index;
@@ -78,6 +229,10 @@ private:
 	std::vector<VectorFormSurf> vector_forms_surf;
 };
 
+// sets the blocks of the block Jacobi preconditioner to the dofs of the
+// active elements (all solution components of the element form one block)
+void create_element_blocks(Mesh *mesh, CommonPreconditionerBlockJacobi *precond);
+
 // return coefficients for all shape functions on the element m,
 // for all solution components
 void calculate_elem_coeffs(Element *e, double **coeffs, int n_eq);
@@ -91,14 +246,84 @@ void element_shapefn(double a, double b,
 void element_shapefn_point(double x_ref, double a, double b, 
 			   int k, double &val, double &der);
 
+// Statistics of one iteration of newton(), newton_inexact() and 
+// jfnk_gmres(), see their argument 'stats'. The last record is the 
+// converged one, where only the residual vector is assembled.
+struct NewtonIterationStats {
+  NewtonIterationStats() {
+    res_norm = 0;
+    assembly_time = 0;
+    nnz = 0;
+    solve_time = 0;
+    linear_iter_num = 0;
+    factorization_reused = false;
+    backtrack_num = 0;
+  }
+
+  double res_norm;             // residual norm at the beginning
+  double assembly_time;        // seconds spent in the assembly
+  int nnz;                     // nonzeros of the assembled Jacobi matrix 
+                               // (0 if it was not assembled)
+  double solve_time;           // seconds spent in the matrix solver 
+                               // (including the conversion of the matrix)
+  int linear_iter_num;         // iterations of the matrix solver
+  bool factorization_reused;   // the factorization (the preconditioner in
+                               // jfnk_gmres()) of the previous iteration 
+                               // was reused
+  int backtrack_num;           // step reductions of the line search 
+                               // (newton_inexact())
+};
+
+// Newton's method. If newton_reuse > 0, the modified Newton method is 
+// used: the Jacobi matrix (and its factorization, if the solver supports 
+// it) is reused for up to 'newton_reuse' subsequent iterations, as long 
+// as the residual norm decreases at least by the factor 
+// 'newton_contraction' in every iteration. If 'stats' is given, it is 
+// filled with the statistics of every iteration (the verbose output is 
+// printed from them).
 void newton(DiscreteProblem *dp, Mesh *mesh, 
             CommonSolver *solver,
             double newton_tol, int newton_maxiter,
-            bool verbose=true);
+            bool verbose=true, int newton_reuse=0, 
+            double newton_contraction=0.5, 
+            std::vector<NewtonIterationStats> *stats=NULL);
+
+// Inexact Newton's method: every linear system is solved by the iterative
+// 'solver' only up to the relative tolerance eta (forcing term), which is 
+// chosen from the decrease of the residual norm (Eisenstat-Walker, at most
+// 'eta_max'), so the systems are solved accurately only near the solution.
+// The solver has to take the tolerance (CommonSolver::set_tolerance()), 
+// otherwise error() is called. The Newton step is halved until the 
+// residual norm decreases enough (backtracking line search, only the 
+// residual vector is assembled). Returns the number of iterations; with 
+// 'verbose', the numbers of step reductions and of the linear solver 
+// iterations (CommonSolver::get_stats()) are reported, 'stats' has them 
+// for every iteration. The line search is a part of the assembly time in 
+// 'stats' (see newton()).
+int newton_inexact(DiscreteProblem *dp, Mesh *mesh, 
+                   CommonSolver *solver,
+                   double newton_tol, int newton_maxiter,
+                   bool verbose=true, double eta_max=0.9, 
+                   std::vector<NewtonIterationStats> *stats=NULL);
 
-void jfnk_cg(DiscreteProblem *dp, Mesh *mesh,
-             double matrix_solver_tol, int matrix_solver_maxiter,  
-	     double jfnk_epsilon, double jfnk_tol, int jfnk_maxiter, bool verbose=true);
+// Jacobian-free Newton-Krylov method: the Newton's method, where every 
+// linear system is solved by the restarted GMRES (up to the relative 
+// tolerance 'matrix_solver_tol') and the products of the Jacobi matrix 
+// with a vector are the finite differences of the residual vectors 
+// (relative step 'jfnk_epsilon', see DiscreteProblem::assemble_vector()),
+// so no matrix is assembled. The optional 'precond' (e.g. 
+// CommonPreconditionerILU0) is set up with the Jacobi matrix assembled
+// every 'precond_lag' iterations by 'dp_precond' (by 'dp' if NULL), which
+// can be a cheaper approximation of the problem, e.g. without the 
+// nonlinear terms. Returns the number of iterations. In 'stats' (see 
+// newton()), the products of the Jacobi matrix are a part of the solve
+// time and the nnz are those of the matrix of the preconditioner.
+int jfnk_gmres(DiscreteProblem *dp, Mesh *mesh,
+               double matrix_solver_tol, int matrix_solver_maxiter,  
+               double jfnk_epsilon, double jfnk_tol, int jfnk_maxiter, 
+               CommonPreconditioner *precond=NULL, int precond_lag=1, 
+               DiscreteProblem *dp_precond=NULL, bool verbose=true, 
+               std::vector<NewtonIterationStats> *stats=NULL);
 
 
 
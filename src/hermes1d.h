@@ -25,6 +25,7 @@
 #include "transforms.h"
 #include "adapt.h"
 #include "graph.h"
+#include "condensation.h"
 
 #include "solvers.h"
 
@@ -41,6 +41,14 @@ Element::Element(double x_left, double x_right, int level, int deg, int n_eq, in
   this->n_eq = n_eq;
   this->n_sln = n_sln;
   if (dof == NULL) error("Not enough memory in Element().");
+  for (int j=0; j < MAX_EQN_NUM; j++) {
+    for (int k=0; k < MAX_P + 1; k++) {
+      dof[j][k] = 0;
+      for (int sln=0; sln < MAX_SLN_NUM; sln++) {
+        coeffs[sln][j][k] = 0;
+      }
+    }
+  }
   sons[0] = sons[1] = NULL; 
   active = 1;
   this->level = level;
@@ -150,18 +158,38 @@ void Element::copy_dofs(int sln_src, int sln_trg)
   }
 }
 
+// Copies the solution coefficients of element 'e' to 'trg', the 
+// coefficients of the active dofs are taken from the vector 'y'.
+static void get_coeffs_with_vector(Element *e, double *y, int sln,
+                                   double trg[MAX_EQN_NUM][MAX_P + 1])
+{
+  for(int c=0; c<e->n_eq; c++) {
+    for (int j=0; j < e->p + 1; j++) {
+      if (e->dof[c][j] != -1) trg[c][j] = y[e->dof[c][j]];
+      else trg[c][j] = e->coeffs[sln][c][j];
+    }
+  }
+}
+
 // Evaluate solution and its derivatives in Gauss quadrature points 
-// of order 'quad_order' in the element.
+// of order 'quad_order' in the element. If 'y' is given, the 
+// coefficients of the active dofs are taken from the solution vector 
+// 'y' instead of the element (the Dirichlet lifts are always taken 
+// from the element).
 void Element::get_solution_quad(int flag, int quad_order, 
                                 double val_phys[MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
-				double der_phys[MAX_EQN_NUM][MAX_QUAD_PTS_NUM], int sln)
+				double der_phys[MAX_EQN_NUM][MAX_QUAD_PTS_NUM], int sln,
+                                double *y)
 {
-  double phys_x[MAX_QUAD_PTS_NUM];          // quad points
-  double phys_w[MAX_QUAD_PTS_NUM];          // quad weights
-  int pts_num;
-  create_phys_element_quadrature(this->x1, this->x2, 
-                                 quad_order, phys_x, phys_w, 
-                                 &pts_num); 
+  double coeffs_y[MAX_EQN_NUM][MAX_P + 1];
+  double (*coeffs)[MAX_P + 1] = this->coeffs[sln];
+  if (y != NULL) {
+    get_coeffs_with_vector(this, y, sln, coeffs_y);
+    coeffs = coeffs_y;
+  }
+  // only the number of quad points is needed (the values are
+  // taken from the tables of the reference shape functions)
+  int pts_num = g_quad_1d_std.get_num_points(quad_order);
 
   double jac = (this->x2 - this->x1)/2.; // Jacobian of reference map
   int p = this->p;
@@ -172,8 +200,8 @@ void Element::get_solution_quad(int flag, int quad_order,
       for (int i=0 ; i < pts_num; i++) {
         der_phys[c][i] = val_phys[c][i] = 0;
         for(int j=0; j<=p; j++) {
-          val_phys[c][i] += this->coeffs[sln][c][j]*lobatto_val_ref_tab[quad_order][i][j];
-          der_phys[c][i] += this->coeffs[sln][c][j]*lobatto_der_ref_tab[quad_order][i][j];
+          val_phys[c][i] += coeffs[c][j]*lobatto_val_ref_tab[quad_order][i][j];
+          der_phys[c][i] += coeffs[c][j]*lobatto_der_ref_tab[quad_order][i][j];
         }
         der_phys[c][i] /= jac;
       }
@@ -184,8 +212,8 @@ void Element::get_solution_quad(int flag, int quad_order,
       for (int i=0 ; i < pts_num; i++) {
         der_phys[c][i] = val_phys[c][i] = 0;
         for(int j=0; j<=p; j++) {
-          val_phys[c][i] += this->coeffs[sln][c][j]*lobatto_val_ref_tab_left[quad_order][i][j];
-          der_phys[c][i] += this->coeffs[sln][c][j]*lobatto_der_ref_tab_left[quad_order][i][j];
+          val_phys[c][i] += coeffs[c][j]*lobatto_val_ref_tab_left[quad_order][i][j];
+          der_phys[c][i] += coeffs[c][j]*lobatto_der_ref_tab_left[quad_order][i][j];
         }
         der_phys[c][i] /= jac;
       }
@@ -196,8 +224,8 @@ void Element::get_solution_quad(int flag, int quad_order,
       for (int i=0 ; i < pts_num; i++) {
         der_phys[c][i] = val_phys[c][i] = 0;
         for(int j=0; j<=p; j++) {
-          val_phys[c][i] += this->coeffs[sln][c][j]*lobatto_val_ref_tab_right[quad_order][i][j];
-          der_phys[c][i] += this->coeffs[sln][c][j]*lobatto_der_ref_tab_right[quad_order][i][j];
+          val_phys[c][i] += coeffs[c][j]*lobatto_val_ref_tab_right[quad_order][i][j];
+          der_phys[c][i] += coeffs[c][j]*lobatto_der_ref_tab_right[quad_order][i][j];
         }
         der_phys[c][i] /= jac;
       }
@@ -268,11 +296,18 @@ double Element::calc_elem_norm_squared(int norm)
   return elem_norm_squared;
 } 
 
-// Evaluate solution and its derivative at point x_phys.
+// Evaluate solution and its derivative at point x_phys (with the 
+// coefficients from the vector 'y' if given, see get_solution_quad()).
 void Element::get_solution_point(double x_phys, 
                                  double val[MAX_EQN_NUM], 
-                                 double der[MAX_EQN_NUM], int sln)
+                                 double der[MAX_EQN_NUM], int sln, double *y)
 {
+  double coeffs_y[MAX_EQN_NUM][MAX_P + 1];
+  double (*coeffs)[MAX_P + 1] = this->coeffs[sln];
+  if (y != NULL) {
+    get_coeffs_with_vector(this, y, sln, coeffs_y);
+    coeffs = coeffs_y;
+  }
   double x1 = this->x1;
   double x2 = this->x2;
   double jac = (x2-x1)/2.;
@@ -282,8 +317,8 @@ void Element::get_solution_point(double x_phys,
   for(int c=0; c < this->n_eq; c++) {
     der[c] = val[c] = 0;
     for(int j=0; j<=p; j++) {
-      val[c] += this->coeffs[sln][c][j]*lobatto_val_ref(x_ref, j);
-      der[c] += this->coeffs[sln][c][j]*lobatto_der_ref(x_ref, j);
+      val[c] += coeffs[c][j]*lobatto_val_ref(x_ref, j);
+      der[c] += coeffs[c][j]*lobatto_der_ref(x_ref, j);
     }
     der[c] /= jac;
   }
@@ -594,6 +629,7 @@ int Mesh::assign_elem_ids()
         count_id++;
     }
     delete I;
+    return count_id;
 }
 
 Element* Mesh::first_active_element()
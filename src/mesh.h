@@ -33,12 +33,14 @@ public:
     void copy_dofs(int sln_src, int sln_trg);
     void get_solution_quad(int flag, int quad_order, 
                            double val_phys[MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
-			   double der_phys[MAX_EQN_NUM][MAX_QUAD_PTS_NUM], int sln=0);
+			   double der_phys[MAX_EQN_NUM][MAX_QUAD_PTS_NUM], int sln=0,
+                           double *y=NULL);
     void get_solution_plot(double x_phys[MAX_PLOT_PTS_NUM], int pts_num,
          double val_phys[MAX_EQN_NUM][MAX_PLOT_PTS_NUM], 
 			   double der_phys[MAX_EQN_NUM][MAX_PLOT_PTS_NUM], int sln=0);
     void get_solution_point(double x_phys, 
-			    double val[MAX_EQN_NUM], double der[MAX_EQN_NUM], int sln=0);
+			    double val[MAX_EQN_NUM], double der[MAX_EQN_NUM], int sln=0,
+                            double *y=NULL);
     int create_cand_list(int adapt_type, int p_ref_left, int p_ref_right, int3 *cand_list);
     void print_cand_list(int num_cand, int3 *cand_list);
     void refine(int3 cand);
@@ -0,0 +1,278 @@
+#include "hermes1d.h"
+
+// This test makes sure that the block forms (add_matrix_form_block(), 
+// add_vector_form_block()), which evaluate the whole element matrix 
+// or vector in one call, give the same Jacobi matrix and residual 
+// vector as the scalar forms, for a coupled system of two equations.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 2;
+int N_elem = 4;                         // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 6;                         // Initial polynomal degree
+
+// ********************************************************************
+
+// The scalar forms
+double jacobian_0_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_0_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += -0.5*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*v[i] + 0.3*u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (2*dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+// residual vector (the problem is linear, so that the Jacobi 
+// matrix above is exact)
+double residual_0(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*dvdx[i] + u_prev[0][0][i]*v[i] 
+            - 0.5*u_prev[0][1][i]*v[i] - sin(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_1(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*v[i] + 0.3*u_prev[0][0][i]*v[i] 
+            + 2*du_prevdx[0][1][i]*dvdx[i] + u_prev[0][1][i]*v[i] 
+            - exp(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+// The same forms as block forms
+
+void jacobian_block_0_0(int num, double *x, double *weights, int n_fns,
+                double u[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double dudx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double **mat, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    for(int j = 0; j<n_fns; j++) {
+      double val = 0;
+      for(int k = 0; k<num; k++) {
+        val += (dudx[j][k]*dudx[i][k] + u[j][k]*u[i][k])*weights[k];
+      }
+      mat[i][j] = val;
+    }
+  }
+};
+
+void jacobian_block_0_1(int num, double *x, double *weights, int n_fns,
+                double u[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double dudx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double **mat, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    for(int j = 0; j<n_fns; j++) {
+      double val = 0;
+      for(int k = 0; k<num; k++) {
+        val += -0.5*u[j][k]*u[i][k]*weights[k];
+      }
+      mat[i][j] = val;
+    }
+  }
+};
+
+void jacobian_block_1_0(int num, double *x, double *weights, int n_fns,
+                double u[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double dudx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double **mat, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    for(int j = 0; j<n_fns; j++) {
+      double val = 0;
+      for(int k = 0; k<num; k++) {
+        val += (dudx[j][k]*u[i][k] + 0.3*u[j][k]*u[i][k])*weights[k];
+      }
+      mat[i][j] = val;
+    }
+  }
+};
+
+void jacobian_block_1_1(int num, double *x, double *weights, int n_fns,
+                double u[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double dudx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double **mat, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    for(int j = 0; j<n_fns; j++) {
+      double val = 0;
+      for(int k = 0; k<num; k++) {
+        val += (2*dudx[j][k]*dudx[i][k] + u[j][k]*u[i][k])*weights[k];
+      }
+      mat[i][j] = val;
+    }
+  }
+};
+
+void residual_block_0(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                int n_fns, double v[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double dvdx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double *vec, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    double val = 0;
+    for(int k = 0; k<num; k++) {
+      val += (du_prevdx[0][0][k]*dvdx[i][k] + u_prev[0][0][k]*v[i][k] 
+              - 0.5*u_prev[0][1][k]*v[i][k] - sin(x[k])*v[i][k])*weights[k];
+    }
+    vec[i] = val;
+  }
+};
+
+void residual_block_1(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                int n_fns, double v[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double dvdx[MAX_P + 1][MAX_QUAD_PTS_NUM], 
+                double *vec, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    double val = 0;
+    for(int k = 0; k<num; k++) {
+      val += (du_prevdx[0][0][k]*v[i][k] + 0.3*u_prev[0][0][k]*v[i][k] 
+              + 2*du_prevdx[0][1][k]*dvdx[i][k] + u_prev[0][1][k]*v[i][k] 
+              - exp(x[k])*v[i][k])*weights[k];
+    }
+    vec[i] = val;
+  }
+};
+
+/******************************************************************************/
+
+int main() {
+  // Create mesh, set Dirichlet BC, enumerate basis functions
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 1);
+  mesh->set_bc_left_dirichlet(1, 0);
+  mesh->set_bc_right_dirichlet(1, 2);
+  int n_dof = mesh->assign_dofs();
+  printf("N_dof = %d\n", n_dof);
+
+  // Register weak forms
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian_0_0);
+  dp->add_matrix_form(0, 1, jacobian_0_1);
+  dp->add_matrix_form(1, 0, jacobian_1_0);
+  dp->add_matrix_form(1, 1, jacobian_1_1);
+  dp->add_vector_form(0, residual_0);
+  dp->add_vector_form(1, residual_1);
+
+  DiscreteProblem *dp_block = new DiscreteProblem();
+  dp_block->add_matrix_form_block(0, 0, jacobian_block_0_0);
+  dp_block->add_matrix_form_block(0, 1, jacobian_block_0_1);
+  dp_block->add_matrix_form_block(1, 0, jacobian_block_1_0);
+  dp_block->add_matrix_form_block(1, 1, jacobian_block_1_1);
+  dp_block->add_vector_form_block(0, residual_block_0);
+  dp_block->add_vector_form_block(1, residual_block_1);
+
+  // Assemble both systems
+  DenseMatrix *mat = new DenseMatrix(n_dof);
+  DenseMatrix *mat_block = new DenseMatrix(n_dof);
+  double *res = new double[n_dof];
+  double *res_block = new double[n_dof];
+  dp->assemble_matrix_and_vector(mesh, mat, res);
+  dp_block->assemble_matrix_and_vector(mesh, mat_block, res_block);
+
+  int success = 1;
+  for (int i=0; i < n_dof; i++) {
+    if (fabs(res[i] - res_block[i]) > 1e-12) {
+      printf("res %d: %g != %g\n", i, res_block[i], res[i]);
+      success = 0;
+    }
+    for (int j=0; j < n_dof; j++) {
+      if (fabs(mat->get(i, j) - mat_block->get(i, j)) > 1e-12) {
+        printf("entry (%d, %d): %g != %g\n", i, j, mat_block->get(i, j), 
+               mat->get(i, j));
+        success = 0;
+      }
+    }
+  }
+
+  // Newton's loop with the block forms (converges in one step)
+  CommonSolverDenseLU solver;
+  newton(dp_block, mesh, &solver, 1e-10, 10);
+
+  delete mat;
+  delete mat_block;
+  delete [] res;
+  delete [] res_block;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
@@ -0,0 +1,180 @@
+#include "hermes1d.h"
+
+// This test makes sure that the static condensation of bubble 
+// functions (CondensationSolver) gives the same solution as 
+// a direct solver applied to the full system, for a coupled 
+// system of two equations with high polynomial degree.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 2;
+int N_elem = 4;                         // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 10;                        // Initial polynomal degree
+
+// Newton's method
+const double NEWTON_TOL = 1e-10;
+const int NEWTON_MAXITER = 10;
+
+// ********************************************************************
+
+// Jacobi matrix blocks
+double jacobian_0_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_0_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += -0.5*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*v[i] + 0.3*u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (2*dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+// residual vector (the problem is linear, so that the Jacobi 
+// matrix above is exact)
+double residual_0(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*dvdx[i] + u_prev[0][0][i]*v[i] 
+            - 0.5*u_prev[0][1][i]*v[i] - sin(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_1(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*v[i] + 0.3*u_prev[0][0][i]*v[i] 
+            + 2*du_prevdx[0][1][i]*dvdx[i] + u_prev[0][1][i]*v[i] 
+            - exp(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+/******************************************************************************/
+
+int main() {
+  // Create mesh, set Dirichlet BC, enumerate basis functions
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 1);
+  mesh->set_bc_left_dirichlet(1, 0);
+  mesh->set_bc_right_dirichlet(1, 2);
+  int n_dof = mesh->assign_dofs();
+  printf("N_dof = %d\n", n_dof);
+
+  // Register weak forms
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian_0_0);
+  dp->add_matrix_form(0, 1, jacobian_0_1);
+  dp->add_matrix_form(1, 0, jacobian_1_0);
+  dp->add_matrix_form(1, 1, jacobian_1_1);
+  dp->add_vector_form(0, residual_0);
+  dp->add_vector_form(1, residual_1);
+
+  // Assemble the full system
+  CSRMatrix *mat = new CSRMatrix(n_dof);
+  dp->create_sparse_structure(mesh, mat);
+  double *res = new double[n_dof];
+  double *res_full = new double[n_dof];
+  dp->assemble_matrix_and_vector(mesh, mat, res);
+  for (int i=0; i < n_dof; i++) res_full[i] = res[i];
+
+  // Solve it with and without static condensation
+  solve_linear_system_dense_lu(mat, res_full);
+  CommonSolverDenseLU dense;
+  CondensationSolver solver(mesh, &dense);
+  int success = solver.solve(mat, res);
+  for (int i=0; i < n_dof; i++) {
+    if (fabs(res[i] - res_full[i]) > 1e-10) {
+      printf("dof %d: %g != %g\n", i, res[i], res_full[i]);
+      success = 0;
+    }
+  }
+
+  // The factorization scheme is passed on to the reduced system solver
+  dp->assemble_vector(mesh, res);
+  solver.set_factorization_scheme(REUSE_FACTORIZATION);
+  if (!solver.solve(mat, res) || !dense.get_stats().factorization_reused 
+      || !solver.get_stats().factorization_reused) {
+    printf("the factorization of the reduced system was not reused\n");
+    success = 0;
+  }
+  solver.set_factorization_scheme(REUSE_SYMBOLIC);
+
+  // A failure of the reduced system solver is reported
+  CommonSolverGMRES gmres;
+  gmres.set_maxiter(1);
+  CondensationSolver solver_gmres(mesh, &gmres);
+  dp->assemble_vector(mesh, res);
+  if (solver_gmres.solve(mat, res)) {
+    printf("the failure of the reduced system solver was not reported\n");
+    success = 0;
+  }
+
+  // Newton's loop with the condensation (converges in one step)
+  newton(dp, mesh, &solver, NEWTON_TOL, NEWTON_MAXITER);
+
+  delete mat;
+  delete [] res;
+  delete [] res_full;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
@@ -0,0 +1,152 @@
+#include "hermes1d.h"
+
+// This test makes sure that the element cache of the DiscreteProblem
+// (quadrature and shape functions of the elements, kept between the
+// assemblies) gives the same Jacobi matrix and residual vector as a new
+// DiscreteProblem, after the previous solution changes and after the
+// mesh is refined, and that the entries of the refined elements are
+// dropped.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 1;
+int N_elem = 5;                         // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 3;                         // Initial polynomal degree
+
+// ********************************************************************
+
+// Jacobi matrix of -u'' + u^3 = f
+double jacobian(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i]
+            + 3*u_prev[0][0][i]*u_prev[0][0][i]*u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+// residual vector (a block form, which gets the shape functions
+// in the arrays of the block forms)
+void residual_block(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                int n_fns, double v[MAX_P + 1][MAX_QUAD_PTS_NUM],
+                double dvdx[MAX_P + 1][MAX_QUAD_PTS_NUM],
+                double *vec, void *user_data)
+{
+  for(int i = 0; i<n_fns; i++) {
+    double val = 0;
+    for(int k = 0; k<num; k++) {
+      double u = u_prev[0][0][k];
+      val += (du_prevdx[0][0][k]*dvdx[i][k] + u*u*u*v[i][k]
+              - sin(x[k])*v[i][k])*weights[k];
+    }
+    vec[i] = val;
+  }
+};
+
+DiscreteProblem *create_dp() {
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian);
+  dp->add_vector_form_block(0, residual_block);
+  return dp;
+}
+
+// assembles the system with 'dp' and with a new DiscreteProblem (with an
+// empty cache) and compares them
+int compare(DiscreteProblem *dp, Mesh *mesh) {
+  int n_dof = mesh->get_n_dof();
+  DiscreteProblem *dp_new = create_dp();
+  DenseMatrix *mat = new DenseMatrix(n_dof);
+  DenseMatrix *mat_new = new DenseMatrix(n_dof);
+  double *res = new double[n_dof];
+  double *res_new = new double[n_dof];
+  dp->assemble_matrix_and_vector(mesh, mat, res);
+  dp_new->assemble_matrix_and_vector(mesh, mat_new, res_new);
+
+  int success = 1;
+  for (int i=0; i < n_dof; i++) {
+    if (res[i] != res_new[i]) {
+      printf("res %d: %g != %g\n", i, res[i], res_new[i]);
+      success = 0;
+    }
+    for (int j=0; j < n_dof; j++) {
+      if (mat->get(i, j) != mat_new->get(i, j)) {
+        printf("mat %d, %d: %g != %g\n", i, j, mat->get(i, j),
+               mat_new->get(i, j));
+        success = 0;
+      }
+    }
+  }
+
+  delete dp_new;
+  delete mat;
+  delete mat_new;
+  delete [] res;
+  delete [] res_new;
+  return success;
+}
+
+// sets the solution coefficients to the values of 'fn'
+void set_solution(Mesh *mesh, double (*fn)(double)) {
+  int n_dof = mesh->get_n_dof();
+  double *y = new double[n_dof];
+  for (int i=0; i < n_dof; i++) y[i] = fn(i*0.1);
+  copy_vector_to_mesh(y, mesh);
+  delete [] y;
+}
+
+/******************************************************************************/
+
+int main() {
+  // Create mesh, set Dirichlet BC, enumerate basis functions
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 1);
+  mesh->set_bc_right_dirichlet(0, 2);
+  mesh->assign_dofs();
+
+  DiscreteProblem *dp = create_dp();
+  int success = 1;
+
+  // the first assembly fills the cache
+  set_solution(mesh, sin);
+  printf("N_dof = %d\n", mesh->get_n_dof());
+  success &= compare(dp, mesh);
+  if (dp->get_element_cache_size() != N_elem) success = 0;
+
+  // the previous solution changes (as in the Newton iterations)
+  set_solution(mesh, cos);
+  success &= compare(dp, mesh);
+
+  // refined elements (in space and in the polynomial degree)
+  mesh->reference_refinement(1, 2);
+  int3 cand = {0, P_init + 2, P_init + 2};
+  mesh->refine_single_elem(0, cand);
+  mesh->assign_dofs();
+  set_solution(mesh, exp);
+  printf("N_dof = %d\n", mesh->get_n_dof());
+  success &= compare(dp, mesh);
+
+  // only the active elements of the last assembly are kept
+  printf("cache size = %d\n", dp->get_element_cache_size());
+  if (dp->get_element_cache_size() != mesh->get_n_active_elem()) success = 0;
+
+  delete dp;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
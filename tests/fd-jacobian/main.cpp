@@ -0,0 +1,233 @@
+#include "hermes1d.h"
+
+// This test makes sure that the finite difference Jacobi matrix
+// (DiscreteProblem::set_fd_jacobian()), computed from the vector forms
+// only, agrees with the exact Jacobi matrix of a nonlinear system of
+// two equations with a nonlinear Newton boundary condition, and that
+// the Newton's method with it converges to the same solution.
+//
+//  -u'' + u*w = sin(x),  u(0) = 1,  u'(B) + Alpha*u(B)^2 = 0,
+//  -w'' + w^3 + u' = 1,  w(0) = 0,  w(B) = 1.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 2;
+int N_elem = 6;                         // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 3;                         // Initial polynomal degree
+double Alpha = 0.5;                     // Newton boundary condition
+
+// Tolerances
+double FD_TOL = 1e-5;                   // Relative tolerance of the matrix
+double NEWTON_TOL = 1e-10;              // Newton's method
+int NEWTON_MAXITER = 50;
+
+// ********************************************************************
+
+// Exact Jacobi matrix
+double jacobian_0_0(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + u[i]*u_prev[0][1][i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_0_1(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += u_prev[0][0][i]*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_0(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += dudx[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_1(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    double w = u_prev[0][1][i];
+    val += (dudx[i]*dvdx[i] + 3*w*w*u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_surf_right(double x, double u, double dudx,
+        double v, double dvdx, double u_prev[MAX_SLN_NUM][MAX_EQN_NUM],
+        double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM], void *user_data)
+{
+  return 2*Alpha*u_prev[0][0]*u*v;
+}
+
+// Residual vector
+double residual_0(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*dvdx[i] + u_prev[0][0][i]*u_prev[0][1][i]*v[i]
+            - sin(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_1(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    double w = u_prev[0][1][i];
+    val += (du_prevdx[0][1][i]*dvdx[i] + w*w*w*v[i]
+            + du_prevdx[0][0][i]*v[i] - v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_surf_right(double x, double u_prev[MAX_SLN_NUM][MAX_EQN_NUM],
+        double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM], double v,
+        double dvdx, void *user_data)
+{
+  return Alpha*u_prev[0][0]*u_prev[0][0]*v;
+}
+
+DiscreteProblem *create_dp(bool fd_jacobian) {
+  DiscreteProblem *dp = new DiscreteProblem();
+  if (fd_jacobian) dp->set_fd_jacobian(true);
+  else {
+    dp->add_matrix_form(0, 0, jacobian_0_0);
+    dp->add_matrix_form(0, 1, jacobian_0_1);
+    dp->add_matrix_form(1, 0, jacobian_1_0);
+    dp->add_matrix_form(1, 1, jacobian_1_1);
+    dp->add_matrix_form_surf(0, 0, jacobian_surf_right, BOUNDARY_RIGHT);
+  }
+  dp->add_vector_form(0, residual_0);
+  dp->add_vector_form(1, residual_1);
+  dp->add_vector_form_surf(0, residual_surf_right, BOUNDARY_RIGHT);
+  return dp;
+}
+
+Mesh *create_mesh() {
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 1);
+  mesh->set_bc_left_dirichlet(1, 0);
+  mesh->set_bc_right_dirichlet(1, 1);
+  int n_dof = mesh->assign_dofs();
+
+  // a nonzero initial guess (the Jacobi matrix depends on it)
+  double *y = new double[n_dof];
+  for (int i=0; i < n_dof; i++) y[i] = 0.5*sin(i + 1.);
+  copy_vector_to_mesh(y, mesh);
+  delete [] y;
+  return mesh;
+}
+
+/******************************************************************************/
+
+int main() {
+  Mesh *mesh = create_mesh();
+  Mesh *mesh_fd = create_mesh();
+  int n_dof = mesh->get_n_dof();
+  printf("N_dof = %d\n", n_dof);
+
+  DiscreteProblem *dp = create_dp(false);
+  DiscreteProblem *dp_fd = create_dp(true);
+  int success = 1;
+
+  // compare the Jacobi matrices and the residual vectors
+  DenseMatrix *mat = new DenseMatrix(n_dof);
+  DenseMatrix *mat_fd = new DenseMatrix(n_dof);
+  double *res = new double[n_dof];
+  double *res_fd = new double[n_dof];
+  dp->assemble_matrix_and_vector(mesh, mat, res);
+  dp_fd->assemble_matrix_and_vector(mesh, mat_fd, res_fd);
+  double max_err = 0;
+  for (int i=0; i < n_dof; i++) {
+    if (res[i] != res_fd[i]) {
+      printf("res %d: %g != %g\n", i, res_fd[i], res[i]);
+      success = 0;
+    }
+    for (int j=0; j < n_dof; j++) {
+      double err = fabs(mat_fd->get(i, j) - mat->get(i, j))
+                   / (1 + fabs(mat->get(i, j)));
+      if (err > max_err) max_err = err;
+    }
+  }
+  printf("Max. relative error of the FD Jacobi matrix: %g\n", max_err);
+  if (max_err > FD_TOL) success = 0;
+
+  // the sparsity pattern of the FD Jacobi matrix
+  CSRMatrix *mat_csr = new CSRMatrix(n_dof);
+  dp_fd->create_sparse_structure(mesh, mat_csr);
+  dp_fd->assemble_matrix(mesh, mat_csr);
+  for (int i=0; i < n_dof; i++) {
+    for (int j=0; j < n_dof; j++) {
+      if (mat_csr->get(i, j) != mat_fd->get(i, j)) {
+        printf("CSR entry %d, %d: %g != %g\n", i, j, mat_csr->get(i, j),
+               mat_fd->get(i, j));
+        success = 0;
+      }
+    }
+  }
+
+  // Newton's method with the exact and with the FD Jacobi matrix
+  newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER);
+  newton(dp_fd, mesh_fd, NULL, NEWTON_TOL, NEWTON_MAXITER);
+  double *y = new double[n_dof];
+  double *y_fd = new double[n_dof];
+  copy_mesh_to_vector(mesh, y);
+  copy_mesh_to_vector(mesh_fd, y_fd);
+  double max_diff = 0;
+  for (int i=0; i < n_dof; i++)
+    if (fabs(y[i] - y_fd[i]) > max_diff) max_diff = fabs(y[i] - y_fd[i]);
+  printf("Max. difference of the solutions: %g\n", max_diff);
+  if (max_diff > 1e-8) success = 0;
+
+  delete mat;
+  delete mat_fd;
+  delete mat_csr;
+  delete [] res;
+  delete [] res_fd;
+  delete [] y;
+  delete [] y_fd;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
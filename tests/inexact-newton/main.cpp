@@ -0,0 +1,236 @@
+#include "hermes1d.h"
+
+// This test makes sure that the inexact Newton's method (newton_inexact())
+// converges to the same solution as the Newton's method with accurate
+// linear solves, with fewer GMRES (and CG) iterations, and that the line 
+// search makes it converge from an initial guess where the full Newton 
+// steps don't converge, and that the statistics of the iterations returned
+// to the caller agree with the solver, for the problem
+//
+//  -D*u'' + atan(u) = 1,  u(A) = u(B) = 0.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 1;
+int N_elem = 40;                        // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 2;                         // Initial polynomal degree
+double D = 0.01;                        // Diffusion coefficient
+
+// Newton's method
+double NEWTON_TOL = 1e-9;
+int NEWTON_MAXITER = 50;
+
+// ********************************************************************
+
+double jacobian(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    double w = u_prev[0][0][i];
+    val += (D*dudx[i]*dvdx[i] + u[i]*v[i]/(1 + w*w))*weights[i];
+  }
+  return val;
+};
+
+double residual(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (D*du_prevdx[0][0][i]*dvdx[i] + atan(u_prev[0][0][i])*v[i]
+            - v[i])*weights[i];
+  }
+  return val;
+};
+
+// GMRES which counts its iterations
+class CountingGMRES : public CommonSolverGMRES
+{
+public:
+  CountingGMRES() { iter_num = 0; }
+  using CommonSolverGMRES::solve;
+  bool solve(Matrix *mat, double *res)
+  {
+    bool success = CommonSolverGMRES::solve(mat, res);
+    iter_num += get_residual_history().size() - 1;
+    return success;
+  }
+  int iter_num;
+};
+
+Mesh *create_mesh(double init_val) {
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 0);
+  mesh->set_bc_right_dirichlet(0, 0);
+  int n_dof = mesh->assign_dofs();
+  double *y = new double[n_dof];
+  for (int i=0; i < n_dof; i++) y[i] = init_val;
+  copy_vector_to_mesh(y, mesh);
+  delete [] y;
+  return mesh;
+}
+
+// Newton's method with the full steps and accurate linear solves, like
+// newton() (which exits if it doesn't converge); returns the number of
+// iterations, or -1 if it doesn't converge in 'maxiter' iterations
+int full_newton(DiscreteProblem *dp, Mesh *mesh, int maxiter) {
+  int n_dof = mesh->get_n_dof();
+  double *y = new double[n_dof];
+  double *res = new double[n_dof];
+  copy_mesh_to_vector(mesh, y);
+  CommonSolverDenseLU solver;
+  int iter_num = 0;
+  while (1) {
+    DenseMatrix mat(n_dof);
+    dp->assemble_matrix_and_vector(mesh, &mat, res);
+    double res_norm = 0;
+    for (int i=0; i < n_dof; i++) res_norm += res[i]*res[i];
+    if (sqrt(res_norm) < NEWTON_TOL) break;
+    if (iter_num >= maxiter) {
+      iter_num = -1;
+      break;
+    }
+    for (int i=0; i < n_dof; i++) res[i] = -res[i];
+    solver.solve(&mat, res);
+    for (int i=0; i < n_dof; i++) y[i] += res[i];
+    copy_vector_to_mesh(y, mesh);
+    iter_num++;
+  }
+  delete [] y;
+  delete [] res;
+  return iter_num;
+}
+
+// maximum difference of the solution coefficients
+double max_difference(Mesh *mesh1, Mesh *mesh2) {
+  int n_dof = mesh1->get_n_dof();
+  double *y1 = new double[n_dof];
+  double *y2 = new double[n_dof];
+  copy_mesh_to_vector(mesh1, y1);
+  copy_mesh_to_vector(mesh2, y2);
+  double max_diff = 0;
+  for (int i=0; i < n_dof; i++)
+    if (fabs(y1[i] - y2[i]) > max_diff) max_diff = fabs(y1[i] - y2[i]);
+  delete [] y1;
+  delete [] y2;
+  return max_diff;
+}
+
+/******************************************************************************/
+
+int main() {
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian);
+  dp->add_vector_form(0, residual);
+
+  CommonPreconditionerJacobi precond;
+  int success = 1;
+
+  // Newton's method with accurate linear solves
+  Mesh *mesh = create_mesh(0);
+  printf("N_dof = %d\n", mesh->get_n_dof());
+  CountingGMRES solver;
+  solver.set_preconditioner(&precond);
+  solver.set_tolerance(1e-12);
+  newton(dp, mesh, &solver, NEWTON_TOL, NEWTON_MAXITER);
+
+  // inexact Newton's method
+  Mesh *mesh_inexact = create_mesh(0);
+  CountingGMRES solver_inexact;
+  solver_inexact.set_preconditioner(&precond);
+  solver_inexact.set_tolerance(1e-12);
+  std::vector<NewtonIterationStats> stats;
+  newton_inexact(dp, mesh_inexact, &solver_inexact, NEWTON_TOL,
+                 NEWTON_MAXITER, true, 0.9, &stats);
+  double diff = max_difference(mesh, mesh_inexact);
+  printf("GMRES iterations: %d (Newton), %d (inexact Newton), %d saved\n",
+         solver.iter_num, solver_inexact.iter_num,
+         solver.iter_num - solver_inexact.iter_num);
+  printf("Max. difference of the solutions: %g\n", diff);
+  if (diff > 1e-7) success = 0;
+  if (solver_inexact.iter_num >= solver.iter_num) success = 0;
+  // the tolerance of the solver is restored
+  if (solver_inexact.get_tolerance() != 1e-12) success = 0;
+
+  // one record per iteration and the converged one, without a Jacobi
+  // matrix
+  int linear_iter_num = 0;
+  for (int i=0; i < (int)stats.size(); i++) {
+    NewtonIterationStats &it = stats[i];
+    bool last = i == (int)stats.size() - 1;
+    if (last != (it.res_norm < NEWTON_TOL)) success = 0;
+    if (last != (it.nnz == 0)) success = 0;
+    if (it.assembly_time < 0 || it.solve_time < 0) success = 0;
+    linear_iter_num += it.linear_iter_num;
+  }
+  printf("Iterations: %d, GMRES iterations: %d\n", (int)stats.size() - 1,
+         linear_iter_num);
+  if (stats.size() < 2) success = 0;
+  if (linear_iter_num != solver_inexact.iter_num) success = 0;
+
+  // the same with CG (the Jacobi matrix is symmetric), the iterations are 
+  // taken from the statistics of the solver
+  Mesh *mesh_cg = create_mesh(0);
+  CommonSolverCG solver_cg;
+  solver_cg.set_preconditioner(&precond);
+  solver_cg.set_tolerance(1e-12);
+  newton(dp, mesh_cg, &solver_cg, NEWTON_TOL, NEWTON_MAXITER, true, 0, 0.5,
+         &stats);
+  int cg_iter_num = 0;
+  for (int i=0; i < (int)stats.size(); i++) 
+    cg_iter_num += stats[i].linear_iter_num;
+  Mesh *mesh_cg_inexact = create_mesh(0);
+  newton_inexact(dp, mesh_cg_inexact, &solver_cg, NEWTON_TOL, 
+                 NEWTON_MAXITER, true, 0.9, &stats);
+  int cg_inexact_iter_num = 0;
+  for (int i=0; i < (int)stats.size(); i++) 
+    cg_inexact_iter_num += stats[i].linear_iter_num;
+  diff = max_difference(mesh, mesh_cg_inexact);
+  printf("CG iterations: %d (Newton), %d (inexact Newton)\n", 
+         cg_iter_num, cg_inexact_iter_num);
+  printf("Max. difference of the solutions: %g\n", diff);
+  if (diff > 1e-7) success = 0;
+  if (cg_inexact_iter_num == 0 || cg_inexact_iter_num >= cg_iter_num) 
+    success = 0;
+  if (solver_cg.get_tolerance() != 1e-12) success = 0;
+
+  // far from the solution (the full Newton steps for atan(u) overshoot
+  // and don't converge, the line search has to shorten them)
+  Mesh *mesh_far = create_mesh(10);
+  CountingGMRES solver_far;
+  solver_far.set_preconditioner(&precond);
+  newton_inexact(dp, mesh_far, &solver_far, NEWTON_TOL, NEWTON_MAXITER, 
+                 true, 0.9, &stats);
+  diff = max_difference(mesh, mesh_far);
+  printf("Max. difference of the solutions: %g\n", diff);
+  if (diff > 1e-7) success = 0;
+  int backtrack_num = 0;
+  for (int i=0; i < (int)stats.size(); i++) 
+    backtrack_num += stats[i].backtrack_num;
+  printf("Step reductions: %d\n", backtrack_num);
+  if (backtrack_num == 0) success = 0;
+  Mesh *mesh_full = create_mesh(10);
+  int full_iter_num = full_newton(dp, mesh_full, NEWTON_MAXITER);
+  printf("Full Newton steps: %d iterations (-1: not converged)\n", 
+         full_iter_num);
+  if (full_iter_num != -1 && full_iter_num <= (int)stats.size() - 1) 
+    success = 0;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
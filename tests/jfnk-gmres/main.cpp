@@ -0,0 +1,174 @@
+#include "hermes1d.h"
+
+// This test makes sure that the residual vector assembled from a solution
+// vector (DiscreteProblem::assemble_vector(mesh, y, res)) is the same as
+// the one assembled from the mesh, and that the JFNK method (jfnk_gmres())
+// converges to the solution of the Newton's method for a problem with a
+// nonsymmetric Jacobi matrix, without a preconditioner and with the ILU(0)
+// preconditioner of the (lagged) Jacobi matrix of the linear part of the
+// problem, also for more unknowns than the former limit MAX_N_DOF,
+//
+//  -u'' + B_conv*u' + u^3 = 1,  u(A) = 0, u(B) = 1.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 1;
+double A = 0, B = 1;                    // Domain end points
+int P_init = 3;                         // Initial polynomal degree
+double B_conv = 20;                     // Convection coefficient
+
+// JFNK
+double MATRIX_SOLVER_TOL = 1e-4;
+int MATRIX_SOLVER_MAXITER = 1000;
+double JFNK_EPSILON = 1e-7;
+double NEWTON_TOL = 1e-8;
+int NEWTON_MAXITER = 50;
+
+// ********************************************************************
+
+// Jacobi matrix of the linear part of the problem
+double jacobian_linear(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + B_conv*dudx[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_cubic(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    double w = u_prev[0][0][i];
+    val += 3*w*w*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double residual(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    double w = u_prev[0][0][i];
+    val += (du_prevdx[0][0][i]*dvdx[i] + B_conv*du_prevdx[0][0][i]*v[i]
+            + w*w*w*v[i] - v[i])*weights[i];
+  }
+  return val;
+};
+
+Mesh *create_mesh(int n_elem) {
+  Mesh *mesh = new Mesh(A, B, n_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 0);
+  mesh->set_bc_right_dirichlet(0, 1);
+  mesh->assign_dofs();
+  return mesh;
+}
+
+// maximum difference of the solution coefficients
+double max_difference(Mesh *mesh1, Mesh *mesh2) {
+  int n_dof = mesh1->get_n_dof();
+  double *y1 = new double[n_dof];
+  double *y2 = new double[n_dof];
+  copy_mesh_to_vector(mesh1, y1);
+  copy_mesh_to_vector(mesh2, y2);
+  double max_diff = 0;
+  for (int i=0; i < n_dof; i++)
+    if (fabs(y1[i] - y2[i]) > max_diff) max_diff = fabs(y1[i] - y2[i]);
+  delete [] y1;
+  delete [] y2;
+  return max_diff;
+}
+
+// solves the problem on a mesh with 'n_elem' elements by the Newton's
+// method and by the JFNK method and compares the solutions
+int compare(DiscreteProblem *dp, int n_elem, CommonPreconditioner *precond,
+            DiscreteProblem *dp_precond) {
+  Mesh *mesh = create_mesh(n_elem);
+  Mesh *mesh_jfnk = create_mesh(n_elem);
+  printf("N_dof = %d\n", mesh->get_n_dof());
+  newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER);
+  jfnk_gmres(dp, mesh_jfnk, MATRIX_SOLVER_TOL, MATRIX_SOLVER_MAXITER,
+             JFNK_EPSILON, NEWTON_TOL, NEWTON_MAXITER, precond, 2,
+             dp_precond);
+  double diff = max_difference(mesh, mesh_jfnk);
+  printf("Max. difference of the solutions: %g\n", diff);
+  delete mesh;
+  delete mesh_jfnk;
+  return diff < 1e-7;
+}
+
+/******************************************************************************/
+
+int main() {
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian_linear);
+  dp->add_matrix_form(0, 0, jacobian_cubic);
+  dp->add_vector_form(0, residual);
+  // the linear part only (for the preconditioner)
+  DiscreteProblem *dp_linear = new DiscreteProblem();
+  dp_linear->add_matrix_form(0, 0, jacobian_linear);
+
+  int success = 1;
+
+  // the residual vector from a solution vector, the mesh is not changed
+  Mesh *mesh = create_mesh(10);
+  int n_dof = mesh->get_n_dof();
+  double *y = new double[n_dof];
+  double *res = new double[n_dof];
+  double *res_y = new double[n_dof];
+  double *y_mesh = new double[n_dof];
+  double *y_mesh_after = new double[n_dof];
+  for (int i=0; i < n_dof; i++) y[i] = sin(i + 1.);
+  copy_mesh_to_vector(mesh, y_mesh);
+  dp->assemble_vector(mesh, y, res_y);
+  copy_mesh_to_vector(mesh, y_mesh_after);
+  for (int i=0; i < n_dof; i++)
+    if (y_mesh_after[i] != y_mesh[i]) success = 0;
+  copy_vector_to_mesh(y, mesh);
+  dp->assemble_vector(mesh, res);
+  for (int i=0; i < n_dof; i++) {
+    if (res[i] != res_y[i]) {
+      printf("res %d: %g != %g\n", i, res_y[i], res[i]);
+      success = 0;
+    }
+  }
+  delete mesh;
+  delete [] y;
+  delete [] res;
+  delete [] res_y;
+  delete [] y_mesh;
+  delete [] y_mesh_after;
+
+  // without a preconditioner
+  success &= compare(dp, 20, NULL, NULL);
+  // ILU(0) with the Jacobi matrix of the linear part, more than
+  // MAX_N_DOF unknowns
+  CommonPreconditionerILU0 precond;
+  success &= compare(dp, MAX_N_DOF/P_init + 1, &precond, dp_linear);
+
+  delete dp;
+  delete dp_linear;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
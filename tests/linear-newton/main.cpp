@@ -0,0 +1,178 @@
+#include "hermes1d.h"
+
+// This test makes sure that the Newton's method for a linear problem
+// (DiscreteProblem::set_linear()) assembles the system only once and
+// gives the same solution as the general Newton's method, for a system
+// of two equations with a Newton boundary condition.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 2;
+int N_elem = 20;                        // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 3;                         // Initial polynomal degree
+
+// Tolerances
+double NEWTON_TOL = 1e-8;
+int NEWTON_MAXITER = 50;
+
+// number of evaluations of the residual forms
+int N_residual_calls = 0;
+
+// ********************************************************************
+
+// Jacobi matrix
+double jacobian_0_0(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_0_1(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += -0.5*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_1(int num, double *x, double *weights,
+                double *u, double *dudx, double *v, double *dvdx,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (2*dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_surf_right(double x, double u, double dudx,
+        double v, double dvdx, double u_prev[MAX_SLN_NUM][MAX_EQN_NUM],
+        double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM], void *user_data)
+{
+  return 3*u*v;
+}
+
+// Residual vector
+double residual_0(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double *v, double *dvdx, void *user_data)
+{
+  N_residual_calls++;
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*dvdx[i] + u_prev[0][0][i]*v[i]
+            - 0.5*u_prev[0][1][i]*v[i] - sin(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_1(int num, double *x, double *weights,
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (2*du_prevdx[0][1][i]*dvdx[i] + u_prev[0][1][i]*v[i]
+            - exp(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_surf_right(double x, double u_prev[MAX_SLN_NUM][MAX_EQN_NUM],
+        double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM], double v,
+        double dvdx, void *user_data)
+{
+  return (3*u_prev[0][0] - 1)*v;
+}
+
+Mesh *create_mesh() {
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 1);
+  mesh->set_bc_left_dirichlet(1, 0);
+  mesh->set_bc_right_dirichlet(1, 2);
+  mesh->assign_dofs();
+  return mesh;
+}
+
+/******************************************************************************/
+
+int main() {
+  Mesh *mesh = create_mesh();
+  Mesh *mesh_linear = create_mesh();
+  int n_dof = mesh->get_n_dof();
+  printf("N_dof = %d\n", n_dof);
+
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian_0_0);
+  dp->add_matrix_form(0, 1, jacobian_0_1);
+  dp->add_matrix_form(1, 1, jacobian_1_1);
+  dp->add_matrix_form_surf(0, 0, jacobian_surf_right, BOUNDARY_RIGHT);
+  dp->add_vector_form(0, residual_0);
+  dp->add_vector_form(1, residual_1);
+  dp->add_vector_form_surf(0, residual_surf_right, BOUNDARY_RIGHT);
+
+  // number of residual form evaluations in one assembly
+  double *res = new double[n_dof];
+  dp->assemble_vector(mesh, res);
+  int n_calls_assembly = N_residual_calls;
+  delete [] res;
+
+  int success = 1;
+
+  // general Newton's method
+  N_residual_calls = 0;
+  newton(dp, mesh, NULL, NEWTON_TOL, NEWTON_MAXITER);
+  printf("General Newton's method: %d assemblies\n",
+         N_residual_calls/n_calls_assembly);
+
+  // Newton's method for linear problems
+  dp->set_linear(true);
+  N_residual_calls = 0;
+  newton(dp, mesh_linear, NULL, NEWTON_TOL, NEWTON_MAXITER);
+  printf("Linear Newton's method: %d assemblies\n",
+         N_residual_calls/n_calls_assembly);
+  if (N_residual_calls != n_calls_assembly) success = 0;
+
+  double *y = new double[n_dof];
+  double *y_linear = new double[n_dof];
+  copy_mesh_to_vector(mesh, y);
+  copy_mesh_to_vector(mesh_linear, y_linear);
+  double max_diff = 0;
+  for (int i=0; i < n_dof; i++)
+    if (fabs(y[i] - y_linear[i]) > max_diff)
+      max_diff = fabs(y[i] - y_linear[i]);
+  printf("Max. difference of the solutions: %g\n", max_diff);
+  if (max_diff > 1e-10) success = 0;
+
+  delete [] y;
+  delete [] y_linear;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
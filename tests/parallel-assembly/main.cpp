@@ -0,0 +1,160 @@
+#include "hermes1d.h"
+
+// This test makes sure that the parallel assembly 
+// (DiscreteProblem::set_parallel()) gives exactly the same Jacobi 
+// matrix and residual vector as the serial one, for a coupled system 
+// of two equations on a mesh with more elements than one batch.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 2;
+int N_elem = 700;                       // Number of elements
+double A = 0, B = 2;                    // Domain end points
+int P_init = 3;                         // Initial polynomal degree
+
+// ********************************************************************
+
+// Jacobi matrix blocks
+double jacobian_0_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_0_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += -0.5*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*v[i] + 0.3*u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (2*dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+// residual vector (the problem is linear, so that the Jacobi 
+// matrix above is exact)
+double residual_0(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*dvdx[i] + u_prev[0][0][i]*v[i] 
+            - 0.5*u_prev[0][1][i]*v[i] - sin(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+double residual_1(int num, double *x, double *weights, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM],  
+                double *v, double *dvdx, void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (du_prevdx[0][0][i]*v[i] + 0.3*u_prev[0][0][i]*v[i] 
+            + 2*du_prevdx[0][1][i]*dvdx[i] + u_prev[0][1][i]*v[i] 
+            - exp(x[i])*v[i])*weights[i];
+  }
+  return val;
+};
+
+/******************************************************************************/
+
+int main() {
+  // Create mesh, set Dirichlet BC, enumerate basis functions
+  Mesh *mesh = new Mesh(A, B, N_elem, P_init, N_eq);
+  mesh->set_bc_left_dirichlet(0, 1);
+  mesh->set_bc_left_dirichlet(1, 0);
+  mesh->set_bc_right_dirichlet(1, 2);
+  int n_dof = mesh->assign_dofs();
+  printf("N_dof = %d\n", n_dof);
+
+  // Register weak forms
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian_0_0);
+  dp->add_matrix_form(0, 1, jacobian_0_1);
+  dp->add_matrix_form(1, 0, jacobian_1_0);
+  dp->add_matrix_form(1, 1, jacobian_1_1);
+  dp->add_vector_form(0, residual_0);
+  dp->add_vector_form(1, residual_1);
+
+  // Assemble the system serially and in parallel
+  CSRMatrix *mat = new CSRMatrix(n_dof);
+  CSRMatrix *mat_parallel = new CSRMatrix(n_dof);
+  dp->create_sparse_structure(mesh, mat);
+  dp->create_sparse_structure(mesh, mat_parallel);
+  double *res = new double[n_dof];
+  double *res_parallel = new double[n_dof];
+  dp->assemble_matrix_and_vector(mesh, mat, res);
+  dp->set_parallel(true);
+  dp->assemble_matrix_and_vector(mesh, mat_parallel, res_parallel);
+
+  int success = 1;
+  for (int i=0; i < n_dof; i++) {
+    if (res[i] != res_parallel[i]) {
+      printf("res %d: %g != %g\n", i, res_parallel[i], res[i]);
+      success = 0;
+    }
+  }
+  for (int k=0; k < mat->get_nnz(); k++) {
+    if (mat->get_Ax()[k] != mat_parallel->get_Ax()[k]) {
+      printf("entry %d: %g != %g\n", k, mat_parallel->get_Ax()[k], 
+             mat->get_Ax()[k]);
+      success = 0;
+    }
+  }
+
+  delete mat;
+  delete mat_parallel;
+  delete [] res;
+  delete [] res_parallel;
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}
@@ -0,0 +1,129 @@
+#include "hermes1d.h"
+
+// This test makes sure that the bilinear forms added by 
+// add_matrix_form_ref() (scaled reference element matrices) give 
+// the same Jacobi matrix as the same forms evaluated by the 
+// quadrature, for a coupled system of two equations and several 
+// polynomial degrees.
+
+#define ERROR_SUCCESS                               0
+#define ERROR_FAILURE                               -1
+
+// General input:
+static int N_eq = 2;
+int N_elem = 5;                         // Number of elements
+double A = 0, B = 3;                    // Domain end points
+
+// ********************************************************************
+
+// Jacobi matrix blocks
+double jacobian_0_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_0_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += -0.5*u[i]*v[i]*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_0(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (dudx[i]*v[i] + 0.3*u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+double jacobian_1_1(int num, double *x, double *weights, 
+                double *u, double *dudx, double *v, double *dvdx, 
+                double u_prev[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                double du_prevdx[MAX_SLN_NUM][MAX_EQN_NUM][MAX_QUAD_PTS_NUM], 
+                void *user_data)
+{
+  double val = 0;
+  for(int i = 0; i<num; i++) {
+    val += (2*dudx[i]*dvdx[i] + u[i]*v[i])*weights[i];
+  }
+  return val;
+};
+
+/******************************************************************************/
+
+int main() {
+  // The same Jacobi matrix evaluated by the quadrature ...
+  DiscreteProblem *dp = new DiscreteProblem();
+  dp->add_matrix_form(0, 0, jacobian_0_0);
+  dp->add_matrix_form(0, 1, jacobian_0_1);
+  dp->add_matrix_form(1, 0, jacobian_1_0);
+  dp->add_matrix_form(1, 1, jacobian_1_1);
+
+  // ... and from the reference matrices
+  DiscreteProblem *dp_ref = new DiscreteProblem();
+  dp_ref->add_matrix_form_ref(0, 0, REF_FORM_STIFFNESS, 1);
+  dp_ref->add_matrix_form_ref(0, 0, REF_FORM_MASS, 1);
+  dp_ref->add_matrix_form_ref(0, 1, REF_FORM_MASS, -0.5);
+  dp_ref->add_matrix_form_ref(1, 0, REF_FORM_ADVECTION, 1);
+  dp_ref->add_matrix_form_ref(1, 0, REF_FORM_MASS, 0.3);
+  dp_ref->add_matrix_form_ref(1, 1, REF_FORM_STIFFNESS, 2);
+  dp_ref->add_matrix_form_ref(1, 1, REF_FORM_MASS, 1);
+
+  int success = 1;
+  int p_init[3] = {1, 4, 9};
+  for (int k = 0; k < 3; k++) {
+    // Create mesh, set Dirichlet BC, enumerate basis functions
+    Mesh *mesh = new Mesh(A, B, N_elem, p_init[k], N_eq);
+    mesh->set_bc_left_dirichlet(0, 1);
+    mesh->set_bc_right_dirichlet(1, 2);
+    int n_dof = mesh->assign_dofs();
+    printf("p = %d, N_dof = %d\n", p_init[k], n_dof);
+
+    DenseMatrix *mat = new DenseMatrix(n_dof);
+    DenseMatrix *mat_ref = new DenseMatrix(n_dof);
+    dp->assemble_matrix(mesh, mat);
+    dp_ref->assemble_matrix(mesh, mat_ref);
+    for (int i=0; i < n_dof; i++) {
+      for (int j=0; j < n_dof; j++) {
+        if (fabs(mat->get(i, j) - mat_ref->get(i, j)) > 1e-10) {
+          printf("entry (%d, %d): %g != %g\n", i, j, mat_ref->get(i, j), 
+                 mat->get(i, j));
+          success = 0;
+        }
+      }
+    }
+
+    delete mat;
+    delete mat_ref;
+    delete mesh;
+  }
+
+  if (success) {
+    printf("Success!\n");
+    return ERROR_SUCCESS;
+  }
+  else {
+    printf("Failure!\n");
+    return ERROR_FAILURE;
+  }
+}